@@ -1,18 +1,93 @@
-from sqlalchemy import create_engine, text
+import os
+
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-DATABASE_URL = "sqlite:///./bot.db"
-
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
+from app.config import (
+    ASYNC_DB,
+    DATABASE_URL,
+    DB_MAX_OVERFLOW,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
 )
 
+# Revisión de Alembic equivalente al esquema que dejaba create_all + ensure_sqlite_schema.
+# Columnas y tablas nuevas van como migraciones en migrations/versions, no acá.
+BASELINE_REVISION = "0001_baseline"
+BASELINE_TABLES = [
+    "users", "moderators", "messages", "cases", "user_actions",
+    "pending_instructions", "conversation_history", "ai_settings",
+    "knowledge_base", "groups", "group_moderators", "state_versions",
+]
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+
+def _engine_options(url: str) -> dict:
+    if url.startswith("sqlite"):
+        return {"connect_args": {"check_same_thread": False}}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def _async_url(url: str) -> str:
+    """Misma base con el driver async equivalente"""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    for prefix in ("postgresql+psycopg2:", "postgresql:", "postgres:"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg:" + url[len(prefix):]
+    return url
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL + busy_timeout: varios workers/procesos escribiendo el mismo archivo
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_DB:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(_async_url(DATABASE_URL), **_engine_options(DATABASE_URL))
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=True)
+
+if DATABASE_URL.startswith("sqlite"):
+    event.listen(engine, "connect", _sqlite_pragmas)
+    if async_engine is not None:
+        event.listen(async_engine.sync_engine, "connect", _sqlite_pragmas)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
 
+def insert_or_ignore(session, model, values: dict) -> bool:
+    """
+    INSERT ... ON CONFLICT DO NOTHING: si otro worker insertó la misma clave
+    al mismo tiempo no hay IntegrityError. True si la fila es nuestra.
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return session.execute(insert(model).values(**values).on_conflict_do_nothing()).rowcount == 1
+
+
 def ensure_sqlite_schema():
     if not DATABASE_URL.startswith("sqlite"):
         return
@@ -32,24 +107,90 @@ def ensure_sqlite_schema():
         "content_length": "INTEGER",
     }
 
+    expected_columns = {
+        "messages": expected_message_columns,
+        "cases": {
+            "chat_id": "VARCHAR",
+        },
+        "pending_instructions": {
+            "claim_token": "VARCHAR",
+            "claimed_at": "DATETIME",
+        },
+    }
+
+    expected_indexes = {
+        "ix_cases_chat_id": ("cases", "chat_id"),
+        "ix_pending_instructions_claim_token": ("pending_instructions", "claim_token"),
+    }
+
     with engine.begin() as conn:
         existing_tables = {
             row[0]
             for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type='table'"))
         }
-        if "messages" not in existing_tables:
-            return
 
-        existing_columns = {
-            row[1]
-            for row in conn.execute(text("PRAGMA table_info(messages)"))
-        }
-
-        for column_name, column_sql in expected_message_columns.items():
-            if column_name in existing_columns:
+        for table_name, columns in expected_columns.items():
+            if table_name not in existing_tables:
                 continue
-            conn.execute(text(f"ALTER TABLE messages ADD COLUMN {column_name} {column_sql}"))
 
+            existing_columns = {
+                row[1]
+                for row in conn.execute(text(f"PRAGMA table_info({table_name})"))
+            }
+
+            for column_name, column_sql in columns.items():
+                if column_name in existing_columns:
+                    continue
+                conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_sql}"))
+
+        if "cases" in existing_tables and "messages" in existing_tables:
+            # Casos viejos: heredar el grupo desde el mensaje
+            conn.execute(text(
+                "UPDATE cases SET chat_id = ("
+                "SELECT messages.chat_id FROM messages WHERE messages.id = cases.message_id"
+                ") WHERE chat_id IS NULL"
+            ))
+
+        for index_name, (table_name, column_name) in expected_indexes.items():
+            if table_name in existing_tables:
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({column_name})"))
+
+
+def _alembic_config():
+    from alembic.config import Config
+
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", os.path.join(os.path.dirname(ALEMBIC_INI), "migrations"))
+    config.set_main_option("sqlalchemy.url", DATABASE_URL.replace("%", "%%"))
+    # No pisar la configuración de logging de uvicorn
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def init_schema(retries: int = 3):
+    """
+    Lleva la base a la última migración de Alembic.
+    Bases creadas antes de Alembic (create_all + ensure_sqlite_schema) se
+    completan hasta la migración inicial, se marcan con esa revisión y
+    después siguen el camino normal.
+    Con varios workers arrancando a la vez, el primero migra y el resto reintenta.
+    """
+    from alembic import command
+
+    for attempt in range(retries):
+        try:
+            config = _alembic_config()
+            tables = set(inspect(engine).get_table_names())
+            if "users" in tables and "alembic_version" not in tables:
+                baseline = [Base.metadata.tables[name] for name in BASELINE_TABLES]
+                Base.metadata.create_all(bind=engine, tables=baseline)
+                ensure_sqlite_schema()
+                command.stamp(config, BASELINE_REVISION)
+            command.upgrade(config, "head")
+            return
+        except OperationalError:
+            if attempt == retries - 1:
+                raise
 
 from app.models.conversation import ConversationTurn
 from app.models.ai_settings import AISettings
@@ -1,4 +1,10 @@
-from app.database import SessionLocal
+from functools import partial
+
+import anyio
+from starlette.concurrency import run_in_threadpool
+
+from app.config import LLM_MAX_CONCURRENCY
+from app.database import SessionLocal, AsyncSessionLocal
 
 
 def get_db():
@@ -7,3 +13,69 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_hot_db():
+    """
+    Sesión para las rutas calientes: AsyncSession si ASYNC_DB está activo,
+    si no la Session sync de siempre (que se usa desde el threadpool).
+    """
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            await _close_sync(db)
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """
+    Ejecuta fn(session, *args) con la lógica ORM sync de siempre.
+    Con AsyncSession corre sobre el driver async sin ocupar hilos;
+    con Session sync se manda al threadpool como hacía FastAPI con los `def`.
+    """
+    if AsyncSessionLocal is not None and hasattr(db, "run_sync"):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+async def close_db(db):
+    """Libera la conexión antes de terminar el request (p.ej. antes de esperar a la IA)"""
+    if hasattr(db, "run_sync"):
+        await db.close()
+    else:
+        await _close_sync(db)
+
+
+_close_limiter = None
+
+
+async def _close_sync(db):
+    """
+    Cierra una Session sync fuera del threadpool de requests (como hace FastAPI
+    con el teardown de sus dependencias): si todos los hilos están esperando
+    una conexión, la que se libera acá no puede quedar esperando un hilo.
+    """
+    global _close_limiter
+    if _close_limiter is None:
+        _close_limiter = anyio.CapacityLimiter(1)
+    await anyio.to_thread.run_sync(db.close, limiter=_close_limiter)
+
+
+_llm_limiter = None
+
+
+async def run_llm(fn, *args, **kwargs):
+    """Llamadas bloqueantes a la IA en un pool propio, separado del de requests"""
+    global _llm_limiter
+    if _llm_limiter is None:
+        _llm_limiter = anyio.CapacityLimiter(LLM_MAX_CONCURRENCY)
+    return await anyio.to_thread.run_sync(partial(fn, *args, **kwargs), limiter=_llm_limiter)
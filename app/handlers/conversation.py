@@ -1,13 +1,21 @@
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
 from app.models import User, Moderator, Case, Message, UserAction
+from app.handlers import conversation_flow
 from app.services.groq_chat import ask_groq
+from app.utils import conversation_state, moderation_summary, reply_templates
+from app.utils.auth import invalidate_moderators_cache, is_active_moderator
+from app.utils.groups import get_group_config, get_max_strikes
+from datetime import datetime
 import re
 
 
 class ConversationHandler:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, defer_ai: bool = False):
         self.db = db
+        # Si es True no se llama a la IA acá: se devuelve {"defer_ai": ...}
+        # y quien llama hace la consulta fuera de la sesión de base
+        self.defer_ai = defer_ai
 
     def normalize_phone(self, phone: str) -> str:
         """Normaliza números de teléfono"""
@@ -37,8 +45,8 @@ class ConversationHandler:
             normalized_real = self.normalize_phone(real_phone)
             is_admin = is_admin or (normalized_real == str(ADMIN_PHONE))
 
-        # Verificar si es moderador (ahora busca por LID también)
-        is_mod = self._is_moderator(phone)
+        # Verificar si es moderador (ahora busca por LID también; set cacheado en memoria)
+        is_mod = is_active_moderator(self.db, phone)
 
         print(f"   👑 Admin: {is_admin}, 🛡️ Mod: {is_mod}")
 
@@ -46,47 +54,16 @@ class ConversationHandler:
         if is_mod and message_lower == "estoy":
             self._update_moderator_lid(phone, real_phone)
 
-        # Comandos de admin
-        if is_admin and (message_lower.startswith("agregar mod") or message_lower.startswith("quitar mod")):
-            return self._handle_admin_command(normalized_phone, message_lower, reply_jid, real_phone)
-
-        # Comandos de usuario
-        if message_lower in ["menu", "/menu"]:
-            if is_mod:
-                return self._show_moderator_menu(normalized_phone, name, reply_jid)
-            return self._show_user_menu(normalized_phone, name, reply_jid)
-
-        if message_lower in ["strikes", "/strikes"]:
-            return self._get_user_strikes(normalized_phone, name, reply_jid)
-
-        if message_lower in ["reglas", "/reglas"]:
-            return self._get_rules(normalized_phone, reply_jid)
-
-        if message_lower in ["ia", "/ia", "hablar con ia", "hablar con la ia"]:
-            return self._show_ai_intro(normalized_phone, name, reply_jid)
-
-        # Sistema de apelación mejorado
-        if message_lower in ["apelar", "/apelar"]:
-            return self._show_appeal_form(normalized_phone, name, reply_jid)
-
-        # Si el usuario está en proceso de apelación
-        if self._is_user_appealing(normalized_phone):
-            return self._process_appeal_text(normalized_phone, message, reply_jid)
-
-        # Menú por defecto
-        return self._chat_with_ai(normalized_phone, message, reply_jid)
-
-    def _is_moderator(self, phone: str) -> bool:
-        """Verifica si es moderador por LID o por número real"""
-        mod = self.db.query(Moderator).filter(
-            Moderator.active == True,
-            (
-                (Moderator.lid == phone) |
-                (Moderator.phone == phone) |
-                (Moderator.phone == self.normalize_phone(phone))
-            )
-        ).first()
-        return mod is not None
+        return conversation_flow.route(self, {
+            "phone": normalized_phone,
+            "message": message,
+            "message_lower": message_lower,
+            "name": name,
+            "reply_jid": reply_jid,
+            "real_phone": real_phone,
+            "is_admin": is_admin,
+            "is_mod": is_mod,
+        })
 
     def _update_moderator_lid(self, lid: str, real_phone: str | None):
         """Actualiza el LID de un moderador cuando se identifica"""
@@ -103,6 +80,7 @@ class ConversationHandler:
         if mod and not mod.lid:
             mod.lid = lid
             self.db.commit()
+            invalidate_moderators_cache()
             print(f"✅ LID actualizado para moderador {normalized_real}: {lid}")
 
     def _show_appeal_form(self, phone: str, name: str, reply_jid: str | None):
@@ -118,47 +96,36 @@ class ConversationHandler:
                 }
             }
 
-        cases_with_strikes = (
-            self.db.query(Case)
-            .join(Message, Case.message_id == Message.id)
-            .join(UserAction, UserAction.case_id == Case.id)
-            .filter(
-                Message.user_id == user.id,
-                UserAction.action.in_(["strike", "ban", "warn", "deleted"]),
-                Case.status == "resolved"
-            )
-            .order_by(Case.resolved_at.desc())
-            .limit(5)
-            .all()
-        )
+        summary = moderation_summary.get_summary(self.db, user)
+        penalties = moderation_summary.get_penalties(summary)
 
         text = f"⚠️ *TUS STRIKES*\n\n"
         text += f"Hola {name or 'usuario'},\n\n"
         text += f"Actualmente tienes *{user.strikes} strike(s)*\n\n"
 
-        if cases_with_strikes:
+        if penalties:
             text += "📜 *Mensajes por los que fuiste penalizado:*\n\n"
-            for i, case in enumerate(cases_with_strikes, 1):
-                msg = self.db.query(Message).filter(Message.id == case.message_id).first()
-                date = case.resolved_at.strftime("%d/%m/%Y") if case.resolved_at else "???"
+            for i, penalty in enumerate(penalties, 1):
+                resolved_at = penalty["resolved_at"]
+                date = datetime.fromisoformat(resolved_at).strftime("%d/%m/%Y") if resolved_at else "???"
 
-                if msg.message_type == "text":
-                    content = msg.content[:80] + "..." if len(msg.content) > 80 else msg.content
-                elif msg.message_type == "image":
+                if penalty["message_type"] == "text":
+                    content = moderation_summary.format_preview(penalty, 80)
+                elif penalty["message_type"] == "image":
                     content = "🖼️ Imagen inapropiada"
                 else:
-                    content = f"Mensaje tipo: {msg.message_type}"
+                    content = f"Mensaje tipo: {penalty['message_type']}"
 
                 text += f"{i}. 📅 {date}\n"
                 text += f"   💬 {content}\n"
-                text += f"   ⚠️ Razón: {case.resolution or 'No especificada'}\n\n"
+                text += f"   ⚠️ Razón: {penalty['resolution'] or 'No especificada'}\n\n"
 
         text += "📝 *¿Deseas apelar?*\n\n"
         text += "Escribe tu descargo explicando por qué consideras que las sanciones no son justas.\n\n"
         text += "Tu apelación será revisada por un moderador.\n\n"
         text += "💡 Tip: Sé claro y respetuoso en tu explicación."
 
-        original_case = self._get_latest_penalty_case(user.id)
+        original_case = self._get_latest_penalty_case(summary)
         if not original_case:
             return {
                 "instructions": {
@@ -178,47 +145,10 @@ class ConversationHandler:
             }
         }
 
-    def _is_user_appealing(self, phone: str) -> bool:
-        """Verifica si el usuario está en proceso de apelación"""
-        from datetime import datetime, timedelta
-        five_min_ago = datetime.now() - timedelta(minutes=5)
-
-        user = self.db.query(User).filter(User.phone == phone).first()
-        if not user:
-            return False
-
-        pending_appeals = (
-            self.db.query(Case)
-            .filter(
-                Case.type == "appeal",
-                Case.status == "pending",
-                Case.note.is_(None),
-                Case.created_at > five_min_ago,
-                Case.original_case_id.isnot(None)
-            )
-            .all()
-        )
-        for appeal in pending_appeals:
-            original_case = self.db.query(Case).filter(Case.id == appeal.original_case_id).first()
-            if not original_case:
-                continue
-            original_message = self.db.query(Message).filter(Message.id == original_case.message_id).first()
-            if original_message and original_message.user_id == user.id:
-                return True
-        return False
-
-    def _get_latest_penalty_case(self, user_id: int):
-        return (
-            self.db.query(Case)
-            .join(Message, Case.message_id == Message.id)
-            .filter(
-                Message.user_id == user_id,
-                Case.status == "resolved",
-                Case.resolution.in_(["warn", "strike", "ban", "delete", "delete_message", "deleted"])
-            )
-            .order_by(Case.resolved_at.desc(), Case.id.desc())
-            .first()
-        )
+    def _get_latest_penalty_case(self, summary):
+        if not summary.latest_penalty_case_id:
+            return None
+        return self.db.get(Case, summary.latest_penalty_case_id)
 
     def _mark_user_appealing(self, user: User, original_case: Case):
         """Crea una apelación real enlazada al caso sancionatorio original"""
@@ -234,6 +164,11 @@ class ConversationHandler:
             .first()
         )
         if existing:
+            conversation_state.set_state(
+                self.db, user.phone, conversation_state.APPEAL_WAIT,
+                target_case_id=existing.id, ttl=conversation_state.APPEAL_WAIT_TTL
+            )
+            self.db.commit()
             return existing
 
         appeal = Case(
@@ -241,10 +176,17 @@ class ConversationHandler:
             status="pending",
             priority=0,
             message_id=original_case.message_id,
+            chat_id=original_case.chat_id,
             original_case_id=original_case.id,
             note=None
         )
         self.db.add(appeal)
+        self.db.flush()
+        moderation_summary.record_appeal_opened(self.db, user)
+        conversation_state.set_state(
+            self.db, user.phone, conversation_state.APPEAL_WAIT,
+            target_case_id=appeal.id, ttl=conversation_state.APPEAL_WAIT_TTL
+        )
         self.db.commit()
         return appeal
 
@@ -254,31 +196,19 @@ class ConversationHandler:
         if not user:
             return {"error": "Usuario no encontrado"}
 
+        state = conversation_state.get_state(self.db, phone)
         appeal = None
-        pending_appeals = (
-            self.db.query(Case)
-            .filter(
-                Case.type == "appeal",
-                Case.status == "pending",
-                Case.note.is_(None),
-                Case.original_case_id.isnot(None)
-            )
-            .order_by(Case.created_at.desc())
-            .all()
-        )
-        for candidate in pending_appeals:
-            original_case = self.db.query(Case).filter(Case.id == candidate.original_case_id).first()
-            if not original_case:
-                continue
-            original_message = self.db.query(Message).filter(Message.id == original_case.message_id).first()
-            if original_message and original_message.user_id == user.id:
-                appeal = candidate
-                break
-
-        if not appeal:
+        if state and state["target_case_id"]:
+            appeal = self.db.get(Case, state["target_case_id"])
+
+        if not appeal or appeal.status != "pending" or appeal.note is not None:
+            # La apelación ya no espera descargo (resuelta o vencida)
+            conversation_state.clear_state(self.db, phone)
+            self.db.commit()
             return self._show_user_menu(phone, user.name, reply_jid)
 
         appeal.note = text
+        conversation_state.clear_state(self.db, phone)
         self.db.commit()
 
         confirmation = f"✅ *Apelación registrada*\n\n"
@@ -304,16 +234,19 @@ class ConversationHandler:
 
         text = f"⚠️ *TUS ADVERTENCIAS*\n\n"
         text += f"Hola {name or 'usuario'},\n\n"
-        text += f"Strikes actuales: *{user.strikes}/3*\n\n"
+        max_strikes = get_max_strikes(conversation_state.get_group(self.db, phone), self.db)
+        text += f"Strikes actuales: *{user.strikes}/{max_strikes}*\n\n"
 
         if user.strikes == 0:
             text += "✅ No tienes strikes. ¡Sigue así!"
+        elif user.strikes >= max_strikes:
+            text += f"❌ Tienes {user.strikes} strikes. Has sido expulsado del grupo."
+        elif user.strikes == max_strikes - 1:
+            text += f"🚨 Tienes {user.strikes} strikes. ¡Cuidado! El próximo puede ser expulsión."
         elif user.strikes == 1:
             text += "⚠️ Tienes 1 strike. Ten cuidado con las reglas."
-        elif user.strikes == 2:
-            text += "🚨 Tienes 2 strikes. ¡Cuidado! El próximo puede ser expulsión."
         else:
-            text += "❌ Tienes 3 strikes. Has sido expulsado del grupo."
+            text += f"⚠️ Tienes {user.strikes} strikes. Ten cuidado con las reglas."
 
         text += "\n\nPara apelar, escribe: *apelar*"
 
@@ -326,18 +259,11 @@ class ConversationHandler:
         }
 
     def _get_rules(self, phone: str, reply_jid: str | None):
-        rules = (
-            "📜 *REGLAS DEL GRUPO*\n\n"
-            "1. 🚫 Prohibido vender/comprar cualquier producto.\n"
-            "2. 👥 Respeto entre miembros.\n"
-            "3. 📵 No spam ni enlaces sospechosos.\n"
-            "4. 🖼️ Imágenes inapropiadas serán eliminadas.\n\n"
-            "⚠️ *Sistema de strikes:*\n"
-            "- 1ra infracción: Advertencia\n"
-            "- 2da infracción: Strike\n"
-            "- 3ra infracción: Expulsión\n\n"
-            "📝 Escribe 'strikes' para ver tus advertencias"
-        )
+        # Las reglas propias del grupo del usuario; si no tiene, el texto "rules" (del grupo o global).
+        # Todo sale de memoria: el grupo lo anota el ingest en conversation_state
+        group = get_group_config(conversation_state.get_group(self.db, phone), self.db)
+        chat_id = group["chat_id"] if group else None
+        rules = (group and group["rules"]) or reply_templates.render("rules", chat_id=chat_id, db=self.db)
 
         return {
             "instructions": {
@@ -348,16 +274,7 @@ class ConversationHandler:
         }
 
     def _show_ai_intro(self, phone: str, name: str, reply_jid: str | None):
-        text = (
-            "🗣️ *MODO CHUSMA ACTIVADO*\n\n"
-            f"Hola {name or 'usuario'}, mandame lo que quieras por privado y te respondo con la IA.\n\n"
-            "Tus palabras clave siguen funcionando igual:\n"
-            "• strikes\n"
-            "• reglas\n"
-            "• apelar\n"
-            "• menu\n\n"
-            "Escribe menu para volver."
-        )
+        text = reply_templates.render("ai_intro", {"name": name or 'usuario'}, db=self.db)
 
         return {
             "instructions": {
@@ -369,6 +286,14 @@ class ConversationHandler:
 
     def _chat_with_ai(self, phone: str, message: str, reply_jid: str | None):
         # phone ya viene normalizado desde handle_message
+        if self.defer_ai:
+            return {
+                "defer_ai": {
+                    "phone": phone,
+                    "message": message,
+                    "to": self._target(phone, reply_jid)
+                }
+            }
         ai_response = ask_groq(phone, message)
         return {
             "instructions": {
@@ -379,15 +304,7 @@ class ConversationHandler:
         }
 
     def _show_moderator_menu(self, phone: str, name: str, reply_jid: str | None):
-        text = (
-            "🛡️ *PANEL DE MODERACIÓN*\n\n"
-            f"Hola {name or 'moderador'},\n\n"
-            "📋 Comandos disponibles:\n\n"
-            "• 'estoy' - Ver siguiente caso pendiente\n"
-            "• 'strikes' - Ver tus strikes\n"
-            "• 'reglas' - Ver reglas del grupo\n\n"
-            "Cuando estés revisando un caso, responde con 1, 2 o 3."
-        )
+        text = reply_templates.render("moderator_menu", {"name": name or 'moderador'}, db=self.db)
 
         return {
             "instructions": {
@@ -398,14 +315,7 @@ class ConversationHandler:
         }
 
     def _show_user_menu(self, phone: str, name: str, reply_jid: str | None):
-        text = (
-            "🤖 *BOT MODERADOR*\n\n"
-            f"Hola {name or 'usuario'},\n\n"
-            "Puedo ayudarte con:\n\n"
-            "• 'strikes' - Ver tus advertencias\n"
-            "• 'reglas' - Ver reglas del grupo\n"
-            "• 'apelar' - Apelar sanciones\n"
-        )
+        text = reply_templates.render("user_menu", {"name": name or 'usuario'}, db=self.db)
 
         return {
             "instructions": {
@@ -453,6 +363,7 @@ class ConversationHandler:
             mod = Moderator(phone=target_phone, active=True, lid=None)
             self.db.add(mod)
             self.db.commit()
+            invalidate_moderators_cache()
             print(f"✅ Moderador creado: {target_phone}")
             
             # Mensaje al nuevo moderador
@@ -473,6 +384,7 @@ class ConversationHandler:
             # Reactivar moderador existente
             mod.active = True
             self.db.commit()
+            invalidate_moderators_cache()
             print(f"✅ Moderador reactivado: {target_phone}")
             
             # Mensaje al moderador reactivado
@@ -498,6 +410,7 @@ class ConversationHandler:
         if mod:
             mod.active = False
             self.db.commit()
+            invalidate_moderators_cache()
 
         return {
             "instructions": {
@@ -0,0 +1,118 @@
+"""
+Ruteo del chat privado: tabla de comandos + máquina de estados por usuario.
+
+Los comandos se resuelven con un dict (texto -> comando) y valen en
+cualquier estado. El texto libre lo atiende el estado actual del usuario,
+que sale de conversation_state (en memoria; la base solo si no está).
+Agregar un flujo = una fila en STATES y, si hace falta, un comando que
+entre a él.
+
+Cada acción recibe (handler, ctx) con ctx = phone, message, message_lower,
+name, reply_jid, real_phone, is_admin, is_mod.
+"""
+from datetime import timedelta
+
+from app.utils import conversation_state
+
+MENU = "menu"  # estado por defecto: sin fila (o con state vacío) en conversation_states
+AI_CHAT = "ai_chat"
+APPEAL_WAIT = conversation_state.APPEAL_WAIT
+
+
+def _chat(handler, ctx):
+    return handler._chat_with_ai(ctx["phone"], ctx["message"], ctx["reply_jid"])
+
+
+# estado -> qué hacer con el texto libre y cuánto dura
+STATES = {
+    MENU: {
+        "on_text": _chat,
+        "timeout": None,
+    },
+    AI_CHAT: {
+        "on_text": _chat,
+        "timeout": timedelta(minutes=30),
+    },
+    APPEAL_WAIT: {
+        "on_text": lambda h, c: h._process_appeal_text(c["phone"], c["message"], c["reply_jid"]),
+        "timeout": conversation_state.APPEAL_WAIT_TTL,
+    },
+}
+
+# Comandos exactos. next_state: a dónde pasa el usuario (None = no cambia).
+# "apelar" no tiene next_state: el formulario pasa a APPEAL_WAIT solo si hay qué apelar.
+COMMANDS = {
+    "menu": {
+        "aliases": ("menu", "/menu"),
+        "action": lambda h, c: (
+            h._show_moderator_menu(c["phone"], c["name"], c["reply_jid"]) if c["is_mod"]
+            else h._show_user_menu(c["phone"], c["name"], c["reply_jid"])
+        ),
+        "next_state": MENU,
+    },
+    "strikes": {
+        "aliases": ("strikes", "/strikes"),
+        "action": lambda h, c: h._get_user_strikes(c["phone"], c["name"], c["reply_jid"]),
+    },
+    "reglas": {
+        "aliases": ("reglas", "/reglas"),
+        "action": lambda h, c: h._get_rules(c["phone"], c["reply_jid"]),
+    },
+    "ia": {
+        "aliases": ("ia", "/ia", "hablar con ia", "hablar con la ia"),
+        "action": lambda h, c: h._show_ai_intro(c["phone"], c["name"], c["reply_jid"]),
+        "next_state": AI_CHAT,
+    },
+    "apelar": {
+        "aliases": ("apelar", "/apelar"),
+        "action": lambda h, c: h._show_appeal_form(c["phone"], c["name"], c["reply_jid"]),
+    },
+}
+
+# Comandos con argumentos: (prefijo, rol requerido, acción)
+PREFIX_COMMANDS = [
+    ("agregar mod", "admin", lambda h, c: h._handle_admin_command(c["phone"], c["message_lower"], c["reply_jid"], c["real_phone"])),
+    ("quitar mod", "admin", lambda h, c: h._handle_admin_command(c["phone"], c["message_lower"], c["reply_jid"], c["real_phone"])),
+]
+
+_ALIASES = {alias: command for command in COMMANDS.values() for alias in command["aliases"]}
+
+
+def match_command(ctx: dict) -> dict | None:
+    command = _ALIASES.get(ctx["message_lower"])
+    if command:
+        return command
+    for prefix, role, action in PREFIX_COMMANDS:
+        if ctx["message_lower"].startswith(prefix) and (role != "admin" or ctx["is_admin"]):
+            return {"action": action}
+    return None
+
+
+def current_state(db, phone: str) -> str:
+    state = conversation_state.get_state(db, phone)
+    if state and state["state"] in STATES:
+        return state["state"]
+    return MENU
+
+
+def transition(db, phone: str, next_state: str):
+    """Cambia de estado solo si hace falta (sin escribir si ya está ahí)"""
+    if current_state(db, phone) == next_state:
+        return
+    if next_state == MENU:
+        conversation_state.clear_state(db, phone)
+    else:
+        conversation_state.set_state(db, phone, next_state, ttl=STATES[next_state]["timeout"])
+    db.commit()
+
+
+def route(handler, ctx: dict):
+    command = match_command(ctx)
+    if command:
+        result = command["action"](handler, ctx)
+        if command.get("next_state"):
+            transition(handler.db, ctx["phone"], command["next_state"])
+        return result
+
+    state = current_state(handler.db, ctx["phone"])
+    return STATES[state]["on_text"](handler, ctx)
@@ -1,21 +1,41 @@
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime, timedelta
+from sqlalchemy import func, insert
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta, timezone
+import asyncio
 import os
 import json
+import threading
+import uuid
 from app.config import MEDIA_IMAGES_PATH
 
 os.makedirs(MEDIA_IMAGES_PATH, exist_ok=True)
 
-from app.database import Base, engine, ensure_sqlite_schema
-from app.dependencies import get_db
-from app.models import User, Message, Case, UserAction, Moderator, PendingInstruction
-from app.config import GROUP_ID, ADMIN_PHONE, MEDIA_IMAGES_PATH
-from app.utils.auth import is_moderator
+from app.database import init_schema
+from app.dependencies import get_db, get_hot_db, close_db, run_db, run_llm
+from app.models import User, Message, Case, UserAction, Moderator, PendingInstruction, Group, GroupModerator, UserModerationSummary
+from app.config import (
+    GROUP_ID, ADMIN_PHONE, MEDIA_IMAGES_PATH, INSTRUCTION_LEASE_SECONDS, OUTBOUND_SCAN,
+    INGEST_BATCH_CONCURRENCY, INGEST_BATCH_MAX,
+)
+from app.database import SessionLocal, engine, async_engine
+from app.utils.auth import invalidate_moderators_cache, is_moderator
+from app.utils.groups import (
+    ensure_default_group,
+    get_active_group_ids,
+    get_group_config,
+    get_max_strikes,
+    get_moderator_chat_ids,
+    invalidate_groups_cache,
+)
+from app.utils.phone import normalize_phone
 from app.utils.message_analysis import analyze_message
-from fastapi.responses import FileResponse
+from app.utils.state_bus import start_watcher
+from app.utils import case_clusters, conversation_state, moderation_summary, outbound, reply_templates, sale_model
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from app.utils import metrics, profiling, traffic_recorder
 
 app = FastAPI()
 app.add_middleware(
@@ -24,9 +44,19 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+metrics.install(app, [engine, async_engine.sync_engine if async_engine is not None else None])
+traffic_recorder.install(app)
+profiling.install(app)
+
+init_schema()
+# Versiones del bus al día en segundo plano: las cachés se enteran de los cambios al instante
+start_watcher()
 
-Base.metadata.create_all(bind=engine)
-ensure_sqlite_schema()
+_startup_db = SessionLocal()
+try:
+    ensure_default_group(_startup_db)
+finally:
+    _startup_db.close()
 
 STATUS_ACTIVE = "active"
 STATUS_WARNED = "warned"
@@ -34,11 +64,12 @@ STATUS_BANNED = "banned"
 
 
 def _get_case_bundle(db: Session, case: Case):
-    message = db.query(Message).filter(Message.id == case.message_id).first()
+    # db.get: si ya están cargados (decisiones en bloque) no vuelve a consultar
+    message = db.get(Message, case.message_id)
     if not message:
         raise HTTPException(status_code=404, detail="message not found")
 
-    user = db.query(User).filter(User.id == message.user_id).first()
+    user = db.get(User, message.user_id)
     if not user:
         raise HTTPException(status_code=404, detail="user not found")
 
@@ -57,6 +88,17 @@ def _get_participant_jid(message: Message) -> str | None:
     return participant
 
 
+def _whatsapp_message_id(whatsapp_message_key) -> str | None:
+    """Clave de idempotencia de un mensaje entrante: "<remoteJid>/<id>" de su key"""
+    try:
+        key = json.loads(whatsapp_message_key) if isinstance(whatsapp_message_key, str) else whatsapp_message_key
+    except ValueError:
+        return None
+    if not isinstance(key, dict) or not key.get("remoteJid") or not key.get("id"):
+        return None
+    return f"{key['remoteJid']}/{key['id']}"
+
+
 def _send_text(to: str, text: str):
     return {"send_message": True, "to": to, "text": text}
 
@@ -66,12 +108,26 @@ def _queue_instructions(db: Session, instructions, source: str = "dashboard"):
         return
 
     instruction_list = instructions if isinstance(instructions, list) else [instructions]
+    # Un solo INSERT para toda la tanda (el ORM las insertaría de a una para leer los ids)
+    db.execute(insert(PendingInstruction), [
+        {"source": source, "status": "pending", "payload": json.dumps(instruction)}
+        for instruction in instruction_list
+    ])
+
+
+def _paced_response(db: Session, instructions, path: str) -> list:
+    """
+    Instrucciones que el conector ejecuta apenas recibe la respuesta: se juntan
+    igual que las de la cola y gastan los tokens del destinatario (no se demoran,
+    pero lo que salga después por la cola espera lo que corresponda).
+    """
+    instruction_list = outbound.coalesce(instructions if isinstance(instructions, list) else [instructions])
+    over = outbound.charge(db, instruction_list)
     for instruction in instruction_list:
-        db.add(PendingInstruction(
-            source=source,
-            status="pending",
-            payload=json.dumps(instruction)
-        ))
+        metrics.inc("outbound_dispatched_total", kind=outbound.instruction_kind(instruction), path=path)
+    if over:
+        metrics.inc("outbound_over_budget_total", over, path=path)
+    return instruction_list
 
 
 def _log_action(db: Session, user: User, case: Case, action: str, note: str, moderator_phone: str):
@@ -95,14 +151,57 @@ def _create_appeal_case(
         status=status,
         priority=0,
         message_id=original_case.message_id,
+        chat_id=original_case.chat_id,
         original_case_id=original_case.id,
         note=note
     )
     db.add(appeal)
     db.flush()
+
+    user = (
+        db.query(User)
+        .join(Message, Message.user_id == User.id)
+        .filter(Message.id == original_case.message_id)
+        .first()
+    )
+    if user:
+        moderation_summary.record_appeal_opened(db, user)
     return appeal
 
 
+def _pending_cases_query(db: Session, phone: str):
+    """Cola de casos pendientes limitada a los grupos del moderador"""
+    query = db.query(Case).filter(Case.status == "pending")
+    if normalize_phone(phone) == str(ADMIN_PHONE):
+        return query
+
+    chat_ids = get_moderator_chat_ids(db, phone)
+    if chat_ids is not None:
+        query = query.filter(Case.chat_id.in_(chat_ids))
+    return query
+
+
+def _claim_next_case(db: Session, phone: str, *order_by) -> Case | None:
+    """
+    Toma el siguiente caso pendiente de forma atómica.
+    El UPDATE condicional evita que dos workers asignen el mismo caso.
+    """
+    for _ in range(5):
+        candidate = _pending_cases_query(db, phone).order_by(*order_by).with_entities(Case.id).first()
+        if not candidate:
+            return None
+
+        claimed = (
+            db.query(Case)
+            .filter(Case.id == candidate[0], Case.status == "pending")
+            .update({"status": "in_review", "assigned_to": phone}, synchronize_session=False)
+        )
+        db.commit()
+        if claimed:
+            return db.query(Case).filter(Case.id == candidate[0]).first()
+    return None
+
+
 def _get_appeals_for_case(db: Session, case: Case):
     root_case_id = case.original_case_id or case.id
     return (
@@ -126,6 +225,7 @@ def _resolve_case(
     message, user = _get_case_bundle(db, case)
     instructions = []
     moderator_phone = str(moderator_phone)
+    max_strikes = get_max_strikes(case.chat_id or message.chat_id, db)
 
     if case.type == "appeal":
         if action == "reject_appeal":
@@ -138,7 +238,7 @@ def _resolve_case(
             if notify_user:
                 instructions.append(_send_text(
                     user.phone,
-                    f"❌ Tu apelación fue revisada y rechazada.\n\nStrikes actuales: {user.strikes}/3"
+                    f"❌ Tu apelación fue revisada y rechazada.\n\nStrikes actuales: {user.strikes}/{max_strikes}"
                 ))
         elif action in {"accept_appeal", "reinstate"}:
             if user.strikes > 0:
@@ -146,7 +246,7 @@ def _resolve_case(
 
             if user.strikes == 0:
                 user.status = STATUS_ACTIVE
-            elif user.strikes < 3:
+            elif user.strikes < max_strikes:
                 user.status = STATUS_WARNED
 
             if action == "reinstate" and allow_reinstate:
@@ -170,7 +270,7 @@ def _resolve_case(
                     if participant_jid:
                         instructions.append({
                             "add_user": True,
-                            "chat_id": GROUP_ID,
+                            "chat_id": message.chat_id or GROUP_ID,
                             "participant_jid": participant_jid
                         })
                     instructions.append(_send_text(
@@ -190,7 +290,7 @@ def _resolve_case(
             if notify_user:
                 instructions.append(_send_text(
                     user.phone,
-                    f"✅ Tu apelación fue aceptada.\n\nSe quitó 1 strike. Ahora tienes {user.strikes}/3 strikes."
+                    f"✅ Tu apelación fue aceptada.\n\nSe quitó 1 strike. Ahora tienes {user.strikes}/{max_strikes} strikes."
                 ))
         else:
             raise HTTPException(status_code=400, detail="invalid action")
@@ -213,7 +313,7 @@ def _resolve_case(
                 ))
         elif action == "strike":
             user.strikes += 1
-            user.status = STATUS_BANNED if user.strikes >= 3 else STATUS_WARNED
+            user.status = STATUS_BANNED if user.strikes >= max_strikes else STATUS_WARNED
             case.resolution = "strike"
             _log_action(db, user, case, "strike", note or "Strike aplicado", moderator_phone)
             if notify_moderator_to:
@@ -226,7 +326,7 @@ def _resolve_case(
             case.resolution = "deleted"
             if action == "delete":
                 user.strikes += 1
-                user.status = STATUS_BANNED if user.strikes >= 3 else STATUS_WARNED
+                user.status = STATUS_BANNED if user.strikes >= max_strikes else STATUS_WARNED
                 _log_action(db, user, case, "strike", note or "Mensaje borrado por infracción", moderator_phone)
             else:
                 _log_action(db, user, case, "delete_message", note or "Mensaje borrado", moderator_phone)
@@ -250,7 +350,7 @@ def _resolve_case(
         elif action == "__legacy_warn__":
             message.deleted = True
             user.strikes += 1
-            user.status = STATUS_BANNED if user.strikes >= 3 else STATUS_WARNED
+            user.status = STATUS_BANNED if user.strikes >= max_strikes else STATUS_WARNED
 
             resolution = "deleted" if action in {"delete", "delete_message"} else action
             log_action = "strike" if action in {"delete", "delete_message"} else action
@@ -279,20 +379,20 @@ def _resolve_case(
                     "⚠️ No se pudo borrar automáticamente (falta ID).\nBórralo manualmente del grupo."
                 ))
         elif action == "ban":
-            if user.strikes < 2:
+            if user.strikes < max_strikes - 1:
                 raise HTTPException(status_code=400, detail="Usuario no tiene strikes suficientes")
 
             user.strikes += 1
             user.status = STATUS_BANNED
             message.deleted = True
             case.resolution = "banned"
-            _log_action(db, user, case, "ban", note or "Expulsado del grupo (3er strike)", moderator_phone)
+            _log_action(db, user, case, "ban", note or f"Expulsado del grupo (strike {user.strikes}/{max_strikes})", moderator_phone)
 
             if notify_moderator_to:
                 instructions.append(_send_text(
                     notify_moderator_to,
                     (
-                        f"✅ Usuario {user.real_phone or user.phone} expulsado (3er strike).\n\n"
+                        f"✅ Usuario {user.real_phone or user.phone} expulsado (strike {user.strikes}/{max_strikes}).\n\n"
                         f"Escribe 'estoy' para siguiente caso."
                     )
                 ))
@@ -323,6 +423,8 @@ def _resolve_case(
     case.resolved_at = datetime.now()
     case.note = note
 
+    moderation_summary.record_resolution(db, user, case, message)
+
     return {
         "instructions": instructions,
         "user": user,
@@ -336,6 +438,46 @@ def ping():
     return {"status": "ok"}
 
 
+def _refresh_queue_depths(db: Session):
+    # Se calculan al scrapear: dos COUNT baratos en vez de llevar la cuenta en cada escritura
+    metrics.set_gauge(
+        "queue_depth",
+        db.query(func.count(Case.id)).filter(Case.status == "pending").scalar() or 0,
+        queue="cases"
+    )
+    for status in ("pending", "dispatched"):
+        metrics.set_gauge(
+            "queue_depth",
+            db.query(func.count(PendingInstruction.id)).filter(PendingInstruction.status == status).scalar() or 0,
+            queue=f"instructions_{status}"
+        )
+    oldest = db.query(func.min(PendingInstruction.created_at)).filter(PendingInstruction.status == "pending").scalar()
+    if oldest is not None and oldest.tzinfo is None:
+        # SQLite guarda CURRENT_TIMESTAMP en UTC y sin zona
+        oldest = oldest.replace(tzinfo=timezone.utc)
+    metrics.set_gauge(
+        "outbound_oldest_pending_seconds",
+        max(0.0, (datetime.now(timezone.utc) - oldest).total_seconds()) if oldest else 0
+    )
+    for kind, count in outbound.exhausted_buckets(db).items():
+        metrics.set_gauge("outbound_exhausted_buckets", count, kind=kind)
+
+
+@app.get("/metrics")
+def metrics_endpoint(db: Session = Depends(get_db)):
+    _refresh_queue_depths(db)
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/dashboard/metrics")
+def dashboard_metrics(db: Session = Depends(get_db)):
+    from app.services import llm_backends
+    from app.services.chat_coalescer import daily_stats
+
+    _refresh_queue_depths(db)
+    return {**metrics.summary(), "ai_coalescing": daily_stats(), "llm_backends": llm_backends.status()}
+
+
 @app.post("/users")
 def create_user(
         phone: str,
@@ -356,9 +498,96 @@ def create_user(
     }
 
 
+USER_FIELDS = {
+    "id": User.id,
+    "phone": User.phone,
+    "real_phone": User.real_phone,
+    "name": User.name,
+    "role": User.role,
+    "status": User.status,
+    "strikes": User.strikes,
+    "created_at": User.created_at,
+}
+USERS_PAGE_MAX = 5000
+
+
+def _user_columns(fields: str | None) -> list[str]:
+    """Columnas pedidas en ?fields=phone,strikes (id va siempre: es la clave del cursor)"""
+    if not fields:
+        return list(USER_FIELDS)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in USER_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"campos invalidos: {', '.join(unknown)}")
+    return ["id"] + [name for name in names if name != "id"]
+
+
+def _row_to_dict(names: list[str], row) -> dict:
+    data = dict(zip(names, row))
+    if data.get("created_at") is not None:
+        data["created_at"] = data["created_at"].isoformat()
+    return data
+
+
+def _users_page(db: Session, names: list[str], after_id: int, limit: int) -> list[dict]:
+    rows = (
+        db.query(*[USER_FIELDS[name] for name in names])
+        .filter(User.id > after_id)
+        .order_by(User.id.asc())
+        .limit(limit)
+        .all()
+    )
+    return [_row_to_dict(names, row) for row in rows]
+
+
+def _ndjson(batches):
+    for batch in batches:
+        if batch:
+            yield "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in batch)
+
+
 @app.get("/users")
 def list_users(db: Session = Depends(get_db)):
-    return db.query(User).all()
+    # Todo en una respuesta (compatibilidad). Para muchos usuarios: /users/page o /users/stream
+    names = list(USER_FIELDS)
+    return [_row_to_dict(names, row) for row in db.query(*USER_FIELDS.values()).order_by(User.id.asc()).all()]
+
+
+@app.get("/users/page")
+def list_users_page(after_id: int = 0, limit: int = 500, fields: str | None = None, db: Session = Depends(get_db)):
+    """Paginado por cursor: pasar next_after_id en el próximo pedido"""
+    names = _user_columns(fields)
+    limit = max(1, min(limit, USERS_PAGE_MAX))
+    users = _users_page(db, names, after_id, limit)
+    return {
+        "users": users,
+        "next_after_id": users[-1]["id"] if len(users) == limit else None
+    }
+
+
+@app.get("/users/stream")
+def stream_users(fields: str | None = None, batch: int = 1000):
+    """NDJSON, un usuario por línea, leyendo de a `batch` filas"""
+    names = _user_columns(fields)
+    batch = max(1, min(batch, USERS_PAGE_MAX))
+
+    def batches():
+        # Sesión propia: el stream sigue después de que termina el handler
+        after_id = 0
+        while True:
+            db = SessionLocal()
+            try:
+                users = _users_page(db, names, after_id, batch)
+            finally:
+                db.close()
+            if not users:
+                return
+            yield users
+            if len(users) < batch:
+                return
+            after_id = users[-1]["id"]
+
+    return StreamingResponse(_ndjson(batches()), media_type="application/x-ndjson")
 
 
 @app.get("/users/{phone}/strikes")
@@ -378,38 +607,54 @@ def get_user_strikes(
     }
 
 
-@app.get("/users/{phone}/history")
-def get_user_history(
-        phone: str,
-        requester_phone: str,
-        db: Session = Depends(get_db)
-):
+def _user_history_page(db: Session, user_id: int, before_id: int | None, limit: int) -> list[dict]:
+    # Cursor por id descendente (más nuevo primero); solo las columnas que se muestran
+    query = db.query(
+        UserAction.id,
+        UserAction.created_at,
+        UserAction.action,
+        UserAction.case_id,
+        UserAction.note,
+        UserAction.moderator_phone
+    ).filter(UserAction.user_id == user_id)
+    if before_id is not None:
+        query = query.filter(UserAction.id < before_id)
+    return [
+        {
+            "id": row.id,
+            "date": row.created_at.isoformat() if row.created_at else None,
+            "action": row.action,
+            "case_id": row.case_id,
+            "note": row.note or "",
+            "moderator": row.moderator_phone
+        }
+        for row in query.order_by(UserAction.id.desc()).limit(limit).all()
+    ]
+
+
+def _authorized_history_user(db: Session, phone: str, requester_phone: str) -> User:
     user = db.query(User).filter(User.phone == phone).first()
     if not user:
         raise HTTPException(status_code=404, detail="user not found")
 
     is_self = (requester_phone == phone)
-    is_mod = is_moderator(db, requester_phone)
-
-    if not is_self and not is_mod:
+    if not is_self and not is_moderator(db, requester_phone):
         raise HTTPException(status_code=403, detail="forbidden")
+    return user
 
-    actions = (
-        db.query(UserAction)
-        .filter(UserAction.user_id == user.id)
-        .order_by(UserAction.created_at.desc())
-        .all()
-    )
 
-    history = []
-    for action in actions:
-        history.append({
-            "date": action.created_at.isoformat() if action.created_at else None,
-            "action": action.action,
-            "case_id": action.case_id,
-            "note": action.note or "",
-            "moderator": action.moderator_phone
-        })
+@app.get("/users/{phone}/history")
+def get_user_history(
+        phone: str,
+        requester_phone: str,
+        limit: int = 100,
+        before_id: int | None = None,
+        db: Session = Depends(get_db)
+):
+    user = _authorized_history_user(db, phone, requester_phone)
+
+    limit = max(1, min(limit, USERS_PAGE_MAX))
+    history = _user_history_page(db, user.id, before_id, limit)
 
     return {
         "user": {
@@ -418,12 +663,51 @@ def get_user_history(
             "status": user.status,
             "strikes": user.strikes
         },
-        "history": history
+        "history": history,
+        "next_before_id": history[-1]["id"] if len(history) == limit else None
     }
 
 
-@app.post("/ingest_message")
-def ingest_message(payload: dict, db: Session = Depends(get_db)):
+@app.get("/users/{phone}/history/stream")
+def stream_user_history(
+        phone: str,
+        requester_phone: str,
+        batch: int = 500,
+        db: Session = Depends(get_db)
+):
+    user_id = _authorized_history_user(db, phone, requester_phone).id
+    batch = max(1, min(batch, USERS_PAGE_MAX))
+
+    def batches():
+        before_id = None
+        while True:
+            session = SessionLocal()
+            try:
+                items = _user_history_page(session, user_id, before_id, batch)
+            finally:
+                session.close()
+            if not items:
+                return
+            yield items
+            if len(items) < batch:
+                return
+            before_id = items[-1]["id"]
+
+    return StreamingResponse(_ndjson(batches()), media_type="application/x-ndjson")
+
+
+def _save(db: Session, commit: bool):
+    if commit:
+        db.commit()
+    else:
+        db.flush()
+
+
+def _ingest_message(db: Session, payload: dict, commit: bool = True):
+    """
+    commit=False: todo queda en la transacción del caller (tandas de /ingest_batch),
+    que ya descartó los mensajes repetidos.
+    """
     try:
         phone = payload.get("phone")
         real_phone = payload.get("real_phone")
@@ -440,21 +724,30 @@ def ingest_message(payload: dict, db: Session = Depends(get_db)):
         if not phone or not message_type:
             return {"error": "invalid payload"}
 
+        # El conector reintenta (timeouts, buffer local): el mismo mensaje se guarda una sola vez
+        whatsapp_message_id = _whatsapp_message_id(whatsapp_message_key)
+        if whatsapp_message_id and commit:
+            existing = db.query(Message.id, Message.flagged).filter(Message.whatsapp_message_id == whatsapp_message_id).first()
+            if existing:
+                return {"stored": True, "duplicate": True, "flagged": bool(existing.flagged), "message_id": existing.id}
+
         user = db.query(User).filter(User.phone == phone).first()
         if not user:
             user = User(phone=phone, real_phone=real_phone, name=name)
             db.add(user)
-            db.commit()
-            db.refresh(user)
+            _save(db, commit)
+            if commit:
+                db.refresh(user)
         else:
             if real_phone and user.real_phone != real_phone:
                 user.real_phone = real_phone
-                db.commit()
+                _save(db, commit)
 
         analysis = analyze_message(
             message_type=message_type,
             content=content if message_type == "text" else None,
-            media_caption=media_caption
+            media_caption=media_caption,
+            db=db
         )
 
         msg = Message(
@@ -466,6 +759,7 @@ def ingest_message(payload: dict, db: Session = Depends(get_db)):
             media_caption=media_caption,
             media_filename=content if message_type == "image" else None,
             whatsapp_message_key=whatsapp_message_key,
+            whatsapp_message_id=whatsapp_message_id,
             raw_payload=raw_payload,
             participant_jid=participant_jid,
             category_label=analysis["category_label"],
@@ -476,10 +770,25 @@ def ingest_message(payload: dict, db: Session = Depends(get_db)):
             content_length=analysis["content_length"]
         )
         db.add(msg)
-        db.commit()
-        db.refresh(msg)
-
-        if not is_group or chat_id != GROUP_ID:
+        try:
+            _save(db, commit)
+        except IntegrityError:
+            if not commit:
+                raise
+            # Otro request guardó el mismo mensaje entre la consulta y el commit
+            db.rollback()
+            existing = db.query(Message.id, Message.flagged).filter(Message.whatsapp_message_id == whatsapp_message_id).first()
+            if not existing:
+                raise
+            return {"stored": True, "duplicate": True, "flagged": bool(existing.flagged), "message_id": existing.id}
+        if commit:
+            db.refresh(msg)
+
+        group = get_group_config(chat_id, db) if is_group else None
+        # Grupo del usuario para reglas y strikes en privado: solo se escribe si cambió
+        if group and conversation_state.set_group(db, user.phone, chat_id):
+            _save(db, commit)
+        if not group:
             return {
                 "stored": True,
                 "flagged": False,
@@ -496,22 +805,25 @@ def ingest_message(payload: dict, db: Session = Depends(get_db)):
                 case = Case(
                     type="infringement",
                     message_id=msg.id,
-                    priority=1
+                    chat_id=chat_id,
+                    # Con modelo de ventas, las dudosas quedan detrás de las seguras
+                    priority=sale_model.case_priority(group["sale_priority"], analysis["sale_score"])
                 )
                 db.add(case)
-                db.commit()
+                _save(db, commit)
 
-        elif message_type == "image":
+        elif message_type == "image" and group["review_images"]:
             flagged = True
             msg.flagged = True
 
             case = Case(
                 type="image_review",
                 message_id=msg.id,
-                priority=2
+                chat_id=chat_id,
+                priority=group["image_priority"]
             )
             db.add(case)
-            db.commit()
+            _save(db, commit)
 
         return {
             "stored": True,
@@ -526,6 +838,93 @@ def ingest_message(payload: dict, db: Session = Depends(get_db)):
         return {"error": str(e)}
 
 
+@app.post("/ingest_message")
+async def ingest_message(payload: dict, db=Depends(get_hot_db)):
+    return await run_db(db, _ingest_message, payload)
+
+
+def _ingest_batch(db: Session, messages: list) -> dict:
+    """
+    Mensajes que el conector juntó mientras la API no estaba (ver whatsapp/ingest_buffer.js).
+    Un resultado por mensaje y en el mismo orden; "retry" indica si vale la pena reenviarlo.
+    La tanda va en una sola transacción; si algún mensaje falla se rehace de a uno.
+    """
+    try:
+        results = _ingest_batch_items(db, messages, commit=False)
+        db.commit()
+    except Exception as e:
+        print(f"⚠️ Tanda de ingest con error ({e}), se guarda de a un mensaje")
+        db.rollback()
+        results = _ingest_batch_items(db, messages, commit=True)
+
+    for status in ("stored", "duplicate", "error"):
+        count = sum(1 for r in results if r["status"] == status)
+        if count:
+            metrics.inc("ingest_batch_messages_total", count, status=status)
+    return {"results": results}
+
+
+def _ingest_batch_items(db: Session, messages: list, commit: bool) -> list:
+    # Los repetidos (reenvíos del buffer) se resuelven con una sola consulta
+    keys = {
+        _whatsapp_message_id(payload.get("whatsapp_message_key"))
+        for payload in messages if isinstance(payload, dict)
+    } - {None}
+    known = {}
+    if keys:
+        for key, message_id, flagged in (
+            db.query(Message.whatsapp_message_id, Message.id, Message.flagged)
+            .filter(Message.whatsapp_message_id.in_(keys))
+        ):
+            known[key] = {"status": "duplicate", "message_id": message_id, "flagged": bool(flagged)}
+
+    results = []
+    for payload in messages:
+        if not isinstance(payload, dict) or not payload.get("phone") or not payload.get("message_type"):
+            results.append({"status": "error", "error": "invalid payload", "retry": False})
+            continue
+        key = _whatsapp_message_id(payload.get("whatsapp_message_key"))
+        if key in known:
+            results.append(dict(known[key], status="duplicate"))
+            continue
+        result = _ingest_message(db, payload, commit=commit)
+        if "error" in result:
+            if not commit:
+                raise RuntimeError(result["error"])
+            db.rollback()
+            results.append({"status": "error", "error": result["error"], "retry": True})
+            continue
+        item = {
+            "status": "duplicate" if result.get("duplicate") else "stored",
+            "message_id": result["message_id"],
+            "flagged": result["flagged"],
+        }
+        if key:
+            known[key] = item
+        results.append(item)
+    return results
+
+
+# Tandas del buffer del conector a la vez por proceso: el resto recibe 429 y espera
+_ingest_batch_slots = threading.BoundedSemaphore(INGEST_BATCH_CONCURRENCY)
+
+
+@app.post("/ingest_batch")
+async def ingest_batch(payload: dict, db=Depends(get_hot_db)):
+    messages = payload.get("messages")
+    if not isinstance(messages, list):
+        raise HTTPException(status_code=400, detail="messages must be a list")
+    if len(messages) > INGEST_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"max {INGEST_BATCH_MAX} messages per batch")
+    if not _ingest_batch_slots.acquire(blocking=False):
+        metrics.inc("ingest_batch_rejected_total")
+        return JSONResponse({"error": "busy"}, status_code=429, headers={"Retry-After": "1"})
+    try:
+        return await run_db(db, _ingest_batch, messages)
+    finally:
+        _ingest_batch_slots.release()
+
+
 @app.get("/moderation/next")
 def get_next_case_for_moderator(
         phone: str,
@@ -536,19 +935,16 @@ def get_next_case_for_moderator(
             "instructions": {
                 "send_message": True,
                 "to": phone,
-                "text": "🤖 *Bot Moderador*\n\nOpciones:\n• /strikes - Ver mis advertencias\n• /apelar - Apelar una sanción\n• /reglas - Ver reglas del grupo"
+                "text": reply_templates.render("not_moderator_help", db=db)
             }
         }
 
-    case = (
-        db.query(Case)
-        .filter(Case.status == "pending")
-        .order_by(
-            Case.type == "appeal",
-            Case.priority.asc(),
-            Case.created_at.asc()
-        )
-        .first()
+    case = _claim_next_case(
+        db,
+        phone,
+        Case.type == "appeal",
+        Case.priority.asc(),
+        Case.created_at.asc()
     )
 
     if not case:
@@ -556,52 +952,50 @@ def get_next_case_for_moderator(
             "instructions": {
                 "send_message": True,
                 "to": phone,
-                "text": "✅ No hay casos pendientes. Buen trabajo."
+                "text": reply_templates.render("no_pending_cases", db=db)
             }
         }
 
-    case.status = "in_review"
-    case.assigned_to = phone
-    db.commit()
-
     message = db.query(Message).filter(Message.id == case.message_id).first()
     user = db.query(User).filter(User.id == message.user_id).first()
 
-    lines = []
+    chat_id = case.chat_id or message.chat_id
 
     if case.type == "appeal":
-        lines.append("📢 *APELACIÓN PENDIENTE*")
-        lines.append(f"👤 Usuario: {user.phone}")
-        lines.append(f"📝 Motivo: {case.note}")
-        lines.append(f"\n🛠️ *Opciones:*")
-        lines.append("✅ /aceptar_apelacion - Quitar strike")
-        lines.append("❌ /rechazar_apelacion - Mantener sanción")
+        text = reply_templates.render("next_appeal_card", {
+            "phone": user.phone,
+            "note": case.note,
+            "case_id": case.id,
+        }, chat_id=chat_id, db=db)
     else:
-        lines.append(f"🚨 *CASO #{case.id}*")
-        lines.append(f"👤 {user.name or 'Usuario'} ({user.phone})")
-        lines.append(f"⚠️ Strikes acumulados: {user.strikes}")
+        max_strikes = get_max_strikes(chat_id, db)
 
+        content = ""
         if message.message_type == "text":
-            lines.append(f"\n💬 *Mensaje:*\n{message.content}")
+            content = reply_templates.render("next_case_card.text", {"content": message.content}, chat_id=chat_id, db=db)
+        elif message.message_type == "image" and message.media_filename:
+            content = reply_templates.render("next_case_card.image_link", {"filename": message.media_filename}, chat_id=chat_id, db=db)
         elif message.message_type == "image":
-            lines.append(f"\n🖼️ *Imagen sospechosa*")
-            if message.media_filename:
-                lines.append(f"🔗 Ver: http://tudominio.com/media/{message.media_filename}")
+            content = reply_templates.render("next_case_card.image", chat_id=chat_id, db=db)
 
-        lines.append(f"\n🛠️ *Opciones:*")
-        lines.append("✅ /ignorar - No es infracción")
-        lines.append("🗑️ /borrar - Eliminar mensaje del grupo")
+        expel_option = ""
+        if user.strikes >= max_strikes - 1:
+            expel_option = reply_templates.render("next_case_card.expel_option", chat_id=chat_id, db=db)
 
-        if user.strikes >= 2:
-            lines.append("🚫 /expulsar - Borrar mensaje y expulsar (3er strike)")
-
-    lines.append(f"\n📝 Uso: /accion {case.id} <opción> [nota]")
+        text = reply_templates.render("next_case_card", {
+            "case_id": case.id,
+            "name": user.name or 'Usuario',
+            "phone": user.phone,
+            "strikes": user.strikes,
+            "content": content,
+            "expel_option": expel_option,
+        }, chat_id=chat_id, db=db)
 
     return {
         "instructions": {
             "send_message": True,
             "to": phone,
-            "text": "\n".join(lines)
+            "text": text
         }
     }
 
@@ -822,12 +1216,14 @@ def moderator_command(payload: dict, db: Session = Depends(get_db)):
             mod.active = True
 
         db.commit()
+        invalidate_moderators_cache()
         return {"status": "moderator added", "phone": target_phone}
 
     if action == "quitar":
         if mod:
             mod.active = False
             db.commit()
+            invalidate_moderators_cache()
         return {"status": "moderator removed", "phone": target_phone}
 
     return {"ignored": True}
@@ -877,16 +1273,7 @@ def user_self_service(
         db.add(user)
         db.commit()
 
-    text = f"""🤖 *Bot Moderador del Grupo*
-
-Hola {user.name or 'usuario'}, tengo estas opciones:
-
-• /strikes - Ver tus advertencias ({user.strikes})
-• /apelar - Apelar una sanción
-• /reglas - Ver reglas del grupo
-• /ayuda - Mostrar este mensaje
-
-Escribe el comando que necesites."""
+    text = reply_templates.render("self_service", {"name": user.name or 'usuario', "strikes": user.strikes}, db=db)
 
     return {
         "instructions": {
@@ -919,14 +1306,15 @@ def get_user_strikes_whatsapp(
         db.commit()
 
     actions = (
-        db.query(UserAction)
+        db.query(UserAction.created_at, UserAction.action, UserAction.note)
         .filter(UserAction.user_id == user.id)
         .order_by(UserAction.created_at.desc())
         .limit(5)
         .all()
     )
 
-    lines = [f"⚠️ *Tus advertencias*\n\nStrikes actuales: {user.strikes}/3"]
+    max_strikes = get_max_strikes(conversation_state.get_group(db, phone), db)
+    lines = [f"⚠️ *Tus advertencias*\n\nStrikes actuales: {user.strikes}/{max_strikes}"]
 
     if actions:
         lines.append("\n📜 Historial reciente:")
@@ -936,7 +1324,7 @@ def get_user_strikes_whatsapp(
     else:
         lines.append("\n✅ No tienes advertencias recientes.")
 
-    if user.strikes >= 2:
+    if user.strikes >= max_strikes - 1:
         lines.append(
             f"\n🚨 *Advertencia:* Con {user.strikes} strikes, la próxima infracción puede resultar en expulsión.")
 
@@ -996,8 +1384,7 @@ def create_simple_appeal(
     }
 
 
-@app.post("/conversation")
-def handle_conversation(payload: dict, db: Session = Depends(get_db)):
+def _handle_conversation(db: Session, payload: dict):
     phone = payload.get("phone")
     real_phone = payload.get("real_phone")
     message = payload.get("message", "").strip()
@@ -1013,7 +1400,7 @@ def handle_conversation(payload: dict, db: Session = Depends(get_db)):
                 "instructions": {
                     "send_message": True,
                     "to": phone,
-                    "text": "🤖 *Bot Moderador*\n\nOpciones:\n• strikes - Ver tus advertencias\n• reglas - Ver reglas del grupo"
+                    "text": reply_templates.render("estoy_not_moderator", db=db)
                 }
             }
 
@@ -1029,16 +1416,14 @@ def handle_conversation(payload: dict, db: Session = Depends(get_db)):
             if mod and not mod.lid:
                 mod.lid = phone
                 db.commit()
+                invalidate_moderators_cache()
 
-        case = (
-            db.query(Case)
-            .filter(Case.status == "pending")
-            .order_by(
-                Case.type == "appeal",
-                Case.priority.asc(),
-                Case.id.asc()
-            )
-            .first()
+        case = _claim_next_case(
+            db,
+            phone,
+            Case.type == "appeal",
+            Case.priority.asc(),
+            Case.id.asc()
         )
 
         if not case:
@@ -1046,61 +1431,47 @@ def handle_conversation(payload: dict, db: Session = Depends(get_db)):
                 "instructions": {
                     "send_message": True,
                     "to": phone,
-                    "text": "✅ No hay casos pendientes. Buen trabajo."
+                    "text": reply_templates.render("no_pending_cases", db=db)
                 }
             }
 
-        case.status = "in_review"
-        case.assigned_to = phone
-        db.commit()
-
         msg = db.query(Message).filter(Message.id == case.message_id).first()
         user = db.query(User).filter(User.id == msg.user_id).first()
+        chat_id = case.chat_id or msg.chat_id
+        max_strikes = get_max_strikes(chat_id, db)
 
         instructions = []
 
         if case.type == "appeal":
-            cases_with_strikes = (
-                db.query(Case)
-                .join(Message, Case.message_id == Message.id)
-                .join(UserAction, UserAction.case_id == Case.id)
-                .filter(
-                    Message.user_id == user.id,
-                    UserAction.action.in_(["strike", "ban", "warn", "deleted"]),
-                    Case.status == "resolved"
-                )
-                .order_by(Case.resolved_at.desc())
-                .limit(5)
-                .all()
-            )
-
-            text = f"📢 *APELACIÓN - CASO #{case.id}*\n\n"
-            text += f"👤 Usuario: {user.name or user.phone}\n"
-            text += f"⚠️ Strikes actuales: {user.strikes}/3\n\n"
-            text += f"📝 *Descargo del usuario:*\n{case.note}\n\n"
-
-            if cases_with_strikes:
-                text += "📜 *Mensajes por los que fue penalizado:*\n\n"
-                for i, old_case in enumerate(cases_with_strikes, 1):
-                    old_msg = db.query(Message).filter(Message.id == old_case.message_id).first()
-                    date = old_case.resolved_at.strftime("%d/%m") if old_case.resolved_at else "???"
-
-                    if old_msg.message_type == "text":
-                        content = old_msg.content[:60] + "..." if len(old_msg.content) > 60 else old_msg.content
-                    elif old_msg.message_type == "image":
-                        content = "🖼️ Imagen"
-                    else:
-                        content = f"{old_msg.message_type}"
-
-                    text += f"{i}. {date} - {content}\n"
-
-            text += "\n🛠️ *¿Qué decides?*\n"
-            text += "Responde con el número:\n\n"
-            text += "1. ❌ Rechazar apelación\n"
-            text += "2. ✅ Aceptar y quitar 1 strike\n"
-
+            # Una sola fila con las últimas sanciones ya armadas
+            summary = moderation_summary.get_summary(db, user)
+            penalties = moderation_summary.get_penalties(summary)
+
+            penalties_text = ""
+            if penalties:
+                parts = [reply_templates.render("appeal_card.penalties_header", chat_id=chat_id, db=db)]
+                for i, penalty in enumerate(penalties, 1):
+                    resolved_at = penalty["resolved_at"]
+                    parts.append(reply_templates.render("appeal_card.penalty", {
+                        "index": i,
+                        "date": datetime.fromisoformat(resolved_at).strftime("%d/%m") if resolved_at else "???",
+                        "content": moderation_summary.format_preview(penalty, 60),
+                    }, chat_id=chat_id, db=db))
+                penalties_text = "".join(parts)
+
+            readmit_option = ""
             if user.status == STATUS_BANNED:
-                text += "3. 🔄 Readmitir al grupo (quita 1 strike)\n"
+                readmit_option = reply_templates.render("appeal_card.readmit_option", chat_id=chat_id, db=db)
+
+            text = reply_templates.render("appeal_card", {
+                "case_id": case.id,
+                "name": user.name or user.phone,
+                "strikes": summary.strikes,
+                "max_strikes": max_strikes,
+                "note": case.note,
+                "penalties": penalties_text,
+                "readmit_option": readmit_option,
+            }, chat_id=chat_id, db=db)
 
             instructions.append({
                 "send_message": True,
@@ -1109,28 +1480,25 @@ def handle_conversation(payload: dict, db: Session = Depends(get_db)):
             })
 
         else:
-            display_phone = user.real_phone or user.phone
-
-            text = f"🚨 *CASO #{case.id}*\n\n"
-            text += f"👤 Usuario: {user.name or 'Sin nombre'}\n"
-            text += f"📞 Número: +{display_phone}\n"
-            text += f"⚠️ Strikes acumulados: {user.strikes}/3\n\n"
-
+            content = ""
             if msg.message_type == "text":
-                text += f"💬 Mensaje:\n{msg.content}\n\n"
+                content = reply_templates.render("case_card.text", {"content": msg.content}, chat_id=chat_id, db=db)
             elif msg.message_type == "image":
-                text += f"🖼️ *Imagen sospechosa*\n"
-                text += f"(La imagen se enviará a continuación)\n\n"
+                content = reply_templates.render("case_card.image", chat_id=chat_id, db=db)
 
-            text += "🛠️ *¿Qué acción tomas?*\n"
-            text += "Responde con el número:\n\n"
-            text += "1. ✅ Ignorar (no es infracción)\n"
-            text += "2. 🗑️ Borrar mensaje + 1 strike\n"
+            expel_option = ""
+            if user.strikes >= max_strikes - 1:
+                expel_option = reply_templates.render("case_card.expel_option", chat_id=chat_id, db=db)
 
-            if user.strikes >= 2:
-                text += "3. 🚫 Expulsar (3er strike)\n"
-
-            text += "\nEjemplo: responde '2' para borrar y sumar strike"
+            text = reply_templates.render("case_card", {
+                "case_id": case.id,
+                "name": user.name or 'Sin nombre',
+                "phone": user.real_phone or user.phone,
+                "strikes": user.strikes,
+                "max_strikes": max_strikes,
+                "content": content,
+                "expel_option": expel_option,
+            }, chat_id=chat_id, db=db)
 
             instructions.append({
                 "send_message": True,
@@ -1145,17 +1513,101 @@ def handle_conversation(payload: dict, db: Session = Depends(get_db)):
                         "send_image": True,
                         "to": phone,
                         "image_path": msg.media_filename,
-                        "caption": f"🖼️ Imagen del caso #{case.id}\nUsuario: {user.name or user.phone}"
+                        "caption": reply_templates.render("case_card.image_caption", {
+                            "case_id": case.id,
+                            "name": user.name or user.phone,
+                        }, chat_id=chat_id, db=db)
                     })
 
         return {"instructions": instructions}
 
     from app.handlers.conversation import ConversationHandler
-    handler = ConversationHandler(db)
+    # defer_ai: la llamada a la IA no se hace con la sesión tomada
+    handler = ConversationHandler(db, defer_ai=True)
     result = handler.handle_message(phone, message, name, reply_jid, real_phone)
     return result
 
 
+async def _ai_reply_stream(deferred: dict, batch):
+    """
+    NDJSON: una línea {"instructions": ...} con la primera oración apenas
+    llega de Groq y otra con el resto al terminar.
+    """
+    from app.services import chat_coalescer
+    from app.services.groq_chat import ask_groq
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def push(text):
+        loop.call_soon_threadsafe(queue.put_nowait, text)
+
+    def push_partial(text):
+        # Si ya llegó otro mensaje, la primera parte de esta respuesta no sale;
+        # si no, la consulta se cierra y lo que llegue después se responde aparte
+        if chat_coalescer.seal(batch):
+            push(text)
+
+    def reply():
+        try:
+            text = ask_groq(deferred["phone"], batch.message, on_partial=push_partial, batch=batch)
+            chat_coalescer.release(batch, replaced=text is None)
+            if text is not None:
+                push(text)
+        finally:
+            push(None)
+
+    # Si el conector corta, la respuesta igual se termina y queda en el historial
+    task = asyncio.ensure_future(run_llm(reply))
+    sent = False
+    while (text := await queue.get()) is not None:
+        sent = True
+        yield json.dumps({"instructions": _send_text(deferred["to"], text)}, ensure_ascii=False) + "\n"
+    await task
+    if not sent:
+        yield json.dumps({"instructions": [], "coalesced": True}) + "\n"
+
+
+@app.post("/conversation")
+async def handle_conversation(payload: dict, db=Depends(get_hot_db)):
+    """Con "stream": true responde NDJSON (una línea por mensaje a mandar)"""
+    result = await run_db(db, _handle_conversation, payload)
+
+    deferred = result.get("defer_ai") if isinstance(result, dict) else None
+    if not deferred:
+        if payload.get("stream"):
+            return StreamingResponse(_ndjson([[result]]), media_type="application/x-ndjson")
+        return result
+
+    from app.services import chat_coalescer
+    from app.services.groq_chat import ask_groq
+    # Mensajes seguidos del mismo usuario: si hay una consulta en curso este
+    # mensaje se suma y este request pregunta por todos (la anterior se descarta)
+    batch = await run_db(db, chat_coalescer.join, deferred["phone"], deferred["message"])
+    # Devolver la conexión al pool antes de esperar a la IA
+    await close_db(db)
+
+    if payload.get("stream"):
+        return StreamingResponse(_ai_reply_stream(deferred, batch), media_type="application/x-ndjson")
+
+    def reply():
+        # En el hilo de la IA: la fila se libera aunque el conector corte
+        text = ask_groq(deferred["phone"], batch.message, batch=batch)
+        chat_coalescer.release(batch, replaced=text is None)
+        return text
+
+    text = await run_llm(reply)
+    if text is None:
+        return {"instructions": [], "coalesced": True}
+    return {
+        "instructions": {
+            "send_message": True,
+            "to": deferred["to"],
+            "text": text
+        }
+    }
+
+
 @app.post("/moderation/response")
 def process_moderator_response(payload: dict, db: Session = Depends(get_db)):
     phone = payload.get("phone")
@@ -1190,7 +1642,7 @@ def process_moderator_response(payload: dict, db: Session = Depends(get_db)):
             action_map["3"] = "reinstate"
     else:
         action_map = {"1": "ignore", "2": "delete"}
-        if user.strikes >= 2:
+        if user.strikes >= get_max_strikes(case.chat_id or message.chat_id, db) - 1:
             action_map["3"] = "ban"
 
     action = action_map.get(response)
@@ -1214,8 +1666,9 @@ def process_moderator_response(payload: dict, db: Session = Depends(get_db)):
         allow_reinstate=True
     )
 
+    instructions = _paced_response(db, result["instructions"], "moderation_response")
     db.commit()
-    return {"instructions": result["instructions"]}
+    return {"instructions": instructions}
 
 
 @app.get("/media/case/{case_id}")
@@ -1237,8 +1690,7 @@ def get_case_media(case_id: int, phone: str, db: Session = Depends(get_db)):
 
     return FileResponse(path, media_type="image/jpeg", filename=message.media_filename)
 
-@app.get("/dashboard/cases")
-def dashboard_cases(db: Session = Depends(get_db)):
+def _dashboard_cases(db: Session):
     cases = db.query(Case).order_by(Case.created_at.desc()).limit(100).all()
     result = []
     for c in cases:
@@ -1253,6 +1705,7 @@ def dashboard_cases(db: Session = Depends(get_db)):
             "priority": c.priority,
             "resolution": c.resolution,
             "created_at": c.created_at.isoformat() if c.created_at else None,
+            "_chatId": c.chat_id or (msg.chat_id if msg else None),
             "_messageId": msg.id if msg else None,
             "_userPhone": user.real_phone or user.phone if user else None,
             "_userName": user.name if user else None,
@@ -1279,10 +1732,15 @@ def dashboard_cases(db: Session = Depends(get_db)):
     return {"cases": result}
 
 
-@app.get("/dashboard/group_report")
-def dashboard_group_report(days: int = 1, limit: int = 40, db: Session = Depends(get_db)):
+@app.get("/dashboard/cases")
+async def dashboard_cases(db=Depends(get_hot_db)):
+    return await run_db(db, _dashboard_cases)
+
+
+def _dashboard_group_report(db: Session, days: int, limit: int, chat_id: str | None):
     days = max(1, min(days, 30))
     limit = max(10, min(limit, 200))
+    chat_id = chat_id or GROUP_ID
 
     now = datetime.now()
     period_start = now - timedelta(days=days - 1)
@@ -1292,7 +1750,7 @@ def dashboard_group_report(days: int = 1, limit: int = 40, db: Session = Depends
         db.query(Message)
         .filter(
             Message.is_group == True,
-            Message.chat_id == GROUP_ID,
+            Message.chat_id == chat_id,
             Message.created_at >= period_start
         )
         .order_by(Message.created_at.asc(), Message.id.asc())
@@ -1303,7 +1761,7 @@ def dashboard_group_report(days: int = 1, limit: int = 40, db: Session = Depends
         db.query(Message)
         .filter(
             Message.is_group == True,
-            Message.chat_id == GROUP_ID
+            Message.chat_id == chat_id
         )
         .order_by(Message.created_at.desc(), Message.id.desc())
         .limit(limit)
@@ -1319,6 +1777,7 @@ def dashboard_group_report(days: int = 1, limit: int = 40, db: Session = Depends
     user_counts = {}
     hourly_counts = {}
     category_counts = {}
+    source_counts = {}
 
     for msg in group_messages:
         user_counts[msg.user_id] = user_counts.get(msg.user_id, 0) + 1
@@ -1326,6 +1785,8 @@ def dashboard_group_report(days: int = 1, limit: int = 40, db: Session = Depends
         hourly_counts[hour_key] = hourly_counts.get(hour_key, 0) + 1
         effective_category = msg.reviewed_category_label or msg.category_label or "UNCLASSIFIED"
         category_counts[effective_category] = category_counts.get(effective_category, 0) + 1
+        source = msg.intent_source or "unknown"
+        source_counts[source] = source_counts.get(source, 0) + 1
 
     active_users = sum(1 for count in user_counts.values() if count >= active_threshold)
     peak_hour = max(hourly_counts.items(), key=lambda item: item[1])[0] if hourly_counts else None
@@ -1365,6 +1826,7 @@ def dashboard_group_report(days: int = 1, limit: int = 40, db: Session = Depends
 
     return {
         "summary": {
+            "chat_id": chat_id,
             "days": days,
             "period_start": period_start.isoformat(),
             "total_messages": len(group_messages),
@@ -1375,7 +1837,9 @@ def dashboard_group_report(days: int = 1, limit: int = 40, db: Session = Depends
             "questions": sum(1 for msg in group_messages if msg.contains_question),
             "sale_messages": sum(1 for msg in group_messages if (msg.reviewed_category_label or msg.category_label) == "SALE"),
             "media_messages": sum(1 for msg in group_messages if msg.message_type == "image"),
-            "peak_hour": peak_hour
+            "peak_hour": peak_hour,
+            # Más de una fuente = etiquetas de distintas versiones del clasificador (ver reclassify_messages.py)
+            "label_sources": source_counts
         },
         "hourly": [
             {"hour": hour, "count": count}
@@ -1390,8 +1854,12 @@ def dashboard_group_report(days: int = 1, limit: int = 40, db: Session = Depends
     }
 
 
-@app.post("/dashboard/messages/{message_id}/classify")
-def dashboard_classify_message(message_id: int, payload: dict, db: Session = Depends(get_db)):
+@app.get("/dashboard/group_report")
+async def dashboard_group_report(days: int = 1, limit: int = 40, chat_id: str | None = None, db=Depends(get_hot_db)):
+    return await run_db(db, _dashboard_group_report, days, limit, chat_id)
+
+
+def _dashboard_classify_message(db: Session, message_id: int, payload: dict):
     category_label = payload.get("category_label")
     intent_label = payload.get("intent_label")
     reviewer = str(payload.get("reviewed_by") or ADMIN_PHONE)
@@ -1424,8 +1892,12 @@ def dashboard_classify_message(message_id: int, payload: dict, db: Session = Dep
     }
 
 
-@app.get("/dashboard/moderators")
-def dashboard_moderators(db: Session = Depends(get_db)):
+@app.post("/dashboard/messages/{message_id}/classify")
+async def dashboard_classify_message(message_id: int, payload: dict, db=Depends(get_hot_db)):
+    return await run_db(db, _dashboard_classify_message, message_id, payload)
+
+
+def _dashboard_moderators(db: Session):
     mods = db.query(Moderator).all()
     return {
         "moderators": [
@@ -1435,8 +1907,91 @@ def dashboard_moderators(db: Session = Depends(get_db)):
     }
 
 
-@app.post("/dashboard/decide")
-def dashboard_decide(payload: dict, db: Session = Depends(get_db)):
+@app.get("/dashboard/moderators")
+async def dashboard_moderators(db=Depends(get_hot_db)):
+    return await run_db(db, _dashboard_moderators)
+
+
+def _group_payload(group: Group, db: Session):
+    moderators = (
+        db.query(Moderator)
+        .join(GroupModerator, GroupModerator.moderator_id == Moderator.id)
+        .filter(GroupModerator.group_id == group.id)
+        .all()
+    )
+    pending = (
+        db.query(func.count(Case.id))
+        .filter(Case.chat_id == group.chat_id, Case.status == "pending")
+        .scalar()
+    ) or 0
+    return {
+        "id": group.id,
+        "chat_id": group.chat_id,
+        "name": group.name,
+        "active": group.active,
+        "rules": group.rules,
+        "max_strikes": group.max_strikes,
+        "sale_priority": group.sale_priority,
+        "image_priority": group.image_priority,
+        "review_images": group.review_images,
+        "moderators": [m.phone for m in moderators],
+        "pending_cases": pending
+    }
+
+
+@app.get("/admin/groups")
+def list_groups(db: Session = Depends(get_db)):
+    groups = db.query(Group).order_by(Group.id.asc()).all()
+    return {"groups": [_group_payload(group, db) for group in groups]}
+
+
+@app.post("/admin/groups")
+def upsert_group(payload: dict, db: Session = Depends(get_db)):
+    chat_id = payload.get("chat_id")
+    if not chat_id or not chat_id.endswith("@g.us"):
+        raise HTTPException(status_code=400, detail="chat_id invalido")
+
+    group = db.query(Group).filter(Group.chat_id == chat_id).first()
+    if not group:
+        group = Group(chat_id=chat_id)
+        db.add(group)
+
+    for field in ("name", "active", "rules", "max_strikes", "sale_priority", "image_priority", "review_images"):
+        if field in payload:
+            setattr(group, field, payload[field])
+
+    db.commit()
+    db.refresh(group)
+    invalidate_groups_cache()
+    return _group_payload(group, db)
+
+
+@app.post("/admin/groups/{group_id}/moderators")
+def set_group_moderators(group_id: int, payload: dict, db: Session = Depends(get_db)):
+    group = db.query(Group).filter(Group.id == group_id).first()
+    if not group:
+        raise HTTPException(status_code=404, detail="grupo no encontrado")
+
+    phones = [normalize_phone(p) for p in payload.get("moderators", []) if p]
+    moderators = db.query(Moderator).filter(Moderator.phone.in_(phones)).all() if phones else []
+    missing = set(phones) - {m.phone for m in moderators}
+    if missing:
+        raise HTTPException(status_code=400, detail=f"moderadores inexistentes: {', '.join(sorted(missing))}")
+
+    db.query(GroupModerator).filter(GroupModerator.group_id == group.id).delete()
+    for mod in moderators:
+        db.add(GroupModerator(group_id=group.id, moderator_id=mod.id))
+    db.commit()
+
+    return _group_payload(group, db)
+
+
+@app.get("/connector/groups")
+def connector_groups():
+    return {"groups": get_active_group_ids()}
+
+
+def _dashboard_decide(db: Session, payload: dict):
     case_id = payload.get("case_id")
     action  = payload.get("action")
     note    = payload.get("note", "Desde dashboard LAN")
@@ -1470,29 +2025,209 @@ def dashboard_decide(payload: dict, db: Session = Depends(get_db)):
     }
 
 
-@app.get("/connector/instructions")
-def connector_list_instructions(limit: int = 20, db: Session = Depends(get_db)):
+@app.post("/dashboard/decide")
+async def dashboard_decide(payload: dict, db=Depends(get_hot_db)):
+    return await run_db(db, _dashboard_decide, payload)
+
+
+APPEAL_ACTIONS = {"accept_appeal", "reject_appeal", "reinstate"}
+BULK_MAX_CASES = 500
+
+
+def _bulk_case_ids(db: Session, payload: dict) -> list[int]:
+    """Casos abiertos elegidos por ids, por usuario o por parecido a un caso"""
+    open_cases = Case.status.in_(("pending", "in_review"))
+    if payload.get("case_ids"):
+        ids = [int(case_id) for case_id in payload["case_ids"]]
+        rows = db.query(Case.id).filter(Case.id.in_(ids), open_cases).all()
+    elif payload.get("user_phone"):
+        phone = str(payload["user_phone"])
+        rows = (
+            db.query(Case.id)
+            .join(Message, Message.id == Case.message_id)
+            .join(User, User.id == Message.user_id)
+            .filter(open_cases, (User.phone == phone) | (User.real_phone == phone))
+            .all()
+        )
+    elif payload.get("cluster_of"):
+        seed = db.query(Case).filter(Case.id == payload["cluster_of"]).first()
+        if not seed:
+            raise HTTPException(status_code=404, detail="caso no encontrado")
+        threshold = float(payload.get("threshold", case_clusters.SIMILARITY_THRESHOLD))
+        return [case.id for case, _ in case_clusters.similar_pending_cases(db, seed, threshold)][:BULK_MAX_CASES]
+    else:
+        raise HTTPException(status_code=400, detail="falta case_ids, user_phone o cluster_of")
+    return sorted(row[0] for row in rows)[:BULK_MAX_CASES]
+
+
+def _dashboard_decide_bulk(db: Session, payload: dict):
+    """
+    La misma decisión sobre muchos casos: _resolve_case caso por caso pero
+    con todo precargado (sin consultas por caso) y un solo commit. Si uno
+    falla no se aplica ninguno. Las instrucciones se juntan: un aviso por
+    destinatario, un borrado por mensaje, una expulsión por usuario.
+    """
+    action = payload.get("action")
+    note = payload.get("note", "Desde dashboard LAN (en bloque)")
+    moderator_phone = str(payload.get("phone") or ADMIN_PHONE)
+
+    case_ids = _bulk_case_ids(db, payload)
+    cases = db.query(Case).filter(Case.id.in_(case_ids)).order_by(Case.id).all() if case_ids else []
+    # Las acciones de apelación solo valen para apelaciones y al revés
+    wants_appeals = action in APPEAL_ACTIONS
+    skipped = [case.id for case in cases if (case.type == "appeal") != wants_appeals]
+    cases = [case for case in cases if (case.type == "appeal") == wants_appeals]
+    if not cases:
+        return {"ok": True, "resolved": [], "skipped": skipped, "instructions": []}
+
+    messages = db.query(Message).filter(Message.id.in_({case.message_id for case in cases})).all()
+    user_ids = {message.user_id for message in messages}
+    db.query(User).filter(User.id.in_(user_ids)).all()
+    db.query(UserModerationSummary).filter(UserModerationSummary.user_id.in_(user_ids)).all()
+
+    instructions, users = [], {}
+    try:
+        for case in cases:
+            result = _resolve_case(
+                db=db,
+                case=case,
+                action=action,
+                moderator_phone=moderator_phone,
+                note=note,
+                notify_moderator_to=None,
+                notify_user=True,
+                allow_reinstate=True
+            )
+            instructions.extend(result["instructions"])
+            users[result["user"].id] = result["user"]
+    except HTTPException as e:
+        db.rollback()
+        raise HTTPException(status_code=e.status_code, detail=f"caso #{case.id}: {e.detail}")
+
+    coalesced = outbound.coalesce(instructions)
+    _queue_instructions(db, coalesced, source="dashboard")
+    # Antes del commit: después cada objeto vencido se volvería a leer de a uno
+    response = {
+        "ok": True,
+        "resolved": [case.id for case in cases],
+        "skipped": skipped,
+        "instructions": coalesced,
+        "instructions_before_coalescing": len(instructions),
+        "users": [
+            {"phone": user.phone, "strikes": user.strikes, "status": user.status}
+            for user in users.values()
+        ]
+    }
+    db.commit()
+    metrics.inc("bulk_decisions_total", action=str(action))
+    metrics.inc("bulk_decision_cases_total", len(cases), action=str(action))
+    print(f"🧹 Decisión en bloque '{action}': {len(cases)} casos, {len(instructions)} -> {len(coalesced)} instrucciones")
+    return response
+
+
+@app.post("/dashboard/decide_bulk")
+async def dashboard_decide_bulk(payload: dict, db=Depends(get_hot_db)):
+    return await run_db(db, _dashboard_decide_bulk, payload)
+
+
+def _dashboard_similar_cases(db: Session, case_id: int, threshold: float):
+    seed = db.query(Case).filter(Case.id == case_id).first()
+    if not seed:
+        raise HTTPException(status_code=404, detail="caso no encontrado")
+    similar = case_clusters.similar_pending_cases(db, seed, threshold)
+    user_phones = set()
+    for case, _ in similar:
+        message = db.get(Message, case.message_id)
+        user = db.get(User, message.user_id) if message else None
+        if user:
+            user_phones.add(user.real_phone or user.phone)
+    return {
+        "case_id": case_id,
+        "threshold": threshold,
+        "cases": [{"id": case.id, "similarity": score} for case, score in similar],
+        "users": len(user_phones),
+    }
+
+
+@app.get("/dashboard/cases/{case_id}/similar")
+async def dashboard_similar_cases(case_id: int, threshold: float = case_clusters.SIMILARITY_THRESHOLD, db=Depends(get_hot_db)):
+    return await run_db(db, _dashboard_similar_cases, case_id, threshold)
+
+
+def _connector_list_instructions(db: Session, limit: int):
+    # Se "alquilan" las instrucciones: quedan en dispatched hasta el ack.
+    # Si el ack no llega en INSTRUCTION_LEASE_SECONDS vuelven a entregarse.
+    # Se toma una ventana más grande que `limit` para juntar textos/duplicados
+    # y repartir por destinatario (outbound.schedule); lo que no sale vuelve a pending.
+    lease_expired = datetime.now() - timedelta(seconds=INSTRUCTION_LEASE_SECONDS)
+    available = (
+        (PendingInstruction.status == "pending") |
+        ((PendingInstruction.status == "dispatched") & (PendingInstruction.claimed_at < lease_expired))
+    )
+    candidate_ids = [
+        row[0]
+        for row in db.query(PendingInstruction.id)
+        .filter(available)
+        .order_by(PendingInstruction.created_at.asc(), PendingInstruction.id.asc())
+        .limit(max(limit, OUTBOUND_SCAN))
+        .all()
+    ]
+    if not candidate_ids:
+        return {"instructions": []}
+
+    token = uuid.uuid4().hex
+    now = datetime.now()
+    (
+        db.query(PendingInstruction)
+        .filter(PendingInstruction.id.in_(candidate_ids), available)
+        .update(
+            {"status": "dispatched", "claim_token": token, "claimed_at": now},
+            synchronize_session=False
+        )
+    )
     items = (
         db.query(PendingInstruction)
-        .filter(PendingInstruction.status == "pending")
+        .filter(PendingInstruction.claim_token == token)
         .order_by(PendingInstruction.created_at.asc(), PendingInstruction.id.asc())
-        .limit(limit)
         .all()
     )
+    by_id = {item.id: item for item in items}
+    plan = outbound.schedule([(item.id, json.loads(item.payload)) for item in items], outbound.Pacer(db), limit)
+
+    for item_id, instruction in plan["changed"].items():
+        by_id[item_id].payload = json.dumps(instruction)
+    for item_id, reason in plan["dropped"]:
+        # Quedó adentro de otra instrucción (o repetida): no se manda sola
+        item = by_id[item_id]
+        item.status, item.error, item.processed_at = "coalesced", reason, now
+        metrics.inc("outbound_coalesced_total", reason=reason)
+    for item_id in plan["deferred"]:
+        item = by_id[item_id]
+        item.status, item.claim_token, item.claimed_at = "pending", None, None
+    for key, count in plan["throttled"].items():
+        metrics.inc("outbound_throttled_total", count, kind=key.split(":", 1)[0])
+    for _, instruction in plan["send"]:
+        metrics.inc("outbound_dispatched_total", kind=outbound.instruction_kind(instruction), path="queue")
+    db.commit()
 
     return {
         "instructions": [
             {
-                "id": item.id,
-                "payload": json.loads(item.payload),
-                "source": item.source,
-                "created_at": item.created_at.isoformat() if item.created_at else None
+                "id": item_id,
+                "payload": instruction,
+                "source": by_id[item_id].source,
+                "created_at": by_id[item_id].created_at.isoformat() if by_id[item_id].created_at else None
             }
-            for item in items
+            for item_id, instruction in plan["send"]
         ]
     }
 
 
+@app.get("/connector/instructions")
+async def connector_list_instructions(limit: int = 20, db=Depends(get_hot_db)):
+    return await run_db(db, _connector_list_instructions, limit)
+
+
 @app.post("/connector/instructions/{instruction_id}/ack")
 def connector_ack_instruction(instruction_id: int, payload: dict, db: Session = Depends(get_db)):
     item = db.query(PendingInstruction).filter(PendingInstruction.id == instruction_id).first()
@@ -1511,24 +2246,41 @@ def connector_ack_instruction(instruction_id: int, payload: dict, db: Session =
     return {"ok": True}
 
 
+@app.get("/admin/profiles")
+def list_profiles():
+    return {"enabled": profiling.PROFILING, "profiles": profiling.list_profiles()}
+
+
+@app.get("/admin/profiles/route")
+def route_profile(route: str, format: str = "json"):
+    # Agregado de todos los perfiles guardados de una ruta (p.ej. /conversation)
+    stacks = profiling.route_stacks(route)
+    if format == "collapsed":
+        return PlainTextResponse(profiling.to_collapsed(stacks))
+    return {"route": route, "top_frames": profiling.top_frames(stacks), "stacks": len(stacks)}
+
+
+@app.get("/admin/profiles/{profile_id}")
+def get_profile(profile_id: int, format: str = "json"):
+    profile = profiling.get_profile(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="perfil no encontrado")
+    if format == "collapsed":
+        return PlainTextResponse(profiling.to_collapsed(profile["stacks"]))
+    data = {key: value for key, value in profile.items() if key != "stacks"}
+    data["top_frames"] = profiling.top_frames(profile["stacks"])
+    return data
+
+
 from app.models.ai_settings import AISettings
 from app.models.knowledge import Knowledge
-from app.utils.ai_config import get_ai_config  # para invalidar caché
+from app.utils.ai_config import get_ai_config, invalidate_ai_config
+from app.utils.knowledge_index import invalidate_knowledge_cache
 
 @app.get("/admin/ai/config")
 def get_ai_config_endpoint(db: Session = Depends(get_db)):
-    config = db.query(AISettings).filter(AISettings.id == 1).first()
-    if not config:
-        config = AISettings(id=1)
-        db.add(config)
-        db.commit()
-        db.refresh(config)
-    return {
-        "system_prompt": config.system_prompt,
-        "temperature": config.temperature,
-        "max_tokens": config.max_tokens,
-        "context_window": config.context_window
-    }
+    # Misma caché que usa la IA (crea la fila por defecto si falta)
+    return get_ai_config(db)
 
 @app.post("/admin/ai/config")
 def update_ai_config(payload: dict, db: Session = Depends(get_db)):
@@ -1541,11 +2293,42 @@ def update_ai_config(payload: dict, db: Session = Depends(get_db)):
     config.max_tokens = payload.get("max_tokens", config.max_tokens)
     config.context_window = payload.get("context_window", config.context_window)
     db.commit()
-    # Invalidar caché
-    import app.utils.ai_config as ai_config
-    ai_config._last_fetch = 0
+    # Invalidar caché en todos los workers
+    invalidate_ai_config()
     return {"ok": True}
 
+@app.get("/admin/state")
+def state_bus_status():
+    """Versiones del bus que ve este worker y qué tiene cargado cada caché"""
+    from app.utils import state_bus, versioned_cache
+
+    return {
+        "pid": os.getpid(),
+        "watcher": state_bus.watcher_running(),
+        "versions": state_bus.known_versions(),
+        "caches": versioned_cache.caches_status(),
+    }
+
+@app.get("/admin/sale_model")
+def sale_model_status():
+    """Modelo de ventas que usa este worker (null: solo heuristic_v2)"""
+    model = sale_model.current()
+    return {"model": model.status() if model else None}
+
+@app.post("/admin/sale_model/train")
+def train_sale_model_endpoint(payload: dict | None = None):
+    """Suma las decisiones nuevas de los moderadores al modelo (ver train_sale_model.py)"""
+    from app.services.sale_training import train
+    payload = payload or {}
+    return train(full=bool(payload.get("full", False)))
+
+@app.get("/admin/llm")
+def llm_backends_status():
+    """Backends de la IA en orden de preferencia, con su salud y latencia"""
+    from app.services import llm_backends
+
+    return {"backends": llm_backends.status()}
+
 @app.get("/admin/knowledge")
 def list_knowledge(db: Session = Depends(get_db)):
     items = db.query(Knowledge).all()
@@ -1562,6 +2345,7 @@ def create_knowledge(payload: dict, db: Session = Depends(get_db)):
     db.add(k)
     db.commit()
     db.refresh(k)
+    invalidate_knowledge_cache()
     return {"id": k.id}
 
 @app.put("/admin/knowledge/{kid}")
@@ -1574,6 +2358,7 @@ def update_knowledge(kid: int, payload: dict, db: Session = Depends(get_db)):
     k.tags = payload.get("tags", k.tags)
     k.enabled = payload.get("enabled", k.enabled)
     db.commit()
+    invalidate_knowledge_cache()
     return {"ok": True}
 
 @app.delete("/admin/knowledge/{kid}")
@@ -1582,4 +2367,62 @@ def delete_knowledge(kid: int, db: Session = Depends(get_db)):
     if k:
         db.delete(k)
         db.commit()
+        invalidate_knowledge_cache()
+    return {"ok": True}
+
+from app.models import ReplyTemplate
+from app.utils.reply_templates import TemplateError, invalidate_templates_cache, list_templates, validate
+
+@app.get("/admin/templates")
+def list_reply_templates(db: Session = Depends(get_db)):
+    return list_templates(db)
+
+@app.put("/admin/templates/{key}")
+def update_reply_template(key: str, payload: dict, db: Session = Depends(get_db)):
+    body = payload.get("body")
+    if not body:
+        raise HTTPException(status_code=400, detail="body required")
+    try:
+        validate(key, body, db)
+    except TemplateError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    chat_id = payload.get("chat_id") or None
+    query = db.query(ReplyTemplate).filter(ReplyTemplate.key == key)
+    query = query.filter(ReplyTemplate.chat_id == chat_id) if chat_id else query.filter(ReplyTemplate.chat_id.is_(None))
+    t = query.first()
+    if not t:
+        t = ReplyTemplate(key=key, chat_id=chat_id)
+        db.add(t)
+    t.body = body
+    db.commit()
+    # Se recompila en todos los workers, sin reiniciar
+    invalidate_templates_cache()
+    return {"ok": True}
+
+@app.delete("/admin/templates/{key}")
+def delete_reply_template(key: str, chat_id: str | None = None, db: Session = Depends(get_db)):
+    """Vuelve al texto del archivo (o al global, si se borra el de un grupo)"""
+    query = db.query(ReplyTemplate).filter(ReplyTemplate.key == key)
+    query = query.filter(ReplyTemplate.chat_id == chat_id) if chat_id else query.filter(ReplyTemplate.chat_id.is_(None))
+    if query.delete(synchronize_session=False):
+        db.commit()
+        invalidate_templates_cache()
     return {"ok": True}
+
+@app.post("/admin/templates/reload")
+def reload_reply_templates():
+    """Relee REPLY_TEMPLATES_PATH después de editarlo a mano"""
+    invalidate_templates_cache()
+    return {"ok": True}
+
+@app.post("/admin/history/compact")
+def compact_history_endpoint(payload: dict | None = None):
+    """Resume y borra los turnos de la IA más viejos que context_window (ver compact_history.py)"""
+    from app.services.history_compaction import compact_all
+    payload = payload or {}
+    return compact_all(
+        keep=payload.get("keep"),
+        use_llm=bool(payload.get("use_llm", False)),
+        max_users=payload.get("max_users"),
+    )
@@ -4,3 +4,11 @@ from .case import Case
 from .user_action import UserAction
 from .moderator import Moderator
 from .pending_instruction import PendingInstruction
+from .group import Group
+from .group_moderator import GroupModerator
+from .state_version import StateVersion
+from .user_moderation_summary import UserModerationSummary
+from .conversation_state import ConversationState
+from .reply_template import ReplyTemplate
+from .outbound_bucket import OutboundBucket
+from .ai_chat_batch import AiChatBatch
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Float, Integer, String, Text
+
+from app.database import Base
+
+
+class AiChatBatch(Base):
+    """Consulta a la IA en curso por teléfono (ver app/services/chat_coalescer.py)"""
+    __tablename__ = "ai_chat_batches"
+
+    phone = Column(String, primary_key=True)
+    # Sube con cada mensaje que se suma: solo guarda la respuesta quien tiene la última
+    generation = Column(Integer, nullable=False, default=1)
+    messages = Column(Text, nullable=False)  # los mensajes juntados, uno por línea
+    started_at = Column(Float, nullable=False)  # time.time() del primer mensaje; 0 si ya no suma (seal)
+    updated_at = Column(Float, nullable=False)
@@ -20,9 +20,12 @@ class Case(Base):
     priority = Column(Integer, default=3)  # 1 alta, 5 baja
 
     # Relación con mensaje
-    message_id = Column(Integer, ForeignKey("messages.id"))
+    message_id = Column(Integer, ForeignKey("messages.id"), index=True)
     message = relationship("Message")
 
+    # Grupo al que pertenece el caso (partición de la cola por grupo)
+    chat_id = Column(String, nullable=True, index=True)
+
     # Referencia al caso original (solo para apelaciones)
     original_case_id = Column(Integer, ForeignKey("cases.id"), nullable=True)
 
@@ -1,12 +1,14 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
 from sqlalchemy.sql import func
 from app.database import Base
 
 class ConversationTurn(Base):
     __tablename__ = "conversation_history"
+    # Historial de un usuario en orden: ask_groq y la compactación
+    __table_args__ = (Index("ix_conversation_history_user_phone_created_at", "user_phone", "created_at"),)
 
     id = Column(Integer, primary_key=True, index=True)
-    user_phone = Column(String, index=True, nullable=False)  # teléfono normalizado
-    role = Column(String, nullable=False)  # 'user' o 'assistant'
+    user_phone = Column(String, nullable=False)  # teléfono normalizado
+    role = Column(String, nullable=False)  # 'user', 'assistant' o 'system' (resumen de lo compactado)
     content = Column(Text, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy.sql import func
+
+from app.database import Base
+
+
+class ConversationState(Base):
+    """Estado del chat privado de un usuario (una fila por teléfono)"""
+    __tablename__ = "conversation_states"
+
+    user_phone = Column(String, primary_key=True)  # teléfono normalizado
+    state = Column(String, nullable=True)
+    # appeal_wait | None (sin estado: la fila queda por group_chat_id)
+
+    # Caso sobre el que se espera la respuesta (la apelación abierta)
+    target_case_id = Column(Integer, ForeignKey("cases.id"), nullable=True)
+
+    expires_at = Column(DateTime, nullable=True)
+
+    # Último grupo moderado donde escribió (lo anota el ingest): reglas y strikes en privado
+    group_chat_id = Column(String, nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
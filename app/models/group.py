@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text
+from sqlalchemy.sql import func
+
+from app.database import Base
+
+
+class Group(Base):
+    __tablename__ = "groups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    chat_id = Column(String, unique=True, index=True, nullable=False)  # 1203...@g.us
+    name = Column(String, nullable=True)
+
+    active = Column(Boolean, default=True)
+
+    # Reglas propias del grupo (si es NULL se usan las reglas por defecto)
+    rules = Column(Text, nullable=True)
+
+    # Umbrales de moderación
+    max_strikes = Column(Integer, default=3)
+    sale_priority = Column(Integer, default=1)
+    image_priority = Column(Integer, default=2)
+    review_images = Column(Boolean, default=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
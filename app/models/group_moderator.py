@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, ForeignKey, UniqueConstraint
+
+from app.database import Base
+
+
+class GroupModerator(Base):
+    __tablename__ = "group_moderators"
+    __table_args__ = (UniqueConstraint("group_id", "moderator_id", name="uq_group_moderator"),)
+
+    id = Column(Integer, primary_key=True)
+    group_id = Column(Integer, ForeignKey("groups.id"), nullable=False, index=True)
+    moderator_id = Column(Integer, ForeignKey("moderators.id"), nullable=False, index=True)
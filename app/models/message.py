@@ -11,7 +11,7 @@ class Message(Base):
     id = Column(Integer, primary_key=True, index=True)
 
     # Relación con usuario
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     user = relationship("User")
 
     # Contexto
@@ -25,6 +25,8 @@ class Message(Base):
 
     # WhatsApp message key (completa, en JSON)
     whatsapp_message_key = Column(Text, nullable=True)
+    # "<remoteJid>/<id>" de esa key: el conector puede reenviar un mensaje (reintentos, buffer) y se guarda una vez
+    whatsapp_message_id = Column(String, nullable=True, unique=True, index=True)
     raw_payload = Column(Text, nullable=True)
 
     # Quién envió el mensaje en el grupo (JID real)
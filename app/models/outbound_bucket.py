@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Float, String
+
+from app.database import Base
+
+
+class OutboundBucket(Base):
+    """Token bucket de envíos por destinatario (ver app/utils/outbound.py)"""
+    __tablename__ = "outbound_buckets"
+
+    key = Column(String, primary_key=True)  # send:<jid> | group:<chat_id>
+    tokens = Column(Float, nullable=False)
+    refilled_at = Column(Float, nullable=False)  # time.time() de la última recarga
@@ -12,5 +12,8 @@ class PendingInstruction(Base):
     status = Column(String, nullable=False, default="pending")
     payload = Column(Text, nullable=False)
     error = Column(Text, nullable=True)
+    # Reparto entre procesos: quién tomó la instrucción y cuándo
+    claim_token = Column(String, nullable=True, index=True)
+    claimed_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     processed_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, UniqueConstraint
+from sqlalchemy.sql import func
+
+from app.database import Base
+
+
+class ReplyTemplate(Base):
+    """
+    Texto de respuesta editado desde el panel.
+    Reemplaza al de app/reply_templates.json con la misma clave.
+    """
+    __tablename__ = "reply_templates"
+    __table_args__ = (UniqueConstraint("key", "chat_id", name="uq_reply_templates_key_chat"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String, nullable=False)
+    chat_id = Column(String, nullable=True)  # None = todos los grupos
+    body = Column(Text, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy.sql import func
+
+from app.database import Base
+
+
+class UserModerationSummary(Base):
+    """
+    Estado de moderación de un usuario ya calculado.
+    Se actualiza en la misma transacción que _resolve_case y las apelaciones.
+    """
+    __tablename__ = "user_moderation_summary"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    strikes = Column(Integer, nullable=False, default=0)
+    status = Column(String, nullable=False, default="active")
+
+    # JSON: últimas sanciones, la más nueva primero
+    # [{case_id, message_id, resolution, resolved_at, message_type, preview}]
+    last_penalties = Column(Text, nullable=False, default="[]")
+    latest_penalty_case_id = Column(Integer, ForeignKey("cases.id"), nullable=True)
+
+    open_appeals = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
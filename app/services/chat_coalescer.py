@@ -0,0 +1,180 @@
+"""
+Junta los mensajes seguidos de un mismo usuario en una sola llamada a la IA.
+
+"hola" / "una pregunta" / "a qué hora abre..." llegan con un segundo de
+diferencia. El primero consulta a la IA enseguida, sin esperar. Si mientras
+esa consulta está en curso entra otro mensaje del mismo teléfono, se suma a
+la fila de ai_chat_batches (sube la generación) y ese request pregunta por
+todos juntos; la consulta anterior queda reemplazada:
+- si todavía no pidió la respuesta, no la pide;
+- si ya la tiene, no la guarda ni la manda (vuelve sin instrucciones).
+Solo guarda la respuesta quien borra la fila con su generación, en la misma
+transacción que el historial, así nunca quedan dos respuestas.
+
+Con streaming, antes de mandar la primera oración la consulta se cierra
+(seal): desde ahí ya no se reemplaza y lo que llega después se responde
+aparte. Así el usuario nunca recibe media respuesta y después otra entera.
+
+La fila está en la base: se juntan también los mensajes que caen en workers
+distintos. Una consulta que empezó hace más de AI_COALESCE_MAX_WAIT ya no
+suma mensajes (el siguiente se responde aparte), para que un usuario que
+escribe sin parar igual reciba respuesta.
+"""
+import time
+from datetime import date
+
+from app.config import AI_COALESCE, AI_COALESCE_MAX_WAIT
+from app.database import SessionLocal, insert_or_ignore
+from app.models import AiChatBatch
+from app.utils import metrics
+
+# Llamadas a Groq por respuesta de ask_groq (clasificar intención + responder)
+CALLS_PER_REPLY = 2
+KEEP_DAYS = 7
+# Una fila sin tocar hace tanto es de un worker que murió a mitad de consulta
+STALE_SECONDS = 120
+
+_daily = {}  # "YYYY-MM-DD" -> {"messages", "replies", "saved_calls"}
+
+
+class Batch:
+    """Consulta que le toca hacer a un request: el texto juntado y su generación"""
+    __slots__ = ("phone", "generation", "message", "count", "calls")
+
+    def __init__(self, phone: str, generation: int | None, message: str, count: int = 1):
+        self.phone = phone
+        self.generation = generation  # None: se responde aparte, sin fila
+        self.message = message
+        self.count = count
+        self.calls = 0  # llamadas a la IA que ya hizo (las suma ask_groq)
+
+
+def _count(field: str, value: int = 1):
+    day = date.today().isoformat()
+    stats = _daily.get(day)
+    if stats is None:
+        stats = _daily[day] = {"messages": 0, "replies": 0, "saved_calls": 0}
+        for old in sorted(_daily)[:-KEEP_DAYS]:
+            del _daily[old]
+    stats[field] += value
+
+
+def _saved(calls: int):
+    """Cada mensaje absorbido ahorra una respuesta entera menos lo que ya había gastado"""
+    _count("saved_calls", calls)
+    metrics.inc("ai_coalesced_messages_total")
+    if calls:
+        metrics.inc("groq_calls_saved_total", calls)
+
+
+def join(db, phone: str, message: str) -> Batch:
+    """
+    Suma el mensaje a la consulta en curso del teléfono, o abre una.
+    Devuelve lo que este request tiene que preguntarle a la IA.
+    """
+    _count("messages")
+    if not AI_COALESCE:
+        return Batch(phone, None, message)
+
+    now = time.time()
+    for _ in range(3):
+        # En curso y todavía abierta: sumarse (un solo UPDATE, atómico entre workers)
+        joined = db.query(AiChatBatch).filter(
+            AiChatBatch.phone == phone,
+            AiChatBatch.started_at >= now - AI_COALESCE_MAX_WAIT,
+            AiChatBatch.updated_at >= now - STALE_SECONDS,
+        ).update({
+            AiChatBatch.generation: AiChatBatch.generation + 1,
+            AiChatBatch.messages: AiChatBatch.messages + "\n" + message,
+            AiChatBatch.updated_at: now,
+        }, synchronize_session=False)
+        if joined:
+            row = db.query(AiChatBatch.generation, AiChatBatch.messages).filter(AiChatBatch.phone == phone).one()
+            db.commit()
+            count = row.messages.count("\n") + 1
+            print(f"[AI] {count} mensajes de {phone} en una sola consulta")
+            return Batch(phone, row.generation, row.messages, count)
+
+        # Quedó de un worker caído: se reemplaza
+        db.query(AiChatBatch).filter(
+            AiChatBatch.phone == phone, AiChatBatch.updated_at < now - STALE_SECONDS
+        ).delete(synchronize_session=False)
+        if insert_or_ignore(db, AiChatBatch, {
+            "phone": phone, "generation": 1, "messages": message, "started_at": now, "updated_at": now,
+        }):
+            db.commit()
+            return Batch(phone, 1, message)
+        db.commit()
+
+        # Hay una en curso que ya no suma mensajes: este se responde aparte
+        if db.query(AiChatBatch.phone).filter(AiChatBatch.phone == phone).first():
+            return Batch(phone, None, message)
+    return Batch(phone, None, message)
+
+
+def superseded(batch: Batch) -> bool:
+    """True si otro mensaje ya se sumó y el request más nuevo responde por todos"""
+    if batch.generation is None:
+        return False
+    db = SessionLocal()
+    try:
+        generation = db.query(AiChatBatch.generation).filter(AiChatBatch.phone == batch.phone).scalar()
+    finally:
+        db.close()
+    return generation != batch.generation
+
+
+def seal(batch: Batch) -> bool:
+    """
+    Antes de mandar una parte de la respuesta: la consulta deja de sumar
+    mensajes. False si ya fue reemplazada (esa parte no tiene que salir).
+    """
+    if batch.generation is None:
+        return True
+    db = SessionLocal()
+    try:
+        # started_at en 0 la saca de la ventana de join() en el mismo UPDATE que verifica la generación
+        sealed = db.query(AiChatBatch).filter(
+            AiChatBatch.phone == batch.phone, AiChatBatch.generation == batch.generation
+        ).update({AiChatBatch.started_at: 0.0}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    return sealed == 1
+
+
+def finish(db, batch: Batch) -> bool:
+    """
+    Dentro de la transacción que guarda la respuesta: True si sigue siendo
+    la última (y la fila se libera con ese commit), False si fue reemplazada.
+    """
+    if batch.generation is None:
+        return True
+    return db.query(AiChatBatch).filter(
+        AiChatBatch.phone == batch.phone, AiChatBatch.generation == batch.generation
+    ).delete(synchronize_session=False) == 1
+
+
+def release(batch: Batch, replaced: bool):
+    """
+    Al terminar el request: libera la fila si quedó (respuesta de respaldo,
+    error) y cuenta lo ahorrado si la consulta fue reemplazada.
+    """
+    if replaced:
+        _saved(max(0, CALLS_PER_REPLY - batch.calls))
+        return
+    _count("replies")
+    if batch.generation is not None:
+        db = SessionLocal()
+        try:
+            db.query(AiChatBatch).filter(
+                AiChatBatch.phone == batch.phone, AiChatBatch.generation == batch.generation
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+
+def daily_stats() -> dict:
+    """Mensajes, respuestas y llamadas a Groq ahorradas por día (este proceso)"""
+    return {day: dict(stats) for day, stats in sorted(_daily.items())}
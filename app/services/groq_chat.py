@@ -1,17 +1,30 @@
-import json
 import re
 import locale
-from urllib import request, error
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
-from app.config import GROQ_API_KEY, GROQ_MODEL
+from app.config import AI_ANSWER_CACHE_TTL
 from app.database import SessionLocal
 from app.models.conversation import ConversationTurn
-from app.models.knowledge import Knowledge
+from app.services import chat_coalescer, llm_backends
+from app.services.history_compaction import CHAT_ROLES, get_summary_turn
+from app.services.prompt_builder import build_messages
 from app.utils.ai_config import get_ai_config
+from app.utils import knowledge_index, metrics, reply_templates
 
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
 MENU_HINT = "\n\nEscribe menu para volver."
 
+# Streaming: la primera parte sale al primer fin de oración pasado este largo
+FIRST_PART_MIN_CHARS = 40
+SENTENCE_END = re.compile(r"[.!?…](?=\s)|\n")
+
+# Últimas respuestas por pregunta normalizada: se reutilizan solo si no hay IA
+ANSWER_CACHE_SIZE = 500
+_answer_cache = OrderedDict()  # pregunta -> (respuesta, monotonic)
+_answer_lock = threading.Lock()
+_WORDS = re.compile(r"\w+")
+
 # Configurar locale para fechas en español (si está disponible)
 try:
     locale.setlocale(locale.LC_TIME, 'es_ES.UTF-8')
@@ -43,56 +56,71 @@ def _fecha_en_espanol():
         mes_es = MESES.get(mes_en, mes_en)
         return f"{dia_es} {now.day} de {mes_es}"
 
-def _call_groq(messages, temperature=0.7, max_tokens=200):
-    payload = {
-        "model": GROQ_MODEL,
-        "messages": messages,
-        "temperature": temperature,
-        "max_tokens": max_tokens,
-    }
-    req = request.Request(
-        GROQ_API_URL,
-        data=json.dumps(payload).encode("utf-8"),
-        headers={
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json",
-            "User-Agent": "Mozilla/5.0 (compatible; WhatsAppBot/1.0)"
-        },
-        method="POST",
-    )
-    try:
-        with request.urlopen(req, timeout=20) as response:
-            data = json.loads(response.read().decode("utf-8"))
-        return data["choices"][0]["message"]["content"].strip()
-    except error.HTTPError as e:
-        error_body = e.read().decode("utf-8") if e.fp else ""
-        print(f"HTTP error {e.code}: {error_body}")
-        raise
-    except error.URLError as e:
-        print(f"URL error: {e.reason}")
-        raise
-
-def _get_relevant_knowledge(user_message: str) -> str:
-    """Busca conocimiento relevante por coincidencia de tags."""
-    db = SessionLocal()
+class _PartialReply:
+    """
+    Junta los pedazos del streaming y entrega la primera parte apenas hay
+    un fin de oración después de FIRST_PART_MIN_CHARS. El resto sale al final.
+    """
+
+    def __init__(self, on_partial):
+        self.on_partial = on_partial
+        self.text = ""
+        self.sent = 0  # caracteres ya entregados
+
+    def feed(self, delta: str):
+        self.text += delta
+        if self.sent:
+            return
+        match = SENTENCE_END.search(self.text, FIRST_PART_MIN_CHARS)
+        if match:
+            first = self.text[:match.end()].strip()
+            self.sent = match.end()
+            self.on_partial(first)
+
+    def rest(self, full_text: str) -> str:
+        # self.sent cuenta sobre el texto sin recortar: cortar de ahí, no de full_text
+        return self.text[self.sent:].strip() if self.sent else full_text
+
+
+def _normalize_question(text: str) -> str:
+    return " ".join(_WORDS.findall(text.lower()))
+
+
+def _remember_answer(question: str, answer: str):
+    key = _normalize_question(question)
+    if not key:
+        return
+    with _answer_lock:
+        _answer_cache[key] = (answer, time.monotonic())
+        _answer_cache.move_to_end(key)
+        while len(_answer_cache) > ANSWER_CACHE_SIZE:
+            _answer_cache.popitem(last=False)
+
+
+def _fallback_reply(user_message: str) -> str:
+    """
+    Sin IA (circuito abierto): respuesta ya dada a la misma pregunta, si no
+    el conocimiento más relevante, si no el aviso de siempre. No toca Groq.
+    """
+    cached = _answer_cache.get(_normalize_question(user_message))
+    if cached and time.monotonic() - cached[1] <= AI_ANSWER_CACHE_TTL:
+        metrics.inc("ai_fallback_replies_total", source="cache")
+        return cached[0]
+    knowledge = _get_relevant_knowledge(user_message)
+    if knowledge:
+        metrics.inc("ai_fallback_replies_total", source="knowledge")
+        return reply_templates.render("ai_knowledge_answer", {"content": knowledge[0]})
+    metrics.inc("ai_fallback_replies_total", source="canned")
+    return reply_templates.render("ai_unavailable")
+
+
+def _get_relevant_knowledge(user_message: str) -> list[str]:
+    """Busca conocimiento relevante por coincidencia de tags, de más a menos relevante."""
     try:
-        text = user_message.lower()
-        all_knowledge = db.query(Knowledge).filter(Knowledge.enabled == True).all()
-
-        relevant = []
-        for k in all_knowledge:
-            if not k.tags:
-                continue
-            tags = [t.strip().lower() for t in k.tags.split(",")]
-            if any(tag in text for tag in tags):
-                relevant.append(k.content)
-
-        return "\n".join(relevant) if relevant else ""
+        return knowledge_index.relevant(user_message)
     except Exception as e:
         print(f"Error en _get_relevant_knowledge: {e}")
-        return ""
-    finally:
-        db.close()
+        return []
 
 def _classify_intent(user_message: str) -> str:
     """Clasifica la intención del mensaje usando Groq."""
@@ -112,7 +140,8 @@ Respondé ÚNICAMENTE con la palabra: INFO, CHUSMERIO, QUEJA o GENERAL.
     ]
 
     try:
-        respuesta = _call_groq(messages, temperature=0, max_tokens=10)
+        # Solo con el backend principal: si está caído se responde en modo GENERAL
+        respuesta = llm_backends.complete(messages, temperature=0, max_tokens=10, fallback=False)
         # Limpiar: quedarse solo con letras mayúsculas
         intent = re.sub(r'[^A-Z]', '', respuesta.upper())
         if intent:
@@ -124,13 +153,22 @@ Respondé ÚNICAMENTE con la palabra: INFO, CHUSMERIO, QUEJA o GENERAL.
         print(f"Error clasificando intención: {e}")
         return "GENERAL"
 
-def ask_groq(user_phone: str, user_message: str) -> str:
-    """Procesa mensaje del usuario, clasifica intención y devuelve respuesta."""
-    if not GROQ_API_KEY:
+def ask_groq(user_phone: str, user_message: str, on_partial=None, batch=None) -> str | None:
+    """
+    Procesa mensaje del usuario, clasifica intención y devuelve respuesta.
+    Con on_partial la respuesta se pide por streaming: on_partial(texto)
+    recibe la primera oración apenas llega y se devuelve solo lo que falta.
+    Con batch (chat_coalescer) devuelve None si otro mensaje del usuario la
+    reemplazó: no pide la respuesta o no la guarda.
+    """
+    if not llm_backends.available():
         return "No puedo hablar con la IA todavía porque falta configurar GROQ_API_KEY." + MENU_HINT
+    # Circuito abierto: contestar ya, sin clasificar ni esperar timeouts
+    if not llm_backends.ready():
+        print("[AI] Sin backend disponible, respuesta de respaldo")
+        return _fallback_reply(user_message) + MENU_HINT
 
     config = get_ai_config()
-    base_prompt = config["system_prompt"]
     temperature = config["temperature"]
     max_tokens = config["max_tokens"]
     context_window = config["context_window"]
@@ -141,64 +179,78 @@ def ask_groq(user_phone: str, user_message: str) -> str:
         # 1. Clasificar intención
         intent = _classify_intent(user_message)
         print(f"[AI] Intent detectado: {intent}")
+        if batch is not None:
+            batch.calls += 1
+            if chat_coalescer.superseded(batch):
+                return None
 
-        # 2. Obtener historial
+        # 2. Obtener historial (índice user_phone + created_at) y el resumen de lo compactado
         history = db.query(ConversationTurn)\
-            .filter(ConversationTurn.user_phone == user_phone)\
+            .filter(ConversationTurn.user_phone == user_phone, ConversationTurn.role.in_(CHAT_ROLES))\
             .order_by(ConversationTurn.created_at.desc())\
             .limit(context_window * 2)\
             .all()
         history = list(reversed(history))
+        summary_turn = get_summary_turn(db, user_phone)
 
-        # 3. Conocimiento relevante
-        knowledge_text = _get_relevant_knowledge(user_message)
+        # 3. Conocimiento relevante (ordenado)
+        knowledge = _get_relevant_knowledge(user_message)
 
         # 4. Fecha en español
         fecha_str = _fecha_en_espanol()
 
-        # 5. Instrucción según intención (sin redundancia)
-        modo_instruccion = {
-            "INFO": "Ahora actuá en MODO INFO: respondé directo, solo datos reales, sin chusmerío.",
-            "CHUSMERIO": "Ahora actuá en MODO CHUSMERIO: sé curioso, cómplice, repreguntá, con tono juguetón.",
-            "QUEJA": "Ahora actuá en MODO QUEJA: explicá con calma, no discutas, ofrecé escribir 'apelar' para revisión.",
-            "GENERAL": "Comportamiento normal, según tu personalidad base."
-        }[intent]
-
-        # 6. Construir system prompt final
-        system_parts = [base_prompt, modo_instruccion, f"Hoy es {fecha_str}."]
-        if knowledge_text:
-            system_parts.append("INFORMACIÓN DISPONIBLE (usala si es relevante):\n" + knowledge_text)
-
-        system_final = "\n\n".join(system_parts)
-
-        # 7. Armar mensajes para la IA
-        messages = [{"role": "system", "content": system_final}]
-        for turn in history:
-            messages.append({"role": turn.role, "content": turn.content})
-        messages.append({"role": "user", "content": user_message})
+        # 5-7. Prompt dentro del presupuesto de tokens (prefijo fijo cacheado por versión de config)
+        messages, prompt_stats = build_messages(
+            config,
+            intent,
+            fecha_str,
+            user_message,
+            knowledge,
+            history,
+            summary_turn.content if summary_turn else None,
+        )
+        print(
+            f"[AI] Prompt ~{prompt_stats['total']}/{prompt_stats['budget']} tokens "
+            f"(system {prompt_stats['system']}, conocimiento {prompt_stats['knowledge']} [{prompt_stats['knowledge_entries']}], "
+            f"resumen {prompt_stats['summary']}, historial {prompt_stats['history']} [{prompt_stats['history_turns']}], "
+            f"usuario {prompt_stats['user']})"
+        )
 
         # 8. Guardar mensaje del usuario en DB (sin hint)
         user_turn = ConversationTurn(user_phone=user_phone, role="user", content=user_message)
         db.add(user_turn)
         db.commit()
 
-        # 9. Obtener respuesta de Groq
-        ai_response = _call_groq(messages, temperature, max_tokens)
+        # 9. Obtener respuesta (Groq o el respaldo local; entera o por streaming, mismo camino)
+        partial = _PartialReply(on_partial) if on_partial else None
+        ai_response = llm_backends.complete(messages, temperature, max_tokens, on_delta=partial.feed if partial else None)
+
+        if batch is not None:
+            batch.calls += 1
 
         if not ai_response:
             ai_response = "Se quedó pensando…"
 
-        # 10. Guardar respuesta en DB (SIN el MENU_HINT)
+        # 10. Guardar respuesta en DB (SIN el MENU_HINT); si la consulta fue
+        # reemplazada, tampoco queda el mensaje: el request nuevo lo incluye
+        if batch is not None and not chat_coalescer.finish(db, batch):
+            db.delete(user_turn)
+            db.commit()
+            return None
         assistant_turn = ConversationTurn(user_phone=user_phone, role="assistant", content=ai_response)
         db.add(assistant_turn)
         db.commit()
+        _remember_answer(user_message, ai_response)
 
-        # 11. Devolver respuesta al usuario CON el hint
-        return ai_response + MENU_HINT
+        # 11. Devolver respuesta al usuario CON el hint (si ya salió una parte, solo lo que falta)
+        rest = partial.rest(ai_response) if partial else ai_response
+        return rest + MENU_HINT if rest else MENU_HINT.strip()
 
     except Exception as e:
         print(f"Error en ask_groq: {e}")
         db.rollback()
-        return "La IA no está respondiendo ahora. Probá de nuevo en un rato." + MENU_HINT
+        if batch is not None and chat_coalescer.superseded(batch):
+            return None
+        return _fallback_reply(user_message) + MENU_HINT
     finally:
         db.close()
\ No newline at end of file
@@ -0,0 +1,240 @@
+"""
+Compactación de conversation_history.
+
+ask_groq solo le manda al modelo los últimos context_window intercambios.
+Lo anterior se reemplaza por un único turno 'system' por usuario con un
+resumen: extractivo y local por defecto, o pedido a Groq con use_llm=True
+(si falla se usa el extractivo). Los turnos originales se borran; con
+archive_path se agregan a un JSONL comprimido después de cada commit.
+
+    python compact_history.py [--llm] [--archive history.jsonl.gz]
+"""
+import gzip
+import json
+import re
+import time
+from collections import Counter
+
+from sqlalchemy import func
+
+from app.database import SessionLocal
+from app.models.conversation import ConversationTurn
+from app.utils.ai_config import get_ai_config
+
+SUMMARY_ROLE = "system"
+SUMMARY_PREFIX = "Resumen de la conversación anterior:\n"
+SUMMARY_MAX_CHARS = 600
+CHAT_ROLES = ("user", "assistant")
+DELETE_CHUNK = 500  # ids por DELETE (límite de variables de SQLite)
+
+ROLE_LABELS = {"user": "Usuario", "assistant": "Bot"}
+
+STOPWORDS = frozenset("""
+a al algo ante con como cual cuando de del donde el ella en entre era es esa ese eso esta este esto
+fue ha hay la las le les lo los me mi mas más muy no nos o para pero por que qué se si sí sin so
+su sus te tu tus un una uno unos y ya yo vos
+""".split())
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _sentences(turns, previous: str | None):
+    """(etiqueta, oración, peso) en orden: primero el resumen anterior"""
+    if previous:
+        for line in previous.splitlines():
+            line = line.strip().lstrip("- ").strip()
+            if line:
+                label, _, sentence = line.partition(": ")
+                if not sentence:
+                    label, sentence = "", line
+                # Lo ya resumido pierde un poco de peso frente a lo nuevo
+                yield label, sentence, 0.8
+    for turn in turns:
+        label = ROLE_LABELS.get(turn.role, turn.role)
+        weight = 1.0 if turn.role == "user" else 0.7
+        for sentence in _SENTENCE_SPLIT.split(turn.content or ""):
+            sentence = sentence.strip()
+            if len(sentence) > 3:
+                yield label, sentence, weight
+
+
+def extractive_summary(turns, previous: str | None = None, max_chars: int = SUMMARY_MAX_CHARS) -> str:
+    """
+    Elige las oraciones con más palabras frecuentes de la conversación,
+    sin repetidas, hasta max_chars, y las deja en el orden original.
+    """
+    candidates = []
+    seen = set()
+    for label, sentence, weight in _sentences(turns, previous):
+        key = sentence.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        words = [w for w in _WORD.findall(key) if w not in STOPWORDS]
+        candidates.append((label, sentence, weight, words))
+
+    frequency = Counter(w for _, _, _, words in candidates for w in set(words))
+    scored = []
+    for position, (label, sentence, weight, words) in enumerate(candidates):
+        if not words:
+            continue
+        score = weight * sum(frequency[w] for w in set(words)) / (len(words) ** 0.5)
+        scored.append((score, position))
+
+    chosen, used = [], 0
+    for _, position in sorted(scored, reverse=True):
+        label, sentence = candidates[position][:2]
+        line = f"- {label}: {sentence}" if label else f"- {sentence}"
+        if used + len(line) + 1 > max_chars:
+            continue
+        chosen.append((position, line))
+        used += len(line) + 1
+    return "\n".join(line for _, line in sorted(chosen))
+
+
+def llm_summary(turns, previous: str | None = None, max_chars: int = SUMMARY_MAX_CHARS) -> str:
+    from app.services import llm_backends
+
+    if not llm_backends.available():
+        return extractive_summary(turns, previous, max_chars)
+
+    conversation = "\n".join(f"{ROLE_LABELS.get(t.role, t.role)}: {t.content}" for t in turns)
+    prompt = (
+        "Resumí en español, en viñetas cortas que empiecen con '- ', lo que importa recordar "
+        "de esta conversación entre un usuario y el bot: datos del usuario, pedidos, quejas y "
+        f"lo que se le respondió. Máximo {max_chars} caracteres."
+    )
+    if previous:
+        conversation = f"Resumen anterior:\n{previous}\n\nConversación nueva:\n{conversation}"
+    try:
+        summary = llm_backends.complete(
+            [{"role": "system", "content": prompt}, {"role": "user", "content": conversation}],
+            temperature=0,
+            max_tokens=250,
+        )
+        return summary[:max_chars] if summary else extractive_summary(turns, previous, max_chars)
+    except Exception as e:
+        print(f"⚠️ Resumen con IA falló, uso el extractivo: {e}")
+        return extractive_summary(turns, previous, max_chars)
+
+
+def get_summary_turn(db, user_phone: str) -> ConversationTurn | None:
+    return (
+        db.query(ConversationTurn)
+        .filter(ConversationTurn.user_phone == user_phone, ConversationTurn.role == SUMMARY_ROLE)
+        .order_by(ConversationTurn.created_at.desc())
+        .first()
+    )
+
+
+def _archive(archive, turns):
+    for turn in turns:
+        archive.write(json.dumps({
+            "id": turn.id,
+            "user_phone": turn.user_phone,
+            "role": turn.role,
+            "content": turn.content,
+            "created_at": turn.created_at.isoformat() if turn.created_at else None,
+        }, ensure_ascii=False) + "\n")
+
+
+def compact_user(db, user_phone: str, keep: int, use_llm: bool = False, archive=None) -> int:
+    """Resume y borra los turnos de user_phone más viejos que los últimos `keep`"""
+    # Filas sueltas (no entidades): siguen valiendo después del rollback del camino con IA
+    old_turns = (
+        db.query(
+            ConversationTurn.id,
+            ConversationTurn.user_phone,
+            ConversationTurn.role,
+            ConversationTurn.content,
+            ConversationTurn.created_at,
+        )
+        .filter(ConversationTurn.user_phone == user_phone, ConversationTurn.role.in_(CHAT_ROLES))
+        .order_by(ConversationTurn.created_at.desc(), ConversationTurn.id.desc())
+        .offset(keep)
+        .all()
+    )
+    if not old_turns:
+        return 0
+    old_turns.reverse()
+
+    summary_turn = get_summary_turn(db, user_phone)
+    previous = summary_turn.content.removeprefix(SUMMARY_PREFIX) if summary_turn else None
+
+    if use_llm:
+        # La llamada a la IA no se hace con la transacción de lectura abierta
+        db.rollback()
+        text = llm_summary(old_turns, previous)
+    else:
+        text = extractive_summary(old_turns, previous)
+
+    if summary_turn is None:
+        summary_turn = ConversationTurn(user_phone=user_phone, role=SUMMARY_ROLE)
+        db.add(summary_turn)
+    summary_turn.content = SUMMARY_PREFIX + text
+    summary_turn.created_at = old_turns[-1].created_at
+
+    ids = [turn.id for turn in old_turns]
+    for start in range(0, len(ids), DELETE_CHUNK):
+        db.query(ConversationTurn).filter(
+            ConversationTurn.id.in_(ids[start:start + DELETE_CHUNK])
+        ).delete(synchronize_session=False)
+    db.commit()
+
+    # Recién con el borrado confirmado: si el commit falla, el próximo
+    # intento los archiva una sola vez
+    if archive is not None:
+        _archive(archive, old_turns)
+    return len(ids)
+
+
+def compact_all(keep: int | None = None, use_llm: bool = False, archive_path: str | None = None, max_users: int | None = None) -> dict:
+    """
+    Compacta a todos los usuarios con más de `keep` turnos (por defecto
+    context_window * 2, lo mismo que lee ask_groq). Un commit por usuario:
+    la escritura bloquea la base lo mínimo posible.
+    """
+    if keep is None:
+        keep = get_ai_config()["context_window"] * 2
+
+    started = time.perf_counter()
+    db = SessionLocal()
+    archive = gzip.open(archive_path, "at", encoding="utf-8") if archive_path else None
+    users = compacted = 0
+    try:
+        query = (
+            db.query(ConversationTurn.user_phone)
+            .filter(ConversationTurn.role.in_(CHAT_ROLES))
+            .group_by(ConversationTurn.user_phone)
+            .having(func.count(ConversationTurn.id) > keep)
+        )
+        if max_users:
+            query = query.limit(max_users)
+        phones = [row[0] for row in query.all()]
+        db.rollback()
+
+        for phone in phones:
+            try:
+                removed = compact_user(db, phone, keep, use_llm=use_llm, archive=archive)
+            except Exception as e:
+                db.rollback()
+                print(f"❌ Error compactando {phone}: {e}")
+                continue
+            if removed:
+                users += 1
+                compacted += removed
+    finally:
+        db.close()
+        if archive is not None:
+            archive.close()
+
+    return {
+        "users": users,
+        "compacted_turns": compacted,
+        "keep": keep,
+        "summarizer": "llm" if use_llm else "extractive",
+        "archive": archive_path,
+        "elapsed_s": round(time.perf_counter() - started, 2),
+    }
+
@@ -0,0 +1,242 @@
+"""
+Backends de LLM intercambiables para ask_groq y los resúmenes.
+
+Todos hablan la API de chat de OpenAI (/v1/chat/completions): Groq y un
+servidor local en CPU (llama.cpp `llama-server`, Ollama, LM Studio...).
+LLM_BACKENDS da el orden de preferencia; complete() usa el primero sano
+y, si falla antes de mandar nada, prueba el siguiente.
+
+Salud: cada backend tiene su circuit breaker (app/utils/circuit_breaker.py)
+con tasa de errores y de llamadas lentas en una ventana móvil. Si no queda
+ninguno cerrado se corta enseguida (LLMUnavailable) en lugar de esperar
+los timeouts.
+"""
+import json
+import threading
+import time
+from urllib import request, error
+
+from app.config import (
+    GROQ_API_KEY, GROQ_API_URL, GROQ_MODEL, GROQ_SLOW_SECONDS, GROQ_TIMEOUT,
+    LLM_BACKENDS, LLM_BREAKER_ERROR_RATE, LLM_BREAKER_HALF_OPEN_CALLS, LLM_BREAKER_MIN_CALLS,
+    LLM_BREAKER_SLOW_RATE, LLM_BREAKER_WINDOW, LLM_COOLDOWN_SECONDS, LLM_FAILURE_THRESHOLD,
+    LOCAL_LLM_API_KEY, LOCAL_LLM_MODEL, LOCAL_LLM_SLOW_SECONDS, LOCAL_LLM_TIMEOUT, LOCAL_LLM_URL,
+)
+from app.utils import metrics
+from app.utils.circuit_breaker import CircuitBreaker
+
+LATENCY_SMOOTHING = 0.2  # peso de la última llamada en la latencia promedio
+
+
+class LLMUnavailable(RuntimeError):
+    """Ningún backend sano para atender el pedido"""
+
+
+class OpenAICompatibleBackend:
+    """Cliente /chat/completions con su propio circuit breaker"""
+
+    def __init__(self, name: str, url: str, model: str, api_key: str = "", timeout: float = 20, slow_seconds: float = 8):
+        self.name = name
+        self.url = url
+        self.model = model
+        self.api_key = api_key
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(
+            name,
+            window=LLM_BREAKER_WINDOW,
+            min_calls=LLM_BREAKER_MIN_CALLS,
+            error_rate=LLM_BREAKER_ERROR_RATE,
+            slow_seconds=slow_seconds,
+            slow_rate=LLM_BREAKER_SLOW_RATE,
+            consecutive_failures=LLM_FAILURE_THRESHOLD,
+            open_seconds=LLM_COOLDOWN_SECONDS,
+            half_open_calls=LLM_BREAKER_HALF_OPEN_CALLS,
+        )
+        self._lock = threading.Lock()
+        self.latency = None  # segundos, promedio móvil
+        self.last_error = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.url)
+
+    def healthy(self) -> bool:
+        return not self.breaker.is_open()
+
+    def _read_stream(self, response, on_delta):
+        """Lee el SSE; devuelve (texto, usage)"""
+        parts, usage = [], {}
+        for raw in response:
+            line = raw.decode("utf-8").strip()
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            # Groq manda el uso en x_groq del último chunk; OpenAI en usage
+            usage = chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage") or usage
+            for choice in chunk.get("choices") or []:
+                delta = (choice.get("delta") or {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    on_delta(delta)
+        return "".join(parts), usage
+
+    def complete(self, messages, temperature=0.7, max_tokens=200, on_delta=None) -> str:
+        """Con on_delta pide la respuesta por streaming y llama on_delta(texto) por cada pedazo"""
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        if on_delta:
+            payload["stream"] = True
+        headers = {
+            "Content-Type": "application/json",
+            "User-Agent": "Mozilla/5.0 (compatible; WhatsAppBot/1.0)"
+        }
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        req = request.Request(self.url, data=json.dumps(payload).encode("utf-8"), headers=headers, method="POST")
+
+        started = time.perf_counter()
+        try:
+            with request.urlopen(req, timeout=self.timeout) as response:
+                if on_delta:
+                    text, usage = self._read_stream(response, on_delta)
+                else:
+                    data = json.loads(response.read().decode("utf-8"))
+                    text, usage = data["choices"][0]["message"]["content"], data.get("usage") or {}
+        except error.HTTPError as e:
+            error_body = e.read().decode("utf-8") if e.fp else ""
+            print(f"HTTP error {e.code} ({self.name}): {error_body}")
+            self._failed(f"http_{e.code}", time.perf_counter() - started)
+            raise
+        except error.URLError as e:
+            print(f"URL error ({self.name}): {e.reason}")
+            self._failed("url", time.perf_counter() - started)
+            raise
+        except TimeoutError:
+            self._failed("timeout", time.perf_counter() - started)
+            raise
+        except Exception as e:
+            # Respuesta rota o corte a mitad del stream: también cuenta para el breaker
+            self._failed(type(e).__name__, time.perf_counter() - started)
+            raise
+        self._succeeded(time.perf_counter() - started, usage)
+        return text.strip()
+
+    def _succeeded(self, elapsed: float, usage: dict):
+        self.breaker.record(True, elapsed)
+        with self._lock:
+            self.latency = elapsed if self.latency is None else \
+                self.latency + LATENCY_SMOOTHING * (elapsed - self.latency)
+        metrics.observe("llm_request_duration_seconds", elapsed, backend=self.name)
+        metrics.inc("llm_requests_total", backend=self.name, outcome="ok")
+        metrics.inc("llm_tokens_total", usage.get("prompt_tokens", 0), backend=self.name, kind="prompt")
+        metrics.inc("llm_tokens_total", usage.get("completion_tokens", 0), backend=self.name, kind="completion")
+
+    def _failed(self, reason: str, elapsed: float):
+        self.breaker.record(False, elapsed)
+        self.last_error = reason
+        metrics.observe("llm_request_duration_seconds", elapsed, backend=self.name)
+        metrics.inc("llm_requests_total", backend=self.name, outcome=reason)
+
+    def status(self) -> dict:
+        return {
+            "name": self.name,
+            "url": self.url,
+            "model": self.model,
+            "breaker": self.breaker.status(),
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+class GroqBackend(OpenAICompatibleBackend):
+    """Groq: además de las llm_* sigue alimentando las métricas groq_* del dashboard"""
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.url and self.api_key)
+
+    def _succeeded(self, elapsed: float, usage: dict):
+        super()._succeeded(elapsed, usage)
+        metrics.observe("groq_request_duration_seconds", elapsed)
+        metrics.inc("groq_tokens_total", usage.get("prompt_tokens", 0), kind="prompt")
+        metrics.inc("groq_tokens_total", usage.get("completion_tokens", 0), kind="completion")
+
+    def _failed(self, reason: str, elapsed: float):
+        super()._failed(reason, elapsed)
+        metrics.observe("groq_request_duration_seconds", elapsed)
+        metrics.inc("groq_errors_total", reason=reason)
+
+
+BACKENDS = {
+    "groq": GroqBackend("groq", GROQ_API_URL, GROQ_MODEL, GROQ_API_KEY, GROQ_TIMEOUT, GROQ_SLOW_SECONDS),
+    "local": OpenAICompatibleBackend(
+        "local", LOCAL_LLM_URL, LOCAL_LLM_MODEL, LOCAL_LLM_API_KEY, LOCAL_LLM_TIMEOUT, LOCAL_LLM_SLOW_SECONDS
+    ),
+}
+
+
+def _enabled() -> list[OpenAICompatibleBackend]:
+    names = [name.strip() for name in LLM_BACKENDS.split(",") if name.strip()]
+    return [BACKENDS[name] for name in names if name in BACKENDS and BACKENDS[name].configured]
+
+
+def available() -> bool:
+    """Hay al menos un backend configurado (sano o no)"""
+    return bool(_enabled())
+
+
+def ready(fallback: bool = True) -> bool:
+    """Algún backend aceptaría un pedido ahora (no consume las pruebas de half_open)"""
+    backends = _enabled()
+    return any(backend.healthy() for backend in (backends if fallback else backends[:1]))
+
+
+def complete(messages, temperature=0.7, max_tokens=200, on_delta=None, fallback=True) -> str:
+    """
+    Respuesta del primer backend sano. Con fallback=False solo se usa el
+    principal (p. ej. clasificar la intención no vale una llamada en CPU).
+    """
+    backends = _enabled()
+    if not fallback:
+        backends = backends[:1]
+
+    sent = []
+
+    def track(delta):
+        sent.append(delta)
+        on_delta(delta)
+
+    last_error = None
+    for backend in backends:
+        # allow() va justo antes de llamar: en half_open reserva la llamada de prueba
+        if not backend.breaker.allow():
+            continue
+        if last_error is not None:
+            print(f"↪️ LLM pruebo con {backend.name} ({last_error})")
+        try:
+            return backend.complete(messages, temperature, max_tokens, on_delta=track if on_delta else None)
+        except Exception as e:
+            last_error = e
+            # Si ya salió parte de la respuesta no se puede seguir con otro backend
+            if sent:
+                raise
+            metrics.inc("llm_fallbacks_total", source=backend.name)
+    if last_error is not None:
+        raise last_error
+    metrics.inc("llm_unavailable_total")
+    raise LLMUnavailable("ningún backend de LLM disponible")
+
+
+def status() -> list[dict]:
+    order = [backend.name for backend in _enabled()]
+    return [
+        {**backend.status(), "configured": backend.configured, "priority": order.index(name) if name in order else None}
+        for name, backend in BACKENDS.items()
+    ]
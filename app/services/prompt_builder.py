@@ -0,0 +1,186 @@
+"""
+Armado del prompt de ask_groq con presupuesto de tokens.
+
+Siempre entran el prefijo fijo (prompt base + modo), la fecha y el mensaje
+del usuario. Con lo que queda, en orden de prioridad:
+
+1. conocimiento relevante, de más a menos coincidencias, hasta
+   KNOWLEDGE_SHARE del resto (enteras las que entran; con lugar de sobra,
+   la primera que no entró va recortada);
+2. el resumen del historial compactado;
+3. el historial, del turno más nuevo al más viejo, por intercambios.
+
+Los tokens se estiman localmente (caracteres y palabras, sin tokenizer); la
+cifra real la devuelve Groq en groq_tokens_total{kind="prompt"} y sirve
+para ajustar CHARS_PER_TOKEN si se desvía.
+"""
+import threading
+
+from app.config import GROQ_MODEL, PROMPT_TOKEN_BUDGET
+from app.utils import metrics
+from app.utils.ai_config import VERSION_KEY as AI_CONFIG_VERSION_KEY
+from app.utils.state_bus import current_version
+
+# Ventana de contexto por modelo (tokens). El presupuesto nunca la supera.
+MODEL_CONTEXT_TOKENS = {
+    "llama-3.1-8b-instant": 131072,
+    "llama-3.3-70b-versatile": 131072,
+    "gemma2-9b-it": 8192,
+    "mixtral-8x7b-32768": 32768,
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+
+KNOWLEDGE_SHARE = 0.4
+MESSAGE_OVERHEAD = 4  # tokens de rol/separadores por mensaje del chat
+CHARS_PER_TOKEN = 3.6  # español con tokenizers tipo Llama 3
+MIN_TRIMMED_TOKENS = 20  # menos que esto no vale la pena mandar recortado
+
+MODES = {
+    "INFO": "Ahora actuá en MODO INFO: respondé directo, solo datos reales, sin chusmerío.",
+    "CHUSMERIO": "Ahora actuá en MODO CHUSMERIO: sé curioso, cómplice, repreguntá, con tono juguetón.",
+    "QUEJA": "Ahora actuá en MODO QUEJA: explicá con calma, no discutas, ofrecé escribir 'apelar' para revisión.",
+    "GENERAL": "Comportamiento normal, según tu personalidad base.",
+}
+
+_prefix_cache = {}  # (versión de ai_config, intención) -> (prompt base, texto, tokens)
+_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """Aproximado y barato (sin recorrer palabra por palabra en Python)"""
+    if not text:
+        return 0
+    # Piso de un token por palabra (textos de palabras cortas o números)
+    return max(text.count(" ") + 1, round(len(text) / CHARS_PER_TOKEN))
+
+
+def token_budget(max_tokens: int, model: str = GROQ_MODEL) -> int:
+    """Tokens de prompt permitidos: el tope configurado sin pasar la ventana del modelo"""
+    context = MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)
+    return max(0, min(PROMPT_TOKEN_BUDGET, context - (max_tokens or 0)))
+
+
+def _static_prefix(config: dict, intent: str) -> tuple[str, int]:
+    """Prompt base + modo, armado y medido una vez por versión de la config"""
+    key = (current_version(AI_CONFIG_VERSION_KEY), intent)
+    base = config["system_prompt"] or ""
+    cached = _prefix_cache.get(key)
+    if cached is None or cached[0] != base:
+        text = "\n\n".join(part for part in (base, MODES.get(intent, MODES["GENERAL"])) if part)
+        cached = (base, text, estimate_tokens(text))
+        with _lock:
+            if len(_prefix_cache) > 64:
+                _prefix_cache.clear()
+            _prefix_cache[key] = cached
+    return cached[1], cached[2]
+
+
+def _trim(text: str, tokens: int) -> str:
+    """Recorta text a ~tokens sin cortar una palabra a la mitad"""
+    cut = text[:int(tokens * CHARS_PER_TOKEN)]
+    if len(cut) < len(text) and " " in cut:
+        cut = cut[:cut.rindex(" ")]
+    return cut + "…"
+
+
+def build_messages(
+        config: dict,
+        intent: str,
+        date_text: str,
+        user_message: str,
+        knowledge: list[str],
+        history: list,
+        summary: str | None = None,
+        model: str = GROQ_MODEL,
+) -> tuple[list[dict], dict]:
+    """
+    Devuelve (messages, stats). knowledge viene ordenado de más a menos
+    relevante; history del más viejo al más nuevo (objetos con role/content).
+    """
+    budget = token_budget(config.get("max_tokens"), model)
+    prefix, prefix_tokens = _static_prefix(config, intent)
+    date_part = f"Hoy es {date_text}."
+    system_tokens = prefix_tokens + estimate_tokens(date_part) + MESSAGE_OVERHEAD
+    user_tokens = estimate_tokens(user_message) + MESSAGE_OVERHEAD
+    used = system_tokens + user_tokens
+
+    # 1. Conocimiento por relevancia
+    knowledge_budget = int(max(0, budget - used) * KNOWLEDGE_SHARE)
+    header = "INFORMACIÓN DISPONIBLE (usala si es relevante):\n"
+    chosen_knowledge, knowledge_tokens = [], 0
+    if knowledge and knowledge_budget > MIN_TRIMMED_TOKENS:
+        knowledge_tokens = estimate_tokens(header)
+        skipped = None
+        for entry in knowledge:
+            cost = estimate_tokens(entry)
+            if knowledge_tokens + cost <= knowledge_budget:
+                chosen_knowledge.append(entry)
+                knowledge_tokens += cost
+            elif skipped is None:
+                skipped = entry
+        # Con lugar de sobra, la más relevante de las que no entraron va recortada
+        room = knowledge_budget - knowledge_tokens
+        if skipped is not None and room >= MIN_TRIMMED_TOKENS:
+            chosen_knowledge.append(_trim(skipped, room))
+            knowledge_tokens += room
+        if not chosen_knowledge:
+            knowledge_tokens = 0
+    used += knowledge_tokens
+
+    system_parts = [prefix, date_part]
+    if chosen_knowledge:
+        system_parts.append(header + "\n".join(chosen_knowledge))
+    messages = [{"role": "system", "content": "\n\n".join(system_parts)}]
+
+    # 2. Resumen de lo compactado
+    summary_tokens = 0
+    if summary:
+        cost = estimate_tokens(summary) + MESSAGE_OVERHEAD
+        if used + cost <= budget:
+            messages.append({"role": "system", "content": summary})
+            summary_tokens = cost
+            used += cost
+
+    # 3. Historial, de lo más nuevo a lo más viejo, sin cortar un intercambio
+    kept = []
+    history_tokens = 0
+    index = len(history)
+    while index > 0:
+        start = index - 2 if index >= 2 and history[index - 1].role == "assistant" else index - 1
+        block = history[start:index]
+        cost = sum(estimate_tokens(turn.content) + MESSAGE_OVERHEAD for turn in block)
+        if used + cost > budget:
+            break
+        kept[:0] = block
+        history_tokens += cost
+        used += cost
+        index = start
+
+    for turn in kept:
+        messages.append({"role": turn.role, "content": turn.content})
+    messages.append({"role": "user", "content": user_message})
+
+    stats = {
+        "budget": budget,
+        "total": used,
+        "system": system_tokens,
+        "knowledge": knowledge_tokens,
+        "knowledge_entries": f"{len(chosen_knowledge)}/{len(knowledge)}",
+        "summary": summary_tokens,
+        "history": history_tokens,
+        "history_turns": f"{len(kept)}/{len(history)}",
+        "user": user_tokens,
+    }
+    _record(stats, len(knowledge) - len(chosen_knowledge), len(history) - len(kept))
+    return messages, stats
+
+
+def _record(stats: dict, dropped_knowledge: int, dropped_turns: int):
+    metrics.inc("groq_prompts_total")
+    for part in ("system", "knowledge", "summary", "history", "user"):
+        if stats[part]:
+            metrics.inc("groq_prompt_tokens_estimated_total", stats[part], part=part)
+    if dropped_knowledge:
+        metrics.inc("groq_prompt_trimmed_total", dropped_knowledge, kind="knowledge")
+    if dropped_turns:
+        metrics.inc("groq_prompt_trimmed_total", dropped_turns, kind="history")
@@ -0,0 +1,200 @@
+"""
+Re-clasificación de los mensajes guardados con el clasificador actual.
+
+Cuando cambia analyze_message (o se entrena el modelo de ventas) las filas
+viejas quedan con category_label / intent_label de la versión anterior y
+los reportes mezclan versiones. reclassify() recorre messages por id en
+lotes de `chunk` filas:
+
+- cada lote es una consulta corta (id > último ORDER BY id LIMIT chunk):
+  memoria acotada al lote y sin un snapshot abierto toda la corrida, que
+  en SQLite no dejaría hacer checkpoint del WAL;
+- los lotes se clasifican en un pool de procesos (analyze_messages: la
+  heurística fila por fila y el modelo de ventas en un solo lote), con a
+  lo sumo 2 lotes por proceso en vuelo;
+- solo se actualizan las filas cuyo resultado cambió, en un executemany
+  por lote, y después se guarda el checkpoint (último id escrito).
+
+Si se corta, la próxima corrida sigue desde el checkpoint; si la anterior
+terminó, empieza de nuevo desde el principio.
+
+    python reclassify_messages.py --workers 4
+"""
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import bindparam, select, update
+
+from app.config import SALE_MODEL_PATH
+from app.database import engine
+from app.models import Message
+from app.utils import sale_model
+from app.utils.message_analysis import HEURISTIC_SOURCE, analyze_messages
+
+DEFAULT_CHUNK = 5000
+DEFAULT_CHECKPOINT = "reclassify.checkpoint.json"
+PROGRESS_EVERY = 20  # lotes
+
+_COLUMNS = (
+    Message.id, Message.message_type, Message.content, Message.media_caption,
+    Message.category_label, Message.intent_label, Message.intent_source,
+)
+_UPDATE = (
+    update(Message.__table__)
+    .where(Message.__table__.c.id == bindparam("row_id"))
+    .values(
+        category_label=bindparam("category_label"),
+        intent_label=bindparam("intent_label"),
+        intent_source=bindparam("intent_source"),
+    )
+)
+
+_worker_model = False
+
+
+def _load_model(model_path: str | None):
+    """Modelo de ventas del archivo, o False (solo heurística)"""
+    if not model_path or not os.path.exists(model_path):
+        return False
+    try:
+        from app.utils.sale_model import SaleModel
+
+        model = SaleModel.load(model_path)
+    except ImportError:
+        return False
+    return model if model.docs.min() > 0 else False
+
+
+def _init_worker(model_path: str | None):
+    global _worker_model
+    _worker_model = _load_model(model_path)
+
+
+def classify_chunk(rows: list[tuple], model=None) -> list[dict]:
+    """Filas (id, tipo, content, caption, categoría, intención, fuente) -> cambios a escribir"""
+    model = _worker_model if model is None else model
+    analyses = analyze_messages([(row[1], row[2], row[3]) for row in rows], model=model)
+    changes = []
+    for row, analysis in zip(rows, analyses):
+        new = (analysis["category_label"], analysis["intent_label"], analysis["intent_source"])
+        if new != tuple(row[4:7]):
+            changes.append({
+                "row_id": row[0],
+                "category_label": new[0],
+                "intent_label": new[1],
+                "intent_source": new[2],
+            })
+    return changes
+
+
+def _chunks(after_id: int, size: int):
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(*_COLUMNS).where(Message.id > after_id).order_by(Message.id).limit(size)
+            ).all()
+        if not rows:
+            return
+        yield [tuple(row) for row in rows]
+        after_id = rows[-1][0]
+
+
+def _new_state() -> dict:
+    return {"last_id": 0, "scanned": 0, "changed": 0, "elapsed_s": 0.0, "done": False}
+
+
+def _read_checkpoint(path: str) -> dict:
+    if path and os.path.exists(path):
+        with open(path) as f:
+            state = json.load(f)
+        if not state.get("done"):
+            return state
+    return _new_state()
+
+
+def _write_checkpoint(path: str, state: dict):
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def reclassify(
+        chunk: int = DEFAULT_CHUNK,
+        workers: int = os.cpu_count() or 1,
+        checkpoint_path: str | None = DEFAULT_CHECKPOINT,
+        restart: bool = False,
+        max_chunks: int | None = None,
+        model_path: str | None = SALE_MODEL_PATH,
+) -> dict:
+    """
+    Re-clasifica desde el checkpoint. workers=0 clasifica en este proceso.
+    max_chunks corta antes (para repartir la corrida en varias veces).
+    """
+    state = _new_state() if restart else _read_checkpoint(checkpoint_path)
+    model = _load_model(model_path)
+    source = f"{sale_model.SOURCE} + {HEURISTIC_SOURCE}" if model else HEURISTIC_SOURCE
+    print(f"🔁 Re-clasificando mensajes desde id {state['last_id']} ({source}, {workers or 'sin'} procesos)")
+
+    started = time.perf_counter()
+    run = {"scanned": 0, "changed": 0, "chunks": 0}
+
+    def write(rows, changes):
+        if changes:
+            with engine.begin() as conn:
+                conn.execute(_UPDATE, changes)
+        run["scanned"] += len(rows)
+        run["changed"] += len(changes)
+        run["chunks"] += 1
+        state.update(
+            last_id=rows[-1][0],
+            scanned=state["scanned"] + len(rows),
+            changed=state["changed"] + len(changes),
+        )
+        _write_checkpoint(checkpoint_path, {**state, "elapsed_s": round(state["elapsed_s"] + time.perf_counter() - started, 1)})
+        if run["chunks"] % PROGRESS_EVERY == 0:
+            rate = run["scanned"] / max(time.perf_counter() - started, 1e-9)
+            print(f"   ... id {state['last_id']}: {run['scanned']} filas, {run['changed']} cambiadas ({rate:.0f} filas/s)")
+
+    chunks = _chunks(state["last_id"], chunk)
+    if max_chunks is not None:
+        chunks = (rows for _, rows in zip(range(max_chunks), chunks))
+
+    if workers <= 0:
+        for rows in chunks:
+            write(rows, classify_chunk(rows, model))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_path,)) as pool:
+            # En orden: el checkpoint solo avanza cuando todo lo anterior ya está escrito
+            in_flight = deque()
+            for rows in chunks:
+                in_flight.append((rows, pool.submit(classify_chunk, rows)))
+                if len(in_flight) >= workers * 2:
+                    done_rows, future = in_flight.popleft()
+                    write(done_rows, future.result())
+            while in_flight:
+                done_rows, future = in_flight.popleft()
+                write(done_rows, future.result())
+
+    elapsed = time.perf_counter() - started
+    state["elapsed_s"] = round(state["elapsed_s"] + elapsed, 1)
+    state["done"] = max_chunks is None or run["chunks"] < max_chunks
+    _write_checkpoint(checkpoint_path, state)
+    result = {
+        **run,
+        "elapsed_s": round(elapsed, 2),
+        "rows_per_s": round(run["scanned"] / elapsed) if elapsed > 0 else None,
+        "last_id": state["last_id"],
+        "done": state["done"],
+        "total": {"scanned": state["scanned"], "changed": state["changed"], "elapsed_s": state["elapsed_s"]},
+        "source": source,
+        "workers": workers,
+        "chunk": chunk,
+    }
+    print(f"✅ Re-clasificación: {run['scanned']} filas, {run['changed']} cambiadas, {result['rows_per_s']} filas/s")
+    return result
@@ -0,0 +1,173 @@
+"""
+Entrenamiento y evaluación del modelo de ventas (app/utils/sale_model.py).
+
+Etiquetas, una por mensaje de texto:
+- la clasificación del dashboard (reviewed_category_label): SALE o no;
+- si no la hay, la resolución del caso de infracción: borrado, strike,
+  advertencia o expulsión = venta; ignorado / aprobado = no venta.
+
+train() suma al modelo guardado solo lo etiquetado desde su trained_until;
+las etiquetas con esa misma fecha que ya sumó quedan en trained_keys y no
+se repiten. Con full=True lo arma de cero. Un mensaje que se vuelve a
+clasificar después de entrenado suma las dos etiquetas hasta el próximo
+full.
+
+evaluate() compara heuristic_v2 con la heurística + modelo en validación
+cruzada sobre los mensajes etiquetados. Ojo: casi todas las etiquetas
+vienen de casos, que solo se abren por la heurística, así que el recall
+se mide sobre lo que alguien miró, no sobre todo el tráfico.
+
+    python train_sale_model.py [--full] [--eval]
+"""
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import or_
+
+from app.config import SALE_MODEL_IGNORE_BELOW, SALE_MODEL_PATH
+from app.database import SessionLocal
+from app.models import Case, Message
+from app.utils import sale_model
+from app.utils.message_analysis import _normalize_text, analyze_messages
+
+SALE_RESOLUTIONS = ("deleted", "delete", "strike", "warn", "banned")
+NOT_SALE_RESOLUTIONS = ("ignored", "approve")
+FIT_CHUNK = 5000
+
+
+def labeled_examples(db, since: datetime | None = None):
+    """
+    (message_id, texto, 1 venta / 0 no, momento de la etiqueta, clave de la etiqueta),
+    primero las del dashboard. Con since: las etiquetadas desde ese momento (inclusive).
+    """
+    reviewed = (
+        db.query(Message.id, Message.content, Message.media_caption, Message.reviewed_category_label, Message.reviewed_at)
+        .filter(Message.reviewed_category_label.isnot(None))
+        .filter(or_(Message.content.isnot(None), Message.media_caption.isnot(None)))
+    )
+    if since is not None:
+        reviewed = reviewed.filter(Message.reviewed_at >= since)
+    for message_id, content, caption, label, labeled_at in reviewed.order_by(Message.id).yield_per(FIT_CHUNK):
+        yield message_id, content or caption, int(label == "SALE"), labeled_at, f"review:{message_id}"
+
+    resolved = (
+        db.query(Message.id, Message.content, Case.id, Case.resolution, Case.resolved_at)
+        .join(Case, Case.message_id == Message.id)
+        .filter(
+            Case.type == "infringement",
+            Case.resolution.in_(SALE_RESOLUTIONS + NOT_SALE_RESOLUTIONS),
+            Message.reviewed_category_label.is_(None),
+            Message.message_type == "text",
+            Message.content.isnot(None),
+        )
+    )
+    if since is not None:
+        resolved = resolved.filter(Case.resolved_at >= since)
+    for message_id, content, case_id, resolution, labeled_at in resolved.order_by(Case.id).yield_per(FIT_CHUNK):
+        yield message_id, content, int(resolution in SALE_RESOLUTIONS), labeled_at, f"case:{case_id}"
+
+
+def train(full: bool = False, path: str = SALE_MODEL_PATH, db=None) -> dict:
+    """Suma las etiquetas nuevas al modelo (o lo arma de cero), lo guarda y avisa a los workers"""
+    from app.utils.sale_model import SaleModel
+
+    started = time.perf_counter()
+    model = SaleModel.load(path) if not full and os.path.exists(path) else SaleModel.empty()
+    since = datetime.fromisoformat(model.trained_until) if model.trained_until else None
+    # Si ninguna etiqueta trae fecha, la próxima vez se sigue desde ahora
+    started_at = datetime.now()
+
+    session = db or SessionLocal()
+    added = {"sale": 0, "not_sale": 0}
+    newest = since
+    # Las de la corrida anterior con fecha == since ya están sumadas
+    trained = set(model.trained_keys) if since is not None else set()
+    boundary = set(trained)  # claves con fecha == newest
+    try:
+        texts, labels = [], []
+        for _, text, label, labeled_at, key in labeled_examples(session, since):
+            if labeled_at == since and key in trained:
+                continue
+            texts.append(_normalize_text(text))
+            labels.append(label)
+            added["sale" if label else "not_sale"] += 1
+            if labeled_at is not None:
+                if newest is None or labeled_at > newest:
+                    newest, boundary = labeled_at, {key}
+                elif labeled_at == newest:
+                    boundary.add(key)
+            if len(texts) >= FIT_CHUNK:
+                model.fit(texts, labels)
+                texts, labels = [], []
+        model.fit(texts, labels)
+    finally:
+        if db is None:
+            session.close()
+
+    model.trained_until = (newest or started_at).isoformat()
+    model.trained_keys = sorted(boundary) if newest is not None else []
+    model.trained_at = time.time()
+    model.save(path)
+    sale_model.invalidate_sale_model()
+    print(f"🧠 Modelo de ventas: +{added['sale']} ventas, +{added['not_sale']} no ventas ({'completo' if full else 'incremental'})")
+    return {"full": full, "added": added, "elapsed_s": round(time.perf_counter() - started, 2), **model.status()}
+
+
+def _scores(predicted: list[bool], truth: list[int]) -> dict:
+    tp = sum(1 for p, t in zip(predicted, truth) if p and t)
+    fp = sum(1 for p, t in zip(predicted, truth) if p and not t)
+    fn = sum(1 for p, t in zip(predicted, truth) if not p and t)
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    return {
+        "flagged": tp + fp,
+        "true_positives": tp,
+        "false_positives": fp,
+        "false_negatives": fn,
+        "precision": round(precision, 3),
+        "recall": round(recall, 3),
+        "f1": round(2 * precision * recall / (precision + recall), 3) if precision + recall else 0.0,
+    }
+
+
+def evaluate(folds: int = 5, db=None) -> dict:
+    """Validación cruzada por message_id % folds: heuristic_v2 vs heurística + modelo"""
+    from app.utils.sale_model import SaleModel
+
+    session = db or SessionLocal()
+    try:
+        examples = [(message_id, text, label) for message_id, text, label, _, _ in labeled_examples(session)]
+    finally:
+        if db is None:
+            session.close()
+
+    truth = [label for _, _, label in examples]
+    heuristic = analyze_messages([("text", text, None) for _, text, _ in examples], model=False)
+    heuristic_sale = [analysis["category_label"] == "SALE" for analysis in heuristic]
+    normalized = [_normalize_text(text) for _, text, _ in examples]
+
+    combined = [False] * len(examples)
+    model_only = [False] * len(examples)
+    for fold in range(folds):
+        held_out = [i for i, (message_id, _, _) in enumerate(examples) if message_id % folds == fold]
+        if not held_out:
+            continue
+        held = set(held_out)
+        train_rows = [i for i in range(len(examples)) if i not in held]
+        model = SaleModel.empty().fit([normalized[i] for i in train_rows], [truth[i] for i in train_rows])
+        probabilities = model.probabilities([normalized[i] for i in held_out])
+        for i, probability in zip(held_out, probabilities):
+            # Lo que haría la API: solo re-puntúa lo que la heurística marcó
+            combined[i] = heuristic_sale[i] and probability >= SALE_MODEL_IGNORE_BELOW
+            model_only[i] = bool(probability >= 0.5)
+
+    return {
+        "examples": len(examples),
+        "sales": sum(truth),
+        "folds": folds,
+        "ignore_below": SALE_MODEL_IGNORE_BELOW,
+        "heuristic_v2": _scores(heuristic_sale, truth),
+        sale_model.SOURCE: _scores(combined, truth),
+        "model_only": _scores(model_only, truth),
+    }
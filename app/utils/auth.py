@@ -1,7 +1,12 @@
-from app.config import ADMIN_PHONE
-from app.models import Moderator
 import re
 
+from app.config import ADMIN_PHONE, GROUP_CACHE_TTL
+from app.database import SessionLocal
+from app.models import Moderator
+from app.utils.versioned_cache import VersionedCache
+
+VERSION_KEY = "moderators"
+
 
 def normalize_phone(phone: str) -> str:
     """Normaliza números de teléfono quitando caracteres no numéricos"""
@@ -10,6 +15,38 @@ def normalize_phone(phone: str) -> str:
     return re.sub(r'\D', '', phone)
 
 
+def _load_moderators(db=None) -> tuple[frozenset, frozenset]:
+    # Reusar la sesión del request si la hay: evita pedir una segunda conexión al pool
+    session = db or SessionLocal()
+    try:
+        rows = session.query(Moderator.phone, Moderator.lid).filter(Moderator.active == True).all()
+    finally:
+        if db is None:
+            session.close()
+    return frozenset(r.phone for r in rows if r.phone), frozenset(r.lid for r in rows if r.lid)
+
+
+_cache = VersionedCache(VERSION_KEY, _load_moderators, ttl=GROUP_CACHE_TTL)
+
+
+def get_moderators(db=None) -> tuple[frozenset, frozenset]:
+    """(teléfonos, LIDs) de los moderadores activos, cacheado en memoria"""
+    return _cache.get(db)
+
+
+def invalidate_moderators_cache():
+    """Llamar después del commit que agrega, quita o cambia el LID de un moderador"""
+    _cache.invalidate()
+
+
+def is_active_moderator(db, phone: str) -> bool:
+    """Moderador activo por LID o por número real (sin contar al admin)"""
+    if not phone:
+        return False
+    phones, lids = get_moderators(db)
+    return phone in lids or phone in phones or normalize_phone(phone) in phones
+
+
 def is_moderator(db, phone: str) -> bool:
     """
     Verifica si un número es moderador.
@@ -18,21 +55,8 @@ def is_moderator(db, phone: str) -> bool:
     if not phone:
         return False
 
-    # Normalizar número
-    normalized = normalize_phone(phone)
-
     # Verificar contra ADMIN_PHONE
-    if normalized == str(ADMIN_PHONE):
+    if normalize_phone(phone) == str(ADMIN_PHONE):
         return True
 
-    # Buscar en la base de datos por LID o por número real
-    mod = db.query(Moderator).filter(
-        Moderator.active == True,
-        (
-            (Moderator.lid == phone) |  # Buscar por LID completo (ej: 9401733800078)
-            (Moderator.phone == phone) |  # Buscar por número original
-            (Moderator.phone == normalized)  # Buscar por número normalizado
-        )
-    ).first()
-
-    return mod is not None
\ No newline at end of file
+    return is_active_moderator(db, phone)
@@ -0,0 +1,64 @@
+"""
+Casos pendientes casi iguales (olas de spam: el mismo aviso con otro precio
+o un emoji de más).
+
+Cada texto se normaliza (minúsculas, sin tildes, números como "0") y se
+parte en 5-gramas de letras; dos casos son parecidos si el Jaccard de esos
+conjuntos llega a `threshold`. Se compara contra los CLUSTER_SCAN_LIMIT
+pendientes más nuevos, que alcanza para una cola de moderación.
+"""
+import re
+
+from sqlalchemy.orm import Session
+
+from app.models import Case, Message
+from app.utils.message_analysis import _normalize_text
+
+SIMILARITY_THRESHOLD = 0.7
+CLUSTER_SCAN_LIMIT = 2000
+SHINGLE = 5
+
+_DIGITS = re.compile(r"\d+")
+_NOISE = re.compile(r"[^a-z0 ]+")
+
+
+def shingles(text: str | None) -> frozenset:
+    normalized = _NOISE.sub("", _DIGITS.sub("0", _normalize_text(text or "")))
+    normalized = " ".join(normalized.split())
+    if len(normalized) <= SHINGLE:
+        return frozenset([normalized]) if normalized else frozenset()
+    return frozenset(normalized[i:i + SHINGLE] for i in range(len(normalized) - SHINGLE + 1))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def similar_pending_cases(db: Session, seed: Case, threshold: float = SIMILARITY_THRESHOLD) -> list[tuple[Case, float]]:
+    """Pendientes (o en revisión) parecidos al caso `seed`, él incluido, de más a menos parecido"""
+    seed_message = db.get(Message, seed.message_id)
+    seed_shingles = shingles(seed_message.content or seed_message.media_caption) if seed_message else frozenset()
+    if not seed_shingles:
+        return [(seed, 1.0)]
+
+    candidates = (
+        db.query(Case, Message.content, Message.media_caption)
+        .join(Message, Message.id == Case.message_id)
+        .filter(
+            Case.status.in_(("pending", "in_review")),
+            Case.type == seed.type,
+            Case.id != seed.id,
+        )
+        .order_by(Case.id.desc())
+        .limit(CLUSTER_SCAN_LIMIT)
+        .all()
+    )
+    found = [(seed, 1.0)]
+    for case, content, caption in candidates:
+        score = jaccard(seed_shingles, shingles(content or caption))
+        if score >= threshold:
+            found.append((case, round(score, 3)))
+    found[1:] = sorted(found[1:], key=lambda item: item[1], reverse=True)
+    return found
@@ -0,0 +1,168 @@
+"""
+Circuit breaker para llamadas salientes (hoy: los backends de LLM).
+
+Estados:
+- closed: pasa todo; se llevan las llamadas de los últimos `window`
+  segundos en baldes de 1 s (total, errores, lentas).
+- open: se corta sin llamar durante `open_seconds`. Abre con
+  `consecutive_failures` fallas seguidas, o cuando en la ventana hay al
+  menos `min_calls` y la tasa de errores o de llamadas lentas (más de
+  `slow_seconds`) llega a su tope.
+- half_open: pasado ese tiempo se dejan salir `half_open_calls` llamadas
+  de prueba; si todas salen bien se cierra, si una falla vuelve a open.
+
+Es por proceso, como las métricas. El estado se publica en
+circuit_state{circuit} (0 closed, 1 half_open, 2 open).
+"""
+import threading
+import time
+from collections import deque
+
+from app.utils import metrics
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    def __init__(
+            self,
+            name: str,
+            window: float = 60,
+            min_calls: int = 5,
+            error_rate: float = 0.5,
+            slow_seconds: float = 8,
+            slow_rate: float = 0.5,
+            consecutive_failures: int = 3,
+            open_seconds: float = 30,
+            half_open_calls: int = 1,
+    ):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.slow_rate = slow_rate
+        self.consecutive_failures = consecutive_failures
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+
+        self._lock = threading.Lock()
+        self._buckets = deque()  # [segundo, llamadas, errores, lentas]
+        self.state = CLOSED
+        self.failures = 0  # seguidas
+        self.opened_at = 0.0
+        self.reason = None
+        self._probes = 0  # llamadas de prueba en curso / hechas en half_open
+        self._probe_successes = 0
+        metrics.set_gauge("circuit_state", STATE_VALUES[CLOSED], circuit=name)
+
+    # --- estado -------------------------------------------------------------
+
+    def _set_state(self, state: str, reason: str | None = None):
+        # Con el lock tomado
+        if state == self.state:
+            return
+        print(f"🔌 Circuito {self.name}: {self.state} -> {state}" + (f" ({reason})" if reason else ""))
+        self.state = state
+        self.reason = reason
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        if state in (OPEN, HALF_OPEN):
+            self._probes = 0
+            self._probe_successes = 0
+        if state == CLOSED:
+            self._buckets.clear()
+            self.failures = 0
+        metrics.set_gauge("circuit_state", STATE_VALUES[state], circuit=self.name)
+        metrics.inc("circuit_transitions_total", circuit=self.name, to=state)
+
+    def _refresh(self, now: float):
+        if self.state == OPEN and now - self.opened_at >= self.open_seconds:
+            self._set_state(HALF_OPEN)
+
+    def is_open(self, now: float | None = None) -> bool:
+        """Sin consumir pruebas: ¿cortaría una llamada ahora?"""
+        now = now or time.monotonic()
+        with self._lock:
+            self._refresh(now)
+            return self.state == OPEN or (self.state == HALF_OPEN and self._probes >= self.half_open_calls)
+
+    def allow(self) -> bool:
+        """Pedir permiso para llamar. En half_open cuenta como prueba."""
+        now = time.monotonic()
+        with self._lock:
+            self._refresh(now)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                return True
+        metrics.inc("circuit_rejected_total", circuit=self.name)
+        return False
+
+    # --- resultados ---------------------------------------------------------
+
+    def _bucket(self, now: float) -> list:
+        second = int(now)
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append([second, 0, 0, 0])
+        cutoff = second - self.window
+        while self._buckets and self._buckets[0][0] <= cutoff:
+            self._buckets.popleft()
+        return self._buckets[-1]
+
+    def _rates(self) -> tuple[int, float, float]:
+        calls = sum(b[1] for b in self._buckets)
+        if not calls:
+            return 0, 0.0, 0.0
+        return calls, sum(b[2] for b in self._buckets) / calls, sum(b[3] for b in self._buckets) / calls
+
+    def record(self, ok: bool, elapsed: float):
+        now = time.monotonic()
+        slow = elapsed >= self.slow_seconds
+        with self._lock:
+            bucket = self._bucket(now)
+            bucket[1] += 1
+            bucket[2] += 0 if ok else 1
+            bucket[3] += 1 if slow else 0
+            self.failures = 0 if ok else self.failures + 1
+
+            if self.state == HALF_OPEN:
+                if not ok:
+                    self._set_state(OPEN, "falló la prueba")
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        self._set_state(CLOSED)
+                return
+            if self.state != CLOSED:
+                return
+
+            if self.failures >= self.consecutive_failures:
+                self._set_state(OPEN, f"{self.failures} fallas seguidas")
+                return
+            calls, error_rate, slow_rate = self._rates()
+            if calls >= self.min_calls:
+                if error_rate >= self.error_rate:
+                    self._set_state(OPEN, f"{error_rate:.0%} de errores en {calls} llamadas")
+                elif slow_rate >= self.slow_rate:
+                    self._set_state(OPEN, f"{slow_rate:.0%} lentas (>{self.slow_seconds:g}s) en {calls} llamadas")
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            self._refresh(now)
+            self._bucket(now)
+            calls, error_rate, slow_rate = self._rates()
+            return {
+                "state": self.state,
+                "reason": self.reason,
+                "retry_in_s": round(max(0.0, self.opened_at + self.open_seconds - now), 1) if self.state == OPEN else 0.0,
+                "window_calls": calls,
+                "error_rate": round(error_rate, 3),
+                "slow_rate": round(slow_rate, 3),
+                "consecutive_failures": self.failures,
+            }
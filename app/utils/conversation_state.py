@@ -0,0 +1,177 @@
+"""
+Estado del chat privado de cada usuario (p.ej. esperando el descargo de una apelación).
+
+Una fila por teléfono en conversation_states y una copia en memoria por
+proceso, así el chequeo en cada mensaje es un acceso al dict o, si no está,
+una lectura por clave primaria. Los cambios se aplican a la copia local al
+hacer commit y se publican en el bus de estado. La versión no es una sola:
+los teléfonos se reparten en SHARDS claves ("conversation_states:07"), y
+cada entrada en memoria recuerda la versión de la suya. Así una apelación
+solo hace releer los teléfonos de su clave en los otros workers, no todos.
+
+La misma fila guarda el último grupo moderado donde escribió el usuario
+(set_group desde el ingest, solo si cambió), así `reglas` y `strikes` en
+privado saben de qué grupo hablar sin buscar en sus mensajes.
+"""
+import threading
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.database import insert_or_ignore
+from app.models import ConversationState
+from app.utils.state_bus import bump_version, bumps_in_transaction, current_version
+
+VERSION_KEY = "conversation_states"
+# Claves del bus entre las que se reparten los teléfonos (el watcher las lee todas)
+SHARDS = 64
+
+APPEAL_WAIT = "appeal_wait"
+APPEAL_WAIT_TTL = timedelta(minutes=5)
+
+# Tope de teléfonos en memoria (también se guardan los "sin estado")
+MAX_CACHED = 20000
+
+# Cambios de la transacción en curso, se aplican en after_commit
+_PENDING_KEY = "conversation_state_changes"
+_VERSION_KEY = "conversation_state_versions"
+
+_cache = {}  # phone -> (versión de su clave, (state, target_case_id, expires_at, group_chat_id) | None)
+_lock = threading.Lock()
+_MISSING = object()
+
+
+def _version_key(phone: str) -> str:
+    return f"{VERSION_KEY}:{zlib.crc32(phone.encode('utf-8')) % SHARDS:02d}"
+
+
+def _entry(row: ConversationState | None):
+    if row is None:
+        return None
+    return (row.state, row.target_case_id, row.expires_at, row.group_chat_id)
+
+
+def _cached(phone: str):
+    version = current_version(_version_key(phone))
+    cached = _cache.get(phone)
+    if cached is None or cached[0] != version:
+        return _MISSING, version
+    return cached[1], version
+
+
+def _remember(changes: dict):
+    """changes: {phone: (versión, entrada)}"""
+    with _lock:
+        if len(_cache) + len(changes) > MAX_CACHED:
+            _cache.clear()
+        _cache.update(changes)
+
+
+def _load(db: Session, phone: str):
+    entry, version = _cached(phone)
+    if entry is _MISSING:
+        entry = _entry(db.get(ConversationState, phone))
+        _remember({phone: (version, entry)})
+    return entry
+
+
+def get_state(db: Session, phone: str) -> dict | None:
+    """Estado vigente del usuario, o None (sin estado o vencido)"""
+    entry = _load(db, phone)
+    if entry is None or entry[0] is None:
+        return None
+
+    state, target_case_id, expires_at, _ = entry
+    if expires_at and expires_at <= datetime.now():
+        return None
+    return {"state": state, "target_case_id": target_case_id, "expires_at": expires_at}
+
+
+def set_state(db: Session, phone: str, state: str, target_case_id: int | None = None, ttl: timedelta | None = None):
+    """Se guarda con el commit del caller"""
+    row = db.get(ConversationState, phone)
+    if row is None:
+        row = ConversationState(user_phone=phone)
+        db.add(row)
+    row.state = state
+    row.target_case_id = target_case_id
+    row.expires_at = datetime.now() + ttl if ttl else None
+    db.info.setdefault(_PENDING_KEY, {})[phone] = _entry(row)
+
+
+def clear_state(db: Session, phone: str):
+    row = db.get(ConversationState, phone)
+    if row is not None and row.group_chat_id:
+        # La fila sigue por el grupo
+        row.state = row.target_case_id = row.expires_at = None
+    elif row is not None:
+        db.delete(row)
+        row = None
+    db.info.setdefault(_PENDING_KEY, {})[phone] = _entry(row)
+
+
+def get_group(db: Session, phone: str) -> str | None:
+    """Último grupo moderado donde escribió el usuario (None si no se sabe)"""
+    entry = _load(db, phone)
+    return entry[3] if entry else None
+
+
+def set_group(db: Session, phone: str, chat_id: str) -> bool:
+    """
+    Se guarda con el commit del caller. Devuelve False sin escribir nada si
+    ya era ese grupo (lo normal: se resuelve en memoria).
+    """
+    if not phone or not chat_id or get_group(db, phone) == chat_id:
+        return False
+    row = db.get(ConversationState, phone)
+    # Dos workers pueden anotar al mismo usuario nuevo a la vez: el segundo actualiza
+    if row is None and insert_or_ignore(db, ConversationState, {"user_phone": phone, "group_chat_id": chat_id}):
+        entry = (None, None, None, chat_id)
+    else:
+        row = row or db.get(ConversationState, phone)
+        row.group_chat_id = chat_id
+        entry = _entry(row)
+    db.info.setdefault(_PENDING_KEY, {})[phone] = entry
+    return True
+
+
+def _bump(phones, connection=None) -> dict:
+    """Sube la versión de cada clave tocada; devuelve {clave: versión}"""
+    return {key: bump_version(key, connection) for key in sorted({_version_key(phone) for phone in phones})}
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_in_transaction(session):
+    # Con el bus SQL la versión sube en la misma transacción: no hace falta
+    # otra conexión del pool mientras el request tiene tomada la suya
+    changes = session.info.get(_PENDING_KEY)
+    if changes and bumps_in_transaction():
+        session.info[_VERSION_KEY] = _bump(changes, session.connection())
+
+
+@event.listens_for(Session, "after_commit")
+def _publish(session):
+    changes = session.info.pop(_PENDING_KEY, None)
+    versions = session.info.pop(_VERSION_KEY, None)
+    if not changes:
+        return
+    if versions is None:
+        try:
+            versions = _bump(changes)
+        except Exception as e:
+            print(f"⚠️ No se pudo publicar el estado de conversación: {e}")
+            with _lock:
+                for phone in changes:
+                    _cache.pop(phone, None)
+            return
+    # Lo recién escrito vale para la versión que publicamos; los demás
+    # teléfonos de la misma clave se releen al próximo uso
+    _remember({phone: (versions[_version_key(phone)], entry) for phone, entry in changes.items()})
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_VERSION_KEY, None)
@@ -0,0 +1,105 @@
+from sqlalchemy.exc import IntegrityError
+
+from app.config import GROUP_ID, GROUP_CACHE_TTL
+from app.database import SessionLocal
+from app.models import Group, GroupModerator, Moderator
+from app.utils.phone import normalize_phone
+from app.utils.versioned_cache import VersionedCache
+
+DEFAULT_MAX_STRIKES = 3
+
+VERSION_KEY = "groups"
+
+
+def _group_to_dict(group: Group) -> dict:
+    return {
+        "id": group.id,
+        "chat_id": group.chat_id,
+        "name": group.name,
+        "active": bool(group.active),
+        "rules": group.rules,
+        "max_strikes": group.max_strikes or DEFAULT_MAX_STRIKES,
+        "sale_priority": group.sale_priority if group.sale_priority is not None else 1,
+        "image_priority": group.image_priority if group.image_priority is not None else 2,
+        "review_images": group.review_images is not False,
+    }
+
+
+def ensure_default_group(db):
+    """Siembra el grupo de GROUP_ID si la tabla está vacía (instalaciones viejas)"""
+    if db.query(Group.id).first():
+        return
+    db.add(Group(chat_id=GROUP_ID, name="Grupo principal", active=True))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Otro worker lo sembró primero
+        db.rollback()
+
+
+def _load_groups(db=None) -> dict:
+    # Reusar la sesión del request si la hay: evita pedir una segunda conexión al pool
+    session = db or SessionLocal()
+    try:
+        return {group.chat_id: _group_to_dict(group) for group in session.query(Group).all()}
+    finally:
+        if db is None:
+            session.close()
+
+
+# Umbrales de moderación por grupo (strikes, prioridades, revisión de imágenes)
+_cache = VersionedCache(VERSION_KEY, _load_groups, ttl=GROUP_CACHE_TTL)
+
+
+def get_groups(db=None) -> dict:
+    """Devuelve {chat_id: config} de todos los grupos, cacheado en memoria"""
+    return _cache.get(db)
+
+
+def get_group_config(chat_id: str | None, db=None) -> dict | None:
+    """Config del grupo monitoreado, o None si el chat no se modera"""
+    if not chat_id:
+        return None
+    group = get_groups(db).get(chat_id)
+    if not group or not group["active"]:
+        return None
+    return group
+
+
+def get_max_strikes(chat_id: str | None, db=None) -> int:
+    group = get_groups(db).get(chat_id) if chat_id else None
+    return group["max_strikes"] if group else DEFAULT_MAX_STRIKES
+
+
+def get_active_group_ids() -> list[str]:
+    return [chat_id for chat_id, group in get_groups().items() if group["active"]]
+
+
+def invalidate_groups_cache():
+    """Invalida la caché en todos los workers (no solo en este proceso)"""
+    _cache.invalidate()
+
+
+def get_moderator_chat_ids(db, phone: str) -> list[str] | None:
+    """
+    Grupos que atiende un moderador.
+    Devuelve None si no tiene grupos asignados (atiende todos).
+    """
+    normalized = normalize_phone(phone)
+    rows = (
+        db.query(Group.chat_id)
+        .join(GroupModerator, GroupModerator.group_id == Group.id)
+        .join(Moderator, Moderator.id == GroupModerator.moderator_id)
+        .filter(
+            Moderator.active == True,
+            (
+                (Moderator.lid == phone) |
+                (Moderator.phone == phone) |
+                (Moderator.phone == normalized)
+            )
+        )
+        .all()
+    )
+    if not rows:
+        return None
+    return [row[0] for row in rows]
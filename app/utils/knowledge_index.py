@@ -0,0 +1,49 @@
+"""
+Índice en memoria de la base de conocimiento de la IA (entradas activas con tags).
+
+Se arma una vez por versión de "knowledge" en el bus; las rutas de
+/admin/knowledge la suben después de cada cambio. Buscar es recorrer
+tuplas en memoria, sin tocar la base en cada mensaje.
+"""
+from app.database import SessionLocal
+from app.models.knowledge import Knowledge
+from app.utils.versioned_cache import VersionedCache
+
+VERSION_KEY = "knowledge"
+
+
+def _load(db=None) -> tuple:
+    # Reusar la sesión del request si la hay: evita pedir una segunda conexión al pool
+    session = db or SessionLocal()
+    try:
+        rows = session.query(Knowledge.tags, Knowledge.content).filter(Knowledge.enabled == True).all()
+    finally:
+        if db is None:
+            session.close()
+    entries = []
+    for tags, content in rows:
+        tags = tuple(tag for tag in (t.strip().lower() for t in (tags or "").split(",")) if tag)
+        if tags:
+            entries.append((tags, content))
+    return tuple(entries)
+
+
+_cache = VersionedCache(VERSION_KEY, _load)
+
+
+def relevant(user_message: str, db=None) -> list[str]:
+    """Contenidos cuyos tags aparecen en el mensaje, de más a menos relevante"""
+    text = user_message.lower()
+    found = []
+    for tags, content in _cache.get(db):
+        hits = [tag for tag in tags if tag in text]
+        if hits:
+            # Más tags coincidentes (y más largos) = más relevante
+            found.append((len(hits), sum(len(tag) for tag in hits), content))
+    found.sort(key=lambda item: (item[0], item[1]), reverse=True)
+    return [content for _, _, content in found]
+
+
+def invalidate_knowledge_cache():
+    """Invalida el índice en todos los workers (después del commit)"""
+    _cache.invalidate()
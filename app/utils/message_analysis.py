@@ -1,6 +1,12 @@
 import re
 import unicodedata
 
+from app.config import SALE_MODEL_IGNORE_BELOW
+from app.utils import sale_model
+
+HEURISTIC_SOURCE = "heuristic_v2"
+MEDIA_TYPES = {"image", "video", "audio", "document", "sticker"}
+
 
 SALE_KEYWORDS = [
     "vendo", "vendiendo", "venta", "compro", "comprar", "permuto",
@@ -102,9 +108,7 @@ def _looks_like_sale(normalized_text: str, contains_link: bool) -> bool:
     return False
 
 
-def analyze_message(message_type: str, content: str | None = None, media_caption: str | None = None) -> dict:
-    base_text = (content or media_caption or "").strip()
-    normalized = _normalize_text(base_text)
+def _heuristic(message_type: str, base_text: str, normalized: str, allow_sale: bool = True) -> dict:
     contains_link = bool(LINK_RE.search(base_text))
     contains_question = _looks_like_question(base_text, normalized)
     text_length = len(base_text) if base_text else 0
@@ -112,11 +116,11 @@ def analyze_message(message_type: str, content: str | None = None, media_caption
     category_label = "GENERAL"
     intent_label = "GENERAL"
 
-    if message_type in {"image", "video", "audio", "document", "sticker"}:
+    if message_type in MEDIA_TYPES:
         category_label = "MEDIA"
         intent_label = "MEDIA_SHARE"
 
-    if _looks_like_sale(normalized, contains_link):
+    if allow_sale and _looks_like_sale(normalized, contains_link):
         category_label = "SALE"
         intent_label = "OFFER"
     elif normalized and _contains_any(normalized, COMPLAINT_PATTERNS):
@@ -138,8 +142,45 @@ def analyze_message(message_type: str, content: str | None = None, media_caption
     return {
         "category_label": category_label,
         "intent_label": intent_label,
-        "intent_source": "heuristic_v2",
+        "intent_source": HEURISTIC_SOURCE,
         "contains_question": contains_question,
         "contains_link": contains_link,
-        "content_length": text_length or None
+        "content_length": text_length or None,
+        "sale_score": None
     }
+
+
+def analyze_messages(items, db=None, model=None) -> list[dict]:
+    """
+    items: (message_type, content, media_caption) por mensaje.
+    Los SALE de la heurística se re-puntúan con el modelo de ventas, todos
+    en un lote: debajo de SALE_MODEL_IGNORE_BELOW se reclasifican como si
+    no fueran venta. Sin modelo (o con model=False) queda heuristic_v2.
+    """
+    results, sales = [], []
+    for message_type, content, media_caption in items:
+        base_text = (content or media_caption or "").strip()
+        normalized = _normalize_text(base_text)
+        analysis = _heuristic(message_type, base_text, normalized)
+        if analysis["category_label"] == "SALE":
+            sales.append((len(results), message_type, base_text, normalized))
+        results.append(analysis)
+
+    if model is None:
+        model = sale_model.current(db) if sales else None
+    if not model or not sales:
+        return results
+
+    scores = model.probabilities([normalized for _, _, _, normalized in sales])
+    for (index, message_type, base_text, normalized), score in zip(sales, scores):
+        score = round(float(score), 3)
+        analysis = results[index]
+        if score < SALE_MODEL_IGNORE_BELOW:
+            analysis = results[index] = _heuristic(message_type, base_text, normalized, allow_sale=False)
+        analysis["intent_source"] = sale_model.SOURCE
+        analysis["sale_score"] = score
+    return results
+
+
+def analyze_message(message_type: str, content: str | None = None, media_caption: str | None = None, db=None) -> dict:
+    return analyze_messages([(message_type, content, media_caption)], db)[0]
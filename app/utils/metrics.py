@@ -0,0 +1,252 @@
+"""
+Métricas en memoria del proceso, exportadas en formato de texto de Prometheus.
+
+Con varios workers cada uno lleva sus propios números: Prometheus los
+distingue por instancia/pid al scrapear.
+"""
+import contextvars
+import os
+import threading
+import time
+
+from app.config import METRICS_ENABLED
+
+# Buckets de latencia en segundos
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_help = {}
+
+# Estadísticas SQL del request en curso: [sentencias, segundos]
+_request_sql = contextvars.ContextVar("request_sql", default=None)
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+
+def describe(name: str, text: str):
+    _help[name] = text
+
+
+def inc(name: str, value: float = 1, **labels):
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels):
+    if not METRICS_ENABLED:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name: str, value: float, **labels):
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                hist["buckets"][i] += 1
+        hist["sum"] += value
+        hist["count"] += 1
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple, extra: dict | None = None) -> str:
+    items = list(labels) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def render_prometheus() -> str:
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {k: {"buckets": list(v["buckets"]), "sum": v["sum"], "count": v["count"]} for k, v in _histograms.items()}
+
+    lines = []
+    seen = set()
+
+    def header(name, kind):
+        if name in seen:
+            return
+        seen.add(name)
+        if name in _help:
+            lines.append(f"# HELP {name} {_help[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, "counter")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), value in sorted(gauges.items()):
+        header(name, "gauge")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), hist in sorted(histograms.items()):
+        header(name, "histogram")
+        for bound, count in zip(BUCKETS, hist["buckets"]):
+            lines.append(f"{name}_bucket{_format_labels(labels, {'le': bound})} {count}")
+        lines.append(f"{name}_bucket{_format_labels(labels, {'le': '+Inf'})} {hist['count']}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {round(hist['sum'], 6)}")
+        lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+    lines.append(f"process_pid {os.getpid()}")
+    return "\n".join(lines) + "\n"
+
+
+def _quantile(hist: dict, q: float) -> float | None:
+    """Cuantil aproximado: el borde del bucket donde cae"""
+    if not hist["count"]:
+        return None
+    target = q * hist["count"]
+    for bound, count in zip(BUCKETS, hist["buckets"]):
+        if count >= target:
+            return bound
+    return float("inf")
+
+
+def summary() -> dict:
+    """Resumen para el dashboard (por ruta, SQL, IA y colas)"""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = dict(_histograms)
+
+    routes = []
+    for (name, labels), hist in histograms.items():
+        if name != "http_request_duration_seconds":
+            continue
+        label_map = dict(labels)
+        sql_statements = counters.get(_key("http_request_sql_statements_total", label_map), 0)
+        p95 = _quantile(hist, 0.95)
+        routes.append({
+            "method": label_map.get("method"),
+            "route": label_map.get("route"),
+            "count": hist["count"],
+            "avg_ms": round(hist["sum"] / hist["count"] * 1000, 2) if hist["count"] else None,
+            "p95_ms": round(p95 * 1000, 2) if p95 not in (None, float("inf")) else None,
+            "avg_sql": round(sql_statements / hist["count"], 1) if hist["count"] else None,
+        })
+    routes.sort(key=lambda r: r["count"], reverse=True)
+
+    groq = histograms.get(_key("groq_request_duration_seconds", {}))
+    return {
+        "enabled": METRICS_ENABLED,
+        "pid": os.getpid(),
+        "routes": routes,
+        "groq": {
+            "calls": groq["count"] if groq else 0,
+            "avg_ms": round(groq["sum"] / groq["count"] * 1000, 2) if groq and groq["count"] else None,
+            "errors": sum(v for (n, _), v in counters.items() if n == "groq_errors_total"),
+            "tokens": sum(v for (n, _), v in counters.items() if n == "groq_tokens_total"),
+        },
+        "queues": {dict(labels).get("queue"): value for (n, labels), value in gauges.items() if n == "queue_depth"},
+        "circuits": {dict(labels).get("circuit"): value for (n, labels), value in gauges.items() if n == "circuit_state"},
+    }
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: latencia y sentencias SQL por ruta"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        stats = [0, 0.0]
+        token = _request_sql.set(stats)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_sql.reset(token)
+            route = scope.get("route")
+            # Ruta con plantilla (/cases/{case_id}) para no explotar la cardinalidad
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            observe("http_request_duration_seconds", elapsed, method=method, route=path)
+            inc("http_request_sql_statements_total", stats[0], method=method, route=path)
+            inc("http_request_sql_seconds_total", stats[1], method=method, route=path)
+            inc("http_requests_total", method=method, route=path, status=status["code"])
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_started
+    stats = _request_sql.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += elapsed
+    inc("sql_statements_total")
+    inc("sql_seconds_total", elapsed)
+
+
+def instrument_engine(engine):
+    from sqlalchemy import event
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def install(app, engines):
+    """Engancha middleware y eventos SQL. Sin METRICS_ENABLED no se instala nada."""
+    if not METRICS_ENABLED:
+        return
+    describe("http_request_duration_seconds", "Latencia por ruta")
+    describe("http_request_sql_statements_total", "Sentencias SQL ejecutadas por ruta")
+    describe("http_request_sql_seconds_total", "Tiempo en SQL por ruta")
+    describe("groq_request_duration_seconds", "Latencia de las llamadas a Groq")
+    describe("groq_prompt_tokens_estimated_total", "Tokens estimados del prompt de ask_groq por parte")
+    describe("groq_prompt_trimmed_total", "Entradas de conocimiento y turnos de historial que no entraron en el prompt")
+    describe("llm_request_duration_seconds", "Latencia de las llamadas a la IA por backend (groq, local)")
+    describe("llm_requests_total", "Llamadas a la IA por backend y resultado")
+    describe("llm_fallbacks_total", "Pedidos que pasaron al siguiente backend porque falló el anterior")
+    describe("llm_unavailable_total", "Pedidos cortados al instante por no haber ningún backend sano")
+    describe("circuit_state", "Estado del circuit breaker (0 cerrado, 1 medio abierto, 2 abierto)")
+    describe("circuit_transitions_total", "Cambios de estado del circuit breaker")
+    describe("circuit_rejected_total", "Llamadas cortadas por el circuit breaker sin salir")
+    describe("ai_fallback_replies_total", "Respuestas de la IA sin backend: cache, conocimiento o aviso")
+    describe("ai_coalesced_messages_total", "Mensajes a la IA que se respondieron junto con el siguiente del mismo usuario")
+    describe("groq_calls_saved_total", "Llamadas a Groq evitadas por juntar mensajes")
+    describe("settings_cache_loads_total", "Lecturas completas de la base por caché versionada (ai_config, knowledge, groups...)")
+    describe("bulk_decisions_total", "Decisiones en bloque desde el dashboard")
+    describe("bulk_decision_cases_total", "Casos resueltos por decisiones en bloque")
+    describe("queue_depth", "Casos e instrucciones pendientes")
+    describe("outbound_dispatched_total", "Instrucciones entregadas al conector por tipo y camino (queue o respuesta directa)")
+    describe("outbound_coalesced_total", "Instrucciones de la cola que no salen solas: texto sumado a otro o repetidas")
+    describe("outbound_throttled_total", "Veces que una instrucción volvió a la cola por falta de token (send o group)")
+    describe("outbound_over_budget_total", "Instrucciones de respuestas directas que salieron sin token (riesgo de bloqueo)")
+    describe("outbound_exhausted_buckets", "Destinatarios o grupos sin token en este momento")
+    describe("outbound_oldest_pending_seconds", "Antigüedad de la instrucción pendiente más vieja")
+    describe("ingest_batch_messages_total", "Mensajes del buffer del conector por resultado (stored, duplicate, error)")
+    describe("ingest_batch_rejected_total", "Tandas de /ingest_batch rechazadas con 429 por haber otra en curso")
+    app.add_middleware(MetricsMiddleware)
+    for engine in engines:
+        if engine is not None:
+            instrument_engine(engine)
@@ -0,0 +1,115 @@
+import json
+
+from sqlalchemy.orm import Session
+
+from app.models import Case, Message, User, UserModerationSummary
+
+# Resoluciones que cuentan como sanción (las viejas también, por datos históricos)
+PENALTY_RESOLUTIONS = ("warn", "strike", "deleted", "banned", "ban", "delete", "delete_message")
+MAX_PENALTIES = 5
+PREVIEW_LENGTH = 80
+
+
+def penalty_entry(case: Case, message: Message | None) -> dict:
+    message_type = message.message_type if message else None
+    preview = None
+    if message and message_type == "text" and message.content:
+        preview = message.content[:PREVIEW_LENGTH + 1]
+    return {
+        "case_id": case.id,
+        "message_id": case.message_id,
+        "resolution": case.resolution,
+        "resolved_at": case.resolved_at.isoformat() if case.resolved_at else None,
+        "message_type": message_type,
+        "preview": preview,
+    }
+
+
+def _rebuild(db: Session, user: User, persist: bool = True) -> UserModerationSummary:
+    """Calcula el resumen desde cero (usuarios sin fila todavía)"""
+    rows = (
+        db.query(Case, Message)
+        .join(Message, Case.message_id == Message.id)
+        .filter(
+            Message.user_id == user.id,
+            Case.type != "appeal",
+            Case.status == "resolved",
+            Case.resolution.in_(PENALTY_RESOLUTIONS)
+        )
+        .order_by(Case.resolved_at.desc(), Case.id.desc())
+        .limit(MAX_PENALTIES)
+        .all()
+    )
+    open_appeals = (
+        db.query(Case.id)
+        .join(Message, Case.message_id == Message.id)
+        .filter(Message.user_id == user.id, Case.type == "appeal", Case.status == "pending")
+        .count()
+    )
+    penalties = [penalty_entry(case, message) for case, message in rows]
+    summary = UserModerationSummary(
+        user_id=user.id,
+        strikes=user.strikes or 0,
+        status=user.status or "active",
+        last_penalties=json.dumps(penalties, ensure_ascii=False),
+        latest_penalty_case_id=penalties[0]["case_id"] if penalties else None,
+        open_appeals=open_appeals,
+    )
+    if persist:
+        db.add(summary)
+        db.flush()
+    return summary
+
+
+def _get_or_rebuild(db: Session, user: User, persist: bool = True) -> tuple[UserModerationSummary, bool]:
+    summary = db.get(UserModerationSummary, user.id)
+    if summary is not None:
+        return summary, False
+    # El rebuild lee las tablas: que vea también los cambios de esta transacción
+    db.flush()
+    return _rebuild(db, user, persist), True
+
+
+def get_summary(db: Session, user: User) -> UserModerationSummary:
+    """
+    Solo lectura: si el usuario no tiene fila se calcula sin guardarla
+    (en SQLite escribir desde un request de lectura puede chocar con otros)
+    """
+    return _get_or_rebuild(db, user, persist=False)[0]
+
+
+def get_penalties(summary: UserModerationSummary) -> list[dict]:
+    return json.loads(summary.last_penalties or "[]")
+
+
+def record_resolution(db: Session, user: User, case: Case, message: Message | None):
+    """Se llama al final de _resolve_case, antes del commit del caller"""
+    summary, rebuilt = _get_or_rebuild(db, user)
+    summary.strikes = user.strikes or 0
+    summary.status = user.status or "active"
+
+    if rebuilt:
+        return
+    if case.type == "appeal":
+        summary.open_appeals = max(0, (summary.open_appeals or 0) - 1)
+    elif case.resolution in PENALTY_RESOLUTIONS:
+        penalties = [p for p in get_penalties(summary) if p["case_id"] != case.id]
+        penalties.insert(0, penalty_entry(case, message))
+        summary.last_penalties = json.dumps(penalties[:MAX_PENALTIES], ensure_ascii=False)
+        summary.latest_penalty_case_id = case.id
+
+
+def record_appeal_opened(db: Session, user: User):
+    summary, rebuilt = _get_or_rebuild(db, user)
+    if not rebuilt:
+        summary.open_appeals = (summary.open_appeals or 0) + 1
+
+
+def format_preview(entry: dict, length: int) -> str:
+    """Texto corto de la sanción para las tarjetas"""
+    if entry.get("message_type") == "text" and entry.get("preview") is not None:
+        preview = entry["preview"]
+        return preview[:length] + "..." if len(preview) > length else preview
+    if entry.get("message_type") == "image":
+        return "🖼️ Imagen"
+    return f"{entry.get('message_type')}"
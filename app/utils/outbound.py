@@ -0,0 +1,254 @@
+"""
+Instrucciones que la API le manda al conector (send_message, delete_message,
+remove_user, add_user) y el ritmo al que salen hacia WhatsApp.
+
+coalesce() junta las que salen de una misma tanda (p. ej. una decisión en
+bloque sobre 80 casos) para que no lleguen 80 avisos al mismo número:
+- los textos seguidos al mismo destinatario (sin otra instrucción en el
+  medio) se unen en un solo mensaje, sin repetir textos iguales y hasta
+  OUTBOUND_MAX_TEXT caracteres: ningún texto pasa delante de un borrado o
+  una expulsión que estaba antes que él;
+- los borrados del mismo mensaje quedan una sola vez, y también una baja
+  (o alta) repetida del mismo participante en el mismo grupo, salvo que en
+  el medio haya una alta (o baja) suya: expulsar, reincorporar y volver a
+  expulsar son tres instrucciones.
+El resto pasa igual y en el mismo orden.
+
+schedule() hace lo mismo con las filas de pending_instructions que el
+conector viene a buscar (así se juntan también decisiones de a una hechas
+en pocos segundos) y además reparte con un token bucket por destinatario:
+lo que no tiene token vuelve a la cola y sale en una consulta siguiente.
+Los buckets viven en la tabla outbound_buckets, compartidos entre workers.
+"""
+import json
+import time
+
+from sqlalchemy.orm import Session
+
+from app.config import (
+    OUTBOUND_BURST, OUTBOUND_GROUP_BURST, OUTBOUND_GROUP_PER_MINUTE, OUTBOUND_MAX_TEXT, OUTBOUND_PER_MINUTE,
+)
+from app.database import insert_or_ignore
+from app.models import OutboundBucket
+
+TEXT_SEPARATOR = "\n\n"
+KINDS = ("send_message", "send_image", "delete_message", "remove_user", "add_user")
+# Saldo mínimo de un bucket: lo que sale sí o sí (respuestas) no frena la cola para siempre
+MIN_TOKENS_FACTOR = -1
+
+
+def instruction_kind(instruction) -> str:
+    if not isinstance(instruction, dict):
+        return "other"
+    for kind in KINDS:
+        if instruction.get(kind):
+            return kind
+    return "other"
+
+
+def _is_plain_text(instruction: dict) -> bool:
+    return bool(instruction.get("send_message")) and set(instruction) <= {"send_message", "to", "text"}
+
+
+def _message_chat(message_key) -> str | None:
+    if isinstance(message_key, str):
+        try:
+            message_key = json.loads(message_key)
+        except ValueError:
+            return None
+    return message_key.get("remoteJid") if isinstance(message_key, dict) else None
+
+
+def pacing_key(instruction: dict) -> str | None:
+    """Bucket que gasta la instrucción: send:<chat destino> o group:<grupo>"""
+    kind = instruction_kind(instruction)
+    if kind in ("send_message", "send_image"):
+        return f"send:{instruction['to']}" if instruction.get("to") else None
+    if kind == "delete_message":
+        chat = _message_chat(instruction.get("message_key"))
+        return f"group:{chat}" if chat else None
+    if kind in ("remove_user", "add_user"):
+        return f"group:{instruction['chat_id']}" if instruction.get("chat_id") else None
+    return None
+
+
+def _dedup_key(instruction: dict):
+    """(sobre qué, qué): una repetida se descarta si lo último que quedó sobre lo mismo fue igual"""
+    if instruction.get("delete_message"):
+        key = instruction.get("message_key")
+        return ("delete", key if isinstance(key, str) else json.dumps(key, sort_keys=True)), "delete"
+    for kind in ("remove_user", "add_user"):
+        if instruction.get(kind):
+            return ("member", instruction.get("chat_id"), instruction.get("participant_jid")), kind
+    return None
+
+
+def _coalesce(items: list[tuple]) -> tuple[list[tuple], list[tuple], set]:
+    """
+    items: [(ref, instrucción)]. Devuelve (quedan, descartadas, cambiadas):
+    quedan = [(ref, instrucción)] en orden, descartadas = [(ref, motivo)] y
+    cambiadas = refs cuyo texto ahora incluye el de otras.
+    """
+    result = []
+    dropped = []
+    groups = []  # [ref, textos] de cada mensaje armado
+    run = None  # (destinatario, grupo) si lo último que quedó es un texto
+    last = {}  # mensaje o participante -> lo último que quedó sobre él
+    for ref, instruction in items:
+        if not isinstance(instruction, dict):
+            result.append((ref, instruction))
+            run = None
+            continue
+        if _is_plain_text(instruction):
+            to, text = instruction.get("to"), instruction.get("text")
+            if run is not None and run[0] == to:
+                group = run[1]
+                if text in group[1]:
+                    dropped.append((ref, "duplicate"))
+                    continue
+                if len(TEXT_SEPARATOR.join(group[1] + [text])) <= OUTBOUND_MAX_TEXT:
+                    group[1].append(text)
+                    dropped.append((ref, "merged_text"))
+                    continue
+            group = [ref, [text]]
+            groups.append(group)
+            run = (to, group)
+            result.append((ref, instruction))
+            continue
+        key = _dedup_key(instruction)
+        if key is not None:
+            target, kind = key
+            if last.get(target) == kind:
+                # Ya salió antes: no corta la seguidilla de textos
+                dropped.append((ref, "duplicate"))
+                continue
+            last[target] = kind
+        result.append((ref, instruction))
+        run = None
+
+    merged = {ref: parts for ref, parts in groups if len(parts) > 1}
+    for index, (ref, instruction) in enumerate(result):
+        if ref in merged:
+            result[index] = (ref, {"send_message": True, "to": instruction.get("to"), "text": TEXT_SEPARATOR.join(merged[ref])})
+    return result, dropped, set(merged)
+
+
+def coalesce(instructions: list[dict]) -> list[dict]:
+    kept, _, _ = _coalesce(list(enumerate(instructions)))
+    return [instruction for _, instruction in kept]
+
+
+class Pacer:
+    """
+    Token buckets de la tabla outbound_buckets para una transacción.
+    Se guardan con save(); el commit lo hace quien lo usa.
+    """
+
+    def __init__(self, db: Session, now: float | None = None):
+        self.db = db
+        self.now = time.time() if now is None else now
+        self._buckets = {}
+
+    @staticmethod
+    def limits(key: str) -> tuple[float, float]:
+        if key.startswith("group:"):
+            return OUTBOUND_GROUP_BURST, OUTBOUND_GROUP_PER_MINUTE
+        return OUTBOUND_BURST, OUTBOUND_PER_MINUTE
+
+    def load(self, keys):
+        missing = {key for key in keys if key and key not in self._buckets}
+        if not missing:
+            return
+        rows = self.db.query(OutboundBucket).filter(OutboundBucket.key.in_(missing)).with_for_update().all()
+        new = missing - {row.key for row in rows}
+        if new:
+            # Dos workers pueden crear el mismo bucket a la vez: el segundo no inserta y lo lee
+            for key in sorted(new):
+                burst, _ = self.limits(key)
+                insert_or_ignore(self.db, OutboundBucket, {"key": key, "tokens": burst, "refilled_at": self.now})
+            rows += self.db.query(OutboundBucket).filter(OutboundBucket.key.in_(new)).with_for_update().all()
+        for row in rows:
+            burst, per_minute = self.limits(row.key)
+            row.tokens = min(burst, row.tokens + max(0.0, self.now - row.refilled_at) * per_minute / 60)
+            row.refilled_at = self.now
+            self._buckets[row.key] = row
+
+    def take(self, key: str | None, force: bool = False) -> bool:
+        """
+        Gasta un token de `key`. Sin token devuelve False y no gasta nada,
+        salvo con force=True (lo que sale igual): gasta y avisa que se pasó.
+        """
+        if key is None:
+            return True
+        self.load([key])
+        bucket = self._buckets[key]
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return True
+        if force:
+            burst, _ = self.limits(key)
+            bucket.tokens = max(MIN_TOKENS_FACTOR * burst, bucket.tokens - 1)
+        return False
+
+    def save(self):
+        self.db.flush()
+
+
+def schedule(rows: list[tuple], pacer: Pacer, limit: int) -> dict:
+    """
+    rows: [(id, instrucción)] en el orden de la cola. Devuelve qué sale ahora
+    (como mucho `limit`), qué se descarta por juntarse con otra, qué payloads
+    cambiaron y qué vuelve a la cola por falta de token.
+    """
+    kept, dropped, changed = _coalesce(rows)
+    keys = [pacing_key(instruction) if isinstance(instruction, dict) else None for _, instruction in kept]
+    pacer.load(keys)
+
+    send, deferred, throttled = [], [], {}
+    for (ref, instruction), key in zip(kept, keys):
+        if len(send) >= limit:
+            deferred.append(ref)
+        elif key in throttled or not pacer.take(key):
+            # Sin token: tampoco sale nada posterior al mismo destinatario (se respeta el orden)
+            throttled[key] = throttled.get(key, 0) + 1
+            deferred.append(ref)
+        else:
+            send.append((ref, instruction))
+    return {
+        "send": send,
+        "dropped": dropped,
+        "changed": {ref: instruction for ref, instruction in kept if ref in changed},
+        "deferred": deferred,
+        "throttled": throttled,
+    }
+
+
+def charge(db: Session, instructions) -> int:
+    """
+    Lo que sale directo en la respuesta de un endpoint (no pasa por la cola):
+    gasta los tokens igual y devuelve cuántas instrucciones se pasaron del ritmo.
+    """
+    instruction_list = instructions if isinstance(instructions, list) else [instructions]
+    pacer = Pacer(db)
+    over = 0
+    for instruction in instruction_list:
+        if isinstance(instruction, dict) and not pacer.take(pacing_key(instruction), force=True):
+            over += 1
+    pacer.save()
+    return over
+
+
+def exhausted_buckets(db: Session, now: float | None = None) -> dict:
+    """Destinatarios sin token ahora mismo, por tipo (send/group): lo que está frenando la cola"""
+    now = time.time() if now is None else now
+    counts = {"send": 0, "group": 0}
+    # Un bucket que no se tocó en la última hora ya está lleno
+    for key, tokens, refilled_at in (
+        db.query(OutboundBucket.key, OutboundBucket.tokens, OutboundBucket.refilled_at)
+        .filter(OutboundBucket.refilled_at > now - 3600)
+        .all()
+    ):
+        _, per_minute = Pacer.limits(key)
+        if tokens + (now - refilled_at) * per_minute / 60 < 1:
+            counts[key.split(":", 1)[0]] = counts.get(key.split(":", 1)[0], 0) + 1
+    return counts
@@ -0,0 +1,203 @@
+"""
+Profiler por muestreo para requests lentos (opt-in con PROFILING=1).
+
+Mientras hay requests en curso un hilo toma cada PROFILE_INTERVAL_MS las
+pilas de todos los hilos que están ejecutando código de app/ (los que
+esperan en el pool o en el event loop se descartan). Si el request tarda
+más que PROFILE_SLOW_MS, o se pidió con el header X-Profile: 1 o con
+?profile=1, se guardan sus pilas en formato "collapsed" (el que leen
+flamegraph.pl y speedscope).
+
+Las muestras son de todo el proceso: con mucha concurrencia un perfil
+puede incluir pilas de otros requests simultáneos.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from itertools import count
+
+from app.config import PROFILING, PROFILE_SLOW_MS, PROFILE_INTERVAL_MS, PROFILE_KEEP
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(APP_DIR)
+
+# Tope de pilas distintas por ruta en el agregado
+MAX_ROUTE_STACKS = 5000
+
+_profiles = deque(maxlen=PROFILE_KEEP)
+_route_stacks = {}
+_ids = count(1)
+_store_lock = threading.Lock()
+
+
+class _Collector:
+    __slots__ = ("stacks", "samples")
+
+    def __init__(self):
+        self.stacks = Counter()
+        self.samples = 0
+
+
+def _frame_label(code) -> str:
+    path = code.co_filename
+    if path.startswith(REPO_DIR):
+        path = os.path.relpath(path, REPO_DIR)
+    else:
+        path = os.path.basename(path)
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> str | None:
+    labels = []
+    in_app = False
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename.startswith(APP_DIR):
+            in_app = True
+        labels.append(_frame_label(code))
+        frame = frame.f_back
+    if not in_app:
+        return None
+    labels.reverse()
+    return ";".join(labels)
+
+
+class _Sampler:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.active = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self, collector: _Collector):
+        with self.lock:
+            self.active.add(collector)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+                self.thread.start()
+
+    def stop(self, collector: _Collector):
+        with self.lock:
+            self.active.discard(collector)
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            with self.lock:
+                if not self.active:
+                    self.thread = None
+                    return
+                collectors = list(self.active)
+
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stack = _collapse(frame)
+                if stack:
+                    stacks.append(stack)
+
+            for collector in collectors:
+                collector.samples += 1
+                collector.stacks.update(stacks)
+            time.sleep(self.interval)
+
+
+_sampler = _Sampler(PROFILE_INTERVAL_MS / 1000)
+
+
+def _forced(scope) -> bool:
+    for name, value in scope.get("headers", []):
+        if name == b"x-profile" and value in (b"1", b"true"):
+            return True
+    query = scope.get("query_string", b"")
+    return b"profile=1" in query.split(b"&")
+
+
+def _store(profile: dict, stacks: Counter):
+    with _store_lock:
+        _profiles.append(profile)
+        aggregate = _route_stacks.setdefault(profile["route"], Counter())
+        aggregate.update(stacks)
+        if len(aggregate) > MAX_ROUTE_STACKS:
+            _route_stacks[profile["route"]] = Counter(dict(aggregate.most_common(MAX_ROUTE_STACKS // 2)))
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/admin/profiles"):
+            return await self.app(scope, receive, send)
+
+        forced = _forced(scope)
+        collector = _Collector()
+        _sampler.start(collector)
+        started_at = time.time()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _sampler.stop(collector)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if forced or elapsed_ms >= PROFILE_SLOW_MS:
+                route = getattr(scope.get("route"), "path", None) or scope["path"]
+                _store({
+                    "id": next(_ids),
+                    "method": scope.get("method"),
+                    "route": route,
+                    "path": scope["path"],
+                    "started_at": started_at,
+                    "duration_ms": round(elapsed_ms, 2),
+                    "samples": collector.samples,
+                    "forced": forced,
+                    "stacks": dict(collector.stacks),
+                }, collector.stacks)
+
+
+def to_collapsed(stacks: dict) -> str:
+    """Una línea por pila: 'a;b;c N'"""
+    return "\n".join(f"{stack} {n}" for stack, n in sorted(stacks.items(), key=lambda item: -item[1])) + "\n"
+
+
+def list_profiles() -> list[dict]:
+    with _store_lock:
+        profiles = list(_profiles)
+    return [
+        {key: value for key, value in profile.items() if key != "stacks"}
+        for profile in reversed(profiles)
+    ]
+
+
+def get_profile(profile_id: int) -> dict | None:
+    with _store_lock:
+        for profile in _profiles:
+            if profile["id"] == profile_id:
+                return profile
+    return None
+
+
+def route_stacks(route: str) -> dict:
+    with _store_lock:
+        return dict(_route_stacks.get(route, {}))
+
+
+def top_frames(stacks: dict, limit: int = 15) -> list[dict]:
+    """Funciones de app/ con más muestras (propias o de lo que llaman)"""
+    totals = Counter()
+    for stack, n in stacks.items():
+        seen = set()
+        for label in stack.split(";"):
+            if label.split(" (", 1)[-1].startswith("app/") and label not in seen:
+                seen.add(label)
+                totals[label] += n
+    return [{"frame": label, "samples": n} for label, n in totals.most_common(limit)]
+
+
+def install(app):
+    if PROFILING:
+        app.add_middleware(ProfilingMiddleware)
+        print(f"🔬 Profiler activo: requests > {PROFILE_SLOW_MS}ms, muestreo cada {PROFILE_INTERVAL_MS}ms")
@@ -0,0 +1,126 @@
+"""
+Textos de las respuestas del bot (menús, reglas, tarjetas de casos).
+
+Los textos por defecto están en app/reply_templates.json (o REPLY_TEMPLATES_PATH);
+la tabla reply_templates guarda los cambios hechos desde el panel, globales
+(chat_id vacío) o para un grupo. Se compilan una sola vez: los que no tienen
+campos quedan ya renderizados y los demás se rellenan con str.format_map.
+Los cambios se publican en el bus de estado y cada worker recompila al
+siguiente uso, sin reiniciar (app/utils/versioned_cache.py).
+"""
+import json
+import string
+
+from app.config import REPLY_TEMPLATES_PATH
+from app.database import SessionLocal
+from app.models import ReplyTemplate
+from app.utils.versioned_cache import VersionedCache
+
+VERSION_KEY = "reply_templates"
+
+_formatter = string.Formatter()
+
+
+class TemplateError(ValueError):
+    pass
+
+
+class _Template:
+    __slots__ = ("key", "body", "fields", "static")
+
+    def __init__(self, key: str, body: str):
+        self.key = key
+        self.body = body
+        try:
+            # Solo campos simples: {nombre}, sin atributos ni índices
+            fields = {field for _, field, _, _ in _formatter.parse(body) if field is not None}
+        except ValueError as e:
+            raise TemplateError(f"{key}: {e}")
+        for field in fields:
+            if not field.isidentifier():
+                raise TemplateError(f"{key}: campo inválido {{{field}}}")
+        self.fields = frozenset(fields)
+        # Sin campos: se guarda ya renderizado (las llaves dobles quedan simples)
+        self.static = body.format() if not fields else None
+
+    def render(self, values: dict) -> str:
+        if self.static is not None:
+            return self.static
+        return self.body.format_map(values)
+
+
+def _read_file(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    # Se aceptan strings o listas de líneas (más legibles en el JSON)
+    return {key: "\n".join(value) if isinstance(value, list) else value for key, value in raw.items()}
+
+
+def _validate(defaults: dict, key: str, body: str) -> _Template:
+    if key not in defaults:
+        raise TemplateError(f"no existe el texto {key}")
+    template = _Template(key, body)
+    unknown = template.fields - defaults[key].fields
+    if unknown:
+        raise TemplateError(f"{key}: campos desconocidos {', '.join(sorted(unknown))}")
+    return template
+
+
+def _load(db=None) -> tuple:
+    """(por defecto {key: _Template}, compilados {(key, chat_id): _Template})"""
+    defaults = {key: _Template(key, body) for key, body in _read_file(REPLY_TEMPLATES_PATH).items()}
+    compiled = {(key, None): template for key, template in defaults.items()}
+
+    # Reusar la sesión del request si la hay: evita pedir una segunda conexión al pool
+    session = db or SessionLocal()
+    try:
+        overrides = session.query(ReplyTemplate).all()
+    finally:
+        if db is None:
+            session.close()
+
+    for row in overrides:
+        try:
+            compiled[(row.key, row.chat_id or None)] = _validate(defaults, row.key, row.body)
+        except TemplateError as e:
+            # Un override roto no puede dejar al bot sin responder: se usa el de por defecto
+            print(f"⚠️ Texto ignorado: {e}")
+    return defaults, compiled
+
+
+_cache = VersionedCache(VERSION_KEY, _load)
+
+
+def validate(key: str, body: str, db=None) -> _Template:
+    """Compila un texto y verifica que use solo los campos del texto por defecto"""
+    defaults, _ = _cache.get(db)
+    return _validate(defaults, key, body)
+
+
+def render(key: str, values: dict | None = None, chat_id: str | None = None, db=None) -> str:
+    """Texto del grupo si tiene uno propio, si no el global"""
+    _, templates = _cache.get(db)
+    template = (chat_id and templates.get((key, chat_id))) or templates[(key, None)]
+    return template.render(values or {})
+
+
+def list_templates(db=None) -> list[dict]:
+    defaults, templates = _cache.get(db)
+    items = []
+    for key, default in sorted(defaults.items()):
+        items.append({
+            "key": key,
+            "fields": sorted(default.fields),
+            "default": default.body,
+            "overrides": {
+                chat_id or "": template.body
+                for (k, chat_id), template in templates.items()
+                if k == key and template is not default
+            },
+        })
+    return items
+
+
+def invalidate_templates_cache():
+    """Llamar después del commit que cambia reply_templates (o al editar el archivo)"""
+    _cache.invalidate()
@@ -0,0 +1,182 @@
+"""
+Modelo de ventas entrenado con las decisiones de los moderadores.
+
+heuristic_v2 marca SALE cualquier texto con "entrada", "promo", "precio"...
+y la cola se llena de falsos positivos. Este modelo vuelve a puntuar esos
+mensajes: naive Bayes multinomial sobre n-gramas hasheados (palabras,
+pares de palabras y 4-gramas de letras, presentes o no) en un vector de
+2**SALE_MODEL_BITS posiciones. Puntuar un lote es sumar pesos con numpy,
+sin diccionario de vocabulario.
+
+El modelo son los conteos por clase; entrenar más (app/services/sale_training.py)
+es sumarle conteos, así que se reentrena de a poco con las etiquetas nuevas.
+Se guarda en SALE_MODEL_PATH y cada worker lo recarga cuando cambia la
+versión "sale_model" del bus.
+
+numpy es opcional: sin numpy o sin modelo entrenado current() devuelve
+None y queda heuristic_v2 solo.
+"""
+import os
+import re
+import time
+import zlib
+
+from app.config import SALE_MODEL_BITS, SALE_MODEL_PATH, SALE_MODEL_SURE_ABOVE
+from app.utils.versioned_cache import VersionedCache
+
+VERSION_KEY = "sale_model"
+SOURCE = "sale_nb_v1"
+SMOOTHING = 0.5  # Laplace sobre cada posición del vector
+
+_TOKEN = re.compile(r"[a-z0-9$]+")
+
+
+def features(normalized_text: str, bits: int = SALE_MODEL_BITS) -> list[int]:
+    """Posiciones hasheadas (sin repetir) de un texto ya normalizado (minúsculas, sin tildes)"""
+    tokens = _TOKEN.findall(normalized_text)
+    grams = [f"w {token}" for token in tokens]
+    grams += [f"b {first} {second}" for first, second in zip(tokens, tokens[1:])]
+    for token in tokens:
+        padded = f" {token} "
+        grams += [f"c {padded[i:i + 4]}" for i in range(max(1, len(padded) - 3))]
+    # crc32 y no hash(): tiene que dar lo mismo en todos los procesos
+    mask = (1 << bits) - 1
+    return sorted({zlib.crc32(gram.encode("utf-8")) & mask for gram in grams})
+
+
+def _sparse(texts, bits: int):
+    """(filas, columnas) de la matriz binaria texto x posición"""
+    import numpy as np
+
+    rows, cols = [], []
+    for row, text in enumerate(texts):
+        positions = features(text, bits)
+        cols.extend(positions)
+        rows.extend([row] * len(positions))
+    return np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)
+
+
+class SaleModel:
+    def __init__(self, counts, docs, bits: int = SALE_MODEL_BITS, trained_until: str | None = None, trained_at: float = 0.0,
+                 trained_keys=()):
+        """counts: (2, 2**bits) veces que cada posición apareció en no-venta / venta; docs: ejemplos por clase"""
+        import numpy as np
+
+        self.bits = bits
+        self.counts = np.asarray(counts, dtype=np.float64)
+        self.docs = np.asarray(docs, dtype=np.float64)
+        self.trained_until = trained_until
+        self.trained_at = trained_at
+        # Etiquetas con fecha igual a trained_until que ya se sumaron (la próxima vez se lee desde >=)
+        self.trained_keys = list(trained_keys)
+        self._weights = None
+
+    @classmethod
+    def empty(cls, bits: int = SALE_MODEL_BITS) -> "SaleModel":
+        import numpy as np
+
+        return cls(np.zeros((2, 1 << bits)), np.zeros(2), bits)
+
+    def fit(self, texts: list[str], labels: list[int]) -> "SaleModel":
+        """Suma ejemplos (texto normalizado, 1 venta / 0 no) a los conteos"""
+        import numpy as np
+
+        if not texts:
+            return self
+        labels = np.asarray(labels, dtype=np.int64)
+        rows, cols = _sparse(texts, self.bits)
+        size = 1 << self.bits
+        for label in (0, 1):
+            self.counts[label] += np.bincount(cols[labels[rows] == label], minlength=size)
+            self.docs[label] += int((labels == label).sum())
+        self._weights = None
+        return self
+
+    def _log_weights(self):
+        import numpy as np
+
+        if self._weights is None:
+            smoothed = self.counts + SMOOTHING
+            log_probs = np.log(smoothed) - np.log(smoothed.sum(axis=1, keepdims=True))
+            prior = np.log(self.docs[1] + 1) - np.log(self.docs[0] + 1)
+            self._weights = (log_probs[1] - log_probs[0], prior)
+        return self._weights
+
+    def probabilities(self, texts: list[str]):
+        """P(venta) para cada texto normalizado, en un solo lote"""
+        import numpy as np
+
+        weights, prior = self._log_weights()
+        rows, cols = _sparse(texts, self.bits)
+        scores = prior + np.bincount(rows, weights=weights[cols], minlength=len(texts))
+        return 1.0 / (1.0 + np.exp(-np.clip(scores, -30, 30)))
+
+    def save(self, path: str = SALE_MODEL_PATH):
+        import numpy as np
+
+        # Escribir aparte y renombrar: un worker nunca lee un archivo a medias
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            counts=self.counts.astype(np.float32),
+            docs=self.docs,
+            bits=self.bits,
+            trained_until=self.trained_until or "",
+            trained_at=self.trained_at or time.time(),
+            trained_keys=np.array(self.trained_keys, dtype=str),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = SALE_MODEL_PATH) -> "SaleModel":
+        import numpy as np
+
+        with np.load(path) as data:
+            return cls(
+                data["counts"],
+                data["docs"],
+                int(data["bits"]),
+                str(data["trained_until"]) or None,
+                float(data["trained_at"]),
+                [str(key) for key in data["trained_keys"]] if "trained_keys" in data.files else (),
+            )
+
+    def status(self) -> dict:
+        return {
+            "source": SOURCE,
+            "bits": self.bits,
+            "examples": {"sale": int(self.docs[1]), "not_sale": int(self.docs[0])},
+            "trained_until": self.trained_until,
+            "trained_at": self.trained_at,
+        }
+
+
+def _load(db=None) -> SaleModel | None:
+    try:
+        import numpy  # noqa: F401  opcional: sin numpy queda heuristic_v2
+    except ImportError:
+        return None
+    if not os.path.exists(SALE_MODEL_PATH):
+        return None
+    model = SaleModel.load(SALE_MODEL_PATH)
+    # Un modelo sin ejemplos de las dos clases no sabe nada todavía
+    return model if model.docs.min() > 0 else None
+
+
+_cache = VersionedCache(VERSION_KEY, _load)
+
+
+def current(db=None) -> SaleModel | None:
+    return _cache.get(db)
+
+
+def invalidate_sale_model():
+    """Después de guardar un modelo nuevo: lo recargan todos los workers"""
+    _cache.invalidate()
+
+
+def case_priority(base_priority: int, score: float | None) -> int:
+    """Las ventas seguras van con la prioridad del grupo; las dudosas detrás (1 alta, 5 baja)"""
+    if score is None or score >= SALE_MODEL_SURE_ABOVE:
+        return base_priority
+    return min(base_priority + 1, 5)
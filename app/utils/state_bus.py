@@ -0,0 +1,253 @@
+"""
+Versiones por clave compartidas entre workers/hosts (cachés, estados).
+
+Cada proceso guarda la última versión conocida de cada clave en memoria.
+Con el watcher andando (start_watcher(), lo arranca la API) esa copia se
+actualiza en segundo plano apenas alguien publica un cambio:
+
+- Redis: PUBLISH en cada bump y un hilo suscripto;
+- Postgres (psycopg2): pg_notify en la misma transacción y un hilo con LISTEN;
+- SQLite: un hilo que relee la tabla state_versions (unas pocas filas)
+  cada STATE_WATCH_INTERVAL.
+
+Así current_version() no hace I/O en el request. Sin watcher (scripts,
+CLI) se consulta el bus como mucho una vez cada STATE_CHECK_INTERVAL.
+"""
+import select
+import time
+import threading
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from app.config import STATE_BUS_URL, STATE_CHECK_INTERVAL, STATE_WATCH_INTERVAL
+from app.database import engine
+
+CHANNEL = "state_versions"
+# Con notificaciones igual se relee todo cada tanto por si se perdió alguna
+FULL_REFRESH_SECONDS = 5
+
+
+class SqlStateBus:
+    """Versiones por clave en la tabla state_versions (sirve para SQLite y Postgres)"""
+
+    def bump(self, key: str, connection=None) -> int:
+        if connection is not None:
+            # Dentro de la transacción del caller: se publica junto con su commit
+            return self._bump_on(connection, key)
+        try:
+            return self._bump(key)
+        except IntegrityError:
+            # Otro proceso insertó la misma clave al mismo tiempo
+            return self._bump(key)
+
+    def _bump(self, key: str) -> int:
+        with engine.begin() as conn:
+            return self._bump_on(conn, key)
+
+    def _bump_on(self, conn, key: str) -> int:
+        if conn.dialect.name == "postgresql":
+            # Se entrega al hacer commit (y no se entrega si hay rollback)
+            conn.execute(text("SELECT pg_notify(:channel, :key)"), {"channel": CHANNEL, "key": key})
+        updated = conn.execute(
+            text("UPDATE state_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE key = :key"),
+            {"key": key}
+        ).rowcount
+        if not updated:
+            conn.execute(
+                text("INSERT INTO state_versions (key, version, updated_at) VALUES (:key, 1, CURRENT_TIMESTAMP)"),
+                {"key": key}
+            )
+        row = conn.execute(text("SELECT version FROM state_versions WHERE key = :key"), {"key": key}).first()
+        return row[0] if row else 0
+
+    def versions(self) -> dict:
+        with engine.connect() as conn:
+            return {row[0]: row[1] for row in conn.execute(text("SELECT key, version FROM state_versions"))}
+
+    def watch(self, on_change, stop: threading.Event):
+        if engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2":
+            self._listen(on_change, stop)
+        else:
+            while not stop.wait(STATE_WATCH_INTERVAL):
+                on_change(self.versions())
+
+    def _listen(self, on_change, stop: threading.Event):
+        raw = engine.raw_connection()
+        raw.detach()  # conexión propia para el LISTEN, fuera del pool
+        dbapi = raw.dbapi_connection
+        try:
+            dbapi.autocommit = True
+            dbapi.cursor().execute(f"LISTEN {CHANNEL}")
+            on_change(self.versions())
+            last_full = time.monotonic()
+            while not stop.is_set():
+                ready, _, _ = select.select([dbapi], [], [], 1)
+                if ready:
+                    dbapi.poll()
+                notified = bool(dbapi.notifies)
+                dbapi.notifies.clear()
+                if notified or time.monotonic() - last_full >= FULL_REFRESH_SECONDS:
+                    on_change(self.versions())
+                    last_full = time.monotonic()
+        finally:
+            raw.close()
+
+
+class RedisStateBus:
+    """Mismo contrato sobre Redis (o cualquier servidor compatible: KeyDB, Valkey...)"""
+
+    PREFIX = "botmod:version:"
+
+    def __init__(self, url: str):
+        import redis  # opcional: solo hace falta si se configura STATE_BUS_URL=redis://
+        self.client = redis.Redis.from_url(url)
+
+    def bump(self, key: str) -> int:
+        version = int(self.client.incr(self.PREFIX + key))
+        self.client.publish(self.PREFIX + CHANNEL, f"{key}={version}")
+        return version
+
+    def versions(self) -> dict:
+        keys = list(self.client.scan_iter(match=self.PREFIX + "*"))
+        if not keys:
+            return {}
+        values = self.client.mget(keys)
+        return {
+            k.decode("utf-8")[len(self.PREFIX):]: int(v or 0)
+            for k, v in zip(keys, values)
+        }
+
+    def watch(self, on_change, stop: threading.Event):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.PREFIX + CHANNEL)
+        try:
+            on_change(self.versions())
+            last_full = time.monotonic()
+            while not stop.is_set():
+                message = pubsub.get_message(timeout=1)
+                if message:
+                    key, _, version = message["data"].decode("utf-8").rpartition("=")
+                    on_change({key: int(version)}, full=False)
+                if time.monotonic() - last_full >= FULL_REFRESH_SECONDS:
+                    on_change(self.versions())
+                    last_full = time.monotonic()
+        finally:
+            pubsub.close()
+
+
+_bus = None
+_versions = {}
+_last_check = 0
+_lock = threading.Lock()
+_merge_lock = threading.Lock()
+_watcher = None
+_watch_stop = threading.Event()
+
+
+def get_bus():
+    global _bus
+    if _bus is None:
+        if STATE_BUS_URL.startswith(("redis://", "rediss://")):
+            _bus = RedisStateBus(STATE_BUS_URL)
+        else:
+            _bus = SqlStateBus()
+    return _bus
+
+
+def current_version(key: str) -> int:
+    """
+    Versión vigente de una clave.
+    Se consulta el bus como mucho una vez cada STATE_CHECK_INTERVAL por proceso.
+    """
+    global _versions, _last_check
+    if watcher_running():
+        # El watcher mantiene _versions al día: nada de I/O acá
+        return _versions.get(key, 0)
+    now = time.time()
+    # Si otro hilo ya está refrescando no se espera: se usa la última versión conocida
+    if (now - _last_check) >= STATE_CHECK_INTERVAL and _lock.acquire(blocking=False):
+        try:
+            if (now - _last_check) >= STATE_CHECK_INTERVAL:
+                try:
+                    _versions = get_bus().versions()
+                except Exception as e:
+                    print(f"⚠️ Bus de estado no disponible: {e}")
+                _last_check = now
+        finally:
+            _lock.release()
+    return _versions.get(key, 0)
+
+
+def bumps_in_transaction() -> bool:
+    """True si el bus es la propia base (se puede versionar dentro de una transacción)"""
+    return isinstance(get_bus(), SqlStateBus)
+
+
+def bump_version(key: str, connection=None) -> int:
+    """
+    Marca una clave como modificada para todos los procesos.
+    connection (solo bus SQL) hace el incremento en esa transacción en vez de abrir otra.
+    """
+    bus = get_bus()
+    version = bus.bump(key, connection) if connection is not None else bus.bump(key)
+    _merge({key: version}, full=False)
+    return version
+
+
+def _merge(versions: dict, full: bool = True):
+    """
+    full: lectura completa del bus, manda (como el refresco por intervalo).
+    Si no, son avisos sueltos y solo se avanza.
+    """
+    global _versions
+    with _merge_lock:
+        if full:
+            if versions != _versions:
+                _versions = versions
+            return
+        if any(_versions.get(key, 0) < version for key, version in versions.items()):
+            _versions = {**_versions, **{k: v for k, v in versions.items() if _versions.get(k, 0) < v}}
+
+
+def _watch_loop():
+    bus = get_bus()
+    while not _watch_stop.is_set():
+        try:
+            bus.watch(_merge, _watch_stop)
+        except Exception as e:
+            print(f"⚠️ Watcher del bus de estado: {e}; reintento")
+            _watch_stop.wait(1)
+
+
+def start_watcher():
+    """Arranca (una vez por proceso) el hilo que sigue los cambios de versión"""
+    global _watcher
+    if STATE_WATCH_INTERVAL <= 0:
+        return  # apagado: se vuelve al chequeo cada STATE_CHECK_INTERVAL
+    with _lock:
+        if _watcher is not None and _watcher.is_alive():
+            return
+        try:
+            _merge(get_bus().versions())
+        except Exception as e:
+            print(f"⚠️ Bus de estado no disponible: {e}")
+        _watch_stop.clear()
+        _watcher = threading.Thread(target=_watch_loop, name="state-bus-watcher", daemon=True)
+        _watcher.start()
+
+
+def stop_watcher():
+    global _watcher
+    _watch_stop.set()
+    if _watcher is not None:
+        _watcher.join(timeout=5)
+    _watcher = None
+
+
+def watcher_running() -> bool:
+    return _watcher is not None and _watcher.is_alive()
+
+
+def known_versions() -> dict:
+    return dict(_versions)
@@ -0,0 +1,93 @@
+"""
+Grabador del tráfico conector → API en un JSONL de solo agregado.
+
+Cada línea es un request con su cuerpo, la respuesta y cuánto tardó.
+benchmarks/replay.py lo vuelve a reproducir contra una copia de la base.
+"""
+import json
+import os
+import threading
+import time
+
+from app.config import RECORD_TRAFFIC_PATH
+
+# Rutas que llama el conector (whatsapp/index.js)
+RECORDED_PREFIXES = (
+    "/ingest_message",
+    "/conversation",
+    "/moderation/response",
+    "/connector/",
+)
+
+_lock = threading.Lock()
+
+
+def _decode(body: bytes):
+    if not body:
+        return None
+    try:
+        return json.loads(body.decode("utf-8"))
+    except ValueError:
+        return body.decode("utf-8", errors="replace")
+
+
+def _write(entry: dict):
+    line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+    with _lock:
+        # Una sola escritura por línea en modo append: varios workers pueden compartir el archivo
+        with open(RECORD_TRAFFIC_PATH, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+class TrafficRecorderMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(RECORDED_PREFIXES):
+            return await self.app(scope, receive, send)
+
+        request_body = []
+        response_body = []
+        status = {"code": None}
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                request_body.append(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response_body.append(message.get("body", b""))
+            await send(message)
+
+        started_at = time.time()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            entry = {
+                "ts": round(started_at, 6),
+                "pid": os.getpid(),
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "body": _decode(b"".join(request_body)),
+                "status": status["code"],
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                "response": _decode(b"".join(response_body)),
+            }
+            try:
+                _write(entry)
+            except OSError as e:
+                print(f"⚠️ No se pudo grabar el tráfico: {e}")
+
+
+def install(app):
+    """Solo se engancha si RECORD_TRAFFIC_PATH está definido"""
+    if RECORD_TRAFFIC_PATH:
+        app.add_middleware(TrafficRecorderMiddleware)
+        print(f"🎙️ Grabando tráfico del conector en {RECORD_TRAFFIC_PATH}")
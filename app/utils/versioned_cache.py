@@ -0,0 +1,69 @@
+"""
+Caché en memoria de un valor de la base atado a una clave del bus de estado.
+
+get() compara la versión de la clave (un acceso al dict del bus, que el
+watcher mantiene al día) con la de la carga y solo vuelve a leer la base
+cuando cambió. invalidate() sube la versión para todos los procesos y va
+después del commit: antes, otro request podría recargar los datos viejos
+y guardarlos con la versión nueva.
+
+    _cache = VersionedCache("ai_config", _load)
+    config = _cache.get(db)      # db opcional: reusa la sesión del request
+    _cache.invalidate()          # después del commit
+"""
+import threading
+import time
+
+from app.utils import metrics
+from app.utils.state_bus import bump_version, current_version
+
+_MISSING = object()
+_registry = []
+
+
+class VersionedCache:
+    def __init__(self, key: str, loader, ttl: float | None = None):
+        """loader(db) arma el valor; ttl (segundos) es solo una red de seguridad"""
+        self.key = key
+        self.loader = loader
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # (versión, monotonic de la carga, valor): se reemplaza entero, nunca a medias
+        self._entry = (None, 0.0, _MISSING)
+        _registry.append(self)
+
+    def _fresh(self, entry, version) -> bool:
+        loaded_version, loaded_at, value = entry
+        if value is _MISSING or loaded_version != version:
+            return False
+        return not self.ttl or time.monotonic() - loaded_at <= self.ttl
+
+    def get(self, db=None):
+        version = current_version(self.key)
+        entry = self._entry
+        if not self._fresh(entry, version):
+            with self._lock:
+                entry = self._entry
+                if not self._fresh(entry, version):
+                    entry = (version, time.monotonic(), self.loader(db))
+                    self._entry = entry
+                    metrics.inc("settings_cache_loads_total", key=self.key)
+        return entry[2]
+
+    def invalidate(self) -> int:
+        """Nueva versión para todos los workers (llamar después del commit)"""
+        self._entry = (None, 0.0, _MISSING)
+        return bump_version(self.key)
+
+    def status(self) -> dict:
+        version, loaded_at, value = self._entry
+        return {
+            "key": self.key,
+            "version": version,
+            "loaded": value is not _MISSING,
+            "age_s": round(time.monotonic() - loaded_at, 1) if value is not _MISSING else None,
+        }
+
+
+def caches_status() -> list[dict]:
+    return [cache.status() for cache in _registry]
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Flujo de apelación con muchos usuarios apelando a la vez.
+
+1. N usuarios con strikes escriben "apelar" (queda una apelación abierta por cada uno)
+2. Otros N usuarios chatean con la IA (cada mensaje pasa por el chequeo de apelación)
+3. Los N apelantes mandan su descargo
+
+    python benchmarks/bench_appeals.py --appellants 1000 --concurrency 64
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import percentiles, post_json, print_json, run_concurrent, scratch_api
+from benchmarks.groq_stub import groq_stub
+
+
+def _seed(path: str, appellants: int) -> tuple[list[str], list[str]]:
+    """Base con al menos N usuarios sancionados; devuelve (apelantes, otros)"""
+    from benchmarks.datagen import generate
+
+    users = appellants * 4
+    generate(
+        out=path, users=users, messages=users * 20, groups=3, appeal_ratio=0.1, turns=0,
+        sale_ratio=0.12, question_ratio=0.25, seed=7, days=30,
+    )
+    con = sqlite3.connect(path)
+    try:
+        penalized = [row[0] for row in con.execute("SELECT phone FROM users WHERE strikes > 0 ORDER BY id")]
+        clean = [row[0] for row in con.execute("SELECT phone FROM users WHERE strikes = 0 ORDER BY id")]
+    finally:
+        con.close()
+    if len(penalized) < appellants:
+        raise SystemExit(f"Solo hay {len(penalized)} usuarios con strikes")
+    return penalized[:appellants], clean[:appellants]
+
+
+def _phase(base_url: str, phones: list[str], message: str, concurrency: int) -> dict:
+    latencies, errors, elapsed = run_concurrent(
+        lambda phone: post_json(f"{base_url}/conversation", {"phone": phone, "message": message}),
+        phones,
+        concurrency,
+    )
+    return {
+        "requests": len(phones),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "errors": len(errors),
+        "error_sample": errors[:2],
+        "latency": percentiles(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--appellants", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--groq-delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="bot_appeals_"), "seed.db")
+    appellants, others = _seed(db_path, args.appellants)
+
+    with groq_stub(delay=args.groq_delay) as (groq_url, _):
+        env = {"GROQ_API_URL": groq_url, "GROQ_API_KEY": "stub"}
+        with scratch_api(workers=args.workers, env=env, db_source=db_path) as base_url:
+            results = {
+                "apelar": _phase(base_url, appellants, "apelar", args.concurrency),
+                "chat_while_appealing": _phase(base_url, others, "hola, a qué hora abre la feria?", args.concurrency),
+                "descargo": _phase(base_url, appellants, "fue un error, no estaba vendiendo", args.concurrency),
+            }
+
+    print_json({
+        "appellants": args.appellants,
+        "concurrency": args.concurrency,
+        "workers": args.workers,
+        "phases": results,
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Compara las rutas calientes con sesión sync (threadpool) vs async (ASYNC_DB=1).
+
+Carga mixta con clientes concurrentes: ingest de mensajes, lectura del
+dashboard y polling del conector, como en producción.
+
+    python benchmarks/bench_async.py --requests 3000 --concurrency 64
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import GROUP_ID
+from benchmarks.common import get_json, percentiles, post_json, print_json, run_concurrent, scratch_api
+
+
+def _ingest_payload(i: int) -> dict:
+    sender = f"549110000{i % 300:04d}"
+    content = "vendo zapatillas $20000 al privado" if i % 5 == 0 else "hola vecinos, alguien sabe si hay luz?"
+    return {
+        "phone": sender,
+        "real_phone": sender,
+        "name": "Vecino",
+        "chat_id": GROUP_ID,
+        "is_group": True,
+        "message_type": "text",
+        "content": content,
+        "whatsapp_message_key": f'{{"remoteJid": "{GROUP_ID}", "id": "A{i}"}}',
+        "participant_jid": f"{sender}@s.whatsapp.net",
+    }
+
+
+def _request(base_url: str, i: int):
+    # 60% ingest, 25% dashboard, 15% conector
+    slot = i % 20
+    if slot < 12:
+        return post_json(f"{base_url}/ingest_message", _ingest_payload(i))
+    if slot < 17:
+        return get_json(f"{base_url}/dashboard/cases")
+    return get_json(f"{base_url}/connector/instructions?limit=5")
+
+
+def _run(async_db: bool, requests: int, concurrency: int, workers: int) -> dict:
+    env = {"ASYNC_DB": "1" if async_db else "0"}
+    with scratch_api(workers=workers, env=env) as base_url:
+        # Calentar: que el dashboard tenga casos que listar
+        for i in range(50):
+            post_json(f"{base_url}/ingest_message", _ingest_payload(i * 5))
+
+        latencies, errors, elapsed = run_concurrent(
+            lambda i: _request(base_url, i),
+            range(requests),
+            concurrency,
+        )
+
+    return {
+        "mode": "async" if async_db else "sync",
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "errors": len(errors),
+        "latency": percentiles(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    results = [_run(mode, args.requests, args.concurrency, args.workers) for mode in (False, True)]
+    print_json({"runs": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Ola de spam: N casos casi iguales de unos pocos usuarios, más algunas
+ventas distintas que no tienen que entrar en el bloque.
+
+Misma base en dos APIs: en una se resuelve caso por caso con
+/dashboard/decide, en la otra con un solo /dashboard/decide_bulk
+(cluster_of). Compara tiempo, sentencias SQL, instrucciones encoladas y
+que el estado final de los usuarios sea el mismo. Después los mismos
+usuarios vuelven a mandar el aviso y se los expulsa (ban): caso por caso
+sale una expulsión por mensaje, en bloque una por usuario.
+
+    python benchmarks/bench_bulk_decide.py --cases 80 --spammers 8
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import get_json, post_json, print_json, scratch_api
+
+SPAM = "🔥 VENDO iPhone 13 128gb ${price} impecable, al privado!! envios a todo el pais"
+OTHERS = ["vendo bici rodado 26 $50000", "alquilo depto 2 ambientes, consultas al privado", "promo 2x1 en empanadas"]
+_SQL = re.compile(r"^sql_statements_total (\S+)$", re.MULTILINE)
+
+
+def _seed(base_url: str, cases: int, spammers: int, offset: int = 0):
+    from app.config import GROUP_ID
+
+    for i in range(offset, offset + cases):
+        phone = f"54933{i % spammers:08d}"
+        post_json(f"{base_url}/ingest_message", {
+            "phone": phone, "real_phone": phone, "name": f"Spammer {i % spammers}", "chat_id": GROUP_ID,
+            "message_type": "text", "content": SPAM.format(price=450000 + i * 1000),
+            "whatsapp_message_key": json.dumps({"remoteJid": GROUP_ID, "id": f"SPAM{i}", "participant": f"{phone}@s.whatsapp.net"}),
+            "participant_jid": f"{phone}@s.whatsapp.net",
+        })
+    for i, text in enumerate(OTHERS):
+        phone = f"54944{i:08d}"
+        post_json(f"{base_url}/ingest_message", {
+            "phone": phone, "real_phone": phone, "name": f"Vecino {i}", "chat_id": GROUP_ID, "message_type": "text",
+            "content": text, "whatsapp_message_key": json.dumps({"remoteJid": GROUP_ID, "id": f"OTHER{offset + i}"}),
+        })
+
+
+def _sql_statements(base_url: str) -> float:
+    _, text, _ = get_json(f"{base_url}/metrics")
+    match = _SQL.search(text or "")
+    return float(match.group(1)) if match else 0.0
+
+
+def _spam_case_ids(base_url: str) -> list[int]:
+    _, body, _ = get_json(f"{base_url}/dashboard/cases")
+    return sorted(c["id"] for c in body["cases"] if c["status"] == "pending" and "iPhone" in (c["_content"] or ""))
+
+
+def _final_state(db_path: str) -> dict:
+    # /dashboard/cases trae solo los 100 más nuevos y /connector/instructions reparte
+    # con ritmo: el estado se lee de la base (y las instrucciones se dan por enviadas)
+    with sqlite3.connect(db_path) as conn:
+        pending_cases = conn.execute("SELECT count(*) FROM cases WHERE status = 'pending'").fetchone()[0]
+        users = {phone: [strikes, status] for phone, strikes, status in conn.execute("SELECT phone, strikes, status FROM users ORDER BY phone")}
+        queued = conn.execute("UPDATE pending_instructions SET status = 'processed' WHERE status = 'pending'").rowcount
+    return {
+        "pending_cases": pending_cases,
+        "users": users,
+        "queued_instructions": queued,
+    }
+
+
+def _measure(base_url: str, fn) -> dict:
+    sql_before = _sql_statements(base_url)
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    # /metrics y /dashboard/cases también cuentan: se descuenta la consulta de métricas del final
+    return {"elapsed_ms": round(elapsed * 1000, 1), "sql_statements": int(_sql_statements(base_url) - sql_before)}
+
+
+def _compare(serial_url: str, bulk_url: str, dbs: dict, action: str) -> dict:
+    serial_ids = _spam_case_ids(serial_url)
+    bulk_ids = _spam_case_ids(bulk_url)
+    bulk_result = {}
+
+    def serial():
+        for case_id in serial_ids:
+            status, body, _ = post_json(f"{serial_url}/dashboard/decide", {"case_id": case_id, "action": action})
+            assert status == 200, body
+
+    def bulk():
+        status, body, _ = post_json(f"{bulk_url}/dashboard/decide_bulk", {"cluster_of": bulk_ids[0], "action": action})
+        assert status == 200, body
+        bulk_result.update(body)
+
+    report = {"action": action, "cases": len(serial_ids)}
+    report["serial"] = {**_measure(serial_url, serial), **_final_state(dbs[serial_url])}
+    report["bulk"] = {
+        **_measure(bulk_url, bulk),
+        "resolved": len(bulk_result["resolved"]),
+        "instructions_before_coalescing": bulk_result["instructions_before_coalescing"],
+        **_final_state(dbs[bulk_url]),
+    }
+    report["same_user_state"] = report["serial"]["users"] == report["bulk"]["users"]
+    report["cluster_matched_spam_only"] = sorted(bulk_result["resolved"]) == bulk_ids
+    for side in ("serial", "bulk"):
+        report[side].pop("users")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", type=int, default=80)
+    parser.add_argument("--spammers", type=int, default=8)
+    parser.add_argument("--action", default="delete")
+    args = parser.parse_args()
+
+    report = {"spammers": args.spammers}
+    workdir = tempfile.mkdtemp()
+    serial_db, bulk_db = os.path.join(workdir, "serial.db"), os.path.join(workdir, "bulk.db")
+    with scratch_api(env={"DATABASE_URL": f"sqlite:///{serial_db}"}) as serial_url, \
+            scratch_api(env={"DATABASE_URL": f"sqlite:///{bulk_db}"}) as bulk_url:
+        dbs = {serial_url: serial_db, bulk_url: bulk_db}
+        _seed(serial_url, args.cases, args.spammers)
+        _seed(bulk_url, args.cases, args.spammers)
+
+        report["first_wave"] = _compare(serial_url, bulk_url, dbs, args.action)
+        # Segunda ola de los mismos usuarios (ya con strikes): expulsión
+        _seed(serial_url, args.spammers * 3, args.spammers, offset=args.cases)
+        _seed(bulk_url, args.spammers * 3, args.spammers, offset=args.cases)
+        report["second_wave_ban"] = _compare(serial_url, bulk_url, dbs, "ban")
+    print_json(report)
+
+
+if __name__ == "__main__":
+    main()
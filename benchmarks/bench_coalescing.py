@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Ráfagas de mensajes a la IA ("hola" / "una pregunta" / "a qué hora abre...")
+sin juntar, juntando con un worker y con dos (los mensajes de un usuario caen
+en workers distintos): llamadas a Groq, respuestas mandadas, cuánto tarda la
+respuesta al último mensaje de cada ráfaga y la de un mensaje solo (que no
+tiene que esperar nada).
+
+    python benchmarks/bench_coalescing.py --users 30 --gap 0.4
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import percentiles, post_json, print_json, scratch_api
+from benchmarks.groq_stub import groq_stub
+
+BURST = ["hola", "una pregunta", "a qué hora abre la farmacia de turno?"]
+
+
+def _payload(phone: str, message: str) -> dict:
+    return {"phone": phone, "real_phone": phone, "message": message, "name": "Vecino"}
+
+
+def _burst(base_url: str, phone: str, gap: float) -> dict:
+    """Manda la ráfaga como el conector (un request por mensaje, sin esperar respuesta)"""
+    with ThreadPoolExecutor(max_workers=len(BURST)) as pool:
+        futures = []
+        for i, message in enumerate(BURST):
+            if i:
+                time.sleep(gap)
+            sent = time.perf_counter()
+            futures.append((sent, pool.submit(post_json, f"{base_url}/conversation", _payload(phone, message))))
+        results = [(sent, future.result()) for sent, future in futures]
+
+    replies = [body for _, (_, body, _) in results if body and body.get("instructions")]
+    last_sent, (_, _, last_elapsed) = results[-1]
+    finished = max(sent + elapsed for sent, (_, _, elapsed) in results)
+    return {
+        "replies": len(replies),
+        "errors": sum(1 for _, (status, _, _) in results if status >= 400),
+        # Desde el último mensaje del usuario hasta que tiene toda la respuesta
+        "wait": finished - last_sent,
+    }
+
+
+def _run(coalesce: bool, workers: int, users: int, gap: float, delay: float) -> dict:
+    with groq_stub(delay=delay) as (url, server):
+        env = {"GROQ_API_URL": url, "GROQ_API_KEY": "stub", "AI_COALESCE": "1" if coalesce else "0"}
+        with scratch_api(workers=workers, env=env) as base_url:
+            phones = [f"54933{i:08d}" for i in range(users)]
+            for phone in phones:
+                post_json(f"{base_url}/conversation", _payload(phone, "ia"))
+
+            # Un mensaje solo: la respuesta no espera a ver si llega otro
+            _, _, single = post_json(f"{base_url}/conversation", _payload(phones[0], "hola"))
+            calls_before = server.calls
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=users) as pool:
+                bursts = list(pool.map(lambda phone: _burst(base_url, phone, gap), phones))
+            elapsed = time.perf_counter() - started
+
+    return {
+        "coalesce": coalesce,
+        "workers": workers,
+        "users": users,
+        "messages": users * len(BURST),
+        "single_message_reply_ms": round(single * 1000, 1),
+        "elapsed_s": round(elapsed, 3),
+        "groq_calls": server.calls - calls_before,
+        "replies_sent": sum(b["replies"] for b in bursts),
+        "errors": sum(b["errors"] for b in bursts),
+        "wait_after_last_message": percentiles([b["wait"] for b in bursts]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=30)
+    parser.add_argument("--gap", type=float, default=0.4, help="segundos entre mensajes de una ráfaga")
+    parser.add_argument("--groq-delay", type=float, default=0.3)
+    args = parser.parse_args()
+
+    runs = [
+        _run(coalesce, workers, args.users, args.gap, args.groq_delay)
+        for coalesce, workers in ((False, 1), (True, 1), (True, 2))
+    ]
+    print_json({"runs": runs})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Tamaño de conversation_history y latencia de la consulta de historial de
+ask_groq en tres momentos:
+
+1. antes: solo el índice por user_phone (esquema anterior a 0005)
+2. índice: (user_phone, created_at)
+3. compactado: después de compact_history (resumen extractivo)
+
+    python benchmarks/bench_history.py --users 2000 --turns-per-user 200
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import percentiles, print_json
+
+SINGLE_INDEX = "ix_conversation_history_user_phone"
+COMPOSITE_INDEX = "ix_conversation_history_user_phone_created_at"
+
+
+def _sizes(path: str) -> dict:
+    con = sqlite3.connect(path)
+    try:
+        con.execute("VACUUM")
+        # En WAL el VACUUM queda en el -wal hasta el checkpoint
+        con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        rows, content_bytes = con.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(content)), 0) FROM conversation_history"
+        ).fetchone()
+        table_bytes = con.execute(
+            "SELECT SUM(pgsize) FROM dbstat WHERE name = 'conversation_history'"
+        ).fetchone()[0]
+        index_bytes = con.execute(
+            "SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name LIKE 'ix_conversation_history%'"
+        ).fetchone()[0]
+    finally:
+        con.close()
+    return {
+        "rows": rows,
+        "content_kb": round(content_bytes / 1024, 1),
+        "table_kb": round(table_bytes / 1024, 1),
+        "indexes_kb": round(index_bytes / 1024, 1),
+        "file_kb": round(os.path.getsize(path) / 1024, 1),
+    }
+
+
+def _use_index(path: str, composite: bool):
+    con = sqlite3.connect(path)
+    try:
+        if composite:
+            con.execute(f"CREATE INDEX IF NOT EXISTS {COMPOSITE_INDEX} ON conversation_history (user_phone, created_at)")
+            con.execute(f"DROP INDEX IF EXISTS {SINGLE_INDEX}")
+        else:
+            con.execute(f"CREATE INDEX IF NOT EXISTS {SINGLE_INDEX} ON conversation_history (user_phone)")
+            con.execute(f"DROP INDEX IF EXISTS {COMPOSITE_INDEX}")
+        con.execute("ANALYZE")
+        con.commit()
+    finally:
+        con.close()
+
+
+def _sql_latency(path: str, phones: list[str], limit: int) -> dict:
+    """Solo SQLite (sin ORM): lo que cambia con el índice y la compactación"""
+    history_sql = (
+        "SELECT * FROM conversation_history WHERE user_phone = ? AND role IN ('user', 'assistant') "
+        "ORDER BY created_at DESC LIMIT ?"
+    )
+    summary_sql = (
+        "SELECT * FROM conversation_history WHERE user_phone = ? AND role = 'system' "
+        "ORDER BY created_at DESC LIMIT 1"
+    )
+    samples = []
+    con = sqlite3.connect(path)
+    try:
+        for phone in phones:
+            started = time.perf_counter()
+            con.execute(history_sql, (phone, limit)).fetchall()
+            con.execute(summary_sql, (phone,)).fetchall()
+            samples.append(time.perf_counter() - started)
+    finally:
+        con.close()
+    return percentiles(samples)
+
+
+def _fetch_latency(phones: list[str], limit: int) -> dict:
+    """La misma consulta que ask_groq (ORM): últimos `limit` turnos + resumen"""
+    from app.database import SessionLocal
+    from app.models.conversation import ConversationTurn
+    from app.services.history_compaction import CHAT_ROLES, get_summary_turn
+
+    samples = []
+    db = SessionLocal()
+    try:
+        for phone in phones:
+            started = time.perf_counter()
+            history = db.query(ConversationTurn)\
+                .filter(ConversationTurn.user_phone == phone, ConversationTurn.role.in_(CHAT_ROLES))\
+                .order_by(ConversationTurn.created_at.desc())\
+                .limit(limit)\
+                .all()
+            get_summary_turn(db, phone)
+            samples.append(time.perf_counter() - started)
+            assert history
+            db.rollback()
+    finally:
+        db.close()
+    return percentiles(samples)
+
+
+def _measure(path: str, phones: list[str], limit: int) -> dict:
+    return {
+        "size": _sizes(path),
+        "fetch_sql": _sql_latency(path, phones, limit),
+        "fetch_orm": _fetch_latency(phones, limit),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--turns-per-user", type=int, default=200)
+    parser.add_argument("--context-window", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    from benchmarks.datagen import generate
+
+    path = os.path.join(tempfile.mkdtemp(), "history.db")
+    seeded = generate(
+        out=path, users=args.users, messages=args.users, groups=1, appeal_ratio=0, turns=args.users * args.turns_per_user,
+        sale_ratio=0.12, question_ratio=0.25, seed=args.seed, days=30,
+    )
+    print(f"🌱 {seeded['conversation_turns']} turnos para {args.users} usuarios en {seeded['elapsed_s']}s")
+
+    from app.services.history_compaction import compact_all
+
+    rng = random.Random(args.seed)
+    phones = [f"54911{rng.randrange(args.users):08d}" for _ in range(args.samples)]
+    limit = args.context_window * 2
+    report = {}
+
+    _use_index(path, composite=False)
+    report["antes"] = _measure(path, phones, limit)
+
+    _use_index(path, composite=True)
+    report["indice"] = _measure(path, phones, limit)
+
+    report["compactacion"] = compact_all(keep=limit)
+    report["compactado"] = _measure(path, phones, limit)
+
+    con = sqlite3.connect(path)
+    try:
+        report["resumen_ejemplo"] = con.execute(
+            "SELECT content FROM conversation_history WHERE role = 'system' LIMIT 1"
+        ).fetchone()[0]
+    finally:
+        con.close()
+
+    print_json(report)
+
+
+if __name__ == "__main__":
+    main()
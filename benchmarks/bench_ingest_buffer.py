@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Buffer local del conector (whatsapp/ingest_buffer.js) durante una caída de la API.
+
+1. Con la API apagada se agregan N mensajes de grupo al buffer (con fsync).
+2. Se levanta la API y se drena contra /ingest_batch: mensajes/s, tandas y
+   tamaño de tanda al final; en la base tiene que haber exactamente N.
+3. Reenvío: los mismos N mensajes (mismas keys) se vuelven a cargar y drenar,
+   como tras un corte antes de guardar el avance; la API los reconoce a todos
+   como repetidos.
+4. Dos buffers drenando a la vez contra un solo worker: cuántas tandas
+   reciben 429 y cuánto sale en total.
+Para comparar, los mismos mensajes de a uno por /ingest_message.
+
+Necesita node (>= 18, por fetch).
+
+    python benchmarks/bench_ingest_buffer.py --messages 5000
+"""
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from benchmarks.common import post_json, print_json, scratch_api
+
+DRIVER = """
+import { IngestBuffer } from %(module)s;
+
+const [dir, mode, baseUrl, count, prefix] = process.argv.slice(2);
+const post = async (messages) => {
+  const response = await fetch(`${baseUrl}/ingest_batch`, {
+    method: "POST",
+    headers: { "content-type": "application/json" },
+    body: JSON.stringify({ messages })
+  });
+  return {
+    status: response.status,
+    data: response.status === 200 ? await response.json() : null,
+    retryAfter: parseFloat(response.headers.get("retry-after")) || null
+  };
+};
+const buffer = new IngestBuffer(dir, post);
+const started = performance.now();
+
+if (mode === "fill") {
+  for (let i = 0; i < Number(count); i++) {
+    const user = i %% 200;
+    const phone = `54977${String(user).padStart(8, "0")}`;
+    buffer.append({
+      phone, real_phone: phone, name: `Vecino ${user}`, chat_id: %(group)s, is_group: true,
+      message_type: "text",
+      content: i %% 10 === 0 ? `vendo bici rodado 26 $${50000 + i}` : `buen día vecinos, alguien sabe si hay luz en la cuadra ${i}?`,
+      whatsapp_message_key: JSON.stringify({ remoteJid: %(group)s, id: `${prefix}${i}`, participant: `${phone}@s.whatsapp.net` }),
+      participant_jid: `${phone}@s.whatsapp.net`
+    });
+  }
+} else {
+  while (buffer.pending) {
+    await buffer.drain();
+    if (buffer.pending) await new Promise(resolve => setTimeout(resolve, buffer.backoffMs));
+  }
+}
+const elapsed = (performance.now() - started) / 1000;
+console.log(JSON.stringify({ elapsed, pending: buffer.pending, batchSize: buffer.batchSize, stats: buffer.stats }));
+"""
+
+
+def _driver(workdir: str) -> str:
+    from app.config import GROUP_ID
+
+    path = os.path.join(workdir, "driver.mjs")
+    with open(path, "w") as f:
+        f.write(DRIVER % {
+            "module": json.dumps("file://" + os.path.join(ROOT, "whatsapp", "ingest_buffer.js")),
+            "group": json.dumps(GROUP_ID),
+        })
+    return path
+
+
+def _node(driver: str, buffer_dir: str, mode: str, base_url: str = "", count: int = 0, prefix: str = "BUF") -> subprocess.Popen:
+    return subprocess.Popen(
+        ["node", driver, buffer_dir, mode, base_url, str(count), prefix],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+
+
+def _result(proc: subprocess.Popen) -> dict:
+    output, _ = proc.communicate()
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _stored(db_path: str, prefix: str) -> int:
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT count(*) FROM messages WHERE whatsapp_message_id LIKE ?", (f"%/{prefix}%",)).fetchone()[0]
+
+
+def _rate(count: int, seconds: float) -> float:
+    return round(count / seconds, 1) if seconds else None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--single", type=int, default=1000, help="mensajes de a uno por /ingest_message para comparar")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    driver = _driver(workdir)
+    db_path = os.path.join(workdir, "bot.db")
+    buffer_dir = os.path.join(workdir, "buffer")
+    report = {"messages": args.messages}
+
+    # 1. API caída: todo al buffer
+    fill = _result(_node(driver, buffer_dir, "fill", count=args.messages))
+    report["buffer_append"] = {"elapsed_s": round(fill["elapsed"], 2), "msgs_per_s": _rate(args.messages, fill["elapsed"])}
+
+    with scratch_api(env={"DATABASE_URL": f"sqlite:///{db_path}"}) as base_url:
+        # 2. Vuelve la API: drenar
+        drain = _result(_node(driver, buffer_dir, "drain", base_url))
+        report["drain"] = {
+            "elapsed_s": round(drain["elapsed"], 2),
+            "msgs_per_s": _rate(args.messages, drain["elapsed"]),
+            "batches": drain["stats"]["batches"],
+            "final_batch_size": drain["batchSize"],
+            "stored": drain["stats"]["stored"],
+            "in_db": _stored(db_path, "BUF"),
+        }
+
+        # 3. Reenvío del mismo buffer
+        _result(_node(driver, buffer_dir, "fill", count=args.messages))
+        replay = _result(_node(driver, buffer_dir, "drain", base_url))
+        report["replay"] = {
+            "elapsed_s": round(replay["elapsed"], 2),
+            "msgs_per_s": _rate(args.messages, replay["elapsed"]),
+            "duplicate": replay["stats"]["duplicate"],
+            "stored": replay["stats"]["stored"],
+            "in_db": _stored(db_path, "BUF"),
+        }
+
+        # 4. Dos buffers a la vez contra un worker (INGEST_BATCH_CONCURRENCY=1)
+        dirs = [os.path.join(workdir, f"buffer_{i}") for i in range(2)]
+        for i, directory in enumerate(dirs):
+            _result(_node(driver, directory, "fill", count=args.messages // 2, prefix=f"PAR{i}_"))
+        started = time.perf_counter()
+        procs = [_node(driver, directory, "drain", base_url) for directory in dirs]
+        parallel = [_result(proc) for proc in procs]
+        elapsed = time.perf_counter() - started
+        report["two_buffers"] = {
+            "elapsed_s": round(elapsed, 2),
+            "msgs_per_s": _rate(sum(r["stats"]["sent"] for r in parallel), elapsed),
+            "rejected_429": sum(r["stats"]["retries"] for r in parallel),
+            "in_db": sum(_stored(db_path, f"PAR{i}_") for i in range(2)),
+        }
+
+        # Comparación: de a uno por /ingest_message
+        from app.config import GROUP_ID
+
+        started = time.perf_counter()
+        for i in range(args.single):
+            phone = f"54988{i % 200:08d}"
+            post_json(f"{base_url}/ingest_message", {
+                "phone": phone, "real_phone": phone, "chat_id": GROUP_ID, "message_type": "text",
+                "content": f"buen día vecinos {i}",
+                "whatsapp_message_key": json.dumps({"remoteJid": GROUP_ID, "id": f"ONE{i}"}),
+            })
+        elapsed = time.perf_counter() - started
+        report["single_ingest_message"] = {"messages": args.single, "elapsed_s": round(elapsed, 2), "msgs_per_s": _rate(args.single, elapsed)}
+
+    print_json(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Latencia por backend de LLM (app/services/llm_backends.py) y cuánto tarda
+la IA en responder cuando Groq se cae y entra el respaldo local.
+
+Sin URLs usa dos stubs: uno "Groq" rápido y uno "local" lento como un
+modelo chico en CPU. En la Raspberry, contra el llama-server de verdad:
+
+    llama-server -m qwen2.5-1.5b-instruct-q4_k_m.gguf --port 8080 &
+    python benchmarks/bench_llm_backends.py \\
+        --local-url http://127.0.0.1:8080/v1/chat/completions --samples 10
+"""
+import argparse
+import os
+import sys
+import time
+from contextlib import ExitStack
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import percentiles, print_json
+from benchmarks.groq_stub import groq_stub
+
+MESSAGES = [
+    {"role": "system", "content": "Sos el asistente del grupo de vecinos. Respondé corto y en español."},
+    {"role": "user", "content": "alguien sabe a qué hora abre la farmacia de turno?"},
+]
+
+
+def _latency(backend, samples: int, stream: bool) -> dict:
+    times, first_token, errors = [], [], 0
+    for _ in range(samples):
+        started = time.perf_counter()
+        first = []
+
+        def on_delta(_):
+            if not first:
+                first.append(time.perf_counter() - started)
+
+        try:
+            backend.complete(MESSAGES, temperature=0.7, max_tokens=120, on_delta=on_delta if stream else None)
+        except Exception:
+            errors += 1
+            continue
+        times.append(time.perf_counter() - started)
+        first_token.extend(first)
+    result = {"total": percentiles(times), "errors": errors}
+    if stream:
+        result["first_token"] = percentiles(first_token)
+    return result
+
+
+def _failover(hung_url: str, timeout: float, samples: int) -> dict:
+    """Groq colgado: las primeras llamadas pagan el timeout, después va directo al local"""
+    from app.services import llm_backends
+
+    groq = llm_backends.BACKENDS["groq"]
+    groq.url, groq.timeout = hung_url, timeout
+    groq.failures, groq.down_until = 0, 0.0
+
+    calls = []
+    for i in range(samples):
+        started = time.perf_counter()
+        llm_backends.complete(MESSAGES, max_tokens=120)
+        calls.append({
+            "call": i + 1,
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+            "groq_healthy": groq.healthy(),
+        })
+    return {"calls": calls, "status": llm_backends.status()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--groq-url", default="")
+    parser.add_argument("--groq-key", default=os.getenv("GROQ_API_KEY", ""))
+    parser.add_argument("--local-url", default="")
+    parser.add_argument("--local-model", default="")
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--stub-groq-delay", type=float, default=0.3)
+    parser.add_argument("--stub-local-delay", type=float, default=1.2, help="prompt processing en CPU")
+    parser.add_argument("--stub-local-token-delay", type=float, default=0.12, help="segundos por palabra en CPU")
+    parser.add_argument("--failover-timeout", type=float, default=2.0, help="GROQ_TIMEOUT para la prueba de caída")
+    args = parser.parse_args()
+
+    with ExitStack() as stack:
+        groq_url, local_url = args.groq_url, args.local_url
+        if not groq_url:
+            groq_url, _ = stack.enter_context(groq_stub(delay=args.stub_groq_delay))
+        if not local_url:
+            local_url, _ = stack.enter_context(
+                groq_stub(delay=args.stub_local_delay, token_delay=args.stub_local_token_delay)
+            )
+        # La config se lee al importar
+        os.environ.update({
+            "GROQ_API_URL": groq_url,
+            "GROQ_API_KEY": args.groq_key or "stub",
+            "LOCAL_LLM_URL": local_url,
+            "LLM_BACKENDS": "groq,local",
+            "LLM_COOLDOWN_SECONDS": "300",
+        })
+        if args.local_model:
+            os.environ["LOCAL_LLM_MODEL"] = args.local_model
+
+        from app.services import llm_backends
+
+        report = {"backends": {}}
+        for name, backend in llm_backends.BACKENDS.items():
+            report["backends"][name] = {
+                "url": backend.url,
+                "model": backend.model,
+                "whole": _latency(backend, args.samples, stream=False),
+                "stream": _latency(backend, args.samples, stream=True),
+            }
+        hung_url, _ = stack.enter_context(groq_stub(delay=600))
+        report["failover"] = _failover(hung_url, args.failover_timeout, min(args.samples, 6))
+
+    print_json(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Salida hacia WhatsApp después de una ráfaga de moderación: ola de spam
+borrada de a un caso, expulsiones (borrado + baja por mensaje), avisos de
+confirmación a los moderadores y respuestas de apelaciones.
+
+Todo se encola con _queue_instructions y un "conector" consulta
+_connector_list_instructions como el de verdad (cada 3 s, de a 20, con ack).
+Los ritmos se aceleran `--scale` veces para no esperar minutos; los tiempos
+del reporte se pasan de vuelta a tiempo real. Compara contra mandar la cola
+tal cual: mensajes que salen y pico por destinatario en un minuto.
+
+    python benchmarks/bench_outbound.py --scale 100
+"""
+import argparse
+import importlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import print_json
+
+GROUP = "120363000000000001@g.us"
+MODERATORS = ["5491100000001", "5491100000002"]
+POLL_SECONDS = 3
+POLL_LIMIT = 20
+
+
+def _burst(rng: random.Random, spam: int, spammers: int, appeals: int) -> list[dict]:
+    """Cada lista por destinatario va en orden; entre destinatarios se mezclan"""
+    streams = defaultdict(list)
+    for i in range(spam):
+        key = {"remoteJid": GROUP, "id": f"SPAM{i}", "participant": f"54933{i % spammers:08d}@s.whatsapp.net"}
+        streams["spam"].append({"delete_message": True, "message_key": json.dumps(key)})
+    for i in range(spammers * 3):
+        participant = f"54933{i % spammers:08d}@s.whatsapp.net"
+        key = {"remoteJid": GROUP, "id": f"BAN{i}", "participant": participant}
+        streams["ban"].append({"delete_message": True, "message_key": json.dumps(key)})
+        streams["ban"].append({"remove_user": True, "chat_id": GROUP, "participant_jid": participant})
+    for i in range(spam // 2):
+        moderator = MODERATORS[i % len(MODERATORS)]
+        streams[moderator].append({
+            "send_message": True, "to": moderator,
+            "text": f"✅ Mensaje borrado.\nUsuario 54933{i % spammers:08d} ahora tiene {i // spammers + 1} strike(s).\n\nEscribe 'estoy' para siguiente caso.",
+        })
+    for i in range(appeals):
+        user = f"54955{i % 5:08d}"
+        text = "❌ Tu apelación fue revisada y rechazada.\n\nStrikes actuales: 2/3" if i % 2 else "✅ Tu apelación fue aceptada."
+        streams[user].append({"send_message": True, "to": user, "text": text})
+
+    order = [name for name, items in streams.items() for _ in items]
+    rng.shuffle(order)
+    positions = Counter()
+    burst = []
+    for name in order:
+        burst.append(streams[name][positions[name]])
+        positions[name] += 1
+    return burst
+
+
+def _peak_per_minute(times: list[float]) -> int:
+    times = sorted(times)
+    peak, start = 0, 0
+    for end, t in enumerate(times):
+        while t - times[start] >= 60:
+            start += 1
+        peak = max(peak, end - start + 1)
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=float, default=100, help="cuántas veces más rápido corre el reloj")
+    parser.add_argument("--spam", type=int, default=80)
+    parser.add_argument("--spammers", type=int, default=8)
+    parser.add_argument("--appeals", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    os.environ["DATABASE_URL"] = "sqlite:///./bot.db"
+    os.environ["METRICS_ENABLED"] = "0"
+    # Ritmos de config.py acelerados: se relee config antes de importar el resto de la app
+    import app.config
+    from app.config import OUTBOUND_BURST, OUTBOUND_GROUP_BURST, OUTBOUND_GROUP_PER_MINUTE, OUTBOUND_PER_MINUTE
+    os.environ["OUTBOUND_PER_MINUTE"] = str(OUTBOUND_PER_MINUTE * args.scale)
+    os.environ["OUTBOUND_GROUP_PER_MINUTE"] = str(OUTBOUND_GROUP_PER_MINUTE * args.scale)
+    importlib.reload(app.config)
+
+    from app.database import SessionLocal, init_schema
+    from app.main import _connector_list_instructions, _queue_instructions
+    from app.models import PendingInstruction
+    from app.utils import outbound
+
+    init_schema()
+    burst = _burst(random.Random(args.seed), args.spam, args.spammers, args.appeals)
+    with SessionLocal() as db:
+        _queue_instructions(db, burst)
+        db.commit()
+
+    unpaced = Counter(outbound.pacing_key(i) for i in burst)
+    sent = defaultdict(list)
+    polls = 0
+    started = time.perf_counter()
+    while True:
+        with SessionLocal() as db:
+            items = _connector_list_instructions(db, POLL_LIMIT)["instructions"]
+            now = (time.perf_counter() - started) * args.scale
+            for item in items:
+                sent[outbound.pacing_key(item["payload"])].append(now)
+                db.query(PendingInstruction).filter(PendingInstruction.id == item["id"]).update({"status": "processed"})
+            db.commit()
+            left = db.query(PendingInstruction).filter(PendingInstruction.status == "pending").count()
+        polls += 1
+        if not left:
+            break
+        time.sleep(POLL_SECONDS / args.scale)
+    drain = (time.perf_counter() - started) * args.scale
+
+    with SessionLocal() as db:
+        statuses = Counter(
+            (status, error) for status, error in db.query(PendingInstruction.status, PendingInstruction.error)
+        )
+
+    def kind(key):
+        return key.split(":", 1)[0] if key else "none"
+
+    report = {
+        "scale": args.scale,
+        "limits": {
+            "send": {"burst": OUTBOUND_BURST, "per_minute": OUTBOUND_PER_MINUTE},
+            "group": {"burst": OUTBOUND_GROUP_BURST, "per_minute": OUTBOUND_GROUP_PER_MINUTE},
+        },
+        "queued": len(burst),
+        "sent": sum(len(times) for times in sent.values()),
+        "coalesced": {error: count for (status, error), count in statuses.items() if status == "coalesced"},
+        "polls": polls,
+        "drain_s_real_time": round(drain, 1),
+        "by_recipient": {},
+    }
+    for key in sorted(unpaced, key=str):
+        report["by_recipient"][key] = {
+            "queued": unpaced[key],
+            "sent": len(sent.get(key, [])),
+            "peak_per_minute_unpaced": unpaced[key],
+            "peak_per_minute": _peak_per_minute(sent.get(key, [])),
+            "allowed_per_minute": int((OUTBOUND_GROUP_BURST + OUTBOUND_GROUP_PER_MINUTE) if kind(key) == "group" else (OUTBOUND_BURST + OUTBOUND_PER_MINUTE)),
+        }
+    print_json(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Re-clasificación masiva (reclassify_messages.py) sobre una base de datagen.
+
+Antes de cada corrida se dejan todas las etiquetas "viejas" (otra fuente)
+para que haya que reescribirlas. Mide filas/s y memoria pico con distintos
+procesos, una corrida sin cambios (solo lectura + clasificación) y que
+cortar y retomar desde el checkpoint deje todo igual.
+
+    python benchmarks/bench_reclassify.py --messages 1000000 --workers 0,1,4
+"""
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from benchmarks.common import print_json, rss_kb
+
+STALE_SOURCE = "heuristic_v1"
+
+
+def _mark_stale(db_path: str):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE messages SET category_label = 'GENERAL', intent_label = 'GENERAL', intent_source = ?", (STALE_SOURCE,))
+
+
+def _stale_rows(db_path: str) -> int:
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT count(*) FROM messages WHERE intent_source = ?", (STALE_SOURCE,)).fetchone()[0]
+
+
+def _children(pid: int) -> list[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def _run(workdir: str, db_path: str, *args) -> dict:
+    """reclassify_messages.py en un proceso aparte: resultado + memoria pico del proceso y de sus workers"""
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{db_path}", "SALE_MODEL_PATH": os.path.join(workdir, "sale_model.npz")}
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "reclassify_messages.py"), "--checkpoint", os.path.join(workdir, "checkpoint.json"), *args],
+        cwd=workdir, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    peaks = {}
+    while proc.poll() is None:
+        # VmHWM es el pico de cada proceso: alcanza con la última lectura antes de que termine
+        for pid in [proc.pid] + _children(proc.pid):
+            try:
+                peaks[pid] = rss_kb(pid)["peak_kb"] or peaks.get(pid, 0)
+            except OSError:
+                pass
+        time.sleep(0.05)
+    output = proc.stdout.read()
+    wall = time.perf_counter() - started
+    result = json.loads(output[output.index("\n{") + 1:])
+    workers = [peak for pid, peak in peaks.items() if pid != proc.pid]
+    return {
+        "workers": result["workers"],
+        "scanned": result["scanned"],
+        "changed": result["changed"],
+        "rows_per_s": result["rows_per_s"],
+        "wall_s": round(wall, 2),
+        "peak_rss_kb": {"main": peaks.get(proc.pid), "worker_max": max(workers) if workers else None},
+        "done": result["done"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--workers", default=f"0,1,{os.cpu_count() or 1}")
+    parser.add_argument("--chunk", type=int, default=5000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, "bench.db")
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "datagen.py"), "--out", db_path,
+         "--messages", str(args.messages), "--turns", "0"],
+        check=True, capture_output=True,
+    )
+    report = {"messages": args.messages, "cpus": os.cpu_count(), "datagen_s": round(time.perf_counter() - started, 1), "runs": []}
+
+    for workers in dict.fromkeys(int(w) for w in args.workers.split(",")):
+        _mark_stale(db_path)
+        report["runs"].append(_run(workdir, db_path, "--restart", "--workers", str(workers), "--chunk", str(args.chunk)))
+        assert _stale_rows(db_path) == 0
+
+    # Ya al día: se lee y clasifica todo pero no se escribe nada
+    report["already_current"] = _run(workdir, db_path, "--restart", "--workers", "1", "--chunk", str(args.chunk))
+
+    # Cortar a mitad y retomar
+    _mark_stale(db_path)
+    half = max(1, args.messages // args.chunk // 2)
+    first = _run(workdir, db_path, "--restart", "--workers", "1", "--chunk", str(args.chunk), "--max-chunks", str(half))
+    left = _stale_rows(db_path)
+    second = _run(workdir, db_path, "--workers", "1", "--chunk", str(args.chunk))
+    report["resume"] = {
+        "first": first,
+        "stale_after_first": left,
+        "second": second,
+        "stale_after_second": _stale_rows(db_path),
+        "scanned_total": first["scanned"] + second["scanned"],
+    }
+    print_json(report)
+
+
+if __name__ == "__main__":
+    main()
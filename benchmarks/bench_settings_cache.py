@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Cachés versionadas (app/utils/versioned_cache.py):
+
+1. propagación: con varias APIs sobre la misma base, cuánto tarda un
+   cambio de /admin/ai/config en verse en todas, con el watcher del bus y
+   sin él (STATE_WATCH_INTERVAL=0: chequeo cada STATE_CHECK_INTERVAL);
+2. costo por mensaje de buscar conocimiento: consulta completa a la base
+   (como antes) vs índice en memoria.
+
+    python benchmarks/bench_settings_cache.py --instances 3 --edits 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import get_json, percentiles, post_json, print_json, scratch_api
+
+
+def _propagation(instances: int, edits: int, watch_interval: str) -> dict:
+    """
+    Varias APIs sobre el mismo archivo SQLite (como workers en un host):
+    se edita en la primera y se mira cuándo lo ven todas las demás.
+    """
+    db_path = os.path.join(tempfile.mkdtemp(), "shared.db")
+    env = {"STATE_WATCH_INTERVAL": watch_interval, "DATABASE_URL": f"sqlite:///{db_path}"}
+    samples, reads = [], 0
+    with ExitStack() as stack:
+        urls = [stack.enter_context(scratch_api(env=env)) for _ in range(instances)]
+        for url in urls:
+            get_json(f"{url}/admin/ai/config")
+        for i in range(edits):
+            temperature = round(0.1 + (i % 9) / 10, 1)
+            post_json(f"{urls[0]}/admin/ai/config", {"temperature": temperature})
+            started = time.perf_counter()
+            pending = set(urls[1:])
+            while pending and time.perf_counter() - started < 10:
+                for url in list(pending):
+                    _, body, _ = get_json(f"{url}/admin/ai/config")
+                    reads += 1
+                    if body["temperature"] == temperature:
+                        pending.discard(url)
+            samples.append(time.perf_counter() - started)
+            time.sleep(0.2)
+    return {
+        "watch_interval": watch_interval,
+        "instances": instances,
+        "edits": edits,
+        "reads": reads,
+        "visible_everywhere": percentiles(samples),
+    }
+
+
+def _knowledge_lookup(entries: int, lookups: int) -> dict:
+    os.chdir(tempfile.mkdtemp())
+    os.environ["DATABASE_URL"] = "sqlite:///./bot.db"
+    from app.database import SessionLocal, init_schema
+    from app.models.knowledge import Knowledge
+    from app.utils import knowledge_index
+
+    init_schema()
+    db = SessionLocal()
+    try:
+        for i in range(entries):
+            db.add(Knowledge(key=f"k{i}", content=f"Dato {i}: " + "texto " * 40, tags=f"tema{i},barrio{i % 20},farmacia" if i % 10 == 0 else f"tema{i},barrio{i % 20}"))
+        db.commit()
+    finally:
+        db.close()
+    message = "alguien sabe de la farmacia del barrio7?"
+
+    def full_query():
+        session = SessionLocal()
+        try:
+            text = message.lower()
+            found = []
+            for k in session.query(Knowledge).filter(Knowledge.enabled == True).all():
+                tags = [t.strip().lower() for t in (k.tags or "").split(",")]
+                hits = [tag for tag in tags if tag and tag in text]
+                if hits:
+                    found.append((len(hits), sum(len(tag) for tag in hits), k.content))
+            found.sort(key=lambda item: (item[0], item[1]), reverse=True)
+            return [content for _, _, content in found]
+        finally:
+            session.close()
+
+    results = {}
+    for name, fn in (("query_each_message", full_query), ("versioned_index", lambda: knowledge_index.relevant(message))):
+        expected = fn()
+        samples = []
+        for _ in range(lookups):
+            started = time.perf_counter()
+            assert fn() == expected
+            samples.append(time.perf_counter() - started)
+        results[name] = {"matches": len(expected), **percentiles(samples)}
+    return {"entries": entries, "lookups": lookups, **results}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--instances", type=int, default=3)
+    parser.add_argument("--edits", type=int, default=20)
+    parser.add_argument("--knowledge", type=int, default=300)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    report = {
+        "propagation": [_propagation(args.instances, args.edits, interval) for interval in ("0", "0.5")],
+        "knowledge": _knowledge_lookup(args.knowledge, args.lookups),
+    }
+    print_json(report)
+
+
+if __name__ == "__main__":
+    main()
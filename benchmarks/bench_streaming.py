@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Tiempo hasta el primer mensaje de la IA en /conversation: respuesta entera
+vs streaming (NDJSON, la primera oración sale apenas la manda Groq).
+
+El stub responde por SSE una palabra cada --token-delay segundos, como Groq.
+Cada usuario entra con "ia" y después manda una pregunta.
+
+    python benchmarks/bench_streaming.py --users 40 --concurrency 8 --token-delay 0.05
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from urllib import request
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import percentiles, post_json, print_json, run_concurrent, scratch_api
+from benchmarks.groq_stub import groq_stub
+
+QUESTION = "alguien sabe a qué hora abre la farmacia de turno?"
+
+
+def _payload(phone: str, message: str, stream: bool = False) -> dict:
+    payload = {"phone": phone, "real_phone": phone, "message": message, "name": "Vecino"}
+    if stream:
+        payload["stream"] = True
+    return payload
+
+
+def _ask_whole(base_url: str, phone: str) -> dict:
+    started = time.perf_counter()
+    status, body, _ = post_json(f"{base_url}/conversation", _payload(phone, QUESTION))
+    elapsed = time.perf_counter() - started
+    return {"status": status, "first": elapsed, "last": elapsed, "parts": 1 if body.get("instructions") else 0}
+
+
+def _ask_stream(base_url: str, phone: str) -> dict:
+    """Lee el NDJSON línea por línea y anota cuándo llega cada parte"""
+    req = request.Request(
+        f"{base_url}/conversation",
+        data=json.dumps(_payload(phone, QUESTION, stream=True)).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    started = time.perf_counter()
+    first = last = None
+    parts = 0
+    with request.urlopen(req, timeout=60) as response:
+        for line in response:
+            if not line.strip():
+                continue
+            last = time.perf_counter() - started
+            first = first if first is not None else last
+            if json.loads(line).get("instructions"):
+                parts += 1
+        status = response.status
+    return {"status": status, "first": first, "last": last, "parts": parts}
+
+
+def _run(stream: bool, users: int, concurrency: int, delay: float, token_delay: float) -> dict:
+    with groq_stub(delay=delay, token_delay=token_delay) as (url, _):
+        env = {"GROQ_API_URL": url, "GROQ_API_KEY": "stub"}
+        with scratch_api(env=env) as base_url:
+            phones = [f"54922{i:08d}" for i in range(users)]
+            for phone in phones:
+                post_json(f"{base_url}/conversation", _payload(phone, "ia"))
+
+            ask = _ask_stream if stream else _ask_whole
+            results = []
+
+            def call(phone):
+                result = ask(base_url, phone)
+                results.append(result)
+                return result["status"], None, result["last"]
+
+            _, errors, elapsed = run_concurrent(call, phones, concurrency)
+
+    return {
+        "mode": "stream" if stream else "entera",
+        "users": users,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "errors": len(errors),
+        "parts_per_reply": round(sum(r["parts"] for r in results) / len(results), 2) if results else None,
+        "first_message": percentiles([r["first"] for r in results if r["first"] is not None]),
+        "last_message": percentiles([r["last"] for r in results if r["last"] is not None]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--groq-delay", type=float, default=0.3, help="segundos hasta el primer token")
+    parser.add_argument("--token-delay", type=float, default=0.05, help="segundos entre palabras")
+    args = parser.parse_args()
+
+    runs = [_run(stream, args.users, args.concurrency, args.groq_delay, args.token_delay) for stream in (False, True)]
+    print_json({"runs": runs})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Memoria y tiempo de listar todos los usuarios: /users completo vs
+paginado por cursor vs stream NDJSON con columnas proyectadas.
+
+Cada variante corre en una API nueva para que el pico de memoria
+(VmHWM) sea solo suyo. Solo Linux.
+
+    python benchmarks/bench_users_memory.py --users 100000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from urllib import request
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import get_json, print_json, rss_kb, scratch_api_process
+
+FIELDS = "strikes,status"
+
+
+def _full(base_url: str) -> tuple[int, int]:
+    with request.urlopen(f"{base_url}/users", timeout=600) as response:
+        body = response.read()
+    return len(body), body.count(b'"phone"')
+
+
+def _paged(base_url: str) -> tuple[int, int]:
+    after_id, size, users = 0, 0, 0
+    while after_id is not None:
+        with request.urlopen(f"{base_url}/users/page?after_id={after_id}&limit=2000&fields={FIELDS}", timeout=600) as response:
+            body = response.read()
+        size += len(body)
+        page = json.loads(body)
+        users += len(page["users"])
+        after_id = page["next_after_id"]
+    return size, users
+
+
+def _stream(base_url: str) -> tuple[int, int]:
+    size, users = 0, 0
+    with request.urlopen(f"{base_url}/users/stream?fields={FIELDS}", timeout=600) as response:
+        for line in response:
+            size += len(line)
+            users += 1
+    return size, users
+
+
+VARIANTS = {"full": _full, "paged": _paged, "stream": _stream}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--only", nargs="+", choices=sorted(VARIANTS), default=list(VARIANTS))
+    args = parser.parse_args()
+
+    from benchmarks.datagen import generate
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="bot_users_"), "users.db")
+    generate(out=db_path, users=args.users, messages=0, groups=1, appeal_ratio=0, turns=0,
+             sale_ratio=0, question_ratio=0, seed=42, days=1)
+
+    results = []
+    for name in args.only:
+        with scratch_api_process(db_source=db_path, env={"METRICS_ENABLED": "0"}) as (base_url, proc):
+            get_json(f"{base_url}/ping")
+            before = rss_kb(proc.pid)
+            started = time.perf_counter()
+            size, count = VARIANTS[name](base_url)
+            elapsed = time.perf_counter() - started
+            after = rss_kb(proc.pid)
+        results.append({
+            "variant": name,
+            "users": count,
+            "elapsed_s": round(elapsed, 3),
+            "response_mb": round(size / 1024 / 1024, 2),
+            "server_rss_before_mb": round(before["rss_kb"] / 1024, 1),
+            "server_peak_mb": round(after["peak_kb"] / 1024, 1),
+            "server_peak_growth_mb": round((after["peak_kb"] - before["rss_kb"]) / 1024, 1),
+        })
+
+    print_json({"users": args.users, "fields": FIELDS, "runs": results})
+
+
+if __name__ == "__main__":
+    main()
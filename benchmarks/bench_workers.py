@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Escalado de la API con 1..N workers de uvicorn sobre la misma base.
+
+Mide throughput de /ingest_message y verifica que ningún caso se asigne
+a dos moderadores cuando varios piden /moderation/next al mismo tiempo.
+
+    python benchmarks/bench_workers.py --workers 1 2 4 --messages 2000
+"""
+import argparse
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import ADMIN_PHONE, GROUP_ID
+from benchmarks.common import get_json, percentiles, post_json, print_json, run_concurrent, scratch_api
+
+CASE_RE = re.compile(r"CASO #(\d+)")
+
+
+def _ingest_payload(i: int) -> dict:
+    sender = f"549110000{i % 500:04d}"
+    content = "vendo zapatillas $20000 al privado" if i % 4 == 0 else "hola vecinos, alguien sabe si hay luz?"
+    return {
+        "phone": sender,
+        "real_phone": sender,
+        "name": "Vecino",
+        "chat_id": GROUP_ID,
+        "is_group": True,
+        "message_type": "text",
+        "content": content,
+        "whatsapp_message_key": f'{{"remoteJid": "{GROUP_ID}", "id": "W{i}"}}',
+        "participant_jid": f"{sender}@s.whatsapp.net",
+    }
+
+
+def _run(workers: int, messages: int, concurrency: int, moderators: int) -> dict:
+    with scratch_api(workers=workers) as base_url:
+        latencies, errors, elapsed = run_concurrent(
+            lambda i: post_json(f"{base_url}/ingest_message", _ingest_payload(i)),
+            range(messages),
+            concurrency,
+        )
+
+        mod_phones = [f"2954{i:06d}" for i in range(moderators)]
+        for phone in mod_phones:
+            post_json(f"{base_url}/moderators/command", {"phone": ADMIN_PHONE, "content": f"agregar mod {phone}"})
+
+        def claim(phone):
+            claimed = []
+            while True:
+                _, body, _ = get_json(f"{base_url}/moderation/next?phone={phone}")
+                match = CASE_RE.search(body["instructions"]["text"])
+                if not match:
+                    return claimed
+                claimed.append(int(match.group(1)))
+
+        with ThreadPoolExecutor(max_workers=moderators) as pool:
+            claims = [case_id for batch in pool.map(claim, mod_phones) for case_id in batch]
+
+    return {
+        "workers": workers,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "errors": len(errors),
+        "latency": percentiles(latencies),
+        "cases_claimed": len(claims),
+        "duplicate_claims": len(claims) - len(set(claims)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--moderators", type=int, default=8)
+    args = parser.parse_args()
+
+    results = [_run(w, args.messages, args.concurrency, args.moderators) for w in args.workers]
+    base = results[0]["throughput_rps"] or 1
+    for result in results:
+        result["speedup"] = round((result["throughput_rps"] or 0) / base, 2)
+    print_json({"runs": results})
+
+
+if __name__ == "__main__":
+    main()
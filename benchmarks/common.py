@@ -0,0 +1,173 @@
+"""Utilidades compartidas por los benchmarks: API descartable, HTTP y percentiles."""
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib import request, error
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def http_json(method: str, url: str, payload=None, timeout: float = 30):
+    """Hace un request JSON y devuelve (status, body, segundos)"""
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = request.Request(
+        url,
+        data=data,
+        headers={"Content-Type": "application/json"},
+        method=method,
+    )
+    started = time.perf_counter()
+    try:
+        with request.urlopen(req, timeout=timeout) as response:
+            body = response.read()
+            status = response.status
+    except error.HTTPError as e:
+        body = e.read() if e.fp else b""
+        status = e.code
+    elapsed = time.perf_counter() - started
+    try:
+        parsed = json.loads(body.decode("utf-8")) if body else None
+    except ValueError:
+        parsed = body.decode("utf-8", errors="replace")
+    return status, parsed, elapsed
+
+
+def post_json(url: str, payload: dict, timeout: float = 30):
+    return http_json("POST", url, payload, timeout)
+
+
+def get_json(url: str, timeout: float = 30):
+    return http_json("GET", url, None, timeout)
+
+
+def wait_until_up(base_url: str, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            status, _, _ = get_json(f"{base_url}/ping", timeout=2)
+            if status == 200:
+                return
+        except (error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"La API no levantó en {timeout}s ({base_url})")
+
+
+@contextmanager
+def scratch_api(workers: int = 1, env: dict | None = None, db_source: str | None = None, port: int | None = None):
+    """
+    Levanta uvicorn en un directorio temporal con su propio bot.db.
+    Si se pasa db_source se copia esa base como punto de partida.
+    """
+    with scratch_api_process(workers, env, db_source, port) as (base_url, _):
+        yield base_url
+
+
+@contextmanager
+def scratch_api_process(workers: int = 1, env: dict | None = None, db_source: str | None = None, port: int | None = None):
+    """Igual que scratch_api pero devuelve también el proceso (para medir memoria)"""
+    workdir = tempfile.mkdtemp(prefix="bot_bench_")
+    if db_source:
+        shutil.copy(db_source, os.path.join(workdir, "bot.db"))
+
+    port = port or free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    proc_env = dict(os.environ)
+    proc_env["PYTHONPATH"] = REPO_ROOT + os.pathsep + proc_env.get("PYTHONPATH", "")
+    proc_env["DATABASE_URL"] = "sqlite:///./bot.db"
+    proc_env.update(env or {})
+
+    log_path = os.path.join(workdir, "uvicorn.log")
+    with open(log_path, "wb") as log_file:
+        proc = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "app.main:app",
+                "--host", "127.0.0.1", "--port", str(port),
+                "--workers", str(workers), "--log-level", "warning",
+            ],
+            cwd=workdir,
+            env=proc_env,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+        )
+        try:
+            wait_until_up(base_url)
+            yield base_url, proc
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def percentiles(samples: list[float]) -> dict:
+    """p50/p95/p99 en milisegundos"""
+    if not samples:
+        return {"count": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    ordered = sorted(samples)
+
+    def pick(q):
+        index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+        return round(ordered[index] * 1000, 2)
+
+    return {
+        "count": len(ordered),
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+def run_concurrent(fn, items, concurrency: int):
+    """
+    Ejecuta fn(item) con N hilos.
+    Devuelve (latencias, errores, segundos totales).
+    """
+    latencies = []
+    errors = []
+
+    def call(item):
+        try:
+            status, body, elapsed = fn(item)
+            if status >= 400:
+                errors.append({"status": status, "body": body})
+            else:
+                latencies.append(elapsed)
+        except Exception as e:
+            errors.append({"error": str(e)})
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, items))
+    return latencies, errors, time.perf_counter() - started
+
+
+def rss_kb(pid: int) -> dict:
+    """Memoria residente actual y pico (VmRSS / VmHWM) de un proceso, en KB. Solo Linux."""
+    values = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(("VmRSS:", "VmHWM:")):
+                key, value = line.split(":", 1)
+                values[key] = int(value.split()[0])
+    return {"rss_kb": values.get("VmRSS"), "peak_kb": values.get("VmHWM")}
+
+
+def print_json(data: dict):
+    print(json.dumps(data, indent=2, ensure_ascii=False))
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Compara dos resultados de workloads.py (p.ej. main vs una rama).
+
+    python benchmarks/compare.py antes.json despues.json --threshold 0.15
+
+Sale con código 1 si algún workload empeora su p95 o su throughput más
+que el umbral.
+"""
+import argparse
+import json
+import sys
+
+
+def _ratio(before, after):
+    if not before or after is None:
+        return None
+    return (after - before) / before
+
+
+def compare(before: dict, after: dict, threshold: float) -> tuple[list[dict], bool]:
+    rows = []
+    regressed = False
+    for name, old in before.get("workloads", {}).items():
+        new = after.get("workloads", {}).get(name)
+        if not new:
+            continue
+        p95_change = _ratio(old["latency"]["p95_ms"], new["latency"]["p95_ms"])
+        rps_change = _ratio(old["throughput_rps"], new["throughput_rps"])
+        worse = (p95_change is not None and p95_change > threshold) or (rps_change is not None and rps_change < -threshold)
+        regressed = regressed or worse
+        rows.append({
+            "workload": name,
+            "p50_ms": [old["latency"]["p50_ms"], new["latency"]["p50_ms"]],
+            "p95_ms": [old["latency"]["p95_ms"], new["latency"]["p95_ms"]],
+            "p99_ms": [old["latency"]["p99_ms"], new["latency"]["p99_ms"]],
+            "throughput_rps": [old["throughput_rps"], new["throughput_rps"]],
+            "p95_change": round(p95_change, 3) if p95_change is not None else None,
+            "throughput_change": round(rps_change, 3) if rps_change is not None else None,
+            "regression": worse,
+        })
+    return rows, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    rows, regressed = compare(before, after, args.threshold)
+    print(json.dumps({
+        "before": before.get("commit"),
+        "after": after.get("commit"),
+        "threshold": args.threshold,
+        "workloads": rows,
+        "regressed": regressed,
+    }, indent=2, ensure_ascii=False))
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Generador de datos sintéticos: usuarios, mensajes de grupo (mezcla realista de
+ventas / preguntas / charla), casos, apelaciones y turnos de conversación.
+
+    python benchmarks/datagen.py --out /tmp/bench.db --users 5000 --messages 100000
+
+La base resultante se usa como punto de partida de los workloads
+(`scratch_api(db_source=...)`). Con la misma --seed sale siempre igual.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SALE_TEXTS = [
+    "vendo bici rodado 26 $50000 al privado",
+    "VENDO heladera no frost impecable, consultas por privado",
+    "promo 2x1 en empanadas, pedidos al privado",
+    "vendo zapatillas talle 40 nuevas $20000",
+    "hago envíos, precio por mayor, escribime",
+    "se vende perrito caniche, $15000 con vacunas",
+    "oferta: corte de pasto y poda, presupuesto sin cargo",
+    "vendo auto 2012 titular, acepto permuta",
+]
+QUESTION_TEXTS = [
+    "alguien sabe a que hora abre la farmacia?",
+    "se cortó la luz en el barrio?",
+    "hay colectivo hoy por el paro?",
+    "alguien conoce un plomero de confianza?",
+    "a qué hora pasa el recolector?",
+    "saben si mañana hay clases?",
+    "donde queda la salita nueva?",
+]
+CHAT_TEXTS = [
+    "hola buen dia a todos",
+    "gracias vecinos!",
+    "que lindo dia hoy",
+    "jajaja tal cual",
+    "buenas noches grupo",
+    "se perdió un gato naranja por la plaza, si lo ven avisen",
+    "felicitaciones a los chicos del club!",
+    "ojo que están cortando la calle principal",
+]
+APPEAL_NOTES = [
+    "no estaba vendiendo, solo preguntaba el precio",
+    "perdón, no sabía la regla, no lo vuelvo a hacer",
+    "era un regalo, no una venta",
+    "me confundí de grupo",
+]
+CONVERSATION_TEXTS = [
+    ("user", "hola, qué onda el grupo?"),
+    ("assistant", "Hola! Es el grupo del barrio, acá se comparte info útil."),
+    ("user", "se puede vender algo?"),
+    ("assistant", "No, las ventas no están permitidas en el grupo."),
+    ("user", "a qué hora abre el municipio?"),
+    ("assistant", "Abre de 8 a 14 de lunes a viernes."),
+]
+
+
+def _pick_text(rng: random.Random, sale_ratio: float, question_ratio: float) -> str:
+    roll = rng.random()
+    if roll < sale_ratio:
+        return rng.choice(SALE_TEXTS)
+    if roll < sale_ratio + question_ratio:
+        return rng.choice(QUESTION_TEXTS)
+    return rng.choice(CHAT_TEXTS)
+
+
+def generate(
+        out: str,
+        users: int,
+        messages: int,
+        groups: int,
+        appeal_ratio: float,
+        turns: int,
+        sale_ratio: float,
+        question_ratio: float,
+        seed: int,
+        days: int,
+        batch: int = 5000
+) -> dict:
+    if os.path.exists(out):
+        os.remove(out)
+    # La URL se fija antes de importar app.database
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(out)}"
+
+    from sqlalchemy import insert
+    from app.config import GROUP_ID, ADMIN_PHONE
+    from app.database import engine, init_schema
+    from app.models import User, Message, Case, UserAction, Group
+    from app.models.conversation import ConversationTurn
+    from app.utils.message_analysis import analyze_message
+
+    init_schema()
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    now = datetime.now()
+
+    chat_ids = [GROUP_ID] + [f"1203630000000{i:05d}@g.us" for i in range(1, groups)]
+    with engine.begin() as conn:
+        conn.execute(insert(Group), [
+            {"chat_id": chat_id, "name": f"Barrio {i}", "active": True, "max_strikes": 3}
+            for i, chat_id in enumerate(chat_ids)
+        ])
+
+        phones = [f"54911{i:08d}" for i in range(users)]
+        user_rows = [
+            {"id": i + 1, "phone": phone, "real_phone": phone, "name": f"Vecino {i}", "strikes": 0, "status": "active"}
+            for i, phone in enumerate(phones)
+        ]
+        for start in range(0, len(user_rows), batch):
+            conn.execute(insert(User), user_rows[start:start + batch])
+
+        strikes = [0] * users
+        message_rows, case_rows, action_rows = [], [], []
+        case_id = 0
+        resolved_cases = []
+
+        def flush():
+            if message_rows:
+                conn.execute(insert(Message), message_rows)
+                message_rows.clear()
+            if case_rows:
+                conn.execute(insert(Case), case_rows)
+                case_rows.clear()
+            if action_rows:
+                conn.execute(insert(UserAction), action_rows)
+                action_rows.clear()
+
+        for i in range(messages):
+            # Un 30% del tráfico lo hacen unos pocos usuarios muy activos
+            if rng.random() < 0.3:
+                user_index = min(int(rng.paretovariate(1.2)) - 1, users - 1)
+            else:
+                user_index = rng.randrange(users)
+            chat_id = chat_ids[i % len(chat_ids)]
+            text = _pick_text(rng, sale_ratio, question_ratio)
+            analysis = analyze_message(message_type="text", content=text)
+            created = now - timedelta(seconds=rng.randrange(days * 86400))
+            flagged = analysis["category_label"] == "SALE"
+            message_id = i + 1
+            message_rows.append({
+                "id": message_id,
+                "user_id": user_index + 1,
+                "chat_id": chat_id,
+                "is_group": True,
+                "message_type": "text",
+                "content": text,
+                "whatsapp_message_key": json.dumps({"remoteJid": chat_id, "id": f"GEN{i}"}),
+                "whatsapp_message_id": f"{chat_id}/GEN{i}",
+                "participant_jid": f"{phones[user_index]}@s.whatsapp.net",
+                "flagged": flagged,
+                "category_label": analysis["category_label"],
+                "intent_label": analysis["intent_label"],
+                "intent_source": analysis["intent_source"],
+                "contains_question": analysis["contains_question"],
+                "contains_link": analysis["contains_link"],
+                "content_length": analysis["content_length"],
+                "created_at": created,
+            })
+
+            if flagged:
+                case_id += 1
+                # La mayoría de los casos viejos ya están resueltos
+                resolved = rng.random() < 0.8
+                case_rows.append({
+                    "id": case_id,
+                    "type": "infringement",
+                    "status": "resolved" if resolved else "pending",
+                    "priority": 1,
+                    "message_id": message_id,
+                    "chat_id": chat_id,
+                    "resolution": "delete" if resolved else None,
+                    "resolved_by": str(ADMIN_PHONE) if resolved else None,
+                    "resolved_at": created + timedelta(minutes=5) if resolved else None,
+                    "created_at": created,
+                })
+                if resolved:
+                    strikes[user_index] += 1
+                    resolved_cases.append((case_id, message_id, chat_id, user_index, created))
+                    action_rows.append({
+                        "user_id": user_index + 1,
+                        "case_id": case_id,
+                        "action": "deleted",
+                        "note": "datagen",
+                        "moderator_phone": str(ADMIN_PHONE),
+                        "created_at": created + timedelta(minutes=5),
+                    })
+
+            if len(message_rows) >= batch:
+                flush()
+        flush()
+
+        appeals = 0
+        for original_id, message_id, chat_id, user_index, created in resolved_cases:
+            if rng.random() >= appeal_ratio:
+                continue
+            case_id += 1
+            appeals += 1
+            case_rows.append({
+                "id": case_id,
+                "type": "appeal",
+                "status": "pending" if rng.random() < 0.5 else "resolved",
+                "priority": 0,
+                "message_id": message_id,
+                "chat_id": chat_id,
+                "original_case_id": original_id,
+                "note": rng.choice(APPEAL_NOTES),
+                "created_at": created + timedelta(hours=1),
+            })
+            if len(case_rows) >= batch:
+                flush()
+        flush()
+
+        for index, count in enumerate(strikes):
+            if count:
+                conn.execute(
+                    User.__table__.update()
+                    .where(User.__table__.c.id == index + 1)
+                    .values(strikes=count, status="banned" if count >= 3 else "warned")
+                )
+
+        turn_rows = []
+        for i in range(turns):
+            role, content = CONVERSATION_TEXTS[i % len(CONVERSATION_TEXTS)]
+            turn_rows.append({
+                "user_phone": phones[(i // len(CONVERSATION_TEXTS)) % users],
+                "role": role,
+                "content": content,
+                "created_at": now - timedelta(seconds=turns - i),
+            })
+            if len(turn_rows) >= batch:
+                conn.execute(insert(ConversationTurn), turn_rows)
+                turn_rows.clear()
+        if turn_rows:
+            conn.execute(insert(ConversationTurn), turn_rows)
+
+    return {
+        "out": out,
+        "users": users,
+        "messages": messages,
+        "groups": len(chat_ids),
+        "cases": case_id,
+        "appeals": appeals,
+        "conversation_turns": turns,
+        "elapsed_s": round(time.perf_counter() - started, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", default="bench.db")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--groups", type=int, default=3)
+    parser.add_argument("--appeal-ratio", type=float, default=0.1)
+    parser.add_argument("--turns", type=int, default=5000)
+    parser.add_argument("--sale-ratio", type=float, default=0.12)
+    parser.add_argument("--question-ratio", type=float, default=0.25)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    result = generate(
+        out=args.out,
+        users=args.users,
+        messages=args.messages,
+        groups=args.groups,
+        appeal_ratio=args.appeal_ratio,
+        turns=args.turns,
+        sale_ratio=args.sale_ratio,
+        question_ratio=args.question_ratio,
+        seed=args.seed,
+        days=args.days,
+    )
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Modelo de ventas vs heuristic_v2 con decisiones de moderadores sintéticas.
+
+Arma una base con mensajes que la heurística marca como SALE: ventas de
+verdad y los falsos positivos de siempre (entradas gratis, promos de la
+salita, preguntas por precios...), armados de partes para que no se
+repitan. Los casos se resuelven delete/ignore según la verdad, con un
+poco de ruido de moderador, y una parte se clasifica en el dashboard.
+Después corre evaluate() (validación cruzada), entrena y mide lo que
+cuesta puntuar un mensaje suelto vs en lote.
+
+    python benchmarks/eval_sale_model.py --labels 4000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import percentiles, print_json
+
+SALE_ITEMS = ["bici rodado 26", "heladera no frost", "zapatillas talle 40", "sillón 3 cuerpos", "celular samsung a12",
+              "cochecito de bebé", "garrafa de 10kg", "mesa de algarrobo", "campera de cuero", "termotanque 80 litros"]
+SALE_TEMPLATES = [
+    "vendo {item} ${price} al privado",
+    "VENDO {item} impecable, consultas por privado",
+    "se vende {item}, ${price}, acepto permuta",
+    "promo {item} a ${price}, hago envios",
+    "{item} nuevo, precio ${price}, escribime",
+    "liquido {item} ${price} negociable",
+    "oferta {item}! {price} mil, retiro en el barrio",
+]
+NOT_SALE_TEMPLATES = [
+    "hay entradas gratis para el acto de la escuela {place}",
+    "alguien sabe si quedan entradas para la kermesse de {place}?",
+    "promo de vacunación en la salita de {place} el sábado",
+    "alguien sabe el precio del boleto a {place}?",
+    "subió el precio de la garrafa otra vez, ojo",
+    "se corta el delivery de la farmacia de {place}?",
+    "la entrada de {place} está cortada por obras",
+    "reserva natural {place}: visitas guiadas gratis",
+    "qué precio tiene el arreglo de la vereda en {place}?",
+    "el club de {place} publicó el horario de la colonia",
+]
+PLACES = ["la plaza", "villa sur", "el centro", "barrio norte", "la costanera", "el club", "la ruta 7", "san martín"]
+
+
+def _text(rng: random.Random, sale: bool) -> str:
+    if sale:
+        return rng.choice(SALE_TEMPLATES).format(item=rng.choice(SALE_ITEMS), price=rng.randrange(5, 300) * 1000)
+    return rng.choice(NOT_SALE_TEMPLATES).format(place=rng.choice(PLACES))
+
+
+def _build(labels: int, sale_ratio: float, noise: float, reviewed_ratio: float, seed: int) -> dict:
+    from sqlalchemy import insert
+
+    from app.config import GROUP_ID
+    from app.database import engine, init_schema
+    from app.models import Case, Message, User
+    from app.utils.message_analysis import analyze_message
+
+    init_schema()
+    rng = random.Random(seed)
+    now = datetime.now()
+    messages, cases, flagged = [], [], 0
+    for i in range(labels):
+        sale = rng.random() < sale_ratio
+        text = _text(rng, sale)
+        analysis = analyze_message("text", text)
+        flagged += analysis["category_label"] == "SALE"
+        created = now - timedelta(minutes=labels - i)
+        reviewed = rng.random() < reviewed_ratio
+        messages.append({
+            "id": i + 1, "user_id": 1, "chat_id": GROUP_ID, "is_group": True, "message_type": "text",
+            "content": text, "category_label": analysis["category_label"], "intent_label": analysis["intent_label"],
+            "intent_source": analysis["intent_source"], "flagged": analysis["category_label"] == "SALE",
+            "reviewed_category_label": ("SALE" if sale else "QUESTION") if reviewed else None,
+            "reviewed_at": created + timedelta(minutes=1) if reviewed else None,
+            "created_at": created,
+        })
+        if analysis["category_label"] == "SALE" and not reviewed:
+            decided_sale = sale if rng.random() >= noise else not sale
+            cases.append({
+                "type": "infringement", "status": "resolved", "priority": 1, "message_id": i + 1, "chat_id": GROUP_ID,
+                "resolution": "deleted" if decided_sale else "ignored", "resolved_at": created + timedelta(minutes=5),
+                "created_at": created,
+            })
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": 1, "phone": "5491100000000", "name": "Vecino", "strikes": 0, "status": "active"}])
+        conn.execute(insert(Message), messages)
+        conn.execute(insert(Case), cases)
+    return {"messages": labels, "heuristic_flagged": flagged, "resolved_cases": len(cases)}
+
+
+def _scoring(model, texts: list[str], batch: int) -> dict:
+    singles = []
+    for text in texts:
+        started = time.perf_counter()
+        model.probabilities([text])
+        singles.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    for start in range(0, len(texts), batch):
+        model.probabilities(texts[start:start + batch])
+    elapsed = time.perf_counter() - started
+    return {
+        "one_by_one": percentiles(singles),
+        "batched": {"batch": batch, "messages_per_s": round(len(texts) / elapsed)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--labels", type=int, default=4000)
+    parser.add_argument("--sale-ratio", type=float, default=0.35)
+    parser.add_argument("--noise", type=float, default=0.05, help="decisiones de moderador equivocadas")
+    parser.add_argument("--reviewed", type=float, default=0.1, help="parte clasificada desde el dashboard")
+    parser.add_argument("--batch", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    os.environ["DATABASE_URL"] = "sqlite:///./bot.db"
+    os.environ["SALE_MODEL_PATH"] = os.path.join(workdir, "sale_model.npz")
+
+    from app.services.sale_training import evaluate, train
+    from app.utils.message_analysis import _normalize_text
+    from app.utils.sale_model import SaleModel
+
+    data = _build(args.labels, args.sale_ratio, args.noise, args.reviewed, args.seed)
+    evaluation = evaluate()
+    training = train(full=True)
+    rng = random.Random(args.seed + 1)
+    texts = [_normalize_text(_text(rng, rng.random() < 0.5)) for _ in range(20000)]
+    scoring = _scoring(SaleModel.load(os.environ["SALE_MODEL_PATH"]), texts, args.batch)
+    print_json({"data": data, "evaluation": evaluation, "training": training, "scoring": scoring})
+
+
+if __name__ == "__main__":
+    main()
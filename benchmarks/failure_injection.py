@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Fallas inyectadas en el stub de Groq para probar el circuit breaker de la IA.
+
+Con la API levantada (solo Groq, sin respaldo local) se pasa por:
+sano -> caída con 503 -> recuperación -> colgado (timeouts) -> recuperación
+-> lento pero respondiendo -> recuperación. En cada etapa se miden las
+respuestas de /conversation y el estado del circuito en /admin/llm y
+/metrics. Sale con código 1 si algún chequeo falla.
+
+    python benchmarks/failure_injection.py
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import get_json, percentiles, post_json, print_json, scratch_api
+from benchmarks.groq_stub import REPLY, groq_stub
+
+QUESTION = "a qué hora abre la farmacia de turno?"
+CANNED = "La IA no está respondiendo ahora"
+
+
+class _Run:
+    def __init__(self, base_url: str, server):
+        self.base_url = base_url
+        self.server = server
+        self.users = 0
+        self.checks = []
+
+    def ask(self, message: str) -> tuple[str, float]:
+        """Usuario nuevo: entra a la IA y pregunta"""
+        self.users += 1
+        phone = f"54944{self.users:08d}"
+        payload = {"phone": phone, "real_phone": phone, "name": "Vecino"}
+        post_json(f"{self.base_url}/conversation", {**payload, "message": "ia"})
+        status, body, elapsed = post_json(f"{self.base_url}/conversation", {**payload, "message": message})
+        text = body["instructions"]["text"] if status == 200 and body.get("instructions") else ""
+        return text, elapsed
+
+    def breaker(self) -> dict:
+        _, body, _ = get_json(f"{self.base_url}/admin/llm")
+        return next(b for b in body["backends"] if b["name"] == "groq")["breaker"]
+
+    def check(self, stage: str, name: str, ok: bool, detail=None):
+        self.checks.append({"stage": stage, "check": name, "ok": bool(ok), "detail": detail})
+        print(f"{'✅' if ok else '❌'} [{stage}] {name}" + (f": {detail}" if detail is not None else ""))
+
+    def stage(self, name: str, messages: int, message: str = QUESTION) -> dict:
+        calls_before = self.server.calls
+        replies = [self.ask(message) for _ in range(messages)]
+        return {
+            "stage": name,
+            "groq_calls": self.server.calls - calls_before,
+            "latency": percentiles([elapsed for _, elapsed in replies]),
+            "replies": replies,
+            "breaker": self.breaker(),
+        }
+
+    def recover(self, cooldown: float) -> dict:
+        self.server.fail_every = 0
+        self.server.delay = 0.0
+        time.sleep(cooldown + 0.2)
+        result = self.stage("recuperación", 2, "hola, cómo va?")
+        self.check("recuperación", "la prueba de half_open cierra el circuito", result["breaker"]["state"] == "closed",
+                   result["breaker"]["state"])
+        self.check("recuperación", "vuelve a responder la IA", all(REPLY in text for text, _ in result["replies"]))
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=8, help="mensajes por etapa")
+    parser.add_argument("--timeout", type=float, default=1.0, help="GROQ_TIMEOUT")
+    parser.add_argument("--cooldown", type=float, default=2.0, help="LLM_COOLDOWN_SECONDS")
+    args = parser.parse_args()
+
+    stages = []
+    with groq_stub(delay=0.0) as (url, server):
+        env = {
+            "GROQ_API_URL": url,
+            "GROQ_API_KEY": "stub",
+            "LLM_BACKENDS": "groq",
+            "GROQ_TIMEOUT": str(args.timeout),
+            "GROQ_SLOW_SECONDS": str(args.timeout / 2),
+            "LLM_COOLDOWN_SECONDS": str(args.cooldown),
+            "LLM_BREAKER_MIN_CALLS": "4",
+            "AI_COALESCE": "0",
+        }
+        with scratch_api(env=env) as base_url:
+            run = _Run(base_url, server)
+
+            healthy = run.stage("sano", 2)
+            stages.append(healthy)
+            run.check("sano", "circuito cerrado", healthy["breaker"]["state"] == "closed")
+
+            # 1. Caída: 503 en cada llamada
+            server.fail_every = 1
+            outage = run.stage("503", args.messages)
+            stages.append(outage)
+            run.check("503", "el circuito abre", outage["breaker"]["state"] == "open", outage["breaker"]["reason"])
+            run.check("503", "con el circuito abierto no se llama a Groq", outage["groq_calls"] <= 4, outage["groq_calls"])
+            tail = [elapsed for _, elapsed in outage["replies"][3:]]
+            run.check("503", "respuestas inmediatas", max(tail) < 0.2, f"max {max(tail) * 1000:.0f} ms")
+            run.check("503", "la pregunta ya respondida sale de la cache",
+                      all(REPLY in text for text, _ in outage["replies"][3:]))
+            other, _ = run.ask("y el horario del centro de salud?")
+            run.check("503", "pregunta nueva: aviso fijo", CANNED in other)
+            _, metrics_text, _ = get_json(f"{base_url}/metrics")
+            run.check("503", "circuit_state en /metrics", 'circuit_state{circuit="groq"} 2' in (metrics_text or ""))
+            stages.append(run.recover(args.cooldown))
+
+            # 2. Colgado: cada llamada se va por timeout
+            server.delay = args.timeout * 5
+            hung = run.stage("colgado", args.messages, "alguien vio un perro perdido?")
+            stages.append(hung)
+            run.check("colgado", "el circuito abre", hung["breaker"]["state"] == "open", hung["breaker"]["reason"])
+            slow_requests = sum(1 for _, elapsed in hung["replies"] if elapsed >= args.timeout)
+            run.check("colgado", "solo los primeros esperan el timeout", slow_requests <= 2, slow_requests)
+            stages.append(run.recover(args.cooldown))
+
+            # 3. Lento pero respondiendo: abre por tasa de llamadas lentas
+            server.delay = args.timeout * 0.7
+            slow = run.stage("lento", args.messages, "cuándo pasa el camión de la basura?")
+            stages.append(slow)
+            run.check("lento", "el circuito abre por lentitud", slow["breaker"]["state"] == "open", slow["breaker"]["reason"])
+            stages.append(run.recover(args.cooldown))
+
+    for stage in stages:
+        stage["replies"] = [{"text": text[:50], "ms": round(elapsed * 1000, 1)} for text, elapsed in stage["replies"]]
+    failed = [check for check in run.checks if not check["ok"]]
+    print_json({"stages": stages, "checks": run.checks, "failed": len(failed)})
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
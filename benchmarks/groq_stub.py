@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Servidor falso compatible con la API de chat de Groq/OpenAI.
+
+Responde con un texto fijo después de un retardo configurable, para medir
+la API sin depender de la red ni gastar tokens. Con "stream": true responde
+por SSE como Groq: el primer token a los `delay` segundos y después una
+palabra cada `token_delay` (sin stream se espera lo mismo y llega todo junto).
+
+    python benchmarks/groq_stub.py --port 9100 --delay 0.3 --token-delay 0.05
+    GROQ_API_URL=http://127.0.0.1:9100/openai/v1/chat/completions GROQ_API_KEY=stub ...
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = "Hola vecino, la farmacia de turno abre a las 9. Cualquier cosa avisá por acá."
+INTENT_REPLY = "GENERAL"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "GroqStub/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            payload = {}
+
+        self.server.calls += 1
+        time.sleep(self.server.delay)
+
+        if self.server.fail_every and self.server.calls % self.server.fail_every == 0:
+            self.send_response(503)
+            self.end_headers()
+            self.wfile.write(b'{"error": "stub failure"}')
+            return
+
+        # El clasificador de intención pide max_tokens chico
+        text = INTENT_REPLY if (payload.get("max_tokens") or 0) <= 10 else REPLY
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in payload.get("messages", []))
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(text.split()),
+            "total_tokens": prompt_tokens + len(text.split()),
+        }
+
+        if payload.get("stream"):
+            self._stream(payload, text, usage)
+            return
+
+        time.sleep(self.server.token_delay * len(text.split()))
+        body = json.dumps({
+            "id": "stub",
+            "object": "chat.completion",
+            "model": payload.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage,
+        }).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, payload: dict, text: str, usage: dict):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(data):
+            self.wfile.write(f"data: {data}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.server.token_delay)
+            event(json.dumps({
+                "id": "stub",
+                "object": "chat.completion.chunk",
+                "model": payload.get("model", "stub"),
+                "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}],
+            }))
+        event(json.dumps({
+            "id": "stub",
+            "object": "chat.completion.chunk",
+            "model": payload.get("model", "stub"),
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            "x_groq": {"usage": usage},
+        }))
+        event("[DONE]")
+
+
+class _Server(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # El cliente cortó por timeout (pruebas de fallas): no ensuciar la salida
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+def make_server(port: int = 0, delay: float = 0.3, fail_every: int = 0, token_delay: float = 0.0) -> ThreadingHTTPServer:
+    server = _Server(("127.0.0.1", port), _Handler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.token_delay = token_delay
+    server.fail_every = fail_every
+    server.calls = 0
+    return server
+
+
+@contextmanager
+def groq_stub(delay: float = 0.3, fail_every: int = 0, token_delay: float = 0.0):
+    """Levanta el stub en un hilo y devuelve (url, server)"""
+    server = make_server(delay=delay, fail_every=fail_every, token_delay=token_delay)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        host, port = server.server_address
+        yield f"http://{host}:{port}/openai/v1/chat/completions", server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--delay", type=float, default=0.3)
+    parser.add_argument("--fail-every", type=int, default=0, help="responder 503 cada N llamadas")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="segundos entre palabras de la respuesta")
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.delay, args.fail_every, args.token_delay)
+    print(f"Groq stub en http://127.0.0.1:{args.port}/openai/v1/chat/completions (delay {args.delay}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
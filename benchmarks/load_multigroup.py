@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga multi-grupo: registra N grupos y hace ingest concurrente en todos.
+
+    python benchmarks/load_multigroup.py --groups 20 --messages 2000 --concurrency 20
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import get_json, percentiles, post_json, print_json, run_concurrent, scratch_api
+
+TEXTS = [
+    "hola buen dia a todos",
+    "alguien sabe a que hora abre la farmacia?",
+    "vendo bici rodado 26 $50000 al privado",
+    "se corto la luz en el barrio?",
+    "promo 2x1 en empanadas, consultas al privado",
+    "gracias vecinos!",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    chat_ids = [f"1203630000000{i:05d}@g.us" for i in range(args.groups)]
+    rng = random.Random(42)
+
+    with scratch_api() as base_url:
+        for i, chat_id in enumerate(chat_ids):
+            post_json(f"{base_url}/admin/groups", {
+                "chat_id": chat_id,
+                "name": f"Barrio {i}",
+                "sale_priority": 1 + (i % 3),
+            })
+
+        payloads = []
+        for i in range(args.messages):
+            chat_id = chat_ids[i % len(chat_ids)]
+            sender = f"54911{rng.randint(1000000, 9999999)}"
+            payloads.append({
+                "phone": sender,
+                "real_phone": sender,
+                "name": "Vecino",
+                "chat_id": chat_id,
+                "is_group": True,
+                "message_type": "text",
+                "content": rng.choice(TEXTS),
+                "whatsapp_message_key": f'{{"remoteJid": "{chat_id}", "id": "BENCH{i}", "participant": "{sender}@s.whatsapp.net"}}',
+                "participant_jid": f"{sender}@s.whatsapp.net",
+            })
+
+        latencies, errors, elapsed = run_concurrent(
+            lambda payload: post_json(f"{base_url}/ingest_message", payload),
+            payloads,
+            args.concurrency,
+        )
+
+        _, groups, _ = get_json(f"{base_url}/admin/groups")
+        pending_per_group = {
+            g["chat_id"]: g["pending_cases"]
+            for g in groups["groups"]
+            if g["chat_id"] in chat_ids
+        }
+
+    print_json({
+        "groups": args.groups,
+        "messages": args.messages,
+        "concurrency": args.concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "errors": len(errors),
+        "latency": percentiles(latencies),
+        "groups_with_cases": sum(1 for count in pending_per_group.values() if count),
+        "pending_cases": sum(pending_per_group.values()),
+    })
+
+
+if __name__ == "__main__":
+    main()
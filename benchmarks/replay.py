@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Reproduce tráfico grabado del conector contra una copia descartable de la base.
+
+Grabar (en la Pi o donde corra la API):
+    RECORD_TRAFFIC_PATH=/var/log/bot/traffic.jsonl ./run_api.sh
+
+Reproducir contra una copia del bot.db de antes de la grabación:
+    python benchmarks/replay.py traffic.jsonl --db bot.db.antes --speed 1
+    python benchmarks/replay.py traffic.jsonl --db bot.db.antes --speed 10
+    python benchmarks/replay.py traffic.jsonl --db bot.db.antes --speed max --concurrency 32
+
+Los requests de un mismo teléfono (y los del polling del conector) se
+reproducen en orden; entre teléfonos distintos, en paralelo. Al final se
+comparan las respuestas (casos marcados, instrucciones) con las grabadas.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import get_json, http_json, percentiles, print_json, scratch_api
+from benchmarks.groq_stub import groq_stub
+
+# Campos que cambian entre corridas aunque el comportamiento sea el mismo
+VOLATILE_KEYS = {"id", "created_at", "claimed_at", "processed_at", "message_id"}
+
+
+def load_recording(path: str) -> list[dict]:
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entries.append(json.loads(line))
+    entries.sort(key=lambda e: e["ts"])
+    return entries
+
+
+def _route(entry: dict) -> str:
+    path = entry["path"]
+    if path.startswith("/connector/instructions/") and path.endswith("/ack"):
+        return "/connector/instructions/{id}/ack"
+    return path
+
+
+def _lane(entry: dict) -> str:
+    """Requests que deben ir en orden comparten carril"""
+    if entry["path"].startswith("/connector/"):
+        return "connector"
+    body = entry.get("body") if isinstance(entry.get("body"), dict) else {}
+    return body.get("phone") or "anon"
+
+
+def _normalize(value):
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items() if k not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    return value
+
+
+class Replayer:
+    def __init__(self, base_url: str, entries: list[dict], speed: float | None):
+        self.base_url = base_url
+        self.entries = entries
+        self.speed = speed
+        self.t0 = entries[0]["ts"] if entries else 0
+        self.started = None
+        # ids de instrucciones grabados -> ids en la reproducción
+        self.instruction_ids = {}
+        self.lock = threading.Lock()
+        self.results = []
+
+    def _wait_turn(self, entry: dict):
+        if not self.speed:
+            return
+        target = self.started + (entry["ts"] - self.t0) / self.speed
+        delay = target - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _url(self, entry: dict) -> str | None:
+        path = entry["path"]
+        if _route(entry) == "/connector/instructions/{id}/ack":
+            recorded_id = int(path.split("/")[3])
+            replay_id = self.instruction_ids.get(recorded_id)
+            if replay_id is None:
+                return None
+            path = f"/connector/instructions/{replay_id}/ack"
+        query = f"?{entry['query']}" if entry.get("query") else ""
+        return f"{self.base_url}{path}{query}"
+
+    def _map_instructions(self, entry: dict, body):
+        recorded = (entry.get("response") or {}).get("instructions") or []
+        replayed = (body or {}).get("instructions") or [] if isinstance(body, dict) else []
+        with self.lock:
+            for old, new in zip(recorded, replayed):
+                self.instruction_ids[old["id"]] = new["id"]
+
+    def _run_lane(self, lane_entries: list[dict]):
+        for entry in lane_entries:
+            self._wait_turn(entry)
+            url = self._url(entry)
+            if url is None:
+                self.results.append({"entry": entry, "skipped": True})
+                continue
+            payload = entry.get("body") if entry["method"] != "GET" else None
+            status, body, elapsed = http_json(entry["method"], url, payload)
+            if entry["path"] == "/connector/instructions":
+                self._map_instructions(entry, body)
+            self.results.append({"entry": entry, "status": status, "body": body, "elapsed": elapsed})
+
+    def run(self, concurrency: int) -> float:
+        lanes = defaultdict(list)
+        for entry in self.entries:
+            lanes[_lane(entry)].append(entry)
+        self.started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(concurrency, max(1, len(lanes)))) as pool:
+            list(pool.map(self._run_lane, lanes.values()))
+        return time.perf_counter() - self.started
+
+
+def _diff(results: list[dict], max_samples: int) -> dict:
+    mismatches = Counter()
+    compared = Counter()
+    samples = []
+    flagged = {"recorded": 0, "replayed": 0}
+    instructions = {"recorded": 0, "replayed": 0}
+
+    for result in results:
+        if result.get("skipped"):
+            continue
+        entry = result["entry"]
+        route = _route(entry)
+        recorded = entry.get("response")
+        replayed = result["body"]
+
+        if route == "/ingest_message":
+            flagged["recorded"] += int(bool((recorded or {}).get("flagged")))
+            flagged["replayed"] += int(bool((replayed or {}).get("flagged")))
+        if route == "/connector/instructions":
+            instructions["recorded"] += len((recorded or {}).get("instructions") or [])
+            instructions["replayed"] += len((replayed or {}).get("instructions") or [])
+            # El contenido del polling depende del momento exacto: se compara por totales
+            continue
+
+        compared[route] += 1
+        same = entry.get("status") == result["status"] and _normalize(recorded) == _normalize(replayed)
+        if not same:
+            mismatches[route] += 1
+            if len(samples) < max_samples:
+                samples.append({
+                    "route": route,
+                    "request": entry.get("body"),
+                    "recorded": recorded,
+                    "replayed": replayed,
+                })
+
+    return {
+        "compared": dict(compared),
+        "mismatches": dict(mismatches),
+        "flagged_cases": flagged,
+        "instructions_delivered": instructions,
+        "samples": samples,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("recording")
+    parser.add_argument("--db", help="copia del bot.db de antes de la grabación")
+    parser.add_argument("--speed", default="1", help="1, 10, ... o max")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--groq-delay", type=float, default=0.3)
+    parser.add_argument("--samples", type=int, default=5)
+    args = parser.parse_args()
+
+    entries = load_recording(args.recording)
+    if not entries:
+        print("La grabación está vacía")
+        return
+    speed = None if args.speed == "max" else float(args.speed)
+
+    with groq_stub(delay=args.groq_delay) as (groq_url, _):
+        env = {"GROQ_API_URL": groq_url, "GROQ_API_KEY": "stub", "RECORD_TRAFFIC_PATH": ""}
+        with scratch_api(workers=args.workers, env=env, db_source=args.db) as base_url:
+            replayer = Replayer(base_url, entries, speed)
+            elapsed = replayer.run(args.concurrency)
+            _, final_metrics, _ = get_json(f"{base_url}/dashboard/metrics")
+
+    by_route = defaultdict(list)
+    recorded_by_route = defaultdict(list)
+    errors = Counter()
+    for result in replayer.results:
+        if result.get("skipped"):
+            continue
+        route = _route(result["entry"])
+        by_route[route].append(result["elapsed"])
+        recorded_by_route[route].append(result["entry"]["duration_ms"] / 1000)
+        if result["status"] >= 400:
+            errors[route] += 1
+
+    print_json({
+        "recording": os.path.basename(args.recording),
+        "requests": len(entries),
+        "skipped": sum(1 for r in replayer.results if r.get("skipped")),
+        "speed": args.speed,
+        "recorded_span_s": round(entries[-1]["ts"] - entries[0]["ts"], 3),
+        "replay_elapsed_s": round(elapsed, 3),
+        "errors": dict(errors),
+        "latency": {
+            route: {"recorded": percentiles(recorded_by_route[route]), "replayed": percentiles(samples)}
+            for route, samples in sorted(by_route.items())
+        },
+        "queues_after": (final_metrics or {}).get("queues"),
+        "diff": _diff(replayer.results, args.samples),
+    })
+
+
+if __name__ == "__main__":
+    main()
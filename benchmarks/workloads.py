@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Workloads de punta a punta contra una API descartable y un Groq falso.
+
+Reproduce el tráfico del conector: mensajes de grupo, privados (menú,
+strikes, IA), moderadores respondiendo casos, el dashboard y el polling de
+instrucciones. Devuelve p50/p95/p99 y throughput en JSON para comparar
+entre commits (ver benchmarks/compare.py).
+
+    python benchmarks/datagen.py --out /tmp/bench.db
+    python benchmarks/workloads.py --db /tmp/bench.db --out results.json
+    python benchmarks/workloads.py --only ingest conversation --requests 500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import ADMIN_PHONE, GROUP_ID
+from benchmarks.common import REPO_ROOT, get_json, percentiles, post_json, print_json, run_concurrent, scratch_api
+from benchmarks.datagen import CHAT_TEXTS, QUESTION_TEXTS, SALE_TEXTS
+from benchmarks.groq_stub import groq_stub
+
+PRIVATE_TEXTS = ["menu", "strikes", "reglas", "hola, a qué hora abre la farmacia?", "qué se puede publicar en el grupo?"]
+
+
+def _group_message(i: int) -> dict:
+    sender = f"54922{i % 1000:08d}"
+    texts = SALE_TEXTS if i % 8 == 0 else QUESTION_TEXTS if i % 3 == 0 else CHAT_TEXTS
+    return {
+        "phone": sender,
+        "real_phone": sender,
+        "name": "Vecino",
+        "chat_id": GROUP_ID,
+        "is_group": True,
+        "message_type": "text",
+        "content": texts[i % len(texts)],
+        "whatsapp_message_key": json.dumps({"remoteJid": GROUP_ID, "id": f"WL{i}", "participant": f"{sender}@s.whatsapp.net"}),
+        "participant_jid": f"{sender}@s.whatsapp.net",
+    }
+
+
+def _private_message(i: int) -> dict:
+    sender = f"54933{i % 500:08d}"
+    return {
+        "phone": sender,
+        "real_phone": sender,
+        "name": "Vecino",
+        "message": PRIVATE_TEXTS[i % len(PRIVATE_TEXTS)],
+        "reply_jid": f"{sender}@s.whatsapp.net",
+    }
+
+
+def _measure(fn, items, concurrency: int) -> dict:
+    latencies, errors, elapsed = run_concurrent(fn, items, concurrency)
+    return {
+        "requests": len(latencies) + len(errors),
+        "errors": len(errors),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "latency": percentiles(latencies),
+    }
+
+
+def workload_ingest(base_url: str, requests: int, concurrency: int) -> dict:
+    return _measure(lambda i: post_json(f"{base_url}/ingest_message", _group_message(i)), range(requests), concurrency)
+
+
+def workload_conversation(base_url: str, requests: int, concurrency: int) -> dict:
+    return _measure(lambda i: post_json(f"{base_url}/conversation", _private_message(i)), range(requests), concurrency)
+
+
+def workload_moderation(base_url: str, requests: int, concurrency: int) -> dict:
+    """Cada moderador pide caso ('estoy') y lo resuelve con /moderation/response"""
+    moderators = [f"2954{i:06d}" for i in range(concurrency)]
+    for phone in moderators:
+        post_json(f"{base_url}/moderators/command", {"phone": ADMIN_PHONE, "content": f"agregar mod {phone}"})
+
+    per_moderator = max(1, requests // (2 * len(moderators)))
+    latencies, errors = [], []
+
+    def run(phone):
+        for _ in range(per_moderator):
+            for url, payload in (
+                (f"{base_url}/conversation", {"phone": phone, "message": "estoy"}),
+                (f"{base_url}/moderation/response", {"phone": phone, "response": "1"}),
+            ):
+                status, body, elapsed = post_json(url, payload)
+                (errors if status >= 400 else latencies).append(elapsed if status < 400 else body)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(moderators)) as pool:
+        list(pool.map(run, moderators))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies) + len(errors),
+        "errors": len(errors),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "latency": percentiles(latencies),
+    }
+
+
+def workload_dashboard(base_url: str, requests: int, concurrency: int) -> dict:
+    urls = [
+        f"{base_url}/dashboard/cases",
+        f"{base_url}/dashboard/group_report?days=7",
+        f"{base_url}/dashboard/moderators",
+    ]
+    return _measure(lambda i: get_json(urls[i % len(urls)]), range(requests), concurrency)
+
+
+def workload_connector(base_url: str, requests: int, concurrency: int) -> dict:
+    """Polling del conector: toma instrucciones y las confirma"""
+
+    def poll(_):
+        status, body, elapsed = get_json(f"{base_url}/connector/instructions?limit=10")
+        for item in (body or {}).get("instructions", []) if status < 400 else []:
+            post_json(f"{base_url}/connector/instructions/{item['id']}/ack", {"status": "processed"})
+        return status, body, elapsed
+
+    return _measure(poll, range(requests), concurrency)
+
+
+def workload_mixed(base_url: str, requests: int, concurrency: int) -> dict:
+    """Tráfico combinado como en producción: mayoría ingest, algo de privados y dashboard"""
+
+    def call(i):
+        slot = i % 20
+        if slot < 12:
+            return post_json(f"{base_url}/ingest_message", _group_message(i))
+        if slot < 15:
+            return post_json(f"{base_url}/conversation", _private_message(i))
+        if slot < 17:
+            return get_json(f"{base_url}/dashboard/cases")
+        return get_json(f"{base_url}/connector/instructions?limit=10")
+
+    return _measure(call, range(requests), concurrency)
+
+
+WORKLOADS = {
+    "ingest": workload_ingest,
+    "conversation": workload_conversation,
+    "moderation": workload_moderation,
+    "dashboard": workload_dashboard,
+    "connector": workload_connector,
+    "mixed": workload_mixed,
+}
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(names, db: str | None, requests: int, concurrency: int, groq_delay: float, workers: int, env: dict | None = None) -> dict:
+    results = {}
+    with groq_stub(delay=groq_delay) as (groq_url, stub):
+        api_env = {"GROQ_API_URL": groq_url, "GROQ_API_KEY": "stub"}
+        api_env.update(env or {})
+        # Una API nueva por workload: cada uno arranca desde el mismo dataset
+        for name in names:
+            with scratch_api(workers=workers, env=api_env, db_source=db) as base_url:
+                results[name] = WORKLOADS[name](base_url, requests, concurrency)
+        groq_calls = stub.calls
+
+    return {
+        "commit": _git_commit(),
+        "dataset": os.path.basename(db) if db else None,
+        "requests": requests,
+        "concurrency": concurrency,
+        "workers": workers,
+        "groq_delay_s": groq_delay,
+        "groq_calls": groq_calls,
+        "workloads": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", help="base generada con datagen.py (por defecto, vacía)")
+    parser.add_argument("--only", nargs="+", choices=sorted(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--groq-delay", type=float, default=0.3)
+    parser.add_argument("--out", help="guardar el JSON también en este archivo")
+    args = parser.parse_args()
+
+    result = run_suite(args.only, args.db, args.requests, args.concurrency, args.groq_delay, args.workers)
+    print_json(result)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
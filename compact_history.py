@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# compact_history.py
+"""
+Resume y borra el historial de la IA más viejo que context_window.
+
+    python compact_history.py                    # resumen extractivo, borra lo viejo
+    python compact_history.py --llm              # resumen pedido a Groq
+    python compact_history.py --archive history.jsonl.gz
+"""
+import argparse
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.history_compaction import compact_all
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keep", type=int, default=None, help="turnos a conservar por usuario (default: context_window * 2)")
+    parser.add_argument("--llm", action="store_true", help="resumir con Groq en vez del extractivo local")
+    parser.add_argument("--archive", default=None, help="JSONL .gz donde guardar los turnos antes de borrarlos")
+    parser.add_argument("--max-users", type=int, default=None)
+    args = parser.parse_args()
+
+    result = compact_all(keep=args.keep, use_llm=args.llm, archive_path=args.archive, max_users=args.max_users)
+    print("🗜️ Historial compactado")
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
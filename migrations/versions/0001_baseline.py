@@ -0,0 +1,237 @@
+"""baseline
+
+Revision ID: 0001_baseline
+Revises: 
+Create Date: 2026-10-19 01:57:17.063238
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001_baseline'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ai_settings',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('system_prompt', sa.Text(), nullable=False),
+    sa.Column('temperature', sa.Float(), nullable=True),
+    sa.Column('max_tokens', sa.Integer(), nullable=True),
+    sa.Column('context_window', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('conversation_history',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_phone', sa.String(), nullable=False),
+    sa.Column('role', sa.String(), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('conversation_history', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_conversation_history_id'), ['id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_conversation_history_user_phone'), ['user_phone'], unique=False)
+
+    op.create_table('groups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('chat_id', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('active', sa.Boolean(), nullable=True),
+    sa.Column('rules', sa.Text(), nullable=True),
+    sa.Column('max_strikes', sa.Integer(), nullable=True),
+    sa.Column('sale_priority', sa.Integer(), nullable=True),
+    sa.Column('image_priority', sa.Integer(), nullable=True),
+    sa.Column('review_images', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('groups', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_groups_chat_id'), ['chat_id'], unique=True)
+        batch_op.create_index(batch_op.f('ix_groups_id'), ['id'], unique=False)
+
+    op.create_table('knowledge_base',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('tags', sa.String(), nullable=True),
+    sa.Column('enabled', sa.Boolean(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('key')
+    )
+    op.create_table('moderators',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('phone', sa.String(), nullable=True),
+    sa.Column('lid', sa.String(), nullable=True),
+    sa.Column('active', sa.Boolean(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('moderators', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_moderators_lid'), ['lid'], unique=False)
+        batch_op.create_index(batch_op.f('ix_moderators_phone'), ['phone'], unique=True)
+
+    op.create_table('pending_instructions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('source', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('claim_token', sa.String(), nullable=True),
+    sa.Column('claimed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('processed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('pending_instructions', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_pending_instructions_claim_token'), ['claim_token'], unique=False)
+        batch_op.create_index(batch_op.f('ix_pending_instructions_id'), ['id'], unique=False)
+
+    op.create_table('state_versions',
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('phone', sa.String(), nullable=False),
+    sa.Column('real_phone', sa.String(), nullable=True),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('role', sa.String(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('strikes', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_users_phone'), ['phone'], unique=True)
+
+    op.create_table('group_moderators',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('group_id', sa.Integer(), nullable=False),
+    sa.Column('moderator_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['group_id'], ['groups.id'], ),
+    sa.ForeignKeyConstraint(['moderator_id'], ['moderators.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('group_id', 'moderator_id', name='uq_group_moderator')
+    )
+    with op.batch_alter_table('group_moderators', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_group_moderators_group_id'), ['group_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_group_moderators_moderator_id'), ['moderator_id'], unique=False)
+
+    op.create_table('messages',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('chat_id', sa.String(), nullable=True),
+    sa.Column('is_group', sa.Boolean(), nullable=True),
+    sa.Column('message_type', sa.String(), nullable=True),
+    sa.Column('content', sa.String(), nullable=True),
+    sa.Column('media_caption', sa.Text(), nullable=True),
+    sa.Column('whatsapp_message_key', sa.Text(), nullable=True),
+    sa.Column('raw_payload', sa.Text(), nullable=True),
+    sa.Column('participant_jid', sa.String(), nullable=True),
+    sa.Column('media_filename', sa.String(), nullable=True),
+    sa.Column('flagged', sa.Boolean(), nullable=True),
+    sa.Column('deleted', sa.Boolean(), nullable=True),
+    sa.Column('category_label', sa.String(), nullable=True),
+    sa.Column('intent_label', sa.String(), nullable=True),
+    sa.Column('intent_source', sa.String(), nullable=True),
+    sa.Column('reviewed_category_label', sa.String(), nullable=True),
+    sa.Column('reviewed_intent_label', sa.String(), nullable=True),
+    sa.Column('reviewed_by', sa.String(), nullable=True),
+    sa.Column('reviewed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('contains_question', sa.Boolean(), nullable=True),
+    sa.Column('contains_link', sa.Boolean(), nullable=True),
+    sa.Column('content_length', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_messages_chat_id'), ['chat_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_messages_id'), ['id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_messages_participant_jid'), ['participant_jid'], unique=False)
+
+    op.create_table('cases',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('type', sa.String(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('priority', sa.Integer(), nullable=True),
+    sa.Column('message_id', sa.Integer(), nullable=True),
+    sa.Column('chat_id', sa.String(), nullable=True),
+    sa.Column('original_case_id', sa.Integer(), nullable=True),
+    sa.Column('assigned_to', sa.String(), nullable=True),
+    sa.Column('resolution', sa.String(), nullable=True),
+    sa.Column('resolved_by', sa.String(), nullable=True),
+    sa.Column('resolved_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('note', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.ForeignKeyConstraint(['message_id'], ['messages.id'], ),
+    sa.ForeignKeyConstraint(['original_case_id'], ['cases.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('cases', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_cases_chat_id'), ['chat_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_cases_id'), ['id'], unique=False)
+
+    op.create_table('user_actions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('case_id', sa.Integer(), nullable=True),
+    sa.Column('action', sa.String(), nullable=False),
+    sa.Column('note', sa.String(), nullable=True),
+    sa.Column('moderator_phone', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['case_id'], ['cases.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('user_actions')
+    with op.batch_alter_table('cases', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_cases_id'))
+        batch_op.drop_index(batch_op.f('ix_cases_chat_id'))
+
+    op.drop_table('cases')
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_messages_participant_jid'))
+        batch_op.drop_index(batch_op.f('ix_messages_id'))
+        batch_op.drop_index(batch_op.f('ix_messages_chat_id'))
+
+    op.drop_table('messages')
+    with op.batch_alter_table('group_moderators', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_group_moderators_moderator_id'))
+        batch_op.drop_index(batch_op.f('ix_group_moderators_group_id'))
+
+    op.drop_table('group_moderators')
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_users_phone'))
+
+    op.drop_table('users')
+    op.drop_table('state_versions')
+    with op.batch_alter_table('pending_instructions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_pending_instructions_id'))
+        batch_op.drop_index(batch_op.f('ix_pending_instructions_claim_token'))
+
+    op.drop_table('pending_instructions')
+    with op.batch_alter_table('moderators', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_moderators_phone'))
+        batch_op.drop_index(batch_op.f('ix_moderators_lid'))
+
+    op.drop_table('moderators')
+    op.drop_table('knowledge_base')
+    with op.batch_alter_table('groups', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_groups_id'))
+        batch_op.drop_index(batch_op.f('ix_groups_chat_id'))
+
+    op.drop_table('groups')
+    with op.batch_alter_table('conversation_history', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_conversation_history_user_phone'))
+        batch_op.drop_index(batch_op.f('ix_conversation_history_id'))
+
+    op.drop_table('conversation_history')
+    op.drop_table('ai_settings')
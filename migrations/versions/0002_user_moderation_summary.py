@@ -0,0 +1,105 @@
+"""user moderation summary
+
+Revision ID: 0002_user_moderation_summary
+Revises: 0001_baseline
+Create Date: 2026-10-19 12:10:42.318904
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002_user_moderation_summary'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+# Copia de app/utils/moderation_summary.py: la migración no importa la app
+PENALTY_RESOLUTIONS = ("warn", "strike", "deleted", "banned", "ban", "delete", "delete_message")
+MAX_PENALTIES = 5
+PREVIEW_LENGTH = 80
+
+
+def _iso(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value.replace(" ", "T")
+    return value.isoformat()
+
+
+def upgrade():
+    op.create_table('user_moderation_summary',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('strikes', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('last_penalties', sa.Text(), nullable=False),
+    sa.Column('latest_penalty_case_id', sa.Integer(), nullable=True),
+    sa.Column('open_appeals', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.ForeignKeyConstraint(['latest_penalty_case_id'], ['cases.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # Backfill: una pasada por las sanciones, ordenadas por usuario y fecha
+    bind = op.get_bind()
+    placeholders = ", ".join(f":r{i}" for i in range(len(PENALTY_RESOLUTIONS)))
+    params = {f"r{i}": resolution for i, resolution in enumerate(PENALTY_RESOLUTIONS)}
+
+    penalties = {}
+    rows = bind.execute(sa.text(f"""
+        SELECT m.user_id, c.id, c.message_id, c.resolution, c.resolved_at, m.message_type, m.content
+        FROM cases c JOIN messages m ON m.id = c.message_id
+        WHERE c.type != 'appeal' AND c.status = 'resolved' AND c.resolution IN ({placeholders})
+        ORDER BY m.user_id, c.resolved_at DESC, c.id DESC
+    """), params)
+    for user_id, case_id, message_id, resolution, resolved_at, message_type, content in rows:
+        entries = penalties.setdefault(user_id, [])
+        if len(entries) >= MAX_PENALTIES:
+            continue
+        entries.append({
+            "case_id": case_id,
+            "message_id": message_id,
+            "resolution": resolution,
+            "resolved_at": _iso(resolved_at),
+            "message_type": message_type,
+            "preview": content[:PREVIEW_LENGTH + 1] if message_type == "text" and content else None,
+        })
+
+    open_appeals = dict(bind.execute(sa.text("""
+        SELECT m.user_id, COUNT(*)
+        FROM cases c JOIN messages m ON m.id = c.message_id
+        WHERE c.type = 'appeal' AND c.status = 'pending'
+        GROUP BY m.user_id
+    """)).fetchall())
+
+    summary = sa.table('user_moderation_summary',
+        sa.column('user_id', sa.Integer),
+        sa.column('strikes', sa.Integer),
+        sa.column('status', sa.String),
+        sa.column('last_penalties', sa.Text),
+        sa.column('latest_penalty_case_id', sa.Integer),
+        sa.column('open_appeals', sa.Integer),
+    )
+    batch = []
+    for user_id, strikes, status in bind.execute(sa.text("SELECT id, strikes, status FROM users")):
+        entries = penalties.get(user_id, [])
+        batch.append({
+            "user_id": user_id,
+            "strikes": strikes or 0,
+            "status": status or "active",
+            "last_penalties": json.dumps(entries, ensure_ascii=False),
+            "latest_penalty_case_id": entries[0]["case_id"] if entries else None,
+            "open_appeals": open_appeals.get(user_id, 0),
+        })
+        if len(batch) >= 1000:
+            op.bulk_insert(summary, batch)
+            batch = []
+    if batch:
+        op.bulk_insert(summary, batch)
+
+
+def downgrade():
+    op.drop_table('user_moderation_summary')
@@ -0,0 +1,86 @@
+"""conversation states
+
+Revision ID: 0003_conversation_states
+Revises: 0002_user_moderation_summary
+Create Date: 2026-10-19 13:02:51.774120
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0003_conversation_states'
+down_revision = '0002_user_moderation_summary'
+branch_labels = None
+depends_on = None
+
+# Igual que APPEAL_WAIT / APPEAL_WAIT_TTL de app/utils/conversation_state.py
+APPEAL_WAIT = "appeal_wait"
+APPEAL_WAIT_TTL = timedelta(minutes=5)
+
+
+def _as_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def upgrade():
+    op.create_table('conversation_states',
+    sa.Column('user_phone', sa.String(), nullable=False),
+    sa.Column('state', sa.String(), nullable=False),
+    sa.Column('target_case_id', sa.Integer(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.ForeignKeyConstraint(['target_case_id'], ['cases.id'], ),
+    sa.PrimaryKeyConstraint('user_phone')
+    )
+
+    # Mensajes/casos de un usuario (apelaciones y resumen de moderación)
+    op.create_index(op.f('ix_messages_user_id'), 'messages', ['user_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_cases_message_id'), 'cases', ['message_id'], unique=False, if_not_exists=True)
+
+    # La clave del bus ya existe: el primer cambio de estado solo hace UPDATE
+    bind = op.get_bind()
+    if not bind.execute(sa.text("SELECT 1 FROM state_versions WHERE key = 'conversation_states'")).first():
+        bind.execute(sa.text(
+            "INSERT INTO state_versions (key, version, updated_at) VALUES ('conversation_states', 0, CURRENT_TIMESTAMP)"
+        ))
+
+    # Usuarios que escribieron "apelar" y todavía no mandaron el descargo
+    rows = bind.execute(sa.text("""
+        SELECT u.phone, a.id, a.created_at
+        FROM cases a
+        JOIN cases o ON o.id = a.original_case_id
+        JOIN messages m ON m.id = o.message_id
+        JOIN users u ON u.id = m.user_id
+        WHERE a.type = 'appeal' AND a.status = 'pending' AND a.note IS NULL
+        ORDER BY a.created_at
+    """)).fetchall()
+
+    now = datetime.now()
+    latest = {}
+    for phone, appeal_id, created_at in rows:
+        created_at = _as_datetime(created_at)
+        if created_at is None:
+            continue
+        expires_at = created_at.replace(tzinfo=None) + APPEAL_WAIT_TTL
+        if expires_at > now:
+            latest[phone] = {"user_phone": phone, "state": APPEAL_WAIT, "target_case_id": appeal_id, "expires_at": expires_at}
+
+    if latest:
+        states = sa.table('conversation_states',
+            sa.column('user_phone', sa.String),
+            sa.column('state', sa.String),
+            sa.column('target_case_id', sa.Integer),
+            sa.column('expires_at', sa.DateTime),
+        )
+        op.bulk_insert(states, list(latest.values()))
+
+
+def downgrade():
+    op.execute("DELETE FROM state_versions WHERE key = 'conversation_states'")
+    op.drop_index(op.f('ix_cases_message_id'), table_name='cases')
+    op.drop_index(op.f('ix_messages_user_id'), table_name='messages')
+    op.drop_table('conversation_states')
@@ -0,0 +1,39 @@
+"""reply templates
+
+Revision ID: 0004_reply_templates
+Revises: 0003_conversation_states
+Create Date: 2026-10-19 14:21:07.530612
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0004_reply_templates'
+down_revision = '0003_conversation_states'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('reply_templates',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('chat_id', sa.String(), nullable=True),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('key', 'chat_id', name='uq_reply_templates_key_chat')
+    )
+    op.create_index(op.f('ix_reply_templates_id'), 'reply_templates', ['id'], unique=False)
+
+    bind = op.get_bind()
+    if not bind.execute(sa.text("SELECT 1 FROM state_versions WHERE key = 'reply_templates'")).first():
+        bind.execute(sa.text(
+            "INSERT INTO state_versions (key, version, updated_at) VALUES ('reply_templates', 0, CURRENT_TIMESTAMP)"
+        ))
+
+
+def downgrade():
+    op.execute("DELETE FROM state_versions WHERE key = 'reply_templates'")
+    op.drop_index(op.f('ix_reply_templates_id'), table_name='reply_templates')
+    op.drop_table('reply_templates')
@@ -0,0 +1,24 @@
+"""conversation history composite index
+
+Revision ID: 0005_conversation_history_index
+Revises: 0004_reply_templates
+Create Date: 2026-10-19 15:03:44.218530
+"""
+from alembic import op
+
+
+revision = '0005_conversation_history_index'
+down_revision = '0004_reply_templates'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # (user_phone, created_at) cubre también las búsquedas solo por user_phone
+    op.create_index('ix_conversation_history_user_phone_created_at', 'conversation_history', ['user_phone', 'created_at'], unique=False, if_not_exists=True)
+    op.drop_index('ix_conversation_history_user_phone', table_name='conversation_history', if_exists=True)
+
+
+def downgrade():
+    op.create_index('ix_conversation_history_user_phone', 'conversation_history', ['user_phone'], unique=False)
+    op.drop_index('ix_conversation_history_user_phone_created_at', table_name='conversation_history')
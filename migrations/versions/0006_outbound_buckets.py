@@ -0,0 +1,27 @@
+"""outbound buckets
+
+Revision ID: 0006_outbound_buckets
+Revises: 0005_conversation_history_index
+Create Date: 2026-10-19 18:40:12.604311
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0006_outbound_buckets'
+down_revision = '0005_conversation_history_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('outbound_buckets',
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('tokens', sa.Float(), nullable=False),
+    sa.Column('refilled_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade():
+    op.drop_table('outbound_buckets')
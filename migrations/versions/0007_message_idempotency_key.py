@@ -0,0 +1,65 @@
+"""message idempotency key
+
+Revision ID: 0007_message_idempotency_key
+Revises: 0006_outbound_buckets
+Create Date: 2026-10-19 20:05:37.118402
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0007_message_idempotency_key'
+down_revision = '0006_outbound_buckets'
+branch_labels = None
+depends_on = None
+
+BATCH = 5000
+
+
+def _whatsapp_message_id(whatsapp_message_key):
+    # Igual que _whatsapp_message_id de app/main.py
+    try:
+        key = json.loads(whatsapp_message_key) if whatsapp_message_key else None
+    except ValueError:
+        return None
+    if not isinstance(key, dict) or not key.get("remoteJid") or not key.get("id"):
+        return None
+    return f"{key['remoteJid']}/{key['id']}"
+
+
+def upgrade():
+    op.add_column('messages', sa.Column('whatsapp_message_id', sa.String(), nullable=True))
+
+    # Mensajes viejos: se completa desde la key guardada, de a BATCH filas
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.text(
+            "SELECT id, whatsapp_message_key FROM messages "
+            "WHERE id > :last_id AND whatsapp_message_key IS NOT NULL ORDER BY id LIMIT :limit"
+        ), {"last_id": last_id, "limit": BATCH}).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        updates = [
+            {"row_id": row_id, "value": value}
+            for row_id, value in ((row_id, _whatsapp_message_id(key)) for row_id, key in rows)
+            if value
+        ]
+        if updates:
+            bind.execute(sa.text("UPDATE messages SET whatsapp_message_id = :value WHERE id = :row_id"), updates)
+
+    # Si un mensaje ya se había guardado dos veces, la key queda solo en el primero
+    bind.execute(sa.text(
+        "UPDATE messages SET whatsapp_message_id = NULL "
+        "WHERE whatsapp_message_id IS NOT NULL AND id NOT IN ("
+        "SELECT min(id) FROM messages WHERE whatsapp_message_id IS NOT NULL GROUP BY whatsapp_message_id)"
+    ))
+    op.create_index(op.f('ix_messages_whatsapp_message_id'), 'messages', ['whatsapp_message_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_messages_whatsapp_message_id'), table_name='messages')
+    op.drop_column('messages', 'whatsapp_message_id')
@@ -0,0 +1,29 @@
+"""ai chat batches
+
+Revision ID: 0008_ai_chat_batches
+Revises: 0007_message_idempotency_key
+Create Date: 2026-10-19 21:05:37.118204
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0008_ai_chat_batches'
+down_revision = '0007_message_idempotency_key'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ai_chat_batches',
+    sa.Column('phone', sa.String(), nullable=False),
+    sa.Column('generation', sa.Integer(), nullable=False),
+    sa.Column('messages', sa.Text(), nullable=False),
+    sa.Column('started_at', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('phone')
+    )
+
+
+def downgrade():
+    op.drop_table('ai_chat_batches')
@@ -0,0 +1,57 @@
+"""conversation state group
+
+Revision ID: 0009_conversation_state_group
+Revises: 0008_ai_chat_batches
+Create Date: 2026-10-19 23:40:12.508311
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0009_conversation_state_group'
+down_revision = '0008_ai_chat_batches'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('conversation_states') as batch_op:
+        batch_op.add_column(sa.Column('group_chat_id', sa.String(), nullable=True))
+        batch_op.alter_column('state', existing_type=sa.String(), nullable=True)
+
+    # Grupo del último mensaje de grupo de cada usuario (lo que antes se buscaba en messages)
+    bind = op.get_bind()
+    latest = dict(bind.execute(sa.text("""
+        SELECT u.phone, m.chat_id
+        FROM messages m
+        JOIN users u ON u.id = m.user_id
+        WHERE m.id IN (
+            SELECT max(id) FROM messages
+            WHERE is_group = :is_group AND chat_id IS NOT NULL
+            GROUP BY user_id
+        )
+    """), {"is_group": True}).fetchall())
+    if not latest:
+        return
+
+    existing = {phone for (phone,) in bind.execute(sa.text("SELECT user_phone FROM conversation_states"))}
+    for phone, chat_id in latest.items():
+        if phone in existing:
+            bind.execute(
+                sa.text("UPDATE conversation_states SET group_chat_id = :chat_id WHERE user_phone = :phone"),
+                {"chat_id": chat_id, "phone": phone},
+            )
+    states = sa.table('conversation_states',
+        sa.column('user_phone', sa.String),
+        sa.column('group_chat_id', sa.String),
+    )
+    new = [{"user_phone": phone, "group_chat_id": chat_id} for phone, chat_id in latest.items() if phone not in existing]
+    if new:
+        op.bulk_insert(states, new)
+
+
+def downgrade():
+    op.execute("DELETE FROM conversation_states WHERE state IS NULL")
+    with op.batch_alter_table('conversation_states') as batch_op:
+        batch_op.alter_column('state', existing_type=sa.String(), nullable=False)
+        batch_op.drop_column('group_chat_id')
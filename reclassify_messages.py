@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# reclassify_messages.py
+"""
+Vuelve a clasificar los mensajes guardados con el clasificador actual
+(heuristic_v2 + modelo de ventas si hay). Se puede cortar y retomar.
+
+    python reclassify_messages.py                     # todos los núcleos, sigue del checkpoint
+    python reclassify_messages.py --workers 2 --chunk 2000
+    python reclassify_messages.py --restart           # desde el principio
+"""
+import argparse
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.reclassify import DEFAULT_CHECKPOINT, DEFAULT_CHUNK, reclassify
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="filas por lote")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="procesos (0 = en este)")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--restart", action="store_true", help="ignorar el checkpoint")
+    parser.add_argument("--max-chunks", type=int, default=None, help="cortar después de N lotes")
+    args = parser.parse_args()
+
+    result = reclassify(
+        chunk=args.chunk,
+        workers=args.workers,
+        checkpoint_path=args.checkpoint,
+        restart=args.restart,
+        max_chunks=args.max_chunks,
+    )
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
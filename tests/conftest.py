@@ -0,0 +1,45 @@
+"""
+Los tests corren contra una base SQLite nueva en un directorio temporal:
+app.config lee DATABASE_URL al importarse, así que se fija antes de importar
+cualquier cosa de app. app.main (que migra la base y crea media/) se importa
+recién en el fixture `app`, ya parados en ese directorio.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORKDIR = tempfile.mkdtemp(prefix="bot-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORKDIR, 'bot.db')}"
+os.environ["GROQ_API_KEY"] = ""
+os.environ["AI_COALESCE"] = "0"
+
+
+@pytest.fixture(scope="session")
+def app():
+    os.chdir(WORKDIR)
+    from app.main import app as fastapi_app
+
+    return fastapi_app
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    from fastapi.testclient import TestClient
+
+    return TestClient(app)
+
+
+@pytest.fixture
+def db(app):
+    from app.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
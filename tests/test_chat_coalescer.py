@@ -0,0 +1,120 @@
+import time
+
+import pytest
+
+from app.database import SessionLocal
+from app.models import AiChatBatch
+from app.services import chat_coalescer
+
+
+@pytest.fixture
+def coalescing(app, monkeypatch):
+    monkeypatch.setattr(chat_coalescer, "AI_COALESCE", True)
+
+
+@pytest.fixture
+def sessions(app):
+    # Dos requests que pueden caer en workers distintos: cada uno con su sesión
+    first, second = SessionLocal(), SessionLocal()
+    try:
+        yield first, second
+    finally:
+        first.close()
+        second.close()
+
+
+def _row(db, phone: str):
+    db.expire_all()
+    return db.query(AiChatBatch).filter(AiChatBatch.phone == phone).first()
+
+
+def test_second_message_takes_over(coalescing, sessions, db):
+    first_db, second_db = sessions
+    phone = "5491100000001"
+
+    first = chat_coalescer.join(first_db, phone, "hola")
+    assert (first.generation, first.message, first.count) == (1, "hola", 1)
+    assert not chat_coalescer.superseded(first)
+
+    second = chat_coalescer.join(second_db, phone, "a qué hora abre la feria?")
+    assert second.generation == 2
+    assert second.message == "hola\na qué hora abre la feria?"
+    assert second.count == 2
+    assert chat_coalescer.superseded(first)
+    assert not chat_coalescer.superseded(second)
+
+    # La vieja ya no puede guardar su respuesta; la nueva sí, y libera la fila
+    assert not chat_coalescer.finish(first_db, first)
+    first_db.rollback()
+    assert chat_coalescer.finish(second_db, second)
+    second_db.commit()
+    assert _row(db, phone) is None
+
+
+def test_lone_message_answers_alone_after_finish(coalescing, sessions, db):
+    first_db, second_db = sessions
+    phone = "5491100000002"
+
+    first = chat_coalescer.join(first_db, phone, "hola")
+    assert chat_coalescer.finish(first_db, first)
+    first_db.commit()
+
+    # Sin consulta en curso: abre una nueva en lugar de sumarse
+    second = chat_coalescer.join(second_db, phone, "otra cosa")
+    assert (second.generation, second.message) == (1, "otra cosa")
+
+
+def test_old_call_stops_collecting(coalescing, sessions, db, monkeypatch):
+    first_db, second_db = sessions
+    phone = "5491100000003"
+
+    first = chat_coalescer.join(first_db, phone, "hola")
+    later = time.time() + chat_coalescer.AI_COALESCE_MAX_WAIT + 1
+    monkeypatch.setattr(chat_coalescer.time, "time", lambda: later)
+
+    second = chat_coalescer.join(second_db, phone, "sigo escribiendo")
+    assert second.generation is None and second.message == "sigo escribiendo"
+    assert not chat_coalescer.superseded(first)
+    assert chat_coalescer.finish(second_db, second)
+
+
+def test_release_frees_row_without_answer(coalescing, sessions, db):
+    first_db, _ = sessions
+    phone = "5491100000004"
+
+    batch = chat_coalescer.join(first_db, phone, "hola")
+    chat_coalescer.release(batch, replaced=False)
+    assert _row(db, phone) is None
+
+
+def test_disabled_never_touches_the_table(app, db):
+    batch = chat_coalescer.join(db, "5491100000005", "hola")
+    assert batch.generation is None
+    assert _row(db, "5491100000005") is None
+
+
+def test_sealed_batch_is_not_replaced(coalescing, sessions, db):
+    first_db, second_db = sessions
+    phone = "5491100000006"
+
+    # Ya salió la primera oración: lo que llega después se responde aparte
+    first = chat_coalescer.join(first_db, phone, "hola")
+    assert chat_coalescer.seal(first)
+    second = chat_coalescer.join(second_db, phone, "otra pregunta")
+    assert second.generation is None and second.message == "otra pregunta"
+    assert not chat_coalescer.superseded(first)
+    assert chat_coalescer.finish(first_db, first)
+    first_db.commit()
+    assert _row(db, phone) is None
+
+
+def test_replaced_batch_cannot_seal(coalescing, sessions, db):
+    first_db, second_db = sessions
+    phone = "5491100000007"
+
+    first = chat_coalescer.join(first_db, phone, "hola")
+    second = chat_coalescer.join(second_db, phone, "una pregunta")
+    # La primera parte de la consulta vieja no sale; la nueva sigue sumando hasta su seal
+    assert not chat_coalescer.seal(first)
+    assert chat_coalescer.seal(second)
+    assert chat_coalescer.finish(second_db, second)
@@ -0,0 +1,97 @@
+import pytest
+
+from app.utils import circuit_breaker
+from app.utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+
+def _breaker(**options):
+    options = {"consecutive_failures": 3, "open_seconds": 30, "half_open_calls": 1, **options}
+    return CircuitBreaker("test", **options)
+
+
+def test_closed_open_half_open_closed(clock):
+    breaker = _breaker()
+    assert breaker.state == CLOSED and breaker.allow()
+
+    for _ in range(3):
+        breaker.record(False, 0.1)
+    assert breaker.state == OPEN
+    assert breaker.is_open() and not breaker.allow()
+
+    clock.now += 29
+    assert not breaker.allow()
+
+    clock.now += 1
+    assert not breaker.is_open()
+    assert breaker.state == HALF_OPEN
+    # Una sola llamada de prueba: la segunda se corta
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record(True, 0.1)
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0 and breaker.allow()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record(False, 0.1)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record(False, 0.1)
+    assert breaker.state == OPEN
+    assert breaker.status()["retry_in_s"] == 30
+
+
+def test_success_resets_consecutive_failures(clock):
+    breaker = _breaker(min_calls=100)
+    for ok in (False, False, True, False, False):
+        breaker.record(ok, 0.1)
+    assert breaker.state == CLOSED
+
+
+def test_error_rate_opens(clock):
+    breaker = _breaker(consecutive_failures=100, min_calls=4, error_rate=0.5)
+    for ok in (True, False, True):
+        breaker.record(ok, 0.1)
+    assert breaker.state == CLOSED
+    breaker.record(False, 0.1)
+    assert breaker.state == OPEN
+
+
+def test_slow_calls_open(clock):
+    breaker = _breaker(min_calls=4, slow_seconds=2, slow_rate=0.5)
+    breaker.record(True, 0.1)
+    breaker.record(True, 0.1)
+    breaker.record(True, 5)
+    assert breaker.state == CLOSED
+    breaker.record(True, 5)
+    assert breaker.state == OPEN
+
+
+def test_window_forgets_old_calls(clock):
+    breaker = _breaker(consecutive_failures=100, window=10, min_calls=4, error_rate=0.5)
+    breaker.record(False, 0.1)
+    breaker.record(False, 0.1)
+    clock.now += 11
+    breaker.record(True, 0.1)
+    breaker.record(True, 0.1)
+    breaker.record(False, 0.1)
+    assert breaker.state == CLOSED
+    assert breaker.status()["window_calls"] == 3
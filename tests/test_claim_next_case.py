@@ -0,0 +1,56 @@
+import threading
+
+from app.database import SessionLocal
+from app.models import Case
+
+WORKERS = 8
+CASES = 40
+
+
+def test_concurrent_claims_never_share_a_case(db):
+    from app.main import _claim_next_case
+
+    chat_id = "claim-race@g.us"
+    cases = [Case(type="infringement", status="pending", chat_id=chat_id) for _ in range(CASES)]
+    db.add_all(cases)
+    db.commit()
+    ours = {case.id for case in cases}
+
+    start = threading.Barrier(WORKERS)
+    claimed = {}
+    errors = []
+
+    def moderator(phone: str):
+        session = SessionLocal()
+        try:
+            start.wait()
+            taken = []
+            while True:
+                case = _claim_next_case(session, phone, Case.id)
+                if case is None:
+                    break
+                taken.append((case.id, case.assigned_to))
+            claimed[phone] = taken
+        except Exception as e:
+            errors.append(e)
+        finally:
+            session.close()
+
+    # Moderadores sin grupos asignados: todos ven la misma cola
+    threads = [threading.Thread(target=moderator, args=(f"54911000{i:04d}",)) for i in range(WORKERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    ids = [case_id for taken in claimed.values() for case_id, _ in taken]
+    assert len(ids) == len(set(ids)), "un caso quedó asignado a dos moderadores"
+    assert ours <= set(ids)
+    for phone, taken in claimed.items():
+        assert all(assigned_to == phone for _, assigned_to in taken)
+
+    db.expire_all()
+    rows = db.query(Case.status, Case.assigned_to).filter(Case.id.in_(ours)).all()
+    assert {status for status, _ in rows} == {"in_review"}
+    assert {assigned for _, assigned in rows} <= set(claimed)
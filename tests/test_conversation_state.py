@@ -0,0 +1,102 @@
+import json
+
+import pytest
+from sqlalchemy import event
+
+from app.config import GROUP_ID
+from app.models import ConversationState
+from app.utils import conversation_state, reply_templates
+
+NORTE = "120363000000000001@g.us"
+
+
+@pytest.fixture(scope="module")
+def norte(client):
+    client.post("/admin/groups", json={"chat_id": NORTE, "name": "Barrio Norte", "rules": "Reglas del norte", "max_strikes": 5})
+    return NORTE
+
+
+@pytest.fixture
+def queries(app):
+    from app.database import engine
+
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    yield statements
+    event.remove(engine, "before_cursor_execute", count)
+
+
+def _group_message(client, phone: str, chat_id: str, message_id: str):
+    client.post("/ingest_message", json={
+        "phone": phone, "real_phone": phone, "chat_id": chat_id, "is_group": True, "message_type": "text",
+        "content": "buen día vecinos",
+        "whatsapp_message_key": json.dumps({"remoteJid": chat_id, "id": message_id}),
+    })
+
+
+def _private(client, phone: str, message: str) -> str:
+    return client.post("/conversation", json={"phone": phone, "message": message}).json()["instructions"]["text"]
+
+
+def test_rules_follow_the_last_group_without_queries(client, norte, queries):
+    phone = "5491122000001"
+    _group_message(client, phone, norte, "RULES1")
+    # Con las cachés de este worker ya cargadas
+    _private(client, phone, "reglas")
+    _private(client, phone, "menu")
+
+    queries.clear()
+    assert _private(client, phone, "reglas") == "Reglas del norte"
+    assert _private(client, phone, "menu")
+    assert queries == []
+
+    _group_message(client, phone, GROUP_ID, "RULES2")
+    assert _private(client, phone, "reglas") == reply_templates.render("rules", chat_id=GROUP_ID)
+
+
+def test_strikes_use_the_group_limit(client, norte):
+    phone = "5491122000002"
+    _group_message(client, phone, norte, "STRIKES1")
+    assert "0/5" in _private(client, phone, "strikes")
+
+
+def test_group_written_only_when_it_changes(client, norte, queries):
+    phone = "5491122000003"
+    _group_message(client, phone, norte, "SAME1")
+    queries.clear()
+    _group_message(client, phone, norte, "SAME2")
+    assert not any("conversation_states" in statement for statement in queries)
+
+
+def test_clearing_the_state_keeps_the_group(db):
+    phone = "5491122000004"
+    assert conversation_state.set_group(db, phone, NORTE)
+    db.commit()
+    assert not conversation_state.set_group(db, phone, NORTE)
+
+    conversation_state.set_state(db, phone, conversation_state.APPEAL_WAIT, target_case_id=None, ttl=conversation_state.APPEAL_WAIT_TTL)
+    db.commit()
+    assert conversation_state.get_state(db, phone)["state"] == conversation_state.APPEAL_WAIT
+    assert conversation_state.get_group(db, phone) == NORTE
+
+    conversation_state.clear_state(db, phone)
+    db.commit()
+    assert conversation_state.get_state(db, phone) is None
+    assert conversation_state.get_group(db, phone) == NORTE
+    db.expire_all()
+    row = db.get(ConversationState, phone)
+    assert row.state is None and row.group_chat_id == NORTE
+
+
+def test_clearing_without_group_deletes_the_row(db):
+    phone = "5491122000005"
+    conversation_state.set_state(db, phone, conversation_state.APPEAL_WAIT, ttl=conversation_state.APPEAL_WAIT_TTL)
+    db.commit()
+    conversation_state.clear_state(db, phone)
+    db.commit()
+    assert db.get(ConversationState, phone) is None
+    assert conversation_state.get_group(db, phone) is None
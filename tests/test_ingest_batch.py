@@ -0,0 +1,60 @@
+import json
+
+from app.config import GROUP_ID
+from app.models import Message
+
+
+def _message(i: int, prefix: str) -> dict:
+    phone = f"54977{i % 3:08d}"
+    return {
+        "phone": phone, "real_phone": phone, "name": f"Vecino {i % 3}", "chat_id": GROUP_ID, "is_group": True,
+        "message_type": "text",
+        "content": f"buen día vecinos, alguien sabe si hay luz en la cuadra {i}?",
+        "whatsapp_message_key": json.dumps({"remoteJid": GROUP_ID, "id": f"{prefix}{i}", "participant": f"{phone}@s.whatsapp.net"}),
+        "participant_jid": f"{phone}@s.whatsapp.net",
+    }
+
+
+def _stored(db, prefix: str) -> int:
+    return db.query(Message).filter(Message.whatsapp_message_id.like(f"%/{prefix}%")).count()
+
+
+def test_replayed_batch_is_duplicate(client, db):
+    batch = [_message(i, "IDEM") for i in range(10)]
+
+    first = client.post("/ingest_batch", json={"messages": batch}).json()["results"]
+    assert [r["status"] for r in first] == ["stored"] * 10
+    assert _stored(db, "IDEM") == 10
+
+    # El buffer del conector reenvía la tanda entera tras un corte
+    second = client.post("/ingest_batch", json={"messages": batch}).json()["results"]
+    assert [r["status"] for r in second] == ["duplicate"] * 10
+    assert [r["message_id"] for r in second] == [r["message_id"] for r in first]
+    assert _stored(db, "IDEM") == 10
+
+
+def test_repeated_key_inside_one_batch(client, db):
+    message = _message(0, "TWICE")
+    results = client.post("/ingest_batch", json={"messages": [message, message]}).json()["results"]
+    assert [r["status"] for r in results] == ["stored", "duplicate"]
+    assert results[0]["message_id"] == results[1]["message_id"]
+    assert _stored(db, "TWICE") == 1
+
+
+def test_partial_replay_and_invalid_items(client, db):
+    old = [_message(i, "MIX") for i in range(3)]
+    client.post("/ingest_batch", json={"messages": old})
+
+    batch = old + [{"phone": "1"}, _message(3, "MIX")]
+    results = client.post("/ingest_batch", json={"messages": batch}).json()["results"]
+    assert [r["status"] for r in results] == ["duplicate"] * 3 + ["error", "stored"]
+    assert results[3]["retry"] is False
+    assert _stored(db, "MIX") == 4
+
+
+def test_ingest_message_after_batch_is_duplicate(client, db):
+    message = _message(0, "ONE")
+    client.post("/ingest_batch", json={"messages": [message]})
+    result = client.post("/ingest_message", json=message).json()
+    assert result.get("duplicate")
+    assert _stored(db, "ONE") == 1
@@ -0,0 +1,100 @@
+import io
+import json
+from urllib import error
+
+import pytest
+
+from app.services import llm_backends
+from app.services.llm_backends import LLMUnavailable, OpenAICompatibleBackend
+from app.utils import circuit_breaker
+from app.utils.circuit_breaker import CLOSED, OPEN, CircuitBreaker
+
+PRIMARY_URL = "http://primary.test/v1/chat/completions"
+FALLBACK_URL = "http://fallback.test/v1/chat/completions"
+MESSAGES = [{"role": "user", "content": "hola"}]
+
+
+class FakeServers:
+    """urlopen falso: cuenta los pedidos por URL y falla en las que están caídas"""
+
+    def __init__(self):
+        self.calls = {PRIMARY_URL: 0, FALLBACK_URL: 0}
+        self.down = set()
+
+    def urlopen(self, req, timeout=None):
+        self.calls[req.full_url] += 1
+        if req.full_url in self.down:
+            raise error.URLError("connection refused")
+        name = "primary" if req.full_url == PRIMARY_URL else "fallback"
+        body = {"choices": [{"message": {"content": f" {name} "}}], "usage": {"prompt_tokens": 3, "completion_tokens": 1}}
+        return io.BytesIO(json.dumps(body).encode("utf-8"))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def servers(monkeypatch):
+    servers = FakeServers()
+    monkeypatch.setattr(llm_backends.request, "urlopen", servers.urlopen)
+    return servers
+
+
+@pytest.fixture
+def backends(monkeypatch, clock):
+    primary = OpenAICompatibleBackend("primary", PRIMARY_URL, "m")
+    fallback = OpenAICompatibleBackend("fallback", FALLBACK_URL, "m")
+    for backend in (primary, fallback):
+        backend.breaker = CircuitBreaker(backend.name, consecutive_failures=2, open_seconds=30, min_calls=100)
+    monkeypatch.setattr(llm_backends, "_enabled", lambda: [primary, fallback])
+    return primary, fallback
+
+
+def test_primary_answers_when_healthy(servers, backends):
+    assert llm_backends.complete(MESSAGES) == "primary"
+    assert servers.calls == {PRIMARY_URL: 1, FALLBACK_URL: 0}
+
+
+def test_falls_back_and_skips_open_primary(servers, backends, clock):
+    primary, fallback = backends
+    servers.down.add(PRIMARY_URL)
+
+    # Cada falla del principal pasa al de respaldo en el mismo pedido
+    assert llm_backends.complete(MESSAGES) == "fallback"
+    assert llm_backends.complete(MESSAGES) == "fallback"
+    assert primary.breaker.state == OPEN
+    assert servers.calls == {PRIMARY_URL: 2, FALLBACK_URL: 2}
+
+    # Con el circuito abierto ni se lo intenta
+    assert llm_backends.complete(MESSAGES) == "fallback"
+    assert servers.calls[PRIMARY_URL] == 2
+    assert llm_backends.ready() and not llm_backends.ready(fallback=False)
+
+    # Pasado open_seconds, una llamada de prueba que sale bien lo vuelve a cerrar
+    servers.down.clear()
+    clock[0] += 30
+    assert llm_backends.complete(MESSAGES) == "primary"
+    assert primary.breaker.state == CLOSED
+    assert fallback.breaker.state == CLOSED
+
+
+def test_no_fallback_for_primary_only_calls(servers, backends):
+    servers.down.add(PRIMARY_URL)
+    with pytest.raises(error.URLError):
+        llm_backends.complete(MESSAGES, fallback=False)
+    assert servers.calls[FALLBACK_URL] == 0
+
+
+def test_all_open_fails_fast(servers, backends):
+    servers.down.update((PRIMARY_URL, FALLBACK_URL))
+    for _ in range(2):
+        with pytest.raises(error.URLError):
+            llm_backends.complete(MESSAGES)
+    calls = dict(servers.calls)
+    with pytest.raises(LLMUnavailable):
+        llm_backends.complete(MESSAGES)
+    assert servers.calls == calls
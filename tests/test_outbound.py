@@ -0,0 +1,89 @@
+import json
+
+from app.config import OUTBOUND_BURST
+from app.models import OutboundBucket
+from app.utils.outbound import TEXT_SEPARATOR, Pacer, _coalesce, coalesce
+
+
+def text(to: str, body: str) -> dict:
+    return {"send_message": True, "to": to, "text": body}
+
+
+def delete(message_id: str) -> dict:
+    key = json.dumps({"remoteJid": "grupo@g.us", "id": message_id})
+    return {"delete_message": True, "message_key": key}
+
+
+def kick(jid: str) -> dict:
+    return {"remove_user": True, "chat_id": "grupo@g.us", "participant_jid": jid}
+
+
+def test_adjacent_texts_merge():
+    assert coalesce([text("a", "uno"), text("a", "dos"), text("a", "uno")]) == [
+        text("a", TEXT_SEPARATOR.join(["uno", "dos"])),
+    ]
+
+
+def test_text_never_jumps_a_delete():
+    result = coalesce([text("a", "uno"), delete("M1"), text("a", "dos")])
+    assert result == [text("a", "uno"), delete("M1"), text("a", "dos")]
+
+
+def test_other_recipient_breaks_the_run():
+    result = coalesce([text("a", "uno"), text("b", "hola"), text("a", "dos")])
+    assert result == [text("a", "uno"), text("b", "hola"), text("a", "dos")]
+
+
+def test_repeated_text_after_a_kick_is_kept():
+    result = coalesce([text("a", "aviso"), kick("1@s"), text("a", "aviso")])
+    assert result == [text("a", "aviso"), kick("1@s"), text("a", "aviso")]
+
+
+def test_dropped_duplicate_does_not_break_the_run():
+    kept, dropped, changed = _coalesce([
+        (1, delete("M1")),
+        (2, text("a", "uno")),
+        (3, delete("M1")),
+        (4, text("a", "dos")),
+    ])
+    assert kept == [(1, delete("M1")), (2, text("a", TEXT_SEPARATOR.join(["uno", "dos"])))]
+    assert dropped == [(3, "duplicate"), (4, "merged_text")]
+    assert changed == {2}
+
+
+def test_non_dict_instruction_keeps_its_place():
+    result = coalesce([text("a", "uno"), "raw", text("a", "dos")])
+    assert result == [text("a", "uno"), "raw", text("a", "dos")]
+
+
+def test_pacer_creates_bucket_once(db):
+    key = "send:test-pacer"
+    for _ in range(2):
+        pacer = Pacer(db, now=1000.0)
+        assert pacer.take(key)
+        pacer.save()
+        db.commit()
+    assert db.query(OutboundBucket).filter(OutboundBucket.key == key).count() == 1
+    assert db.query(OutboundBucket).filter(OutboundBucket.key == key).one().tokens == OUTBOUND_BURST - 2
+
+
+def add(jid: str) -> dict:
+    return {"add_user": True, "chat_id": "grupo@g.us", "participant_jid": jid}
+
+
+def test_kick_after_reinstate_is_kept():
+    # Ban, apelación aceptada y otro ban: el usuario tiene que quedar afuera
+    assert coalesce([kick("1@s"), add("1@s"), kick("1@s")]) == [kick("1@s"), add("1@s"), kick("1@s")]
+    assert coalesce([add("1@s"), kick("1@s"), add("1@s")]) == [add("1@s"), kick("1@s"), add("1@s")]
+
+
+def test_repeated_kick_is_dropped_per_participant():
+    kept, dropped, _ = _coalesce([
+        (1, kick("1@s")),
+        (2, add("2@s")),
+        (3, kick("1@s")),
+        (4, kick("2@s")),
+        (5, kick("2@s")),
+    ])
+    assert [ref for ref, _ in kept] == [1, 2, 4]
+    assert dropped == [(3, "duplicate"), (5, "duplicate")]
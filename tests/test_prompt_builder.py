@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import prompt_builder
+from app.services.prompt_builder import build_messages, estimate_tokens
+
+CONFIG = {"system_prompt": "Sos el bot del grupo del barrio.", "max_tokens": 200}
+
+
+def turn(role: str, content: str):
+    return SimpleNamespace(role=role, content=content)
+
+
+def conversation(exchanges: int) -> list:
+    history = []
+    for i in range(exchanges):
+        history.append(turn("user", f"pregunta {i} " + "sobre la feria del sábado " * 10))
+        history.append(turn("assistant", f"respuesta {i} " + "la feria es en la plaza " * 10))
+    return history
+
+
+@pytest.fixture
+def budget(app, monkeypatch):
+    monkeypatch.setattr(prompt_builder, "PROMPT_TOKEN_BUDGET", 600)
+    return 600
+
+
+def _tokens(messages) -> int:
+    return sum(estimate_tokens(m["content"]) + prompt_builder.MESSAGE_OVERHEAD for m in messages)
+
+
+def test_stays_within_budget(budget):
+    knowledge = [f"dato {i}: " + "horarios de la feria y del centro de salud " * 8 for i in range(10)]
+    messages, stats = build_messages(
+        CONFIG, "INFO", "lunes", "¿a qué hora abre la feria?", knowledge, conversation(30), summary="Resumen: " + "charla vieja " * 20,
+    )
+    assert stats["budget"] == budget
+    assert stats["total"] <= budget
+    assert _tokens(messages) <= budget
+    # Se recortó: no entró todo el conocimiento ni todo el historial
+    assert stats["knowledge_entries"] != "10/10"
+    assert stats["history_turns"] != "60/60"
+
+
+def test_keeps_newest_history_in_whole_exchanges(budget):
+    history = conversation(30)
+    messages, stats = build_messages(CONFIG, "GENERAL", "lunes", "hola", [], history)
+    kept = messages[1:-1]
+    assert kept, "con 600 tokens algo del historial tiene que entrar"
+    assert kept[0]["role"] == "user" and kept[-1]["role"] == "assistant"
+    assert kept[-1]["content"] == history[-1].content
+    assert messages[-1] == {"role": "user", "content": "hola"}
+
+
+def test_knowledge_by_relevance_and_share(budget):
+    knowledge = ["el más relevante " * 5, "segundo " * 5] + ["relleno " * 200]
+    messages, stats = build_messages(CONFIG, "INFO", "lunes", "hola", knowledge, [])
+    system = messages[0]["content"]
+    assert "el más relevante" in system and "segundo" in system
+    assert stats["knowledge"] <= int((budget - stats["system"] - stats["user"]) * prompt_builder.KNOWLEDGE_SHARE)
+
+
+def test_summary_only_when_it_fits(budget):
+    messages, stats = build_messages(CONFIG, "GENERAL", "lunes", "hola", [], [], summary="viejo " * 2000)
+    assert stats["summary"] == 0
+    assert len(messages) == 2
+
+
+def test_budget_never_exceeds_model_window(monkeypatch):
+    monkeypatch.setattr(prompt_builder, "PROMPT_TOKEN_BUDGET", 100000)
+    assert prompt_builder.token_budget(1000, "gemma2-9b-it") == 8192 - 1000
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# train_sale_model.py
+"""
+Entrena el modelo de ventas con las decisiones de los moderadores (necesita numpy).
+
+    python train_sale_model.py              # suma lo etiquetado desde el último entrenamiento
+    python train_sale_model.py --full       # de cero con todas las etiquetas
+    python train_sale_model.py --eval       # precision/recall vs heuristic_v2 (validación cruzada)
+"""
+import argparse
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.sale_training import evaluate, train
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--full", action="store_true", help="rearmar el modelo de cero")
+    parser.add_argument("--eval", action="store_true", help="solo evaluar, sin guardar el modelo")
+    parser.add_argument("--folds", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.eval:
+        print(json.dumps(evaluate(folds=args.folds), indent=2, ensure_ascii=False))
+        return
+    print(json.dumps(train(full=args.full), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -15,14 +15,24 @@ import { Boom } from "@hapi/boom";
 import fs from "fs";
 import path from "path";
 import pino from "pino";
+import { IngestBuffer } from "./ingest_buffer.js";
 
 // ================================
 // CONFIGURACIÓN
 // ================================
 const API_BASE_URL = "http://localhost:8000";
-const GROUP_ID = "120363200443002725@g.us";
+// Grupo por defecto, se usa hasta que la API devuelva la lista de grupos
+const GROUP_ID = process.env.GROUP_ID || "120363200443002725@g.us";
+let monitoredGroups = new Set([GROUP_ID]);
 let socketReady = false;
 let instructionPoller = null;
+let groupsPoller = null;
+
+// DEBUG=1 vuelca mensajes e instrucciones completos a la consola
+const DEBUG = process.env.DEBUG === "1";
+function debugLog(...args) {
+  if (DEBUG) console.log(...args);
+}
 
 // Logger silencioso (evita spam en consola, reduce fingerprint raro)
 const logger = pino({ level: "silent" });
@@ -49,13 +59,31 @@ if (!fs.existsSync(IMAGE_DIR)) {
   fs.mkdirSync(IMAGE_DIR, { recursive: true });
 }
 
+// Mensajes de grupo que no llegaron a la API (ver ingest_buffer.js)
+const BUFFER_DIR = path.resolve(process.env.INGEST_BUFFER_DIR || "buffer");
+const ingestBuffer = new IngestBuffer(BUFFER_DIR, async (messages) => {
+  const response = await axios.post(`${API_BASE_URL}/ingest_batch`, { messages }, {
+    timeout: 30000,
+    validateStatus: () => true
+  });
+  return {
+    status: response.status,
+    data: response.data,
+    retryAfter: parseFloat(response.headers["retry-after"]) || null
+  };
+});
+if (ingestBuffer.pending) {
+  console.log(`📦 Buffer con ${ingestBuffer.pending} mensaje(s) sin enviar a la API`);
+}
+ingestBuffer.start();
+
 // ================================
 // FUNCIÓN PARA BORRAR MENSAJES
 // ================================
 async function deleteMessageFromGroup(sock, messageKey) {
   try {
     console.log(`🗑️ Intentando borrar mensaje...`);
-    console.log(`   Key:`, JSON.stringify(messageKey, null, 2));
+    if (DEBUG) console.log(`   Key:`, JSON.stringify(messageKey, null, 2));
 
     await sock.sendMessage(messageKey.remoteJid, {
       delete: messageKey
@@ -114,7 +142,7 @@ async function addUserToGroup(sock, chatId, participantJid) {
 
     const result = await sock.groupParticipantsUpdate(chatId, [participantJid], "add");
 
-    console.log(`   Resultado:`, JSON.stringify(result, null, 2));
+    if (DEBUG) console.log(`   Resultado:`, JSON.stringify(result, null, 2));
 
     if (result && result[0]) {
       const status = result[0].status;
@@ -149,7 +177,7 @@ async function processInstructions(instructions, sock, originalChatId = null) {
     return;
   }
 
-  console.log("🔧 Procesando instrucciones:", JSON.stringify(instructions, null, 2));
+  if (DEBUG) console.log("🔧 Procesando instrucciones:", JSON.stringify(instructions, null, 2));
 
   let instructionList = [];
   if (Array.isArray(instructions)) {
@@ -171,7 +199,7 @@ async function processInstructions(instructions, sock, originalChatId = null) {
 
   for (const instruction of instructionList) {
     try {
-      console.log("🔹 Procesando instrucción:", instruction);
+      debugLog("🔹 Procesando instrucción:", instruction);
 
       // 1. Enviar mensaje
       if (instruction.send_message && instruction.to && instruction.text) {
@@ -207,7 +235,7 @@ async function processInstructions(instructions, sock, originalChatId = null) {
       if (instruction.delete_message && instruction.message_key) {
         console.log("🗑️ Intentando borrar mensaje del grupo...");
         const messageKey = JSON.parse(instruction.message_key);
-        console.log("   Key parseada:", messageKey);
+        debugLog("   Key parseada:", messageKey);
         await deleteMessageFromGroup(sock, messageKey);
       }
 
@@ -222,7 +250,7 @@ async function processInstructions(instructions, sock, originalChatId = null) {
         console.log(`   participant_jid: ${instruction.participant_jid}`);
 
         const result = await addUserToGroup(sock, instruction.chat_id, instruction.participant_jid);
-        console.log(`   Resultado de agregar:`, result);
+        debugLog(`   Resultado de agregar:`, result);
 
         if (!result.success) {
           let errorMsg = "❌ No se pudo agregar al usuario. ";
@@ -254,6 +282,32 @@ async function processInstructions(instructions, sock, originalChatId = null) {
   }
 }
 
+// Respuesta NDJSON de /conversation con stream: true. Cada línea es un
+// {"instructions": ...} y se manda apenas llega (la IA responde en partes).
+async function processInstructionStream(stream, sock, chatId) {
+  let buffer = "";
+  for await (const chunk of stream) {
+    buffer += chunk.toString("utf8");
+    let newline;
+    while ((newline = buffer.indexOf("\n")) >= 0) {
+      const line = buffer.slice(0, newline).trim();
+      buffer = buffer.slice(newline + 1);
+      if (!line) continue;
+      const item = JSON.parse(line);
+      debugLog("✅ Parte de /conversation:", item);
+      if (item.instructions) {
+        await processInstructions(item.instructions, sock, chatId);
+      }
+    }
+  }
+  if (buffer.trim()) {
+    const item = JSON.parse(buffer);
+    if (item.instructions) {
+      await processInstructions(item.instructions, sock, chatId);
+    }
+  }
+}
+
 async function buildGroupMessagePayload(msg, messageType, sender, pushName, chatId, participantJid) {
   const normalizedType = SUPPORTED_GROUP_MESSAGE_TYPES[messageType];
   if (!normalizedType) {
@@ -316,6 +370,24 @@ async function buildGroupMessagePayload(msg, messageType, sender, pushName, chat
   };
 }
 
+async function refreshMonitoredGroups() {
+  try {
+    const response = await axios.get(`${API_BASE_URL}/connector/groups`, {
+      timeout: 10000
+    });
+    const groups = response.data.groups;
+    if (!Array.isArray(groups)) {
+      console.error("❌ Respuesta inválida de /connector/groups, se mantienen los grupos actuales");
+      return;
+    }
+    // La lista vacía también vale: sin grupos activos no se reenvía nada
+    monitoredGroups = new Set(groups);
+  } catch (error) {
+    // La API no respondió: se sigue con los grupos que ya se conocían
+    console.error("❌ Error consultando grupos monitoreados:", error.message);
+  }
+}
+
 async function pollPendingInstructions(sock) {
   if (!socketReady) return;
 
@@ -415,6 +487,11 @@ async function start() {
         }, 3000);
       }
 
+      if (!groupsPoller) {
+        groupsPoller = setInterval(refreshMonitoredGroups, 60000);
+      }
+      refreshMonitoredGroups();
+
       pollPendingInstructions(sock);
     }
   });
@@ -426,10 +503,10 @@ async function start() {
     try {
       const msg = messages[0];
 
-      console.log(`\n🔎 RAW MESSAGE DEBUG:`);
-      console.log(`   msg.message:`, msg.message ? 'EXISTS' : 'UNDEFINED');
-      if (msg.message) {
-        console.log(`   msg.message keys:`, Object.keys(msg.message));
+      debugLog(`\n🔎 RAW MESSAGE DEBUG:`);
+      debugLog(`   msg.message:`, msg.message ? 'EXISTS' : 'UNDEFINED');
+      if (DEBUG && msg.message) {
+        debugLog(`   msg.message keys:`, Object.keys(msg.message));
       }
 
       if (!msg.message) return;
@@ -445,7 +522,7 @@ async function start() {
         ? (msg.key.participant || msg.participant)
         : msg.key.remoteJid;
 
-      console.log("👤 participantJid:", participantJid);
+      debugLog("👤 participantJid:", participantJid);
 
       // Buscar el tipo de mensaje real
       const messageKeys = Object.keys(msg.message);
@@ -459,10 +536,10 @@ async function start() {
         key === 'extendedTextMessage'
       ) || messageKeys[0];
 
-      console.log(`\n🔎 ===== DEBUG MENSAJE =====`);
-      console.log(`   messageType: ${messageType}`);
-      console.log(`   msg.message:`, JSON.stringify(msg.message, null, 2));
-      console.log(`========================\n`);
+      debugLog(`\n🔎 ===== DEBUG MENSAJE =====`);
+      debugLog(`   messageType: ${messageType}`);
+      if (DEBUG) console.log(`   msg.message:`, JSON.stringify(msg.message, null, 2));
+      debugLog(`========================\n`);
 
       console.log(`\n📨 Nuevo mensaje recibido:`);
       console.log(`   Chat: ${isGroup ? 'Grupo' : 'Privado'}`);
@@ -476,18 +553,18 @@ async function start() {
         sender = chatId.split("@")[0];
       }
 
-      console.log(`\n🔍 DEBUG - Información completa del remitente:`);
-      console.log(`   msg.key:`, JSON.stringify(msg.key, null, 2));
-      console.log(`   msg.participant:`, msg.participant);
-      console.log(`   msg.pushName:`, msg.pushName);
-      console.log(`   msg.verifiedBizName:`, msg.verifiedBizName);
+      debugLog(`\n🔍 DEBUG - Información completa del remitente:`);
+      if (DEBUG) console.log(`   msg.key:`, JSON.stringify(msg.key, null, 2));
+      debugLog(`   msg.participant:`, msg.participant);
+      debugLog(`   msg.pushName:`, msg.pushName);
+      debugLog(`   msg.verifiedBizName:`, msg.verifiedBizName);
 
       const pushName = msg.pushName || "Usuario";
 
       // ============================================
       // 1. MENSAJES EN GRUPO (DETECCIÓN DE VENTAS)
       // ============================================
-      if (isGroup && chatId === GROUP_ID) {
+      if (isGroup && monitoredGroups.has(chatId)) {
         console.log(`   👥 Grupo monitoreado`);
         const payload = await buildGroupMessagePayload(
           msg,
@@ -514,18 +591,31 @@ async function start() {
           console.log(`   🔍 ¿Palabra clave de venta?: ${hasSalesKeyword}`);
         }
 
+        // Con mensajes viejos todavía en el buffer, el nuevo va detrás de ellos
+        if (ingestBuffer.pending) {
+          ingestBuffer.append(payload);
+          console.log(`📦 Mensaje al buffer (${ingestBuffer.pending} pendientes)`);
+          return;
+        }
+
         try {
           console.log(`   📞 Teléfono real: ${payload.real_phone}`);
           console.log("📤 Enviando a /ingest_message...");
           const response = await axios.post(`${API_BASE_URL}/ingest_message`, payload, {
             timeout: 10000
           });
-          console.log("✅ API respondió:", response.data);
+          debugLog("✅ API respondió:", response.data);
         } catch (error) {
           console.error("❌ Error enviando a API:", error.message);
           if (error.response) {
             console.error("   Detalles:", error.response.data);
           }
+          // Sin respuesta o error del servidor: se guarda y se reenvía cuando vuelva
+          // (si la API llegó a guardarlo, lo descarta por la key del mensaje)
+          if (!error.response || error.response.status >= 500) {
+            ingestBuffer.append(payload);
+            console.log(`📦 Mensaje al buffer (${ingestBuffer.pending} pendientes)`);
+          }
         }
         return;
       }
@@ -553,9 +643,9 @@ async function start() {
           console.log(`🔢 Respuesta numérica detectada: ${messageText}`);
           try {
             const payload = { phone: sender, response: messageText.trim() };
-            console.log("📤 Enviando a /moderation/response:", payload);
+            debugLog("📤 Enviando a /moderation/response:", payload);
             const response = await axios.post(`${API_BASE_URL}/moderation/response`, payload);
-            console.log("✅ Respuesta de /moderation/response:", response.data);
+            debugLog("✅ Respuesta de /moderation/response:", response.data);
 
             if (response.data.instructions) {
               await processInstructions(response.data.instructions, sock, chatId);
@@ -572,16 +662,15 @@ async function start() {
             real_phone: realPhone,
             message: messageText,
             name: pushName,
-            reply_jid: chatId
+            reply_jid: chatId,
+            stream: true
           };
 
-          console.log("📤 Enviando a /conversation:", payload);
-          const response = await axios.post(`${API_BASE_URL}/conversation`, payload);
-          console.log("✅ Respuesta de /conversation:", response.data);
-
-          if (response.data.instructions) {
-            await processInstructions(response.data.instructions, sock, chatId);
-          }
+          debugLog("📤 Enviando a /conversation:", payload);
+          const response = await axios.post(`${API_BASE_URL}/conversation`, payload, {
+            responseType: "stream"
+          });
+          await processInstructionStream(response.data, sock, chatId);
         } catch (error) {
           console.error("Error en /conversation:", error.message);
         }
@@ -591,7 +680,7 @@ async function start() {
       // ============================================
       // 3. OTROS GRUPOS (IGNORAR)
       // ============================================
-      if (isGroup && chatId !== GROUP_ID) {
+      if (isGroup && !monitoredGroups.has(chatId)) {
         console.log(`   👥 Grupo no monitoreado, ignorando`);
         return;
       }
@@ -621,7 +710,7 @@ process.on('SIGINT', () => {
 // Iniciar el bot
 console.log("🚀 Iniciando bot moderador de WhatsApp...");
 console.log(`🌐 API: ${API_BASE_URL}`);
-console.log(`👥 Grupo monitoreado: ${GROUP_ID}`);
+console.log(`👥 Grupo por defecto: ${GROUP_ID}`);
 console.log("📸 Directorio de imágenes:", IMAGE_DIR);
 console.log("==========================================");
 
@@ -0,0 +1,222 @@
+// ============================================
+// BUFFER LOCAL DE MENSAJES DE GRUPO
+// ============================================
+// Si la API no responde (reinicio, caída), los mensajes de grupo se agregan
+// a un archivo JSONL en disco en vez de perderse. Un drenador los manda a
+// /ingest_batch en tandas cuando la API vuelve:
+// - la tanda crece mientras la API responde rápido y se achica con errores
+//   o respuestas lentas; con 429/503 se respeta Retry-After;
+// - el avance (offset en bytes) se guarda aparte y se escribe con rename,
+//   así un corte a mitad de tanda solo reenvía esa tanda (la API descarta
+//   repetidos por la key del mensaje);
+// - mientras quede algo en el buffer los mensajes nuevos también van al
+//   final, para no pasar adelante de los viejos.
+import fs from "fs";
+import path from "path";
+
+const READ_CHUNK = 1 << 20;
+
+export class IngestBuffer {
+  constructor(dir, post, options = {}) {
+    this.dir = dir;
+    this.post = post; // async (messages) => ({ status, data, retryAfter })
+    this.minBatch = options.minBatch || 10;
+    this.maxBatch = options.maxBatch || 200;
+    this.slowMs = options.slowMs || 2000;
+    this.maxAttempts = options.maxAttempts || 5;
+    this.maxBackoffMs = options.maxBackoffMs || 30000;
+    this.fsync = options.fsync ?? true;
+
+    fs.mkdirSync(dir, { recursive: true });
+    this.queuePath = path.join(dir, "ingest.jsonl");
+    this.offsetPath = path.join(dir, "ingest.offset");
+    this.deadPath = path.join(dir, "ingest.dead.jsonl");
+
+    this.offset = this._readOffset();
+    this.pending = this._countPending();
+    this.batchSize = this.minBatch;
+    this.backoffMs = 0;
+    this.draining = false;
+    this.timer = null;
+    this.stats = { sent: 0, stored: 0, duplicate: 0, dropped: 0, batches: 0, retries: 0 };
+  }
+
+  _readOffset() {
+    try {
+      const offset = parseInt(fs.readFileSync(this.offsetPath, "utf8"), 10) || 0;
+      const size = fs.existsSync(this.queuePath) ? fs.statSync(this.queuePath).size : 0;
+      return offset <= size ? offset : 0;
+    } catch {
+      return 0;
+    }
+  }
+
+  _writeOffset(offset) {
+    const tmp = `${this.offsetPath}.tmp`;
+    fs.writeFileSync(tmp, String(offset));
+    fs.renameSync(tmp, this.offsetPath);
+    this.offset = offset;
+  }
+
+  _countPending() {
+    let count = 0;
+    this._scan(this.offset, Infinity, () => count++);
+    return count;
+  }
+
+  // Recorre líneas completas desde `from`; devuelve el offset después de la última leída
+  _scan(from, limit, onLine) {
+    if (!fs.existsSync(this.queuePath)) return from;
+    const fd = fs.openSync(this.queuePath, "r");
+    try {
+      const buffer = Buffer.alloc(READ_CHUNK);
+      let position = from;
+      let rest = Buffer.alloc(0);
+      let read = 0;
+      while (read < limit) {
+        const bytes = fs.readSync(fd, buffer, 0, READ_CHUNK, position + rest.length);
+        if (!bytes) break;
+        const data = Buffer.concat([rest, buffer.subarray(0, bytes)]);
+        let start = 0;
+        let newline;
+        while (read < limit && (newline = data.indexOf(10, start)) !== -1) {
+          onLine(data.subarray(start, newline).toString("utf8"));
+          read++;
+          start = newline + 1;
+        }
+        position += start;
+        rest = data.subarray(start);
+        if (read >= limit) break;
+      }
+      return position;
+    } finally {
+      fs.closeSync(fd);
+    }
+  }
+
+  append(payload, attempts = 0) {
+    const line = JSON.stringify({ payload, attempts, buffered_at: Date.now() }) + "\n";
+    const fd = fs.openSync(this.queuePath, "a");
+    try {
+      fs.writeSync(fd, line);
+      if (this.fsync) fs.fsyncSync(fd);
+    } finally {
+      fs.closeSync(fd);
+    }
+    this.pending++;
+  }
+
+  _readBatch() {
+    const entries = [];
+    const end = this._scan(this.offset, this.batchSize, line => {
+      try {
+        entries.push(JSON.parse(line));
+      } catch {
+        // Línea cortada por un apagón a mitad de escritura
+        console.error("⚠️ Buffer: línea inválida descartada");
+      }
+    });
+    return { entries, end };
+  }
+
+  _compact() {
+    // Todo enviado: se vacía el archivo en vez de dejarlo crecer
+    if (fs.existsSync(this.queuePath) && this.offset >= fs.statSync(this.queuePath).size) {
+      fs.truncateSync(this.queuePath, 0);
+      this._writeOffset(0);
+      this.pending = 0;
+    }
+  }
+
+  _wait(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+  }
+
+  // Manda tandas hasta vaciar el buffer o hasta que la API falle
+  async drain() {
+    if (this.draining || this.pending === 0) return;
+    this.draining = true;
+    const sentBefore = this.stats.sent;
+    try {
+      while (this.pending > 0) {
+        const { entries, end } = this._readBatch();
+        if (!entries.length) {
+          if (end > this.offset) this._writeOffset(end);
+          this._compact();
+          this.pending = 0;
+          break;
+        }
+
+        const started = Date.now();
+        let response;
+        try {
+          response = await this.post(entries.map(entry => entry.payload));
+        } catch (error) {
+          response = { status: 0, error: error.message };
+        }
+        const elapsed = Date.now() - started;
+
+        if (response.status === 429 || response.status === 503) {
+          // Backpressure de la API: esperar lo que pide con una tanda más chica
+          this.batchSize = Math.max(this.minBatch, Math.floor(this.batchSize / 2));
+          this.stats.retries++;
+          await this._wait((response.retryAfter || 1) * 1000);
+          continue;
+        }
+        if (response.status !== 200 || !Array.isArray(response.data?.results)) {
+          this.batchSize = this.minBatch;
+          this.backoffMs = Math.min(this.maxBackoffMs, Math.max(1000, this.backoffMs * 2));
+          this.stats.retries++;
+          console.error(`❌ Buffer: la API no respondió (${response.status || response.error}); reintento en ${this.backoffMs} ms`);
+          return;
+        }
+
+        this.backoffMs = 0;
+        const results = response.data.results;
+        entries.forEach((entry, i) => {
+          const result = results[i] || { status: "error", retry: true };
+          if (result.status === "stored" || result.status === "duplicate") {
+            this.stats[result.status]++;
+          } else if (result.retry && entry.attempts + 1 < this.maxAttempts) {
+            this.append(entry.payload, entry.attempts + 1);
+          } else {
+            fs.appendFileSync(this.deadPath, JSON.stringify({ ...entry, error: result.error }) + "\n");
+            this.stats.dropped++;
+          }
+        });
+        this._writeOffset(end);
+        this.pending -= entries.length;
+        this.stats.sent += entries.length;
+        this.stats.batches++;
+        this._compact();
+
+        // Tanda rápida: la siguiente más grande; lenta: más chica
+        if (elapsed < this.slowMs / 2) {
+          this.batchSize = Math.min(this.maxBatch, this.batchSize * 2);
+        } else if (elapsed > this.slowMs) {
+          this.batchSize = Math.max(this.minBatch, Math.floor(this.batchSize / 2));
+        }
+      }
+      if (this.pending === 0 && this.stats.sent > sentBefore) {
+        console.log(`📦 Buffer vacío: ${this.stats.stored} guardados, ${this.stats.duplicate} repetidos, ${this.stats.dropped} descartados`);
+      }
+    } finally {
+      this.draining = false;
+    }
+  }
+
+  // Intenta drenar cada `intervalMs` (más espaciado mientras la API siga caída)
+  start(intervalMs = 2000) {
+    if (this.timer) return;
+    const tick = async () => {
+      await this.drain();
+      this.timer = setTimeout(tick, Math.max(intervalMs, this.backoffMs));
+    };
+    this.timer = setTimeout(tick, 0);
+  }
+
+  stop() {
+    clearTimeout(this.timer);
+    this.timer = null;
+  }
+}